@@ -2,52 +2,109 @@
 # Date: 02/22/2022
 # used starter code and concepts from "Computer Networking: A Top-Down Approach" by James F. Kurose and Keith Ross
 
+import argparse
+import random
 from socket import *
 from socket_constants import *
 from game_constants import *
 from game_helpers import RPSGameManager
 from generic_utils import get_validated_input
+from match_log import MatchRecorder, append_match
+from rps_bots import BOT_KINDS, make_bot
+from rps_metrics import add_metrics_arguments, start_metrics_export
+from udp_transport import ReliableUDPSocket
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Reads command-line options. With no options, a person plays interactively.
+    :return: parsed options
+    """
+    parser = argparse.ArgumentParser(description='Play Super LAN Rock-Paper-Scissors as player 1.')
+    parser.add_argument('--bot', choices=BOT_KINDS, help='let a bot play instead of prompting')
+    parser.add_argument('--moves', default='', help='comma-separated moves for the scripted bot, like R,P,S')
+    parser.add_argument('--rounds', type=int, help='bot quits after this many rounds')
+    parser.add_argument('--stage', choices=list(STAGES), help='stage for the bot; random if not given')
+    parser.add_argument('--seed', type=int, help='seed for the random, solver, and ngram bots')
+    parser.add_argument('--regen-seed', type=int,
+                        help='seed for regenerating options, to replay a match exactly; random if not given')
+    parser.add_argument('--udp', action='store_true',
+                        help='play over the UDP transport; the server must be started with --udp too')
+    parser.add_argument('--match-log', metavar='PATH', help='append the finished match to this match log')
+    parser.add_argument('--name', help=f"name for the match server's leaderboard, up to {MAX_PLAYER_NAME_LENGTH} "
+                                       f'characters')
+    add_metrics_arguments(parser)
+
+    return parser.parse_args()
 
 
 def main():
     """Be a client"""
-    # Create a client socket,
-    # using default address family (SOCK_STREAM means to use TCP)
-    client_socket = socket(family=AF_INET, type=SOCK_STREAM)
+    args = parse_args()
+    start_metrics_export(args)
+
+    if args.udp:
+        # Sequenced, acknowledged datagrams that the game uses just like a TCP socket
+        client_socket = ReliableUDPSocket.connect((SERVER_NAME, SERVER_PORT))
+
+    else:
+        # Create a client socket,
+        # using default address family (SOCK_STREAM means to use TCP)
+        client_socket = socket(family=AF_INET, type=SOCK_STREAM)
 
-    # Connect to the server specified above
-    client_socket.connect((SERVER_NAME, SERVER_PORT))
+        # Connect to the server specified above
+        client_socket.connect((SERVER_NAME, SERVER_PORT))
 
     # Print this socket's configuration data
     print(f'Connected at {SERVER_NAME}:{SERVER_PORT}. Type {QUIT_MESSAGE} to quit.')
 
     # Instantiate the game manager, which tracks state
-    game_manager = RPSGameManager()
+    bot = None
+    if args.bot is not None:
+        script = [move for move in args.moves.split(',') if move != '']
+        bot = make_bot(args.bot, script, args.rounds, args.seed)
+
+    game_manager = RPSGameManager(move_selector=bot, regen_seed=args.regen_seed)
+    game_manager.player_name = args.name
+    if args.match_log is not None:
+        game_manager.match_recorder = MatchRecorder()
 
     # Select a stage
     all_stages = [stage for stage in STAGES]
-    validation_error_message = 'If you really want more stages, fork the repo.'
-    stage_selection = get_validated_input(STAGE_CHOICE_PROMPT, all_stages, validation_error_message, True)
+    if bot is not None:
+        stage_selection = args.stage if args.stage is not None else random.choice(all_stages)
+    else:
+        validation_error_message = 'If you really want more stages, fork the repo.'
+        stage_selection = get_validated_input(STAGE_CHOICE_PROMPT, all_stages, validation_error_message, True)
     game_manager.set_stage(stage_selection)
 
-    # Start the game by taking the first turn
-    game_manager.play_next_move()
-    game_manager.send_state_to_opponent(client_socket)
+    # A person watches the keyboard and the server together, so the opponent quitting shows up right away.
+    # This takes the first turn, then interacts with the server until sending or receiving a quit message.
+    if bot is None:
+        game_manager.play_game_with_keyboard(client_socket, moves_first=True)
+
+    else:
+        # Start the game by taking the first turn
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(client_socket)
 
-    # Edge case: if local player's initial move is quit message, skip remaining interaction
-    if game_manager.get_local_player_move() != QUIT_MESSAGE:
-        # Tell local player to wait for opponent
-        print(WAITING_FOR_OPPONENT_MESSAGE)
+        # Edge case: if local player's initial move is quit message, skip remaining interaction
+        if game_manager.get_local_player_move() != QUIT_MESSAGE:
+            # Tell local player to wait for opponent
+            print(WAITING_FOR_OPPONENT_MESSAGE)
 
-        # Interact with the server until sending or receiving a quit message
-        game_manager.play_game(client_socket)
+            # Interact with the server until sending or receiving a quit message
+            game_manager.play_game(client_socket)
 
-    else:
-        print('No contest.')
+        else:
+            print('No contest.')
 
     # Close socket connection
     client_socket.close()
 
+    if args.match_log is not None:
+        append_match(args.match_log, game_manager.match_recorder)
+
     print('\nConnection closed.')
 
 
@@ -0,0 +1,1107 @@
+"""
+Hosts many Super LAN Rock-Paper-Scissors matches at once from one process.
+
+Players run the regular client and connect here instead of to Super_LAN_RPS_server.py.
+Every client believes it's player 1, so the match server referees:
+it pairs two clients who picked the same stage and are rated close enough (see matchmaking.py),
+waits for both of their moves,
+resolves the round with RPSGameManager's rules, and replies to each client
+with the state as that client's opponent would have sent it.
+The referee tracks both players' move counts itself, replaying each client's regeneration from the regen seed
+it opened with, so a client can't play a move it doesn't have or report counts it wasn't dealt.
+
+A gateway (rps_gateway.py) can also relay many players over one connection,
+each on its own GELA372 channel; every channel gets a seat just like a directly connected client.
+
+Spectators (rps_spectator.py) connect the same way but open with a watch request,
+and get an update after every round of the match they watch (see spectators.py).
+
+With --workers, one worker process per core shares the port (see match_workers.py).
+"""
+
+import argparse
+import asyncio
+import functools
+import signal
+import socket
+import time
+from socket import SOL_SOCKET, SO_SNDBUF
+from typing import Optional, Union
+from socket_constants import *
+from game_constants import *
+from game_helpers import RPSGameManager
+from leaderboard import DEFAULT_LEADERBOARD_PATH, LeaderboardReader, LeaderboardWriter
+from match_log import DEFAULT_MATCH_LOG_PATH, MatchLogWriter, MatchRecorder
+from match_workers import LobbyExchange, WorkerSupervisor, get_default_worker_count, get_worker_path
+from matchmaking import MatchmakingQueue, MatchmakingTicket, RatingBook
+from regen_streams import RegenStream, read_regen_seed
+from rps_metrics import METRICS, add_metrics_arguments, start_metrics_export
+from spectators import MatchBroadcast, SpectatorUpdate, describe_live_matches, find_broadcast
+from socket_helpers import ChannelMultiplexer, GELA372Channel, GELA372Receiver, PacketUnpackError, frame_message, \
+    receive_message_bytes_async
+import state_codec
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class InvalidStateError(Exception):
+    def __init__(self, message: str, player: Optional[str] = None):
+        """
+        :param message: what the client did wrong
+        :param player: player whose client sent the invalid state, once the referee knows which one it is
+        """
+        super().__init__(message)
+        self.player = player
+
+
+class MatchSeat:
+    """
+    One connected client's side of a match
+    """
+    def __init__(self, reader: Optional[asyncio.StreamReader], writer: Optional[asyncio.StreamWriter],
+                 receiver: Optional[GELA372Receiver]):
+        """
+        :param reader: stream the client's bytes arrive on
+        :param writer: stream to the client
+        :param receiver: reassembly buffer for the connection, which may already hold the client's first bytes
+        """
+        self.reader = reader
+        self.writer = writer
+        self.receiver = receiver
+        self.protocol_version = GELA372_DEFAULT_VERSION
+        self.state_codec = STATE_CODEC_JSON
+        self.delta_state_sync = state_codec.DeltaStateSync()
+        self.understands_notices = False  # only clients that offered codecs know what a notice is
+        self.player_name = None  # name the client sent with its opening state, if any
+        self.regen_seed = None  # regen seed the client sent with its opening state, if any
+        self.last_state_message = None  # raw payload of the last state (or watch request) the client sent
+        self.match_finished = asyncio.get_running_loop().create_future()
+
+    async def receive_state(self) -> dict:
+        """
+        Waits for the client's next state message.
+        Answers resync requests along the way, and asks for a resync if a delta can't be applied.
+        :return: the client's state, from the client's perspective
+        """
+        while True:
+            incoming_message = await self.receive_message()
+            self.last_state_message = incoming_message
+
+            if state_codec.is_resync_request(incoming_message):
+                if self.delta_state_sync.last_sent_fields is not None:
+                    await self.send_message(self.delta_state_sync.encode_snapshot())
+
+                continue
+
+            decode_start_time = time.perf_counter() if METRICS.enabled else None
+
+            try:
+                if state_codec.is_delta_state(incoming_message):
+                    sent_state = self.delta_state_sync.decode_delta(incoming_message)
+                else:
+                    sent_state = RPSGameManager.decode_state(incoming_message)
+
+            except state_codec.StateResyncNeeded:
+                await self.send_message(self.delta_state_sync.encode_resync_request())
+                continue
+
+            except ValueError as error:
+                raise InvalidStateError('client sent a message that is not a game state') from error
+
+            if decode_start_time is not None:
+                METRICS.state_decode_seconds.observe(
+                    time.perf_counter() - decode_start_time, state_codec.get_state_codec_name(incoming_message))
+
+            break
+
+        if not isinstance(sent_state, dict):
+            raise InvalidStateError('client sent a message that is not a game state')
+
+        # Answer the client's codec offer, or keep using whatever codec it switched to
+        offered_codecs = sent_state.pop(STATE_CODEC_OFFER_KEY, None)
+        if self.protocol_version != GELA372_VERSION_2:
+            self.state_codec = STATE_CODEC_JSON
+        elif state_codec.is_binary_state(incoming_message):
+            self.state_codec = STATE_CODEC_BINARY
+        elif state_codec.is_delta_state(incoming_message):
+            self.state_codec = STATE_CODEC_DELTA
+        elif isinstance(offered_codecs, list):
+            self.state_codec = state_codec.choose_state_codec(offered_codecs)
+
+        if isinstance(offered_codecs, list):
+            self.understands_notices = True
+
+        return sent_state
+
+    async def receive_message(self) -> bytes:
+        """
+        Waits for the client's next message of any kind
+        :return: raw payload of the message
+        """
+        incoming_message = await receive_message_bytes_async(self.reader, self.receiver)
+
+        # Reply in whichever GELA372 version this client speaks
+        self.protocol_version = self.receiver.peer_version
+
+        return incoming_message
+
+    async def send_message(self, outgoing_message: Union[str, bytes]):
+        """
+        Sends any message to the client, framed in the client's GELA372 version
+        :param outgoing_message: message to send
+        """
+        buffers = frame_message(outgoing_message, self.protocol_version)
+        self.writer.writelines(buffers)
+
+        if METRICS.enabled:
+            METRICS.record_sent_message(buffers)
+
+        await self.writer.drain()
+
+    async def send_update(self, update: SpectatorUpdate):
+        """
+        Sends a spectator update to a spectator's client, reusing the update's frame for the client's GELA372 version
+        :param update: update shared by every spectator of the match
+        """
+        self.writer.write(update.get_frame(self.protocol_version))
+        await self.writer.drain()
+
+    def send_update_nowait(self, update: SpectatorUpdate) -> bool:
+        """
+        Sends a spectator update to a spectator's client if its connection has room, without waiting
+        :param update: update shared by every spectator of the match
+        :return: True if the update was sent, or False if the connection is backed up or closing
+        """
+        transport = self.writer.transport
+        if transport.is_closing() or transport.get_write_buffer_size() >= SPECTATOR_WRITE_BUFFER_LIMIT:
+            return False
+
+        self.writer.write(update.get_frame(self.protocol_version))
+
+        return True
+
+    def limit_write_buffer(self):
+        """
+        Keeps little buffered for a client that only watches, so a slow spectator falls behind instead of piling up
+        """
+        self.writer.transport.set_write_buffer_limits(high=SPECTATOR_WRITE_BUFFER_LIMIT)
+
+        # The kernel's send buffer would otherwise hold far more, for every spectator
+        connection_socket = self.writer.get_extra_info('socket')
+        if connection_socket is not None:
+            connection_socket.setsockopt(SOL_SOCKET, SO_SNDBUF, SPECTATOR_WRITE_BUFFER_LIMIT)
+
+    async def send_state(self, state: dict):
+        """
+        Sends a state message to the client
+        :param state: state to send, from the client's perspective
+        """
+        encode_start_time = time.perf_counter() if METRICS.enabled else None
+
+        if self.state_codec == STATE_CODEC_DELTA:
+            outgoing_message = self.delta_state_sync.encode_delta(state)
+        else:
+            outgoing_message = state_codec.encode_state(state, self.state_codec)
+
+        if encode_start_time is not None:
+            METRICS.state_encode_seconds.observe(time.perf_counter() - encode_start_time, self.state_codec)
+
+        await self.send_message(outgoing_message)
+
+    async def send_notice(self, text: str):
+        """
+        Shows the client's player a message, if the client understands notices
+        :param text: message for the player
+        """
+        if self.understands_notices:
+            await self.send_message(state_codec.encode_notice(text))
+
+    def is_disconnected(self) -> bool:
+        """
+        :return: True if the client has closed its side of the connection
+        """
+        return self.reader.at_eof()
+
+    def hand_off(self, lobby_exchange: LobbyExchange, worker_index: int) -> bool:
+        """
+        Moves the client's connection to another worker, which reads the client's last state message again
+        as if the client had just sent it there. Clients send nothing more until they're answered,
+        so nothing else is left unread.
+        :param lobby_exchange: exchange to send the connection through
+        :param worker_index: worker to send it to
+        :return: True if the connection was handed off, and this seat let go of it
+        """
+        sent_bytes = b''.join(frame_message(self.last_state_message, self.protocol_version))
+        sent_bytes += self.receiver.get_unparsed_bytes()
+
+        if not lobby_exchange.hand_off(worker_index, self.writer.get_extra_info('socket'), sent_bytes):
+            return False
+
+        # The other worker holds the connection now, so closing this copy doesn't end it
+        self.writer.transport.abort()
+
+        if not self.match_finished.done():
+            self.match_finished.set_result(None)
+
+        return True
+
+    def close(self):
+        """
+        Closes the connection and releases whoever is waiting for this seat's match to end
+        """
+        self.writer.close()
+
+        if not self.match_finished.done():
+            self.match_finished.set_result(None)
+
+
+class ChannelSeat(MatchSeat):
+    """
+    One client's side of a match, reached through a channel of a gateway's multiplexed connection.
+    The gateway frames messages in whichever GELA372 version its client speaks, so the channel always carries v2.
+    """
+    def __init__(self, channel: GELA372Channel):
+        """
+        :param channel: channel the gateway relays the client on
+        """
+        super().__init__(None, None, None)
+        self.channel = channel
+
+    async def receive_message(self) -> bytes:
+        return await self.channel.receive()
+
+    async def send_message(self, outgoing_message: Union[str, bytes]):
+        await self.channel.send(outgoing_message)
+
+    async def send_update(self, update: SpectatorUpdate):
+        await self.channel.send(update.payload)
+
+    def send_update_nowait(self, update: SpectatorUpdate) -> bool:
+        # Sending on a channel may have to wait, so the spectator's sender always does it
+        return False
+
+    def limit_write_buffer(self):
+        # The channel's own backlog limit already applies
+        pass
+
+    def is_disconnected(self) -> bool:
+        return self.channel.at_eof()
+
+    def hand_off(self, lobby_exchange: LobbyExchange, worker_index: int) -> bool:
+        # The gateway's connection carries other players too, so its channels stay with this worker
+        return False
+
+    def close(self):
+        self.channel.close()
+
+        if not self.match_finished.done():
+            self.match_finished.set_result(None)
+
+
+def read_sender_data(sent_state: dict) -> dict:
+    """
+    Extracts the sending client's own player data from a state it sent
+    :param sent_state: state received from a client
+    :return: the sender's player data, with a validated current_move
+    """
+    try:
+        sender_data = sent_state['player'][sent_state['whose_turn']]
+        move = sender_data['current_move']
+
+    except (KeyError, TypeError) as error:
+        raise InvalidStateError('client sent an incomplete game state') from error
+
+    if move not in ALL_MOVES and move != QUIT_MESSAGE:
+        raise InvalidStateError(f'client sent an invalid move: {move!r}')
+
+    return sender_data
+
+
+def read_player_name(opening_state: dict) -> Optional[str]:
+    """
+    Reads the name a client may send with its opening state, for the leaderboard
+    :param opening_state: first state received from a client
+    :return: the player's name, or None if the client didn't send a usable one
+    """
+    name = opening_state.pop(PLAYER_NAME_KEY, None)
+
+    if not isinstance(name, str):
+        return None
+
+    name = name.strip()
+    if name == '' or len(name) > MAX_PLAYER_NAME_LENGTH or not name.isprintable():
+        return None
+
+    return name
+
+
+def read_move_choices(sender_data: dict) -> dict:
+    """
+    Validates the shape of the move choices a client reports for itself.
+    The referee then checks them against the counts it tracks (see Match.check_move()).
+    :param sender_data: sender's player data from read_sender_data()
+    :return: validated move choices
+    """
+    move_choices = sender_data.get('move_choices')
+
+    if not isinstance(move_choices, dict) or sorted(move_choices) != sorted(ALL_MOVES):
+        raise InvalidStateError('client sent invalid move choices')
+
+    for count in move_choices.values():
+        if not isinstance(count, int) or count < 0:
+            raise InvalidStateError('client sent invalid move choices')
+
+    return move_choices
+
+
+def read_regenerated_options(move_options: dict, reported_choices: dict, move: str) -> dict:
+    """
+    Checks the counts reported by a client that regenerated without a regen seed, so with draws the referee
+    can't replay: the counts from before its move must be its tracked ones plus exactly one regeneration's worth
+    :param move_options: the client's tracked options, which have dwindled below REGEN_THRESHOLD
+    :param reported_choices: move choices the client reported, from read_move_choices()
+    :param move: the client's move, which reported_choices already has subtracted
+    :return: the client's options after regenerating, before its move
+    """
+    regenerated_options = dict(reported_choices)
+    regenerated_options[move] += 1
+    added_counts = [regenerated_options[each_move] - move_options[each_move] for each_move in ALL_MOVES]
+
+    if any(count < 0 or count % REGEN_QUANTITY_EACH != 0 for count in added_counts) or \
+            sum(added_counts) != REGEN_ITERATIONS * REGEN_QUANTITY_EACH:
+        raise InvalidStateError('client regenerated options the rules do not allow')
+
+    return regenerated_options
+
+
+class Match:
+    """
+    Referees one match between two seats
+    """
+    def __init__(self, stage: str, seat_1: MatchSeat, seat_2: MatchSeat, match_log: Optional[MatchLogWriter] = None,
+                 leaderboard: Optional[LeaderboardWriter] = None, broadcast: Optional[MatchBroadcast] = None,
+                 ratings: Optional[RatingBook] = None):
+        """
+        :param stage: stage both players selected
+        :param seat_1: seat refereed as player 1
+        :param seat_2: seat refereed as player 2
+        :param match_log: log the match is appended to once it ends, if any
+        :param leaderboard: leaderboard every round and the match's result are reported to, if any
+        :param broadcast: where every round is published for spectators, if anywhere
+        :param ratings: ratings every round's result updates, if any
+        """
+        self.seats = {PLAYER_1: seat_1, PLAYER_2: seat_2}
+        self.player_names = {player: seat.player_name for player, seat in self.seats.items()}
+        self.match_log = match_log
+        self.leaderboard = leaderboard
+        self.broadcast = broadcast
+        self.ratings = ratings
+        self.match_recorder = MatchRecorder(stage)
+        self.last_round_moves = {}  # each player's move in the latest round, for spectators
+
+        # The referee's game manager holds both players' authoritative state, but never prints or prompts
+        self.game_manager = RPSGameManager(show_output=False)
+        self.game_manager.set_stage(stage)
+
+        # Every client plays as player 1 on its own side, so it regenerates from player 1's stream for its own seed.
+        # A client that sent no seed has its regeneration checked against the rules instead of replayed.
+        self.regen_streams = {player: None if seat.regen_seed is None else RegenStream(seat.regen_seed, PLAYER_1)
+                              for player, seat in self.seats.items()}
+
+    @staticmethod
+    def get_other_player(player: str) -> str:
+        """
+        :param player: a player's representative constant defined in game_constants.py
+        :return: the other player's representative constant
+        """
+        return PLAYER_2 if player == PLAYER_1 else PLAYER_1
+
+    def build_state_for(self, player: str, scores_before_round: dict) -> dict:
+        """
+        Builds the state a seat's client expects to receive from its opponent.
+        Every client sees itself as player 1, and the state comes back on player 2's turn,
+        so the client changes the turn back to itself when the message arrives.
+        :param player: player whose client will receive the state
+        :param scores_before_round: scores before this round, since each client awards the round itself
+        :return: state from the given player's perspective
+        """
+        players = self.game_manager.state['player']
+        opponent = self.get_other_player(player)
+
+        return {
+            'whose_turn': PLAYER_2,
+            'round_winner': '',
+            'stage': self.game_manager.get_stage(),
+            'player': {
+                PLAYER_1: {
+                    'score': scores_before_round[player],
+                    'move_choices': players[player]['move_choices'],
+                    'current_move': players[player]['current_move'],
+                },
+                PLAYER_2: {
+                    'score': scores_before_round[opponent],
+                    'move_choices': players[opponent]['move_choices'],
+                    'current_move': players[opponent]['current_move'],
+                },
+            }
+        }
+
+    def get_scores(self) -> dict:
+        """
+        :return: each player's current score
+        """
+        local_player_score, opponent_score = self.game_manager.get_scores()
+
+        return {self.game_manager.get_local_player(): local_player_score,
+                self.game_manager.get_opponent(): opponent_score}
+
+    async def collect_moves(self) -> dict:
+        """
+        Waits for both seats' next state messages.
+        Stops as soon as either seat quits, disconnects, or misbehaves, without waiting on the other.
+        :return: each player's sent state, or None if someone left
+        """
+        pending = {asyncio.ensure_future(seat.receive_state()): player for player, seat in self.seats.items()}
+        sent_states = {}
+
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    player = pending.pop(task)
+
+                    try:
+                        sent_state = task.result()
+                        sender_data = read_sender_data(sent_state)
+
+                    except (PacketUnpackError, ConnectionError):
+                        await self.end_for_quitter(player, 'Your opponent disconnected.')
+                        return None
+
+                    except InvalidStateError:
+                        await self.end_for_quitter(player, 'Your opponent sent an invalid move.')
+                        return None
+
+                    if sender_data['current_move'] == QUIT_MESSAGE:
+                        await self.end_for_quitter(player)
+                        return None
+
+                    sent_states[player] = sent_state
+
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return sent_states
+
+    async def end_for_quitter(self, quitter: str, notice: Optional[str] = None):
+        """
+        Tells the quitter's opponent that the quitter quit
+        :param quitter: player who quit or disconnected
+        :param notice: explanation shown to the opponent first, if the quitter didn't just quit
+        """
+        opponent = self.get_other_player(quitter)
+        self.game_manager.set_player_current_move(quitter, QUIT_MESSAGE)
+
+        # Only log a quit; a disconnect or invalid move isn't the player choosing to leave
+        if notice is None:
+            self.match_recorder.quitter = quitter
+
+        try:
+            if notice is not None:
+                await self.seats[opponent].send_notice(notice)
+
+            await self.seats[opponent].send_state(self.build_state_for(opponent, self.get_scores()))
+
+        except ConnectionError:
+            pass
+
+    def check_move(self, player: str, sender_data: dict, is_opening_round: bool):
+        """
+        Checks a player's move and the counts their client reports against the counts the referee tracks,
+        then records the move
+        :param player: player who sent the move
+        :param sender_data: the player's data from read_sender_data(), with a move other than quitting
+        :param is_opening_round: True if the move choices are still the stage's initial ones
+        """
+        move = sender_data['current_move']
+        reported_choices = read_move_choices(sender_data)
+        move_options = self.game_manager.get_player_move_options(player)
+
+        # Seeded clients' regeneration is replayed after each round, but an unseeded client's shows up here first
+        if self.regen_streams[player] is None and not is_opening_round and \
+                sum(move_options.values()) < REGEN_THRESHOLD:
+            move_options = read_regenerated_options(move_options, reported_choices, move)
+            self.game_manager.set_player_move_options(player, move_options)
+
+        if move_options[move] < 1:
+            raise InvalidStateError('client used a move it does not have')
+
+        self.game_manager.record_player_move(player, move)
+
+        if self.game_manager.get_player_move_options(player) != reported_choices:
+            raise InvalidStateError('client reported move choices it does not have')
+
+    def resolve_round(self, sent_states: dict, is_opening_round: bool):
+        """
+        Checks and records both moves, awards the round, and regenerates options like each client does
+        :param sent_states: each player's sent state, from collect_moves()
+        :param is_opening_round: True if the move choices are still the stage's initial ones
+        :raises InvalidStateError: naming the player whose move or counts don't check out
+        """
+        resolution_start_time = time.perf_counter() if METRICS.enabled else None
+
+        for player, sent_state in sent_states.items():
+            try:
+                self.check_move(player, read_sender_data(sent_state), is_opening_round)
+
+            except InvalidStateError as error:
+                raise InvalidStateError(str(error), player) from error
+
+        # Resolve from player 1's perspective; the winner is recorded as a player either way
+        self.game_manager.set_local_player(PLAYER_1)
+        self.game_manager.calculate_round_result()
+
+        moves = {player: read_sender_data(sent_state)['current_move'] for player, sent_state in sent_states.items()}
+        winner = self.game_manager.get_round_winner()
+        self.last_round_moves = moves
+
+        self.match_recorder.record_round(
+            moves, winner, {player: self.game_manager.get_player_move_options(player) for player in self.seats})
+
+        # Recorded before regenerating, since the recorder works out regeneration from the next round's counts
+        for player, regen_stream in self.regen_streams.items():
+            if regen_stream is not None:
+                self.game_manager.regenerate_if_low(player, regen_stream)
+
+        if self.leaderboard is not None:
+            self.leaderboard.record_round(self.game_manager.get_stage(), self.player_names, moves, winner)
+
+        if self.ratings is not None:
+            rating_changes = self.ratings.record_round(self.player_names, winner)
+
+            if self.leaderboard is not None and len(rating_changes) > 0:
+                self.leaderboard.record_rating_changes(rating_changes)
+
+        if resolution_start_time is not None:
+            METRICS.round_resolution_seconds.observe(time.perf_counter() - resolution_start_time)
+
+    def build_spectator_update(self, is_final: bool) -> dict:
+        """
+        :param is_final: True if the match is over
+        :return: the whole match so far, as every spectator sees it
+        """
+        return {
+            'match': self.broadcast.match_id,
+            'stage': self.game_manager.get_stage(),
+            'round': self.match_recorder.round_count,
+            'names': self.player_names,
+            'moves': self.last_round_moves,
+            'round_winner': self.game_manager.get_round_winner(),
+            'scores': self.get_scores(),
+            'finished': is_final,
+            'quitter': self.match_recorder.quitter,
+        }
+
+    async def play(self, opening_states: dict):
+        """
+        Referees rounds until a player quits or disconnects
+        :param opening_states: each player's first sent state, which was read while pairing
+        """
+        sent_states = opening_states
+        is_opening_round = True
+
+        try:
+            # A player can quit with their opening move, before there's a round to resolve
+            for player, opening_state in opening_states.items():
+                if read_sender_data(opening_state)['current_move'] == QUIT_MESSAGE:
+                    await self.end_for_quitter(player)
+                    return
+
+            while sent_states is not None:
+                scores_before_round = self.get_scores()
+
+                try:
+                    self.resolve_round(sent_states, is_opening_round)
+
+                except InvalidStateError as error:
+                    await self.end_for_quitter(error.player, 'Your opponent sent an invalid move.')
+                    break
+
+                is_opening_round = False
+
+                for player, seat in self.seats.items():
+                    await seat.send_state(self.build_state_for(player, scores_before_round))
+
+                if self.broadcast is not None:
+                    self.broadcast.publish(self.build_spectator_update(False))
+
+                sent_states = await self.collect_moves()
+
+        except ConnectionError:
+            pass
+
+        finally:
+            for seat in self.seats.values():
+                seat.close()
+
+            if self.broadcast is not None:
+                self.broadcast.publish(self.build_spectator_update(True), is_final=True)
+
+            if self.match_log is not None and self.match_recorder.round_count > 0:
+                self.match_log.append(self.match_recorder)
+
+            if self.leaderboard is not None and self.match_recorder.round_count > 0:
+                self.leaderboard.record_match(self.game_manager.get_stage(), self.player_names, self.get_scores(),
+                                              self.match_recorder.round_count)
+
+
+class MatchServer:
+    """
+    Accepts clients and pairs them into matches by stage and rating
+    """
+    def __init__(self, match_log: Optional[MatchLogWriter] = None, leaderboard: Optional[LeaderboardWriter] = None,
+                 lobby_exchange: Optional[LobbyExchange] = None, worker_index: int = 0,
+                 ratings: Optional[RatingBook] = None):
+        """
+        :param match_log: log every finished match is appended to, if any
+        :param leaderboard: leaderboard every round and match result is reported to, if any
+        :param lobby_exchange: exchange for pairing players with other workers' players, if this is a worker
+        :param worker_index: which worker this is, if it's one
+        :param ratings: players' ratings so far; everyone starts unrated if not given
+        """
+        # Stage name -> queue of players waiting for an opponent on that stage; each ticket's player is
+        # the (seat, opening state) the player's match starts from
+        self.lobby = {stage: MatchmakingQueue() for stage in STAGES}
+        self.ratings = RatingBook() if ratings is None else ratings
+        self.active_matches = set()
+        self.match_log = match_log
+        self.leaderboard = leaderboard
+        self.lobby_exchange = lobby_exchange
+        self.worker_index = worker_index
+        self.broadcasts = {}  # match ID -> MatchBroadcast of every live match
+
+        # Workers number their matches worker_index + 1, then every worker_count-th ID after it,
+        # so IDs never collide and any worker can tell which worker a match is on
+        self.worker_count = 1 if lobby_exchange is None else lobby_exchange.worker_count
+        self.next_match_id = worker_index + 1
+        self._background_tasks = set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves a new connection, which is either one client or a gateway's multiplexed connection,
+        told apart by whether the first frame belongs to a channel
+        :param reader: stream the bytes arrive on
+        :param writer: stream to the client or gateway
+        """
+        receiver = GELA372Receiver(BUFFER_SIZE)
+
+        try:
+            is_multiplexed = receiver.is_channel_frame_next()
+
+            while is_multiplexed is None:
+                data = await reader.read(BUFFER_SIZE)
+                if len(data) == 0:
+                    writer.close()
+                    return
+
+                receiver.feed(data)
+                is_multiplexed = receiver.is_channel_frame_next()
+
+        except ConnectionError:
+            writer.close()
+            return
+
+        if is_multiplexed:
+            await ChannelMultiplexer(reader, writer, receiver).run(self.handle_channel)
+        else:
+            await self.handle_seat(MatchSeat(reader, writer, receiver))
+
+    async def handle_channel(self, channel: GELA372Channel):
+        """
+        Serves one client relayed by a gateway
+        :param channel: channel the gateway opened for the client
+        """
+        await self.handle_seat(ChannelSeat(channel))
+
+    async def handle_seat(self, seat: MatchSeat):
+        """
+        Reads a new client's opening move and either parks it in the lobby or starts its match
+        :param seat: the new client's seat
+        """
+        try:
+            opening_state = await seat.receive_state()
+
+            if WATCH_KEY in opening_state:
+                await self.handle_spectator(seat, opening_state[WATCH_KEY])
+                return
+
+            read_sender_data(opening_state)
+            stage = opening_state['stage']
+            seat.player_name = read_player_name(opening_state)
+            seat.regen_seed = read_regen_seed(opening_state.pop(REGEN_SEED_KEY, None))
+
+            if stage not in STAGES:
+                raise InvalidStateError(f'client chose an unknown stage: {stage!r}')
+
+        except (PacketUnpackError, InvalidStateError, ConnectionError, KeyError, TypeError):
+            seat.close()
+            return
+
+        ticket = MatchmakingTicket(self.ratings.get_rating(seat.player_name), (seat, opening_state))
+        waiting_ticket = self.pop_opponent(stage, ticket)
+
+        if waiting_ticket is None:
+            # Waiting players gather on the lowest-numbered worker with any waiting on the stage
+            if self.lobby_exchange is not None:
+                waiting_worker_index = self.lobby_exchange.find_waiting_worker(stage, self.worker_index)
+
+                if waiting_worker_index is not None and waiting_worker_index < self.worker_index and \
+                        seat.hand_off(self.lobby_exchange, waiting_worker_index):
+                    return
+
+            self.lobby[stage].add(ticket)
+            self.update_waiting_flag(stage)
+
+            try:
+                await seat.send_notice(f'Waiting for another player to choose {stage}.')
+            except ConnectionError:
+                pass
+
+            await seat.match_finished
+            return
+
+        self.update_waiting_flag(stage)
+        await self.play_match(stage, waiting_ticket.player, ticket.player)
+
+    def pop_opponent(self, stage: str, ticket: MatchmakingTicket) -> Optional[MatchmakingTicket]:
+        """
+        Takes the best waiting opponent for a player out of the lobby, skipping any who disconnected while waiting
+        :param stage: stage the player chose
+        :param ticket: the player's ticket
+        :return: the opponent's ticket, or None if no waiting player is acceptable
+        """
+        while True:
+            waiting_ticket = self.lobby[stage].pop_opponent(ticket)
+            if waiting_ticket is None or not waiting_ticket.player[0].is_disconnected():
+                return waiting_ticket
+
+            waiting_ticket.player[0].close()
+
+    def update_waiting_flag(self, stage: str):
+        """
+        Tells the other workers whether this one has players waiting on a stage, if this is a worker
+        :param stage: stage whose lobby changed
+        """
+        if self.lobby_exchange is not None:
+            self.lobby_exchange.set_waiting(self.worker_index, stage, len(self.lobby[stage]) > 0)
+
+    async def play_match(self, stage: str, waiting_player: tuple, player: tuple):
+        """
+        Referees a match between two paired players until it ends
+        :param stage: stage both players chose
+        :param waiting_player: (seat, opening state) of the player who waited longer, who plays as player 1
+        :param player: (seat, opening state) of the other player
+        """
+        waiting_seat, waiting_opening_state = waiting_player
+        seat, opening_state = player
+        broadcast = MatchBroadcast(self.next_match_id)
+        self.next_match_id += self.worker_count
+        match = Match(stage, waiting_seat, seat, self.match_log, self.leaderboard, broadcast, self.ratings)
+
+        self.active_matches.add(match)
+        self.broadcasts[broadcast.match_id] = broadcast
+        try:
+            await match.play({PLAYER_1: waiting_opening_state, PLAYER_2: opening_state})
+        finally:
+            self.active_matches.discard(match)
+            del self.broadcasts[broadcast.match_id]
+
+    def start_background_task(self, coroutine):
+        """
+        Runs a coroutine without waiting for it, keeping a reference until it's done
+        :param coroutine: coroutine to run
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def handle_spectator(self, seat: MatchSeat, match_id: Optional[int]):
+        """
+        Streams a live match to a client that sent a watch request
+        :param seat: the spectator's seat
+        :param match_id: ID of the match to watch, or None for the most-watched live match
+        """
+        # Only clients that know about watching send watch requests, and those understand notices
+        seat.understands_notices = True
+        broadcast = find_broadcast(self.broadcasts, match_id)
+
+        # Matches on other workers are watched there
+        if broadcast is None and type(match_id) is int and self.lobby_exchange is not None:
+            match_worker_index = (match_id - 1) % self.worker_count
+            if match_worker_index != self.worker_index and seat.hand_off(self.lobby_exchange, match_worker_index):
+                return
+
+        if broadcast is None:
+            try:
+                await seat.send_notice(describe_live_matches(self.broadcasts))
+            except ConnectionError:
+                pass
+
+            seat.close()
+            return
+
+        seat.limit_write_buffer()
+        await broadcast.watch(seat)
+
+    async def serve(self, port: int = SERVER_PORT):
+        """
+        Accepts connections forever
+        :param port: port to listen on
+        """
+        server = await asyncio.start_server(self.handle_connection, port=port, backlog=MATCH_SERVER_BACKLOG)
+        lobby_sweeper = asyncio.ensure_future(self.sweep_lobby())
+
+        try:
+            async with server:
+                await server.serve_forever()
+
+        finally:
+            lobby_sweeper.cancel()
+
+    def adopt_connection(self, connection_socket: socket.socket, sent_bytes: bytes):
+        """
+        Takes in a player or spectator another worker handed off
+        :param connection_socket: the client's connection
+        :param sent_bytes: what the client sent the other worker, to be read again here
+        """
+        self.start_background_task(self.handle_adopted_connection(connection_socket, sent_bytes))
+
+    async def handle_adopted_connection(self, connection_socket: socket.socket, sent_bytes: bytes):
+        """
+        Serves a client another worker handed off, just as if it had connected here
+        :param connection_socket: the client's connection
+        :param sent_bytes: what the client sent the other worker, to be read again here
+        """
+        try:
+            reader, writer = await asyncio.open_connection(sock=connection_socket)
+
+        except OSError:
+            connection_socket.close()
+            return
+
+        receiver = GELA372Receiver(BUFFER_SIZE)
+        receiver.feed(sent_bytes)
+
+        await self.handle_seat(MatchSeat(reader, writer, receiver))
+
+    async def sweep_lobby(self):
+        """
+        Pairs up waiting players whose rating windows have widened enough to accept each other.
+        If this is a worker, also hands its waiting players to the lowest-numbered worker with players waiting
+        on the same stage, if that's not itself, so players who raced into different workers still meet.
+        """
+        while True:
+            await asyncio.sleep(LOBBY_SWEEP_INTERVAL)
+
+            for stage, queue in self.lobby.items():
+                for waiting_ticket, ticket in queue.pop_pairs():
+                    tickets = (waiting_ticket, ticket)
+
+                    # Whoever is still connected keeps waiting, without losing their place
+                    if any(paired_ticket.player[0].is_disconnected() for paired_ticket in tickets):
+                        for paired_ticket in tickets:
+                            if paired_ticket.player[0].is_disconnected():
+                                paired_ticket.player[0].close()
+                            else:
+                                queue.add(paired_ticket)
+                        continue
+
+                    self.start_background_task(self.play_match(stage, waiting_ticket.player, ticket.player))
+
+                if self.lobby_exchange is not None and len(queue) > 0:
+                    waiting_worker_index = self.lobby_exchange.find_waiting_worker(stage, self.worker_index)
+
+                    if waiting_worker_index is not None and waiting_worker_index < self.worker_index:
+                        for ticket in queue:
+                            seat = ticket.player[0]
+
+                            if seat.is_disconnected() or seat.hand_off(self.lobby_exchange, waiting_worker_index):
+                                queue.remove(ticket)
+                                seat.close()
+
+                self.update_waiting_flag(stage)
+
+    async def serve_until_drained(self, port: int = SERVER_PORT, drain_timeout: float = DRAIN_TIMEOUT):
+        """
+        Accepts connections as one of several workers sharing the port, until SIGTERM asks it to drain.
+        Draining stops accepting, sends waiting players away, and lets matches finish for up to drain_timeout.
+        :param port: port to listen on, shared with the other workers
+        :param drain_timeout: most seconds to wait for matches to finish
+        """
+        loop = asyncio.get_running_loop()
+        drain_requested = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, drain_requested.set)
+
+        server = await asyncio.start_server(self.handle_connection, port=port, backlog=MATCH_SERVER_BACKLOG,
+                                            reuse_port=True)
+        self.lobby_exchange.listen(self.worker_index, self.adopt_connection)
+        lobby_sweeper = asyncio.ensure_future(self.sweep_lobby())
+
+        await drain_requested.wait()
+
+        server.close()
+        lobby_sweeper.cancel()
+        self.lobby_exchange.clear_worker(self.worker_index)
+
+        waiting_seats = [ticket.player[0] for queue in self.lobby.values() for ticket in queue]
+        self.lobby = {stage: MatchmakingQueue() for stage in STAGES}
+
+        for seat in waiting_seats:
+            try:
+                await seat.send_notice('The server is shutting down. Please try again later.')
+            except ConnectionError:
+                pass
+
+            seat.close()
+
+        drain_deadline = time.monotonic() + drain_timeout
+        while len(self.active_matches) > 0 and time.monotonic() < drain_deadline:
+            await asyncio.sleep(0.1)
+
+        # Out of time: end the matches still playing, so they finish up (and get logged) like any other
+        for match in list(self.active_matches):
+            for seat in match.seats.values():
+                seat.close()
+
+        while len(self.active_matches) > 0:
+            await asyncio.sleep(0.01)
+
+
+def raise_open_file_limit():
+    """
+    Raises this process's open file limit as far as allowed, since every idle player holds a socket open
+    """
+    if resource is None:
+        return
+
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard_limit == resource.RLIM_INFINITY or hard_limit > soft_limit:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+        except (ValueError, OSError):
+            pass
+
+
+def load_ratings(leaderboard: Optional[LeaderboardWriter]) -> RatingBook:
+    """
+    :param leaderboard: the match server's leaderboard, if it keeps one
+    :return: every rated player's rating from the leaderboard, or no ratings without one
+    """
+    if leaderboard is None:
+        return RatingBook()
+
+    with LeaderboardReader(leaderboard.path) as reader:
+        return RatingBook(reader.get_ratings())
+
+
+def run_worker(worker_index: int, lobby_exchange: LobbyExchange, args: argparse.Namespace):
+    """
+    Runs one worker of a multi-process match server until it's drained.
+    Each worker appends to its own match log and serves its own metrics, but they all share the leaderboard.
+    Ratings are read from the leaderboard when the worker starts, so a worker only sees its own matches' rating changes
+    until it's restarted, though every worker's changes add up in the leaderboard.
+    :param worker_index: which worker this is
+    :param lobby_exchange: exchange shared by every worker
+    :param args: the match server's parsed options
+    """
+    worker_args = argparse.Namespace(**vars(args))
+    if args.metrics_port is not None:
+        worker_args.metrics_port = args.metrics_port + worker_index
+    if args.metrics_file is not None:
+        worker_args.metrics_file = get_worker_path(args.metrics_file, worker_index)
+    start_metrics_export(worker_args)
+
+    match_log = None if args.no_match_log else MatchLogWriter(get_worker_path(args.match_log, worker_index))
+    leaderboard = None if args.no_leaderboard else LeaderboardWriter(args.leaderboard)
+    match_server = MatchServer(match_log, leaderboard, lobby_exchange, worker_index, load_ratings(leaderboard))
+
+    try:
+        asyncio.run(match_server.serve_until_drained(args.port, args.drain_timeout))
+
+    finally:
+        if match_log is not None:
+            match_log.close()
+
+        if leaderboard is not None:
+            leaderboard.close()
+
+
+def main():
+    """Be a match server"""
+    parser = argparse.ArgumentParser(description='Host many Super LAN Rock-Paper-Scissors matches at once.')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='port to listen on')
+    parser.add_argument('--match-log', default=DEFAULT_MATCH_LOG_PATH, help='file every finished match is appended to')
+    parser.add_argument('--no-match-log', action='store_true', help="don't log matches")
+    parser.add_argument('--leaderboard', default=DEFAULT_LEADERBOARD_PATH, help='database of player stats')
+    parser.add_argument('--no-leaderboard', action='store_true', help="don't keep player stats")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes sharing the port; 0 for one per core')
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help='seconds workers let matches finish after being asked to stop')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    worker_count = get_default_worker_count() if args.workers == 0 else args.workers
+
+    print('starting match server')
+
+    raise_open_file_limit()
+
+    if worker_count > 1:
+        print(f'listening for connection requests on port {args.port} with {worker_count} workers')
+        if not args.no_match_log:
+            print(f'appending finished matches to {get_worker_path(args.match_log, 0)} and the like, one per worker')
+
+        supervisor = WorkerSupervisor(worker_count, functools.partial(run_worker, args=args))
+        supervisor.run()
+
+        print(f'\nMatch server stopped. Workers restarted after crashing: {supervisor.restart_count}')
+        return
+
+    start_metrics_export(args)
+
+    match_log = None if args.no_match_log else MatchLogWriter(args.match_log)
+    if match_log is not None:
+        print(f'appending finished matches to {args.match_log} ({match_log.match_count} logged so far)')
+
+    leaderboard = None if args.no_leaderboard else LeaderboardWriter(args.leaderboard)
+    ratings = load_ratings(leaderboard)
+    if leaderboard is not None:
+        print(f'keeping player stats in {args.leaderboard} ({len(ratings)} rated players so far)')
+
+    print(f'listening for connection requests on port {args.port}')
+
+    try:
+        asyncio.run(MatchServer(match_log, leaderboard, ratings=ratings).serve(args.port))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        if match_log is not None:
+            match_log.close()
+
+        # Let the leaderboard apply whatever is still queued
+        if leaderboard is not None:
+            leaderboard.close()
+
+    print('\nMatch server stopped.')
+
+
+if __name__ == '__main__':
+    main()
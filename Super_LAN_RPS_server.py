@@ -2,44 +2,68 @@
 # Date: 02/22/2022
 # used starter code and concepts from "Computer Networking: A Top-Down Approach" by James F. Kurose and Keith Ross
 
+import argparse
 from socket import *
 from socket_constants import *
 from game_constants import *
 from game_helpers import RPSGameManager
+from match_log import MatchRecorder, append_match
+from rps_metrics import add_metrics_arguments, start_metrics_export
+from udp_transport import ReliableUDPSocket
 
 
 def main():
     """Be a server"""
+    parser = argparse.ArgumentParser(description='Play Super LAN Rock-Paper-Scissors as player 2.')
+    parser.add_argument('--udp', action='store_true',
+                        help='play over the UDP transport; the client must be started with --udp too')
+    parser.add_argument('--match-log', metavar='PATH', help='append the finished match to this match log')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    start_metrics_export(args)
+
     print('starting server')
 
-    # Create a server socket,
-    # Using default address family (SOCK_STREAM means to use TCP)
-    server_socket = socket(family=AF_INET, type=SOCK_STREAM)
+    if args.udp:
+        # Wait for player 1's first datagram, then talk only to whoever sent it
+        print('listening for player 1 over UDP')
+        connection_socket, client_address = ReliableUDPSocket.accept(SERVER_PORT)
 
-    # Listen for connections
-    server_socket.bind(('', SERVER_PORT))
-    server_socket.listen(1)  # allow max of 1 queued connection
-    print('listening for connection requests')
+    else:
+        # Create a server socket,
+        # Using default address family (SOCK_STREAM means to use TCP)
+        server_socket = socket(family=AF_INET, type=SOCK_STREAM)
 
-    # Accept only one connection.
-    # This is where a forever loop would start if accepting many connections.
-    connection_socket, client_address = server_socket.accept()
+        # Listen for connections
+        server_socket.bind(('', SERVER_PORT))
+        server_socket.listen(1)  # allow max of 1 queued connection
+        print('listening for connection requests')
+
+        # Accept only one connection.
+        # This is where a forever loop would start if accepting many connections.
+        connection_socket, client_address = server_socket.accept()
 
     # Print this socket's configuration data
     print(f'Connected at {SERVER_NAME}:{SERVER_PORT}. Type {QUIT_MESSAGE} to quit.\n')
 
     # Instantiate the game manager, which tracks state
     game_manager = RPSGameManager()
+    if args.match_log is not None:
+        game_manager.match_recorder = MatchRecorder()
 
     # Print a server-specific notice
     print('You are player 2. Waiting for player 1 to select a stage and a first move...\n')
 
-    # Interact with the new connection
-    game_manager.play_game(connection_socket)
+    # Interact with the new connection, watching the keyboard too so the opponent quitting shows up right away
+    game_manager.play_game_with_keyboard(connection_socket)
 
     # Close the connection
     connection_socket.close()
 
+    if args.match_log is not None:
+        append_match(args.match_log, game_manager.match_recorder)
+
     print('\nConnection closed.')
 
 
@@ -0,0 +1,103 @@
+"""
+Measures the leaderboard (leaderboard.py): what reporting a round costs the game loop,
+how fast the background writer applies reports, and how fast queries are once there are many players and results.
+
+Matches are made up rather than played, so the figures are the leaderboard's own cost.
+
+Example: python benchmark_leaderboard.py --matches 1000000 --players 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from game_constants import *
+from generic_utils import get_percentile
+from leaderboard import LeaderboardReader, LeaderboardWriter
+
+
+def main():
+    """Measure the leaderboard"""
+    parser = argparse.ArgumentParser(description='Measure reporting to and querying the leaderboard.')
+    parser.add_argument('--matches', type=int, default=100000, help='matches to report')
+    parser.add_argument('--rounds', type=int, default=10, help='rounds per match')
+    parser.add_argument('--players', type=int, default=10000, help='distinct player names')
+    parser.add_argument('--queries', type=int, default=1000, help='queries of each kind to time')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the made-up matches')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    stages = list(STAGES)
+    names = [f'player-{index}' for index in range(args.players)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        report_times = []
+
+        start_time = time.perf_counter()
+        with LeaderboardWriter(path) as leaderboard:
+            for _ in range(args.matches):
+                stage = rng.choice(stages)
+                player_names = {PLAYER_1: rng.choice(names), PLAYER_2: rng.choice(names)}
+                scores = {PLAYER_1: 0, PLAYER_2: 0}
+
+                for _ in range(args.rounds):
+                    moves = {PLAYER_1: rng.choice(ALL_MOVES), PLAYER_2: rng.choice(ALL_MOVES)}
+                    winner = rng.choice([PLAYER_1, PLAYER_2, TIE])
+                    if winner != TIE:
+                        scores[winner] += 1
+
+                    report_start_time = time.perf_counter()
+                    leaderboard.record_round(stage, player_names, moves, winner)
+                    report_times.append(time.perf_counter() - report_start_time)
+
+                leaderboard.record_match(stage, player_names, scores, args.rounds)
+
+            report_end_time = time.perf_counter()
+            leaderboard.flush()
+            batch_count = leaderboard.batch_count
+
+        apply_end_time = time.perf_counter()
+
+        with LeaderboardReader(path) as reader:
+            top_times = []
+            for _ in range(args.queries):
+                query_start_time = time.perf_counter()
+                reader.get_top_players(10)
+                top_times.append(time.perf_counter() - query_start_time)
+
+            player_times = []
+            for _ in range(args.queries):
+                query_start_time = time.perf_counter()
+                reader.get_player(rng.choice(names))
+                reader.get_recent_matches(rng.choice(names))
+                player_times.append(time.perf_counter() - query_start_time)
+
+            top_player = reader.get_top_players(1)[0]
+
+        database_size = sum(os.path.getsize(os.path.join(directory, file_name)) for file_name in os.listdir(directory))
+
+    report_count = args.matches * (args.rounds + 1)
+    report_times.sort()
+    top_times.sort()
+    player_times.sort()
+
+    print(f'{args.matches} matches of {args.rounds} rounds between {args.players} players, '
+          f'{2 * args.matches} match results stored')
+    print(f'record_round p50/p99:   {get_percentile(report_times, 50) * 1e6:.2f} / '
+          f'{get_percentile(report_times, 99) * 1e6:.2f} us')
+    print(f'reports queued:         {report_count / (report_end_time - start_time):,.0f}/s')
+    print(f'reports applied:        {report_count / (apply_end_time - start_time):,.0f}/s '
+          f'in {batch_count} transactions')
+    print(f'database size:          {database_size / 2 ** 20:,.1f} MiB')
+    print(f'top 10 p50/p99:         {get_percentile(top_times, 50) * 1e3:.3f} / '
+          f'{get_percentile(top_times, 99) * 1e3:.3f} ms')
+    print(f'one player p50/p99:     {get_percentile(player_times, 50) * 1e3:.3f} / '
+          f'{get_percentile(player_times, 99) * 1e3:.3f} ms')
+    print(f'leader:                 {top_player["name"]} with {top_player["match_wins"]} wins '
+          f'in {top_player["matches"]} matches')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures the match log (match_log.py): how fast finished matches are appended,
+how many bytes each round takes, how fast one match is looked up by ID, and how fast every match is streamed.
+
+Matches are made up rather than played, so the figures are the log's own cost.
+
+Example: python benchmark_match_log.py --matches 1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from game_constants import *
+from match_log import MatchLogReader, MatchLogWriter, MatchRecorder, get_index_path
+from rulesets import OUTCOME_LOSS, OUTCOME_TIE, OUTCOME_WIN
+
+# Round winner by the outcome for player 1's move
+_WINNERS_BY_OUTCOME = {OUTCOME_TIE: TIE, OUTCOME_WIN: PLAYER_1, OUTCOME_LOSS: PLAYER_2}
+
+
+def make_match(rng: random.Random, max_rounds: int) -> MatchRecorder:
+    """
+    Makes up a finished match with random moves and some regeneration
+    :param rng: random stream to draw from
+    :param max_rounds: most rounds the match can have
+    :return: the match's recorder
+    """
+    stage = rng.choice(list(STAGES))
+    recorder = MatchRecorder(stage)
+    move_counts = {player: dict(STAGES[stage]) for player in (PLAYER_1, PLAYER_2)}
+
+    for _ in range(rng.randint(1, max_rounds)):
+        moves = {}
+        for player, counts in move_counts.items():
+            moves[player] = rng.choice([move for move, count in counts.items() if count > 0])
+            counts[moves[player]] -= 1
+
+        winner = _WINNERS_BY_OUTCOME[RULESET.get_outcome(moves[PLAYER_1], moves[PLAYER_2])]
+
+        recorder.record_round(moves, winner, move_counts)
+
+        for counts in move_counts.values():
+            if sum(counts.values()) < REGEN_THRESHOLD:
+                for _ in range(REGEN_ITERATIONS):
+                    counts[rng.choice(ALL_MOVES)] += REGEN_QUANTITY_EACH
+
+    recorder.quitter = rng.choice([PLAYER_1, PLAYER_2, ''])
+
+    return recorder
+
+
+def main():
+    """Measure the match log"""
+    parser = argparse.ArgumentParser(description='Measure appending to, looking up, and streaming the match log.')
+    parser.add_argument('--matches', type=int, default=200000, help='matches to append')
+    parser.add_argument('--max-rounds', type=int, default=30, help='most rounds per made-up match')
+    parser.add_argument('--lookups', type=int, default=100000, help='matches to look up by ID')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the made-up matches')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    # Matches are made up ahead of time, so only appending is timed
+    distinct_matches = [make_match(rng, args.max_rounds) for _ in range(min(args.matches, 1000))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.rpslog')
+
+        start_time = time.perf_counter()
+        with MatchLogWriter(path) as match_log:
+            for match_index in range(args.matches):
+                match_log.append(distinct_matches[match_index % len(distinct_matches)])
+        append_time = time.perf_counter() - start_time
+
+        log_size = os.path.getsize(path)
+        index_size = os.path.getsize(get_index_path(path))
+
+        with MatchLogReader(path) as reader:
+            match_ids = [rng.randrange(len(reader)) for _ in range(args.lookups)]
+
+            start_time = time.perf_counter()
+            for match_id in match_ids:
+                reader.get_match(match_id)
+            lookup_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            round_count = sum(match.round_count for match in reader.iter_matches())
+            stream_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            decoded_round_count = sum(1 for match in reader.iter_matches() for _ in match.iter_rounds())
+            decode_time = time.perf_counter() - start_time
+
+    print(f'{args.matches} matches, {round_count} rounds')
+    print(f'append:          {args.matches / append_time:>12,.0f} matches/s')
+    print(f'log size:        {log_size / 2 ** 20:>12,.1f} MiB ({(log_size - 8) / round_count:.1f} bytes/round, '
+          f'index {index_size / 2 ** 20:,.1f} MiB)')
+    print(f'lookup by ID:    {lookup_time / args.lookups * 1e6:>12,.2f} us/match')
+    print(f'stream headers:  {args.matches / stream_time:>12,.0f} matches/s')
+    print(f'decode rounds:   {decoded_round_count / decode_time:>12,.0f} rounds/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures what RPSGameManager's match state costs: memory per match, and CPU per match setup and per round.
+For comparison, memory is also measured for the nested state dict that JSON messages carry,
+which is how the game manager used to hold its state.
+
+Example: python benchmark_match_state.py --matches 100000 --rounds 200000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from game_constants import *
+from game_helpers import RPSGameManager
+
+
+def measure_memory_per_item(build_item, count: int) -> float:
+    """
+    :param build_item: callable taking no arguments that returns one item to keep alive
+    :param count: number of items to build
+    :return: bytes allocated per item
+    """
+    tracemalloc.start()
+    items = [build_item() for _ in range(count)]
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Don't count the list holding the items
+    return (allocated_bytes - items.__sizeof__()) / count
+
+
+def build_match(stage: str) -> RPSGameManager:
+    """
+    :param stage: stage name from STAGES
+    :return: a referee-style game manager at the start of a match on the given stage
+    """
+    game_manager = RPSGameManager(show_output=False)
+    game_manager.set_stage(stage)
+
+    return game_manager
+
+
+def time_match_setup(stage: str, match_count: int) -> float:
+    """
+    :param stage: stage name from STAGES
+    :param match_count: matches to set up
+    :return: microseconds to create a game manager and set its stage
+    """
+    start_time = time.perf_counter()
+
+    for _ in range(match_count):
+        build_match(stage)
+
+    return (time.perf_counter() - start_time) / match_count * 1e6
+
+
+def time_rounds(stage: str, round_count: int) -> float:
+    """
+    Plays rounds the way the match server's referee does: record both moves, award the round, then regenerate
+    :param stage: stage name from STAGES
+    :param round_count: rounds to play
+    :return: microseconds per round
+    """
+    game_manager = build_match(stage)
+
+    # Choose the moves up front, so only the game manager is timed
+    moves = [random.choice(ALL_MOVES) for _ in range(2 * round_count)]
+
+    start_time = time.perf_counter()
+
+    for round_index in range(round_count):
+        for player_index, player in enumerate((PLAYER_1, PLAYER_2)):
+            game_manager.record_player_move(player, moves[2 * round_index + player_index])
+
+        game_manager.set_local_player(PLAYER_1)
+        game_manager.calculate_round_result()
+
+        for player in (PLAYER_1, PLAYER_2):
+            if game_manager.count_remaining_move_options(player) < REGEN_THRESHOLD:
+                for _ in range(REGEN_ITERATIONS):
+                    game_manager.regenerate_random_option(player)
+
+    return (time.perf_counter() - start_time) / round_count * 1e6
+
+
+def main():
+    """Benchmark the game manager's match state"""
+    parser = argparse.ArgumentParser(description='Measure memory per match and CPU per round of the match state.')
+    parser.add_argument('--matches', type=int, default=100000, help='matches kept alive for the memory measurement')
+    parser.add_argument('--rounds', type=int, default=200000, help='rounds played for the CPU measurement')
+    parser.add_argument('--stage', choices=list(STAGES), default=list(STAGES)[0], help='stage to play on')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the moves')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    game_manager_bytes = measure_memory_per_item(lambda: build_match(args.stage), args.matches)
+    state_dict_bytes = measure_memory_per_item(lambda: build_match(args.stage).state, args.matches)
+    setup_time = time_match_setup(args.stage, args.matches)
+    round_time = time_rounds(args.stage, args.rounds)
+
+    print(f'memory per match, game manager: {game_manager_bytes:.0f} bytes')
+    print(f'memory per match, nested state dict alone: {state_dict_bytes:.0f} bytes')
+    print(f'CPU per match setup: {setup_time:.3f} us')
+    print(f'CPU per round: {round_time:.3f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Measures the matchmaking queue (matchmaking.py) with many players waiting:
+what it costs to add a player, remove one, pair an arriving player, and sweep the queue for pairs,
+at each queue size. Every cost should stay flat as the queue grows.
+
+Ratings are spread like a real player base, bunched around DEFAULT_RATING.
+
+Example: python benchmark_matchmaking.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import time
+from matchmaking import DEFAULT_RATING, MatchmakingQueue, MatchmakingTicket
+
+RATING_SPREAD = 300.0  # standard deviation of the simulated players' ratings
+
+
+def fill_queue(size: int, rng: random.Random, now: float) -> MatchmakingQueue:
+    """
+    :param size: players to queue
+    :param rng: random number generator for ratings and wait times
+    :param now: current time, in the same units as the tickets' enqueued_at
+    :return: a queue with that many players, who have been waiting up to 10 seconds
+    """
+    matchmaking_queue = MatchmakingQueue()
+
+    for player_index in range(size):
+        matchmaking_queue.add(
+            MatchmakingTicket(rng.gauss(DEFAULT_RATING, RATING_SPREAD), player_index, now - 10 * rng.random()))
+
+    return matchmaking_queue
+
+
+def measure(size: int, operations: int, seed: int) -> dict:
+    """
+    :param size: players waiting in the queue throughout
+    :param operations: operations of each kind to time
+    :param seed: seed for ratings and wait times
+    :return: microseconds per operation, by kind
+    """
+    rng = random.Random(seed)
+    now = 1000.0
+    matchmaking_queue = fill_queue(size, rng, now)
+    arrivals = [MatchmakingTicket(rng.gauss(DEFAULT_RATING, RATING_SPREAD), None, now) for _ in range(operations)]
+    costs = {}
+
+    # Adding, then removing the same players, leaves the queue as it was
+    start_time = time.perf_counter()
+    for ticket in arrivals:
+        matchmaking_queue.add(ticket)
+    costs['add'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for ticket in arrivals:
+        matchmaking_queue.remove(ticket)
+    costs['remove'] = time.perf_counter() - start_time
+
+    # Pairing is finding the opponent, then removing them, which was timed above; finding leaves the queue's size alone
+    opponents = []
+    start_time = time.perf_counter()
+    for ticket in arrivals:
+        opponents.append(matchmaking_queue.find_opponent(ticket, now))
+    costs['pair'] = time.perf_counter() - start_time
+    paired_count = sum(opponent is not None for opponent in opponents)
+
+    # One sweep pairs at most one player per bucket
+    start_time = time.perf_counter()
+    pairs = matchmaking_queue.pop_pairs(now)
+    sweep_seconds = time.perf_counter() - start_time
+
+    return {
+        'add': costs['add'] / operations * 1e6,
+        'remove': costs['remove'] / operations * 1e6,
+        'pair': costs['pair'] / operations * 1e6,
+        'paired': paired_count / operations,
+        'sweep': sweep_seconds * 1e6,
+        'sweep_pairs': len(pairs),
+    }
+
+
+def main():
+    """Measure the matchmaking queue"""
+    parser = argparse.ArgumentParser(description='Measure the matchmaking queue with many players waiting.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='queued players')
+    parser.add_argument('--operations', type=int, default=10000, help='operations of each kind to time')
+    parser.add_argument('--seed', type=int, default=0, help='seed for ratings and wait times')
+    args = parser.parse_args()
+
+    print(f'{"queued":>8} {"add us":>7} {"remove us":>10} {"pair us":>8} {"paired":>7} {"sweep us":>9} '
+          f'{"sweep pairs":>12}')
+
+    for size in args.sizes:
+        result = measure(size, args.operations, args.seed)
+
+        print(f'{size:>8} {result["add"]:>7.2f} {result["remove"]:>10.2f} {result["pair"]:>8.2f} '
+              f'{result["paired"]:>7.0%} {result["sweep"]:>9.0f} {result["sweep_pairs"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measures what the hot-path metrics (rps_metrics.py) cost, by playing the same bot matches with metrics off and on.
+
+Both players run in this process over a socket pair, as in benchmark_round_modes.py but without the thinking,
+so nearly all the time goes to the game and socket code the metrics are recorded in.
+Trials alternate between off and on so that drift in the machine's speed affects both alike.
+
+Example: python benchmark_metrics.py --matches 200 --rounds 30 --trials 5
+"""
+
+import argparse
+import socket
+import threading
+import time
+from game_constants import *
+from benchmark_round_modes import TimedGameManager
+from rps_bots import RandomBot
+from rps_metrics import METRICS
+
+
+def play_match(rounds: int, seed: int) -> int:
+    """
+    Plays one bot match over a socket pair, with player 2 on its own thread
+    :param rounds: player 1's bot quits after this many rounds
+    :param seed: seed for the bots' moves
+    :return: number of rounds player 1 saw resolved
+    """
+    player_1_socket, player_2_socket = socket.socketpair()
+
+    # Player 2 never quits first, so player 1's bot decides how long the match lasts
+    player_2_manager = TimedGameManager(RandomBot(2 * rounds, seed + 1))
+    player_2_thread = threading.Thread(target=player_2_manager.play_game, args=(player_2_socket,))
+    player_2_thread.start()
+
+    game_manager = TimedGameManager(RandomBot(rounds, seed))
+
+    try:
+        game_manager.set_stage(list(STAGES)[seed % len(STAGES)])
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(player_1_socket)
+        game_manager.play_game(player_1_socket)
+
+    finally:
+        player_2_thread.join()
+        player_1_socket.close()
+        player_2_socket.close()
+
+    return len(game_manager.round_end_times)
+
+
+def run_trial(matches: int, rounds: int, seed: int) -> float:
+    """
+    :param matches: matches to play
+    :param rounds: rounds per match
+    :param seed: base seed; every trial with the same seed plays the same matches
+    :return: rounds resolved per second
+    """
+    round_count = 0
+    start_time = time.perf_counter()
+
+    for match_index in range(matches):
+        round_count += play_match(rounds, seed + match_index)
+
+    return round_count / (time.perf_counter() - start_time)
+
+
+def main():
+    """Measure the cost of metrics"""
+    parser = argparse.ArgumentParser(description='Compare bot match throughput with metrics off and on.')
+    parser.add_argument('--matches', type=int, default=100, help='matches per trial')
+    parser.add_argument('--rounds', type=int, default=30, help='rounds per match')
+    parser.add_argument('--trials', type=int, default=3, help='trials with metrics off, and as many with them on')
+    parser.add_argument('--seed', type=int, default=0, help='base seed')
+    args = parser.parse_args()
+
+    rates = {False: [], True: []}
+
+    for _ in range(args.trials):
+        for enabled in (False, True):
+            METRICS.enabled = enabled
+            rates[enabled].append(run_trial(args.matches, args.rounds, args.seed))
+
+    METRICS.enabled = False
+
+    best_off_rate = max(rates[False])
+    best_on_rate = max(rates[True])
+
+    print(f'metrics off: {best_off_rate:>10,.0f} rounds/s (best of {args.trials})')
+    print(f'metrics on:  {best_on_rate:>10,.0f} rounds/s (best of {args.trials})')
+    print(f'overhead:    {(best_off_rate / best_on_rate - 1) * 100:>10.1f} %')
+    print(f'messages recorded: {METRICS.messages_sent.get():,} sent, {METRICS.messages_received.get():,} received')
+
+
+if __name__ == '__main__':
+    main()
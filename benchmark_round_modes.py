@@ -0,0 +1,193 @@
+"""
+Compares how long rounds take when relayed and when played by commit and reveal (see commit_reveal.py).
+
+Plays bot matches on loopback TCP, with player 1 as the client and player 2 as the server,
+exactly as Super_LAN_RPS_client.py and Super_LAN_RPS_server.py play them.
+Each bot thinks for a while before every move. Relayed rounds pay for both players' thinking one after the other,
+while in commit-reveal rounds both players think at once, so the gap between rounds shrinks by about one think time.
+Every match is checked to end with both players agreeing on the score.
+
+Example: python benchmark_round_modes.py --matches 10 --rounds 30 --think-ms 20
+"""
+
+import argparse
+import threading
+import time
+from socket import AF_INET, SOCK_STREAM, create_connection, socket
+from typing import List
+from socket_constants import *
+from game_constants import *
+from game_helpers import RPSGameManager
+from rps_bots import RandomBot
+
+
+class ThinkingBot(RandomBot):
+    """
+    Random bot that takes a while to choose, like a person would
+    """
+    def __init__(self, think_time: float, max_rounds: int, seed: int):
+        """
+        :param think_time: seconds to wait before every move
+        :param max_rounds: quits after playing this many moves
+        :param seed: seed for this bot's own random stream, for repeatable runs
+        """
+        super().__init__(max_rounds, seed)
+        self.think_time = think_time
+
+    def __call__(self, game_manager, valid_moves: List[str]) -> str:
+        time.sleep(self.think_time)
+
+        return super().__call__(game_manager, valid_moves)
+
+
+class TimedGameManager(RPSGameManager):
+    """
+    Game manager for a bot that notes when every round ends
+    """
+    def __init__(self, bot):
+        """
+        :param bot: move selector that plays for this player
+        """
+        super().__init__(move_selector=bot, show_output=False)
+        self.round_end_times = []
+
+    def handle_end_of_round(self):
+        super().handle_end_of_round()
+        self.round_end_times.append(time.perf_counter())
+
+
+class RoundModeResult:
+    """
+    Measurements from every match played in one round mode
+    """
+    def __init__(self, name: str):
+        """
+        :param name: round mode name for the report
+        """
+        self.name = name
+        self.round_durations = []
+        self.commit_reveal_match_count = 0
+        self.mismatched_match_count = 0
+
+
+def play_player_2(listening_socket: socket, think_time: float, rounds: int, seed: int, outcome: dict):
+    """
+    Plays player 2's side of a match as Super_LAN_RPS_server.py does
+    :param listening_socket: socket player 1 connects to
+    :param think_time: seconds the bot thinks before every move
+    :param rounds: bot quits after this many rounds
+    :param seed: seed for the bot's moves
+    :param outcome: receives the final scores
+    """
+    connection_socket, _ = listening_socket.accept()
+    listening_socket.close()
+    game_manager = TimedGameManager(ThinkingBot(think_time, rounds, seed))
+
+    try:
+        game_manager.play_game(connection_socket)
+        outcome['player_2_scores'] = game_manager.get_scores()
+
+    finally:
+        connection_socket.close()
+
+
+def play_match(round_modes: List[str], port: int, think_time: float, rounds: int, seed: int,
+               result: RoundModeResult):
+    """
+    Plays one bot match over loopback and records how long its rounds took
+    :param round_modes: round modes player 1 offers; empty to relay every round
+    :param port: free port for player 2 to listen on
+    :param think_time: seconds each bot thinks before every move
+    :param rounds: player 1's bot quits after this many rounds
+    :param seed: seed for the bots' moves
+    :param result: receives the match's measurements
+    """
+    outcome = {}
+
+    listening_socket = socket(family=AF_INET, type=SOCK_STREAM)
+    listening_socket.bind(('', port))
+    listening_socket.listen(1)
+
+    # Player 2 never quits first, so player 1's bot decides how long the match lasts
+    player_2_thread = threading.Thread(target=play_player_2,
+                                       args=(listening_socket, think_time, 2 * rounds, seed + 1, outcome))
+    player_2_thread.start()
+
+    connection_socket = create_connection((SERVER_NAME, port))
+    game_manager = TimedGameManager(ThinkingBot(think_time, rounds, seed))
+    game_manager.round_modes = round_modes
+
+    try:
+        game_manager.set_stage(list(STAGES)[seed % len(STAGES)])
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(connection_socket)
+        game_manager.play_game(connection_socket)
+
+    finally:
+        connection_socket.close()
+
+    player_2_thread.join()
+
+    if outcome.get('player_2_scores') != tuple(reversed(game_manager.get_scores())):
+        result.mismatched_match_count += 1
+
+    if game_manager.is_commit_reveal():
+        result.commit_reveal_match_count += 1
+
+    # Time from the end of one round to the end of the next, as the local player sees it
+    round_end_times = game_manager.round_end_times
+    result.round_durations += [end - start for start, end in zip(round_end_times, round_end_times[1:])]
+
+
+def print_report(results: List[RoundModeResult], matches: int):
+    """
+    Prints one line of round figures per round mode
+    :param results: measurements for each round mode
+    :param matches: matches played in each round mode
+    """
+    print(f'{"round mode":<16} {"rounds":>7} {"mean ms":>8} {"commit-reveal":>14} {"bad":>4}')
+
+    for result in results:
+        round_durations = result.round_durations
+        if len(round_durations) == 0:
+            print(f'{result.name:<16} no rounds completed')
+            continue
+
+        mean_duration = sum(round_durations) / len(round_durations)
+
+        print(f'{result.name:<16} {len(round_durations):>7} {mean_duration * 1000:>8.2f} '
+              f'{f"{result.commit_reveal_match_count}/{matches}":>14} {result.mismatched_match_count:>4}')
+
+
+def main():
+    """Compare round modes"""
+    parser = argparse.ArgumentParser(description='Compare relayed and commit-reveal rounds on loopback.')
+    parser.add_argument('--matches', type=int, default=10, help='matches per round mode')
+    parser.add_argument('--rounds', type=int, default=30, help='rounds per match')
+    parser.add_argument('--think-ms', type=float, default=20.0, help='milliseconds each bot thinks before a move')
+    parser.add_argument('--port', type=int, default=SERVER_PORT + 2, help='first of the loopback ports to use')
+    parser.add_argument('--seed', type=int, default=0, help='base seed')
+    args = parser.parse_args()
+
+    runs = [
+        ('relay', []),
+        ('commit-reveal', [ROUND_MODE_COMMIT_REVEAL]),
+    ]
+
+    results = []
+    port = args.port
+
+    for name, round_modes in runs:
+        result = RoundModeResult(name)
+
+        for match_index in range(args.matches):
+            play_match(round_modes, port, args.think_ms / 1000, args.rounds, args.seed + match_index, result)
+            port += 1
+
+        results.append(result)
+
+    print_report(results, args.matches)
+
+
+if __name__ == '__main__':
+    main()
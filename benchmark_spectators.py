@@ -0,0 +1,241 @@
+"""
+Measures spectator fan-out on the match server (see spectators.py): how long players' rounds take
+with no spectators and with thousands of them, how spread out each round's delivery to spectators is,
+and how many updates slow spectators had to skip.
+
+Runs a match server, two bot players who think for a while before every move, and every spectator in this process,
+so on a machine with few cores the spectators' own reading competes with the server for CPU.
+Some spectators are slow on purpose: they shrink their receive buffers and read far slower than rounds are played,
+which would stall the players if the match ever waited on a spectator.
+
+Example: python benchmark_spectators.py --spectators 2000 --slow-spectators 50 --rounds 300
+"""
+
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from socket import create_connection
+from typing import Dict, List, Tuple
+from socket_constants import *
+from game_constants import *
+from benchmark_round_modes import ThinkingBot, TimedGameManager
+from generic_utils import get_percentile
+from Super_LAN_RPS_match_server import MatchServer, raise_open_file_limit
+from socket_helpers import GELA372Receiver, PacketUnpackError, frame_message, receive_message_bytes_async
+from spectators import MatchBroadcast
+import state_codec
+
+
+def play_seat(port: int, stage: str, think_time: float, rounds: int, seed: int, game_managers: List[TimedGameManager]):
+    """
+    Plays one bot seat to the end against the match server
+    :param port: match server port
+    :param stage: stage to select
+    :param think_time: seconds the bot thinks before every move
+    :param rounds: bot quits after this many rounds
+    :param seed: seed for the bot's moves
+    :param game_managers: receives the seat's game manager, which notes when every round ends
+    """
+    connection_socket = create_connection((SERVER_NAME, port))
+    game_manager = TimedGameManager(ThinkingBot(think_time, rounds, seed))
+    game_managers.append(game_manager)
+
+    try:
+        game_manager.set_stage(stage)
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(connection_socket)
+        game_manager.play_game(connection_socket)
+
+    except OSError:
+        # The match server may close a seat while its bot is still sending a move the match no longer needs
+        pass
+
+    finally:
+        connection_socket.close()
+
+
+async def spectate(port: int, match_id: int, arrival_times: Dict[int, List[float]], joined: List[int],
+                   read_delay: float = 0.0):
+    """
+    Watches a match, noting when each round's update arrives
+    :param port: match server port
+    :param match_id: match to watch
+    :param arrival_times: round number -> arrival time of that round's update at every spectator so far
+    :param joined: counts this spectator once its first update arrives
+    :param read_delay: seconds to wait before reading each message; a slow spectator also shrinks its receive buffer
+    """
+    if read_delay > 0:
+        slow_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        slow_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1)
+        slow_socket.connect((SERVER_NAME, port))
+        reader, writer = await asyncio.open_connection(sock=slow_socket, limit=BUFFER_SIZE)
+    else:
+        reader, writer = await asyncio.open_connection(SERVER_NAME, port)
+
+    writer.writelines(frame_message(state_codec.encode_watch_request(match_id)))
+    receiver = GELA372Receiver(BUFFER_SIZE)
+    has_joined = False
+
+    try:
+        while True:
+            if read_delay > 0:
+                await asyncio.sleep(read_delay)
+
+            message = await receive_message_bytes_async(reader, receiver)
+            arrival_time = time.perf_counter()
+
+            if not state_codec.is_spectator_update(message):
+                continue
+
+            update = state_codec.decode_spectator_update(message)
+            arrival_times.setdefault(update['round'], []).append(arrival_time)
+
+            if not has_joined:
+                joined[0] += 1
+                has_joined = True
+
+            if update['finished']:
+                return
+
+    except (PacketUnpackError, ConnectionError):
+        pass
+
+    finally:
+        writer.close()
+
+
+async def watch_match(port: int, match_server: MatchServer, spectator_count: int, slow_spectator_count: int,
+                      slow_read_delay: float, arrival_times: Dict[int, List[float]]) -> Tuple[float, MatchBroadcast]:
+    """
+    Connects every spectator to the newest live match and waits for the match to end
+    :param port: match server port
+    :param match_server: the running match server, to find the match in
+    :param spectator_count: spectators that read every update as soon as it arrives
+    :param slow_spectator_count: spectators that read too slowly to keep up
+    :param slow_read_delay: seconds slow spectators wait before reading each message
+    :param arrival_times: receives every update's arrival times, by round number
+    :return: time.perf_counter() once every spectator had its first update, and the match's broadcast
+    """
+    while len(match_server.broadcasts) == 0:
+        await asyncio.sleep(0.001)
+
+    match_id = max(match_server.broadcasts)
+    broadcast = match_server.broadcasts[match_id]
+    joined = [0]
+    slow_spectators = [asyncio.ensure_future(spectate(port, match_id, {}, [0], slow_read_delay))
+                       for _ in range(slow_spectator_count)]
+    spectators = [asyncio.ensure_future(spectate(port, match_id, arrival_times, joined))
+                  for _ in range(spectator_count)]
+
+    while joined[0] < spectator_count and not all(spectator.done() for spectator in spectators):
+        await asyncio.sleep(0.001)
+    all_joined_time = time.perf_counter()
+
+    await asyncio.gather(*spectators)
+
+    # Slow spectators would take a while yet to read their way to the end
+    for slow_spectator in slow_spectators:
+        slow_spectator.cancel()
+    await asyncio.gather(*slow_spectators, return_exceptions=True)
+
+    return all_joined_time, broadcast
+
+
+def run_match(port: int, match_server: MatchServer, spectator_count: int, slow_spectator_count: int,
+              slow_read_delay: float, think_time: float, rounds: int, seed: int) -> dict:
+    """
+    Plays one match with the given spectators
+    :param port: match server port
+    :param match_server: the running match server
+    :param spectator_count: spectators that read every update as soon as it arrives
+    :param slow_spectator_count: spectators that read too slowly to keep up
+    :param slow_read_delay: seconds slow spectators wait before reading each message
+    :param think_time: seconds each bot thinks before every move
+    :param rounds: rounds per match
+    :param seed: seed for the bots' moves and the stage
+    :return: the match's measurements
+    """
+    game_managers = []
+    stage = list(STAGES)[seed % len(STAGES)]
+
+    # Player 2 never quits first, so player 1's bot decides how long the match lasts
+    player_threads = [threading.Thread(target=play_seat, args=(port, stage, think_time, rounds, seed, game_managers)),
+                      threading.Thread(target=play_seat,
+                                       args=(port, stage, think_time, 2 * rounds, seed + 1, game_managers))]
+    for player_thread in player_threads:
+        player_thread.start()
+        time.sleep(0.05)  # the first to connect waits in the lobby
+
+    arrival_times = {}
+    all_joined_time = time.perf_counter()
+    skipped_update_count = 0
+    if spectator_count + slow_spectator_count > 0:
+        all_joined_time, broadcast = asyncio.run(
+            watch_match(port, match_server, spectator_count, slow_spectator_count, slow_read_delay, arrival_times))
+        skipped_update_count = broadcast.skipped_update_count
+
+    for player_thread in player_threads:
+        player_thread.join()
+
+    # Only count rounds that ended after every spectator had joined, so connecting doesn't count against the match
+    round_end_times = [end_time for end_time in game_managers[0].round_end_times if end_time >= all_joined_time]
+    round_overheads = [end - start - think_time for start, end in zip(round_end_times, round_end_times[1:])]
+    delivery_spreads = [max(times) - min(times) for times in arrival_times.values() if len(times) == spectator_count]
+
+    return {
+        'round_overheads': round_overheads,
+        'delivery_spreads': delivery_spreads,
+        'updates_received': sum(len(times) for times in arrival_times.values()),
+        'updates_skipped': skipped_update_count,
+    }
+
+
+def main():
+    """Measure spectator fan-out"""
+    parser = argparse.ArgumentParser(description='Measure how spectators affect a match on the match server.')
+    parser.add_argument('--spectators', type=int, default=1000, help='spectators that read every update')
+    parser.add_argument('--slow-spectators', type=int, default=50, help='spectators that read too slowly to keep up')
+    parser.add_argument('--slow-read-ms', type=float, default=20.0,
+                        help='milliseconds slow spectators wait before reading each message')
+    parser.add_argument('--rounds', type=int, default=300, help='rounds per match')
+    parser.add_argument('--think-ms', type=float, default=20.0, help='milliseconds each bot thinks before a move')
+    parser.add_argument('--port', type=int, default=SERVER_PORT + 2, help='loopback port for the match server')
+    parser.add_argument('--seed', type=int, default=0, help='base seed')
+    args = parser.parse_args()
+
+    raise_open_file_limit()
+
+    match_server = MatchServer()
+    threading.Thread(target=asyncio.run, args=(match_server.serve(args.port),), daemon=True).start()
+    time.sleep(0.2)
+
+    think_time = args.think_ms / 1000
+    runs = [('no spectators', 0, 0), (f'{args.spectators} + {args.slow_spectators} slow', args.spectators,
+                                      args.slow_spectators)]
+
+    print(f'{"spectators":<20} {"rounds":>6} {"p50 ms":>7} {"p99 ms":>7} {"spread p50":>11} {"spread p99":>11} '
+          f'{"updates":>9} {"skipped":>8}')
+
+    for run_index, (name, spectator_count, slow_spectator_count) in enumerate(runs):
+        result = run_match(args.port, match_server, spectator_count, slow_spectator_count, args.slow_read_ms / 1000,
+                           think_time, args.rounds, args.seed + run_index)
+
+        # Round overhead is a round's duration beyond the bots' thinking
+        round_overheads = sorted(result['round_overheads'])
+        delivery_spreads = sorted(result['delivery_spreads'])
+        spread_text = ['-', '-']
+        if len(delivery_spreads) > 0:
+            spread_text = [f'{get_percentile(delivery_spreads, percentile) * 1000:.2f}' for percentile in (50, 99)]
+
+        print(f'{name:<20} {len(round_overheads):>6} {get_percentile(round_overheads, 50) * 1000:>7.2f} '
+              f'{get_percentile(round_overheads, 99) * 1000:>7.2f} {spread_text[0]:>11} {spread_text[1]:>11} '
+              f'{result["updates_received"]:>9} {result["updates_skipped"]:>8}')
+
+    print('p50/p99 ms: round time beyond thinking. spread: ms from the first to the last spectator receiving a round. '
+          'skipped: updates spectators skipped for falling behind')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares the state codecs: encode time, decode time, and wire size.
+
+Example: python benchmark_state_codec.py --iterations 200000
+"""
+
+import argparse
+import copy
+import timeit
+from game_constants import *
+import state_codec
+
+
+def build_sample_state() -> dict:
+    """
+    :return: a typical mid-game state, in the format used by RPSGameManager
+    """
+    return {
+        'whose_turn': PLAYER_2,
+        'round_winner': PLAYER_1,
+        'stage': 'RAINFOREST',
+        'player': {
+            PLAYER_1: {'score': 12, 'move_choices': {'R': 1, 'P': 2, 'S': 0}, 'current_move': 'P'},
+            PLAYER_2: {'score': 9, 'move_choices': {'R': 0, 'P': 1, 'S': 2}, 'current_move': 'R'},
+        }
+    }
+
+
+def build_previous_state(state: dict) -> dict:
+    """
+    :param state: state from build_sample_state()
+    :return: the state one turn earlier, before player 2 moved and the round was awarded
+    """
+    previous_state = copy.deepcopy(state)
+    previous_state['whose_turn'] = PLAYER_1
+    previous_state['round_winner'] = ''
+    previous_state['player'][PLAYER_1]['score'] -= 1
+    previous_state['player'][PLAYER_2]['current_move'] = 'P'
+    previous_state['player'][PLAYER_2]['move_choices']['R'] += 1
+
+    return previous_state
+
+
+def time_per_call(function, iterations: int) -> float:
+    """
+    :param function: callable taking no arguments
+    :param iterations: number of calls per measurement
+    :return: best of three measurements, in microseconds per call
+    """
+    return min(timeit.repeat(function, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main():
+    """Benchmark the state codecs"""
+    parser = argparse.ArgumentParser(description='Compare the state codecs.')
+    parser.add_argument('--iterations', type=int, default=100000, help='calls per measurement')
+    args = parser.parse_args()
+
+    state = build_sample_state()
+
+    print(f'{"codec":<10} {"bytes":>6} {"encode us":>10} {"decode us":>10}')
+
+    for codec in (STATE_CODEC_JSON, STATE_CODEC_BINARY):
+        message = state_codec.encode_state(state, codec)
+        wire_message = message.encode() if isinstance(message, str) else message
+
+        # A received message arrives as bytes, whatever the codec
+        encode_time = time_per_call(lambda: state_codec.encode_state(state, codec), args.iterations)
+        decode_time = time_per_call(lambda: state_codec.decode_state(wire_message), args.iterations)
+
+        assert state_codec.decode_state(wire_message) == state
+
+        print(f'{codec:<10} {len(wire_message):>6} {encode_time:>10.3f} {decode_time:>10.3f}')
+
+    # A delta is measured against the sender's previous state, which the receiver already has
+    previous_state = build_previous_state(state)
+    previous_fields = state_codec.state_to_fields(previous_state)
+    sender_sync = state_codec.DeltaStateSync()
+    receiver_sync = state_codec.DeltaStateSync()
+
+    def encode_delta() -> bytes:
+        sender_sync.last_sent_fields = previous_fields
+        return sender_sync.encode_delta(state)
+
+    def decode_delta() -> dict:
+        receiver_sync.last_received_fields = previous_fields
+        receiver_sync.expected_received_sequence = 0
+        return receiver_sync.decode_delta(wire_message)
+
+    wire_message = encode_delta()
+    assert decode_delta() == state
+
+    encode_time = time_per_call(encode_delta, args.iterations)
+    decode_time = time_per_call(decode_delta, args.iterations)
+
+    print(f'{STATE_CODEC_DELTA:<10} {len(wire_message):>6} {encode_time:>10.3f} {decode_time:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,617 @@
+"""
+Microbenchmarks for the paths every round goes through, with saved baselines to catch regressions:
+
+- GELA372 framing: send_message() and then receive_message_bytes() over a socketpair, for messages from 10 B to 1 MB,
+  framed as v1 packets and as v2 frames, at every BUFFER_SIZE in --buffer-sizes.
+  Also the old receive_next_packet(), which expects one packet per recv, on messages that fit in one packet.
+- State codecs: encode_state() and decode_state() for JSON and binary, and delta-1 encoding and decoding.
+- Rounds: calculate_round_result(), and handle_end_of_round() with printing off, regenerating as in a real match.
+  Also whole rounds through the engine (see rps_engine.py): step(), and step_many() over ENGINE_BATCH_SIZE matches,
+  where one op is one match's round.
+- Bots: NGramBot choosing a move, then learning from the round, against an opponent cycling through the moves.
+- Whole rounds between two bots over the in-memory loopback (see loopback_transport.py), relayed and commit-reveal,
+  which covers everything a round sends and receives apart from the kernel.
+
+Each benchmark reports ns/op, wire bytes/op where something goes on the wire,
+and alloc B/op: the most memory in use at once during one op beyond what was in use before it,
+measured by tracemalloc in a separate pass, since CPython doesn't count allocations.
+
+--save-baseline saves the results, and later runs compare against them: a benchmark more than --threshold slower
+than its baseline is a regression, and the suite exits with status 1. Baselines only mean something on the machine
+they were saved on.
+
+Example: python benchmark_suite.py --save-baseline
+         python benchmark_suite.py --filter gela372.v2 --threshold 0.15
+"""
+
+import argparse
+import json
+import platform
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+from socket_constants import *
+from game_constants import *
+from benchmark_state_codec import build_previous_state, build_sample_state
+from game_helpers import RPSGameManager
+from loopback_transport import play_loopback_match
+from rps_bots import NGramBot, RandomBot
+import rps_engine
+import socket_helpers
+import state_codec
+
+DEFAULT_BASELINE_PATH = 'benchmark_baselines.json'
+MESSAGE_SIZES = [10, 100, 1000, 10 * 1000, 100 * 1000, 1000 * 1000]
+INLINE_MESSAGE_SIZE = 64 * 1024  # largest message sent and received on one thread; larger ones need a sender thread
+ALLOCATION_SAMPLES = 5  # ops measured by tracemalloc for each benchmark
+ENGINE_BATCH_SIZE = 1000  # matches stepped per step_many() call
+
+# Builds a function that runs the benchmarked op the given number of times, from a fresh start
+Preparer = Callable[[int], Callable[[], None]]
+
+
+class Microbenchmark:
+    """
+    One benchmarked op
+    """
+    def __init__(self, name: str, prepare: Preparer, wire_bytes: Optional[int] = None,
+                 buffer_size: Optional[int] = None):
+        """
+        :param name: dotted name, which --filter matches and baselines are saved under
+        :param prepare: given an op count, returns a function that runs the op that many times
+        :param wire_bytes: bytes one op puts on the wire, if any
+        :param buffer_size: BUFFER_SIZE to run with, or None to leave it as it is
+        """
+        self.name = name
+        self.prepare = prepare
+        self.wire_bytes = wire_bytes
+        self.buffer_size = buffer_size
+
+
+def format_size(size: int) -> str:
+    """
+    :param size: bytes
+    :return: size like 10B, 100KB, or 1MB
+    """
+    for unit_size, unit in ((1000 * 1000, 'MB'), (1000, 'KB')):
+        if size >= unit_size and size % unit_size == 0:
+            return f'{size // unit_size}{unit}'
+
+    return f'{size}B'
+
+
+def build_message(size: int) -> str:
+    """
+    :param size: message length
+    :return: ASCII message of that length, so it's the same size in bytes and in v1's characters
+    """
+    return ('{"filler": "' + 'x' * size)[:size]
+
+
+def prepare_round_trips(message: str, version: int, buffer_size: int) -> Preparer:
+    """
+    :param message: message each op sends and receives
+    :param version: GELA372 version to frame it with
+    :param buffer_size: BUFFER_SIZE, which sizes the receive buffer
+    :return: preparer for sending the message through a socketpair and reading it back out whole.
+             Like in a match, one message is in flight at a time: a v1 receiver can't tell where a message's
+             last packet ends if the next message is already behind it.
+    """
+    def prepare(count: int) -> Callable[[], None]:
+        sending_socket, receiving_socket = socket.socketpair()
+        receiver = socket_helpers.GELA372Receiver(4 * buffer_size)
+        received = threading.Semaphore(0)
+
+        def send_all():
+            for _ in range(count):
+                socket_helpers.send_message(message, sending_socket, version)
+                received.acquire()
+
+        def run_inline():
+            for _ in range(count):
+                socket_helpers.send_message(message, sending_socket, version)
+                socket_helpers.receive_message_bytes(receiving_socket, receiver)
+
+        def run_with_sender_thread():
+            sender = threading.Thread(target=send_all)
+            sender.start()
+
+            for _ in range(count):
+                socket_helpers.receive_message_bytes(receiving_socket, receiver)
+                received.release()
+
+            sender.join()
+
+        def run():
+            try:
+                (run_inline if len(message) <= INLINE_MESSAGE_SIZE else run_with_sender_thread)()
+
+            finally:
+                sending_socket.close()
+                receiving_socket.close()
+
+        return run
+
+    return prepare
+
+
+def prepare_packet_reads(message: str) -> Preparer:
+    """
+    :param message: message that fits in one v1 packet
+    :return: preparer for sending the message and reading it back with receive_next_packet()
+    """
+    def prepare(count: int) -> Callable[[], None]:
+        sending_socket, receiving_socket = socket.socketpair()
+
+        def run():
+            try:
+                for _ in range(count):
+                    socket_helpers.send_message(message, sending_socket, GELA372_VERSION_1)
+                    socket_helpers.receive_next_packet(receiving_socket)
+
+            finally:
+                sending_socket.close()
+                receiving_socket.close()
+
+        return run
+
+    return prepare
+
+
+def build_framing_benchmarks(buffer_sizes: List[int]) -> List[Microbenchmark]:
+    """
+    :param buffer_sizes: BUFFER_SIZE values to sweep
+    :return: GELA372 send and receive benchmarks
+    """
+    benchmarks = []
+
+    for buffer_size in buffer_sizes:
+        for size in MESSAGE_SIZES:
+            message = build_message(size)
+
+            for version in (GELA372_VERSION_1, GELA372_VERSION_2):
+                previous_buffer_size = socket_helpers.BUFFER_SIZE
+                socket_helpers.BUFFER_SIZE = buffer_size
+                wire_bytes = sum(len(buffer) for buffer in socket_helpers.frame_message(message, version))
+                socket_helpers.BUFFER_SIZE = previous_buffer_size
+
+                benchmarks.append(Microbenchmark(
+                    f'gela372.v{version}.{format_size(size)}.buffer-{buffer_size}',
+                    prepare_round_trips(message, version, buffer_size), wire_bytes, buffer_size))
+
+            if size < buffer_size:
+                benchmarks.append(Microbenchmark(
+                    f'gela372.receive_next_packet.{format_size(size)}.buffer-{buffer_size}',
+                    prepare_packet_reads(message), size + 1, buffer_size))
+
+    return benchmarks
+
+
+def prepare_repeated_call(build_call: Callable[[], Callable[[], object]]) -> Preparer:
+    """
+    :param build_call: returns the op, from a fresh start
+    :return: preparer that calls the op over and over
+    """
+    def prepare(count: int) -> Callable[[], None]:
+        call = build_call()
+
+        def run():
+            for _ in range(count):
+                call()
+
+        return run
+
+    return prepare
+
+
+def build_codec_benchmarks() -> List[Microbenchmark]:
+    """
+    :return: state codec benchmarks on a typical mid-game state
+    """
+    state = build_sample_state()
+    benchmarks = []
+
+    for codec in (STATE_CODEC_JSON, STATE_CODEC_BINARY):
+        message = state_codec.encode_state(state, codec)
+        wire_message = message.encode() if isinstance(message, str) else message
+
+        benchmarks.append(Microbenchmark(f'codec.{codec}.encode_state', prepare_repeated_call(
+            lambda codec=codec: lambda: state_codec.encode_state(state, codec)), len(wire_message)))
+        benchmarks.append(Microbenchmark(f'codec.{codec}.decode_state', prepare_repeated_call(
+            lambda wire_message=wire_message: lambda: state_codec.decode_state(wire_message)), len(wire_message)))
+
+    # A delta is measured against the sender's previous state, which the receiver already has
+    previous_fields = state_codec.state_to_fields(build_previous_state(state))
+    fields = state_codec.state_to_fields(state)
+
+    def build_delta_encode() -> Callable[[], bytes]:
+        sender_sync = state_codec.DeltaStateSync()
+
+        def encode_delta() -> bytes:
+            sender_sync.last_sent_fields = previous_fields
+            return sender_sync.encode_delta_fields(fields)
+
+        return encode_delta
+
+    delta_message = build_delta_encode()()
+
+    def build_delta_decode() -> Callable[[], tuple]:
+        receiver_sync = state_codec.DeltaStateSync()
+
+        def decode_delta() -> tuple:
+            receiver_sync.last_received_fields = previous_fields
+            receiver_sync.expected_received_sequence = 0
+            return receiver_sync.decode_delta_fields(delta_message)
+
+        return decode_delta
+
+    benchmarks.append(Microbenchmark(f'codec.{STATE_CODEC_DELTA}.encode_delta_fields',
+                                     prepare_repeated_call(build_delta_encode), len(delta_message)))
+    benchmarks.append(Microbenchmark(f'codec.{STATE_CODEC_DELTA}.decode_delta_fields',
+                                     prepare_repeated_call(build_delta_decode), len(delta_message)))
+
+    return benchmarks
+
+
+def build_round_match(stage: str) -> RPSGameManager:
+    """
+    :param stage: stage name from STAGES
+    :return: a quiet game manager partway into a match on the stage, player 1's side, with a fixed regen seed
+    """
+    game_manager = RPSGameManager(show_output=False, regen_seed=0)
+    game_manager.set_stage(stage)
+    game_manager.set_local_player(PLAYER_1)
+
+    # Player 2 never regenerates on player 1's side, so give them enough moves to last the whole run
+    game_manager.set_player_move_options(PLAYER_2, {move: 1 << 30 for move in ALL_MOVES})
+
+    return game_manager
+
+
+def play_round(game_manager: RPSGameManager, local_move: str, opponent_move: str):
+    """
+    One round on player 1's side: both moves are recorded, then handle_end_of_round() awards and regenerates
+    :param game_manager: game manager from build_round_match()
+    :param local_move: player 1's move, which they must have
+    :param opponent_move: player 2's move
+    """
+    game_manager.record_player_move(PLAYER_1, local_move)
+    game_manager.record_player_move(PLAYER_2, opponent_move)
+    game_manager.handle_end_of_round()
+
+
+def prepare_rounds(count: int) -> Callable[[], None]:
+    """
+    Plays the rounds once untimed to choose moves player 1 always has; regeneration is seeded,
+    so replaying the same moves on a fresh game manager regenerates the same options
+    :param count: rounds to play
+    :return: function that replays the rounds
+    """
+    stage = list(STAGES)[0]
+    rehearsal = build_round_match(stage)
+    moves = []
+
+    for round_index in range(count):
+        local_options = rehearsal.get_player_move_options(PLAYER_1)
+        playable_moves = [move for move in ALL_MOVES if local_options[move] > 0]
+        round_moves = (playable_moves[round_index % len(playable_moves)], ALL_MOVES[round_index % len(ALL_MOVES)])
+        play_round(rehearsal, *round_moves)
+        moves.append(round_moves)
+
+    game_manager = build_round_match(stage)
+
+    def run():
+        for local_move, opponent_move in moves:
+            play_round(game_manager, local_move, opponent_move)
+
+    return run
+
+
+def plan_engine_rounds(count: int) -> List[tuple]:
+    """
+    Plays the rounds once through the engine to choose moves both players always have, like prepare_rounds()
+    :param count: rounds to plan
+    :return: each round's (player 1's move, player 2's move), for a match on the first stage with regen seed 0
+    """
+    fields = rps_engine.new_fields(list(STAGES)[0])
+    regen_streams = rps_engine.new_regen_streams(0)
+    moves = []
+
+    for round_index in range(count):
+        round_moves = tuple(
+            playable_moves[round_index % len(playable_moves)]
+            for playable_moves in ([move for move in ALL_MOVES if fields[rps_engine.MOVE_COUNT_FIELDS[player][move]] > 0]
+                                   for player in (PLAYER_1, PLAYER_2)))
+        rps_engine.play_round(fields, *round_moves, regen_streams)
+        moves.append(round_moves)
+
+    return moves
+
+
+def prepare_engine_steps(count: int) -> Callable[[], None]:
+    """
+    :param count: rounds to play
+    :return: function that plays them through step(), as one match
+    """
+    moves = plan_engine_rounds(count)
+    regen_streams = rps_engine.new_regen_streams(0)
+
+    def run():
+        fields = rps_engine.new_fields(list(STAGES)[0])
+        for move_1, move_2 in moves:
+            fields, _ = rps_engine.step(fields, move_1, move_2, regen_streams)
+
+    return run
+
+
+def prepare_engine_batches(count: int) -> Callable[[], None]:
+    """
+    :param count: match rounds to play, ENGINE_BATCH_SIZE matches at a time
+    :return: function that plays them through step_many(); every match plays the same moves with the same seed
+    """
+    batch_size = min(count, ENGINE_BATCH_SIZE)
+    round_count = -(-count // batch_size)
+    moves = plan_engine_rounds(round_count)
+    regen_streams = [rps_engine.new_regen_streams(0) for _ in range(batch_size)]
+
+    def run():
+        states = [tuple(rps_engine.new_fields(list(STAGES)[0]))] * batch_size
+
+        # The last round only steps as many matches as it takes to make count
+        for round_index, round_moves in enumerate(moves):
+            match_count = min(batch_size, count - round_index * batch_size)
+            states, _ = rps_engine.step_many(states[:match_count], [round_moves] * match_count,
+                                             regen_streams[:match_count])
+
+    return run
+
+
+def build_round_benchmarks() -> List[Microbenchmark]:
+    """
+    :return: round resolution benchmarks
+    """
+    def build_round_result() -> Callable[[], None]:
+        game_manager = build_round_match(list(STAGES)[0])
+        game_manager.set_player_current_move(PLAYER_1, ALL_MOVES[0])
+        game_manager.set_player_current_move(PLAYER_2, ALL_MOVES[-1])
+
+        return game_manager.calculate_round_result
+
+    return [
+        Microbenchmark('round.calculate_round_result', prepare_repeated_call(build_round_result)),
+        Microbenchmark('round.handle_end_of_round', prepare_rounds),
+        Microbenchmark('round.engine.step', prepare_engine_steps),
+        Microbenchmark('round.engine.step_many', prepare_engine_batches),
+    ]
+
+
+def prepare_bot_moves(count: int) -> Callable[[], None]:
+    """
+    :param count: moves for the bot to choose
+    :return: function that has a fresh NGramBot choose that many moves for player 1,
+             each followed by recording the round's moves, without resolving it
+    """
+    game_manager = build_round_match(list(STAGES)[0])
+    bot = NGramBot(seed=0)
+    opponent_moves = [ALL_MOVES[round_index % len(ALL_MOVES)] for round_index in range(count)]
+
+    # Keep player 1 from running out, since rounds aren't resolved and nothing regenerates
+    game_manager.set_player_move_options(PLAYER_1, {move: 1 << 30 for move in ALL_MOVES})
+
+    def run():
+        for opponent_move in opponent_moves:
+            move = bot(game_manager, game_manager.get_all_valid_moves(PLAYER_1))
+            game_manager.record_player_move(PLAYER_1, move)
+            game_manager.record_player_move(PLAYER_2, opponent_move)
+
+    return run
+
+
+def build_bot_benchmarks() -> List[Microbenchmark]:
+    """
+    :return: bot decision benchmarks
+    """
+    return [Microbenchmark('bot.ngram', prepare_bot_moves)]
+
+
+def prepare_loopback_rounds(round_modes: List[str]) -> Preparer:
+    """
+    :param round_modes: round modes both players offer; empty to relay every round
+    :return: preparer for playing that many rounds between two bots, as one loopback match
+    """
+    def prepare(count: int) -> Callable[[], None]:
+        client_manager = RPSGameManager(RandomBot(count, 1), show_output=False, regen_seed=0)
+        server_manager = RPSGameManager(RandomBot(None, 2), show_output=False)
+        client_manager.round_modes = list(round_modes)
+        server_manager.round_modes = list(round_modes)
+
+        return lambda: play_loopback_match(client_manager, server_manager, list(STAGES)[0])
+
+    return prepare
+
+
+def build_loopback_benchmarks() -> List[Microbenchmark]:
+    """
+    :return: whole-round benchmarks over the loopback transport
+    """
+    return [
+        Microbenchmark('match.loopback.relay', prepare_loopback_rounds([])),
+        Microbenchmark(f'match.loopback.{ROUND_MODE_COMMIT_REVEAL}',
+                       prepare_loopback_rounds([ROUND_MODE_COMMIT_REVEAL])),
+    ]
+
+
+def time_benchmark(benchmark: Microbenchmark, min_time: float, repeat: int) -> float:
+    """
+    Runs enough ops at once to take at least min_time, like timeit's autorange, then keeps the fastest of repeat runs
+    :param benchmark: benchmark to time
+    :param min_time: least seconds one run should take
+    :param repeat: runs to time
+    :return: nanoseconds per op
+    """
+    count = 1
+    while True:
+        run = benchmark.prepare(count)
+        start_time = time.perf_counter()
+        run()
+        elapsed_seconds = time.perf_counter() - start_time
+
+        if elapsed_seconds >= min_time:
+            break
+        count *= 2 if elapsed_seconds == 0 else max(2, min(10, int(1.2 * min_time / elapsed_seconds)))
+
+    best_seconds = elapsed_seconds
+    for _ in range(repeat - 1):
+        run = benchmark.prepare(count)
+        start_time = time.perf_counter()
+        run()
+        best_seconds = min(best_seconds, time.perf_counter() - start_time)
+
+    return best_seconds / count * 1e9
+
+
+def measure_allocation(benchmark: Microbenchmark) -> int:
+    """
+    :param benchmark: benchmark to measure
+    :return: the most bytes an op had in use at once beyond what was in use before it, over ALLOCATION_SAMPLES ops
+    """
+    # Warm up caches first, so they don't count against the op
+    benchmark.prepare(1)()
+
+    peak_bytes = 0
+
+    # Tracing starts fresh around each op, so the peak is the op's own (tracemalloc.reset_peak() needs Python 3.9)
+    for _ in range(ALLOCATION_SAMPLES):
+        run = benchmark.prepare(1)
+        tracemalloc.start()
+
+        try:
+            run()
+            _, traced_peak_bytes = tracemalloc.get_traced_memory()
+
+        finally:
+            tracemalloc.stop()
+
+        peak_bytes = max(peak_bytes, traced_peak_bytes)
+
+    return peak_bytes
+
+
+def run_benchmark(benchmark: Microbenchmark, min_time: float, repeat: int) -> dict:
+    """
+    :param benchmark: benchmark to run
+    :param min_time: least seconds each timed run should take
+    :param repeat: timed runs, of which the fastest counts
+    :return: the benchmark's results, as saved in baselines
+    """
+    previous_buffer_size = socket_helpers.BUFFER_SIZE
+    if benchmark.buffer_size is not None:
+        socket_helpers.BUFFER_SIZE = benchmark.buffer_size
+
+    try:
+        return {
+            'ns_per_op': time_benchmark(benchmark, min_time, repeat),
+            'alloc_bytes_per_op': measure_allocation(benchmark),
+            'wire_bytes_per_op': benchmark.wire_bytes,
+        }
+
+    finally:
+        socket_helpers.BUFFER_SIZE = previous_buffer_size
+
+
+def load_baselines(path: str) -> dict:
+    """
+    :param path: baseline file
+    :return: benchmark name -> saved results, or nothing if there's no baseline file
+    """
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file)['benchmarks']
+
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(path: str, baselines: dict):
+    """
+    :param path: baseline file to write
+    :param baselines: benchmark name -> results
+    """
+    with open(path, 'w') as baseline_file:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'benchmarks': baselines,
+        }, baseline_file, indent=2, sort_keys=True)
+
+
+def main():
+    """Run the microbenchmarks"""
+    parser = argparse.ArgumentParser(description='Microbenchmark the GELA372 framing, state codecs, and rounds.')
+    parser.add_argument('--filter', nargs='+', default=[], help='only run benchmarks whose names contain one of these')
+    parser.add_argument('--buffer-sizes', type=int, nargs='+',
+                        default=sorted({BUFFER_SIZE // 4, BUFFER_SIZE, 4 * BUFFER_SIZE, 16 * BUFFER_SIZE}),
+                        help=f'BUFFER_SIZE values to sweep; socket_constants.py has {BUFFER_SIZE}')
+    parser.add_argument('--min-time', type=float, default=0.1, help='least seconds each timed run takes')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark; the fastest counts')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='save these results to the baseline file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fraction slower than baseline that counts as a regression; '
+                             'timings on a busy machine easily vary by 10-20%%')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks without running them')
+    args = parser.parse_args()
+
+    benchmarks = (build_framing_benchmarks(args.buffer_sizes) + build_codec_benchmarks() + build_round_benchmarks() +
+                  build_bot_benchmarks() + build_loopback_benchmarks())
+    if len(args.filter) > 0:
+        benchmarks = [benchmark for benchmark in benchmarks
+                      if any(pattern in benchmark.name for pattern in args.filter)]
+
+    if args.list:
+        for benchmark in benchmarks:
+            print(benchmark.name)
+        return
+
+    baselines = load_baselines(args.baseline)
+    regressed_names = []
+
+    name_width = max([len(benchmark.name) for benchmark in benchmarks] + [9])
+    print(f'{"benchmark":<{name_width}} {"ns/op":>14} {"alloc B/op":>11} {"wire B/op":>10} {"vs baseline":>12}')
+
+    for benchmark in benchmarks:
+        result = run_benchmark(benchmark, args.min_time, args.repeat)
+        baseline = baselines.get(benchmark.name)
+
+        comparison = ''
+        if baseline is not None:
+            ratio = result['ns_per_op'] / baseline['ns_per_op']
+            comparison = f'{ratio - 1:+.1%}'
+
+            if ratio > 1 + args.threshold:
+                comparison += ' SLOWER'
+                regressed_names.append(benchmark.name)
+
+        wire_bytes = '' if result['wire_bytes_per_op'] is None else f'{result["wire_bytes_per_op"]:,}'
+        print(f'{benchmark.name:<{name_width}} {result["ns_per_op"]:>14,.0f} {result["alloc_bytes_per_op"]:>11,} '
+              f'{wire_bytes:>10} {comparison:>12}', flush=True)
+
+        if args.save_baseline:
+            baselines[benchmark.name] = result
+
+    if args.save_baseline:
+        save_baselines(args.baseline, baselines)
+        print(f'\nsaved {len(benchmarks)} results to {args.baseline}')
+
+    if len(regressed_names) > 0:
+        print(f'\n{len(regressed_names)} of {len(benchmarks)} benchmarks are more than {args.threshold:.0%} slower '
+              f'than {args.baseline}: {", ".join(regressed_names)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Compares round-trip latency of peer-to-peer games over TCP and over the UDP transport (udp_transport.py).
+
+Plays bot matches on loopback, with player 1 as the client and player 2 as the server, exactly as
+Super_LAN_RPS_client.py and Super_LAN_RPS_server.py play them. The UDP transport is also run while dropping
+and reordering a share of its own datagrams, and every match is checked to end with both players
+agreeing on the score, which only happens if every message arrived once and in order.
+
+Example: python benchmark_transport.py --matches 20 --rounds 200 --loss 0.05 --reorder 0.05
+"""
+
+import argparse
+import threading
+import time
+from socket import AF_INET, SOCK_STREAM, create_connection, socket
+from typing import List
+from socket_constants import *
+from game_constants import *
+from generic_utils import get_percentile
+from rps_bots import RandomBot
+from rps_load_generator import MeasuredGameManager
+from udp_transport import ReliableUDPSocket
+
+
+class TransportResult:
+    """
+    Measurements from every match played over one transport
+    """
+    def __init__(self, name: str):
+        """
+        :param name: transport name for the report
+        """
+        self.name = name
+        self.round_trip_times = []
+        self.mismatched_match_count = 0
+        self.failed_match_count = 0
+        self.retransmit_count = 0
+        self.duplicate_count = 0
+        self.simulated_loss_count = 0
+
+
+def play_player_2(accept_connection, rounds: int, seed: int, outcome: dict):
+    """
+    Plays player 2's side of a match as Super_LAN_RPS_server.py does
+    :param accept_connection: callable taking no arguments that returns the connection to player 1
+    :param rounds: bot quits after this many rounds
+    :param seed: seed for the bot's moves
+    :param outcome: receives the connection and the final scores
+    """
+    connection_socket = accept_connection()
+    game_manager = MeasuredGameManager(RandomBot(rounds, seed))
+    outcome['player_2_socket'] = connection_socket
+
+    try:
+        game_manager.play_game(connection_socket)
+        outcome['player_2_scores'] = game_manager.get_scores()
+
+    except OSError as error:
+        outcome['error'] = error
+
+    finally:
+        connection_socket.close()
+
+
+def play_match(transport: str, port: int, rounds: int, seed: int, loss_rate: float, reorder_rate: float,
+               result: TransportResult):
+    """
+    Plays one bot match over loopback and records its measurements
+    :param transport: 'tcp' or 'udp'
+    :param port: free port for player 2 to listen on
+    :param rounds: player 1's bot quits after this many rounds
+    :param seed: seed for the bots' moves and the simulated impairments
+    :param loss_rate: fraction of UDP datagrams each side drops on purpose
+    :param reorder_rate: fraction of UDP datagrams each side reorders on purpose
+    :param result: receives the match's measurements
+    """
+    outcome = {}
+
+    if transport == 'tcp':
+        listening_socket = socket(family=AF_INET, type=SOCK_STREAM)
+        listening_socket.bind(('', port))
+        listening_socket.listen(1)
+
+        def accept_connection():
+            connection_socket, _ = listening_socket.accept()
+            listening_socket.close()
+            return connection_socket
+
+        def connect():
+            return create_connection((SERVER_NAME, port))
+
+    else:
+        def accept_connection():
+            connection_socket, _ = ReliableUDPSocket.accept(port, loss_rate=loss_rate, reorder_rate=reorder_rate,
+                                                            seed=2 * seed + 1)
+            return connection_socket
+
+        def connect():
+            return ReliableUDPSocket.connect((SERVER_NAME, port), loss_rate=loss_rate, reorder_rate=reorder_rate,
+                                             seed=2 * seed)
+
+    # Player 2 never quits first, so player 1's bot decides how long the match lasts
+    player_2_thread = threading.Thread(target=play_player_2, args=(accept_connection, 2 * rounds, seed + 1, outcome))
+    player_2_thread.start()
+
+    # Let player 2 start listening before player 1 connects
+    time.sleep(0.05)
+
+    connection_socket = connect()
+    game_manager = MeasuredGameManager(RandomBot(rounds, seed))
+
+    # Commit-reveal rounds aren't timed as round trips, so keep relaying every round
+    game_manager.round_modes = []
+
+    try:
+        game_manager.set_stage(list(STAGES)[seed % len(STAGES)])
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(connection_socket)
+        game_manager.play_game(connection_socket)
+
+    except OSError:
+        result.failed_match_count += 1
+
+    finally:
+        connection_socket.close()
+
+    player_2_thread.join()
+
+    if 'error' in outcome:
+        result.failed_match_count += 1
+    elif outcome.get('player_2_scores') != tuple(reversed(game_manager.get_scores())):
+        result.mismatched_match_count += 1
+
+    result.round_trip_times += game_manager.round_trip_times
+
+    for udp_socket in (connection_socket, outcome.get('player_2_socket')):
+        if isinstance(udp_socket, ReliableUDPSocket):
+            result.retransmit_count += udp_socket.retransmit_count
+            result.duplicate_count += udp_socket.duplicate_count
+            result.simulated_loss_count += udp_socket.simulated_loss_count
+
+
+def print_report(results: List[TransportResult]):
+    """
+    Prints one line of latency figures per transport
+    :param results: measurements for each transport
+    """
+    print(f'{"transport":<28} {"rounds":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} '
+          f'{"dropped":>8} {"resent":>7} {"dups":>5} {"bad":>4}')
+
+    for result in results:
+        round_trip_times = sorted(result.round_trip_times)
+        if len(round_trip_times) == 0:
+            print(f'{result.name:<28} no rounds completed')
+            continue
+
+        percentiles = ' '.join(f'{get_percentile(round_trip_times, percent) * 1000:>8.3f}' for percent in (50, 95, 99))
+        bad_match_count = result.mismatched_match_count + result.failed_match_count
+
+        print(f'{result.name:<28} {len(round_trip_times):>7} {percentiles} {round_trip_times[-1] * 1000:>8.3f} '
+              f'{result.simulated_loss_count:>8} {result.retransmit_count:>7} {result.duplicate_count:>5} '
+              f'{bad_match_count:>4}')
+
+
+def main():
+    """Compare transports"""
+    parser = argparse.ArgumentParser(description='Compare game round trips over TCP and UDP on loopback.')
+    parser.add_argument('--matches', type=int, default=20, help='matches per transport')
+    parser.add_argument('--rounds', type=int, default=200, help='rounds per match')
+    parser.add_argument('--loss', type=float, default=0.05, help='fraction of datagrams dropped in the lossy run')
+    parser.add_argument('--reorder', type=float, default=0.05,
+                        help='fraction of datagrams reordered in the lossy run')
+    parser.add_argument('--port', type=int, default=SERVER_PORT + 2, help='first of the loopback ports to use')
+    parser.add_argument('--seed', type=int, default=0, help='base seed')
+    args = parser.parse_args()
+
+    runs = [
+        ('tcp', 'TCP', 0.0, 0.0),
+        ('udp', 'UDP', 0.0, 0.0),
+        ('udp', f'UDP {args.loss:.0%} loss {args.reorder:.0%} reorder', args.loss, args.reorder),
+    ]
+
+    results = []
+    port = args.port
+
+    for transport, name, loss_rate, reorder_rate in runs:
+        result = TransportResult(name)
+
+        for match_index in range(args.matches):
+            play_match(transport, port, args.rounds, args.seed + match_index, loss_rate, reorder_rate, result)
+            port += 1
+
+        results.append(result)
+
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
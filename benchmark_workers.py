@@ -0,0 +1,127 @@
+"""
+Measures how the match server's throughput grows with worker processes (see match_workers.py).
+
+For each worker count, starts the match server with that many workers, plays the same bot matches against it
+from several load generator processes at once, and then drains it with SIGTERM.
+Load generators run on the same machine and compete with the workers for cores,
+so the speedup is only meaningful with cores to spare; on a single core, more workers can't play faster.
+
+Example: python benchmark_workers.py --workers 1 2 4 --matches 200 --rounds 50
+"""
+
+import argparse
+import multiprocessing
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Tuple
+from socket_constants import *
+from game_constants import *
+from match_workers import get_default_worker_count
+from rps_load_generator import SeatResult, run_bot_seat
+
+
+def play_matches(port: int, match_count: int, rounds: int, seed: int) -> Tuple[int, int]:
+    """
+    Plays bot matches against the match server, one thread per seat. Runs in a load generator process.
+    :param port: match server port
+    :param match_count: matches to play at once
+    :param rounds: rounds each match plays before a bot quits
+    :param seed: base seed for the bots' moves
+    :return: rounds played, counting each match's rounds once, and seats that ended with an error
+    """
+    stage = list(STAGES)[0]
+    results = [SeatResult() for _ in range(2 * match_count)]
+    threads = [threading.Thread(target=run_bot_seat, args=(SERVER_NAME, port, stage, rounds, seed + index, result),
+                                daemon=True)
+               for index, result in enumerate(results)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    round_count = sum(len(result.round_trip_times) for result in results) // 2
+    error_count = sum(result.error is not None for result in results)
+
+    return round_count, error_count
+
+
+def run_trial(port: int, worker_count: int, generator_count: int, match_count: int, rounds: int,
+              seed: int) -> dict:
+    """
+    Starts a match server with the given workers, plays every match against it, and drains it
+    :param port: port for the match server
+    :param worker_count: worker processes
+    :param generator_count: load generator processes, which split the matches between them
+    :param match_count: matches to play at once, across every load generator
+    :param rounds: rounds per match
+    :param seed: base seed for the bots' moves
+    :return: the trial's measurements
+    """
+    server = subprocess.Popen([sys.executable, 'Super_LAN_RPS_match_server.py', '--port', str(port),
+                               '--workers', str(worker_count), '--no-match-log', '--no-leaderboard'],
+                              stdout=subprocess.DEVNULL)
+
+    try:
+        time.sleep(1.0 + 0.2 * worker_count)  # let every worker start listening
+
+        matches_per_generator = [match_count // generator_count + (index < match_count % generator_count)
+                                 for index in range(generator_count)]
+        start_time = time.perf_counter()
+        with multiprocessing.Pool(generator_count) as pool:
+            results = pool.starmap(play_matches, [(port, count, rounds, seed + 10000 * index)
+                                                  for index, count in enumerate(matches_per_generator)])
+        elapsed_seconds = time.perf_counter() - start_time
+
+        # No matches are left, so draining should take about as long as it takes the workers to notice
+        drain_start_time = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=DRAIN_TIMEOUT + 10)
+        drain_seconds = time.perf_counter() - drain_start_time
+
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
+
+    round_count = sum(round_count for round_count, _ in results)
+
+    return {
+        'rounds_per_second': round_count / elapsed_seconds,
+        'rounds': round_count,
+        'errors': sum(error_count for _, error_count in results),
+        'drain_seconds': drain_seconds,
+    }
+
+
+def main():
+    """Measure throughput by worker count"""
+    parser = argparse.ArgumentParser(description='Compare match server throughput across worker counts.')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='worker counts to try; 1 and one per core if not given')
+    parser.add_argument('--generators', type=int, default=4, help='load generator processes')
+    parser.add_argument('--matches', type=int, default=100, help='matches to play at once')
+    parser.add_argument('--rounds', type=int, default=50, help='rounds per match')
+    parser.add_argument('--port', type=int, default=SERVER_PORT + 3, help='loopback port for the match server')
+    parser.add_argument('--seed', type=int, default=0, help='base seed')
+    args = parser.parse_args()
+
+    worker_counts = args.workers or sorted({1, get_default_worker_count()})
+    print(f'{get_default_worker_count()} cores available')
+    print(f'{"workers":>7} {"rounds/s":>10} {"speedup":>8} {"rounds":>8} {"errors":>7} {"drain s":>8}')
+
+    base_rate = None
+    for worker_count in worker_counts:
+        result = run_trial(args.port, worker_count, args.generators, args.matches, args.rounds, args.seed)
+        base_rate = base_rate or result['rounds_per_second']
+
+        print(f'{worker_count:>7} {result["rounds_per_second"]:>10,.0f} '
+              f'{result["rounds_per_second"] / base_rate:>7.2f}x {result["rounds"]:>8} {result["errors"]:>7} '
+              f'{result["drain_seconds"]:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Bookkeeping for commit-reveal rounds (see ROUND_MODE_COMMIT_REVEAL in game_constants.py).
+
+Each player commits to their move by sending the SHA-256 digest of the reveal message they'll send later.
+The reveal holds a random nonce, so the digest can't be matched against the three possible moves,
+and it's sent only once both commitments are in, so neither player can choose after seeing the other's move.
+The reveal also holds the sender's role, so a player who echoes the opponent's commitment and then their reveal
+is caught: that reveal names the wrong player.
+Its move counts must be the ones the receiver tracks for the sender, plus at most one regeneration's worth,
+so a player can't spend options they don't have.
+"""
+
+import hashlib
+import hmac
+import secrets
+from typing import Tuple
+from game_constants import *
+import state_codec
+
+
+class CommitmentError(ValueError):
+    pass
+
+
+def is_reachable_move_counts(tracked_counts: tuple, revealed_counts: tuple) -> bool:
+    """
+    :param tracked_counts: a player's remaining options as the opponent tracks them, in ALL_MOVES order
+    :param revealed_counts: the remaining options the player revealed, in ALL_MOVES order
+    :return: True if the revealed counts are the tracked ones, or the tracked ones after one regeneration
+             the rules allow, since players regenerate on their own after a round
+    """
+    if tuple(revealed_counts) == tuple(tracked_counts):
+        return True
+
+    added_counts = [revealed - tracked for revealed, tracked in zip(revealed_counts, tracked_counts)]
+
+    return sum(tracked_counts) < REGEN_THRESHOLD and \
+        all(count >= 0 and count % REGEN_QUANTITY_EACH == 0 for count in added_counts) and \
+        sum(added_counts) == REGEN_ITERATIONS * REGEN_QUANTITY_EACH
+
+
+class CommitRevealRound:
+    """
+    One player's side of the current commit-reveal round, reused from round to round
+    """
+    __slots__ = ('local_player', 'local_reveal', 'local_commitment', 'has_sent_reveal', 'opponent_commitment')
+
+    def __init__(self, local_player: str):
+        """
+        :param local_player: local player's role, PLAYER_1 or PLAYER_2
+        """
+        self.local_player = local_player
+        self.start_round()
+
+    def start_round(self):
+        """
+        Forgets the finished round's commitments and reveal
+        """
+        self.local_reveal = None  # reveal message committed to this round, or None before committing
+        self.local_commitment = None  # digest of local_reveal
+        self.has_sent_reveal = False
+        self.opponent_commitment = None  # digest the opponent committed to this round, or None before it arrives
+
+    def commit(self, move: str, move_counts: tuple) -> bytes:
+        """
+        Commits to the local player's move for this round
+        :param move: R, P, or S
+        :param move_counts: local player's remaining options before the move, in ALL_MOVES order
+        :return: commitment message to send
+        """
+        self.local_reveal = state_codec.encode_reveal(self.local_player, move,
+                                                      secrets.token_bytes(COMMITMENT_NONCE_SIZE), move_counts)
+        self.local_commitment = hashlib.sha256(self.local_reveal).digest()
+
+        return state_codec.encode_commitment(self.local_commitment)
+
+    def receive_commitment(self, message: bytes):
+        """
+        :param message: the opponent's commitment message for this round
+        """
+        if self.opponent_commitment is not None:
+            raise CommitmentError('opponent committed twice in one round')
+
+        opponent_commitment = state_codec.decode_commitment(message)
+
+        if self.local_commitment is not None and hmac.compare_digest(opponent_commitment, self.local_commitment):
+            raise CommitmentError("opponent committed to the local player's own reveal")
+
+        self.opponent_commitment = opponent_commitment
+
+    def is_ready_to_reveal(self) -> bool:
+        """
+        :return: True once both players have committed and the local reveal hasn't been sent yet
+        """
+        return self.local_reveal is not None and self.opponent_commitment is not None and not self.has_sent_reveal
+
+    def reveal(self) -> bytes:
+        """
+        :return: the reveal message committed to this round, to send
+        """
+        self.has_sent_reveal = True
+
+        return self.local_reveal
+
+    def open_reveal(self, message: bytes, tracked_counts: tuple) -> Tuple[str, tuple]:
+        """
+        Checks the opponent's reveal against their commitment and their tracked options, then starts the next round
+        :param message: the opponent's reveal message
+        :param tracked_counts: the opponent's remaining options as the local player tracks them, in ALL_MOVES order
+        :return: the opponent's move (or the quit message, which needs no commitment),
+                 and their remaining options before the move, in ALL_MOVES order
+        """
+        player, move, _, move_counts = state_codec.decode_reveal(message)
+
+        if player == self.local_player:
+            raise CommitmentError("opponent revealed the local player's move as their own")
+
+        if move == QUIT_MESSAGE:
+            return move, move_counts
+
+        if self.opponent_commitment is None or not self.has_sent_reveal:
+            raise CommitmentError('opponent revealed a move before both players committed')
+
+        if not hmac.compare_digest(hashlib.sha256(message).digest(), self.opponent_commitment):
+            raise CommitmentError("opponent's reveal doesn't match their commitment")
+
+        if move_counts[ALL_MOVES.index(move)] < 1:
+            raise CommitmentError('opponent revealed a move they have none of')
+
+        if not is_reachable_move_counts(tracked_counts, move_counts):
+            raise CommitmentError("opponent revealed options they don't have")
+
+        self.start_round()
+
+        return move, move_counts
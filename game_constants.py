@@ -1,6 +1,8 @@
 # Author: Mark Mendez
 # Date: 03/01/2022
 
+from rulesets import load_ruleset
+
 QUIT_MESSAGE = '\\q'
 QUIT_MESSAGE_PRINTABLE = r'\q'
 
@@ -22,18 +24,19 @@ REPLY_LINE_PREFIX = 'vs '
 # This prints after a player takes their turn and before the round results are received
 WAITING_FOR_OPPONENT_MESSAGE = 'Waiting for opponent'
 
-# This prints when each player is taking their turn
-TURN_PROMPT = r'What is your next move (R / P / S) if you have them, or \q to quit?' + '\n'
+# Choose the moves, which moves beat which, and the stages: a built-in ruleset from rulesets.py
+# ('rps', 'rpsls', 'rps7', or 'rps15') or the path to a ruleset JSON file. Both players need the same ruleset.
+RULESET_NAME = 'rps'
+RULESET = load_ruleset(RULESET_NAME)
 
 # Keep a simple list of all moves
-ALL_MOVES = ['R', 'P', 'S']
+ALL_MOVES = RULESET.moves
 
 # Define which moves are defeated by a given move
-MOVE_PRIORITY = {
-    'R': 'S',
-    'P': 'R',
-    'S': 'P'
-}
+MOVE_BEATS = RULESET.beats
+
+# This prints when each player is taking their turn
+TURN_PROMPT = 'What is your next move (' + ' / '.join(ALL_MOVES) + r') if you have them, or \q to quit?' + '\n'
 
 # The game guarantees that both players always have at least REGEN_THRESHOLD move options.
 # When it's time to regenerate a move, the game adds REGEN_QUANTITY_EACH to a random option,
@@ -43,41 +46,55 @@ REGEN_QUANTITY_EACH = 1
 REGEN_ITERATIONS = 2
 
 # Define stage choices
-STAGES = {
-    'HEAVEN': {
-        'R': 3,
-        'P': 3,
-        'S': 3,
-    },
-    'OFFICE': {
-        'R': 1,
-        'P': 2,
-        'S': 2,
-    },
-    'RAINFOREST': {
-        'R': 2,
-        'P': 3,
-        'S': 1,
-    },
-    'MOUNTAIN': {
-        'R': 2,
-        'P': 1,
-        'S': 1,
-    },
-    'ASTEROID': {
-        'R': 3,
-        'P': 1,
-        'S': 2,
-    },
-    'ARMORY': {
-        'R': 2,
-        'P': 1,
-        'S': 3,
-    },
-}
+STAGES = RULESET.stages
 
 # Choose the message that displays to the client player who selects the stage
 STAGE_CHOICE_PROMPT = ('You are player 1.\n\nChoose a stage by entering its name. ' +
-                       'R, P, and S show how many of Rock, Paper, and Scissors each player gets.\n\n' +
+                       f'{RULESET.describe_move_counts()} each player gets.\n\n' +
                        f'{STAGES}\n\n'
                        )
+
+# Choose how game state is encoded on the wire.
+# The player who speaks first offers every codec it supports under STATE_CODEC_OFFER_KEY in its opening (JSON) state,
+# and the other player answers in the first offered codec it also supports.
+# Players that don't know about codecs just keep using JSON.
+STATE_CODEC_JSON = 'json'
+STATE_CODEC_BINARY = 'binary-1'  # fixed layout described in state_codec.py; needs GELA372 v2 framing
+STATE_CODEC_DELTA = 'delta-1'  # only the fields that changed, described in state_codec.py; needs GELA372 v2 framing
+SUPPORTED_STATE_CODECS = [STATE_CODEC_DELTA, STATE_CODEC_BINARY, STATE_CODEC_JSON]  # most preferred first
+STATE_CODEC_OFFER_KEY = 'codecs'
+
+# Notices are short messages for the player, like the match server saying it's looking for an opponent.
+# A notice is a JSON object holding its text under NOTICE_KEY, and can arrive at any time.
+NOTICE_KEY = 'notice'
+NOTICE_LINE_PREFIX = 'Notice: '
+
+# Rounds normally relay: player 1 sends a move, then player 2 chooses and answers with theirs.
+# In commit-reveal rounds, both players choose at the same time and send a hash commitment to their move,
+# then reveal it once both commitments are in, so neither can see the other's move first.
+# Player 1 offers every round mode it supports under ROUND_MODE_OFFER_KEY in its opening (JSON) state,
+# and player 2 accepts one with a ROUND_MODE_ACCEPT_KEY message right before its first reply.
+# The opening round always relays, and players that don't know about round modes keep relaying.
+ROUND_MODE_COMMIT_REVEAL = 'commit-reveal-1'  # layouts described in state_codec.py; needs GELA372 v2 framing
+SUPPORTED_ROUND_MODES = [ROUND_MODE_COMMIT_REVEAL]
+ROUND_MODE_OFFER_KEY = 'round_modes'
+ROUND_MODE_ACCEPT_KEY = 'round_mode'
+COMMITMENT_NONCE_SIZE = 16  # random bytes in each reveal, so a commitment can't be matched against the three moves
+
+# Player 1 may name its player in its opening (JSON) state under PLAYER_NAME_KEY,
+# so the match server can keep the player's stats across matches (see leaderboard.py).
+# Unnamed players still play; they just aren't on the leaderboard.
+PLAYER_NAME_KEY = 'name'
+MAX_PLAYER_NAME_LENGTH = 24
+
+# Player 1 sends the match's regen seed under REGEN_SEED_KEY in its opening (JSON) state.
+# Each player regenerates options from their own stream seeded by it (see regen_streams.py),
+# so a match's regeneration can be replayed from its seed. Players that don't know about it draw their own.
+REGEN_SEED_KEY = 'regen_seed'
+
+# Spectators connect to the match server like players, but open with a watch request instead of a state:
+# a JSON object holding the ID of the match to watch under WATCH_KEY, or null for the most-watched live match.
+# The match server then sends a spectator update, a JSON object under SPECTATE_KEY, after every round.
+# Every update holds the whole match so far, so a spectator that misses some still ends up with the right score.
+WATCH_KEY = 'watch'
+SPECTATE_KEY = 'spectate'
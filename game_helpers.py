@@ -1,14 +1,33 @@
 # Author: Mark Mendez
 # Date: 03/01/2022
 
-import copy
-import json
+import collections
 import enum
-import random
-from typing import Tuple, List
+import os
+import selectors
+import sys
+import time
+from typing import Callable, List, Optional, Tuple, Union
 from socket_helpers import *
 from game_constants import *
 from generic_utils import get_validated_input
+import state_codec
+from commit_reveal import CommitmentError, CommitRevealRound
+from regen_streams import RegenStream, new_regen_seed, read_regen_seed
+import rps_engine
+from rps_engine import CURRENT_MOVE_FIELDS, FIRST_MOVE_COUNT_FIELDS, PLAYER_INDEXES
+from rps_metrics import METRICS
+from state_codec import (FIELD_WHOSE_TURN, FIELD_ROUND_WINNER, FIELD_STAGE, FIELD_CURRENT_MOVES, FIELD_SCORES,
+                         NO_VALUE_CODE, MOVE_CODES, MOVES_BY_CODE, WINNERS_BY_CODE, STAGE_NAMES)
+
+
+# Chooses a move, given the game manager asking and the list of valid moves (including the quit message)
+MoveSelector = Callable[['RPSGameManager', List[str]], str]
+
+MOVE_VALIDATION_ERROR_MESSAGE = 'No fancy stuff in this game. You have to win using the power of prediction!'
+
+_PLAYERS_BY_CODE = {1: PLAYER_1, 2: PLAYER_2}  # whose_turn field values
+_MOVE_COUNT = len(ALL_MOVES)
 
 
 class EndGameCode(enum.Enum):
@@ -25,33 +44,78 @@ class RPSGameManager:
     Helper class for Super LAN Rock-Paper-Scissors.
     Tracks local state and sends socket messages to align state between players.
     """
-    def __init__(self):
+    __slots__ = ('move_selector', 'show_output', 'protocol_version', 'state_codec', 'round_modes',
+                 '_has_offered_state_codecs', '_has_received_state', '_delta_state_sync', '_fields',
+                 '_has_offered_round_modes', '_accepted_round_mode', '_commit_reveal_round', 'match_recorder',
+                 'player_name', 'regen_seed', '_regen_streams')
+
+    def __init__(self, move_selector: Optional[MoveSelector] = None, show_output: bool = True,
+                 regen_seed: Optional[int] = None):
         """
         Initializes local game state
+        :param move_selector: chooses the local player's moves instead of prompting,
+                              given this game manager and the list of valid moves (see rps_bots.py)
+        :param show_output: if False, nothing is printed, which is useful for bots and load tests
+        :param regen_seed: seed for regenerating options, sent to the opponent as player 1; a fresh one if None.
+                           Player 2 switches to player 1's seed when it arrives.
+        """
+        self.move_selector = move_selector
+        self.show_output = show_output
+
+        # GELA372 version for outgoing messages. Switches to the opponent's version once they've sent something.
+        self.protocol_version = GELA372_DEFAULT_VERSION
+
+        # Codec for outgoing states. Starts as JSON, which every player understands, until negotiated.
+        self.state_codec = STATE_CODEC_JSON
+        self._has_offered_state_codecs = False
+        self._has_received_state = False
+        self._delta_state_sync = state_codec.DeltaStateSync()
+
+        # Round modes this player offers or accepts; empty to always relay rounds.
+        # Rounds relay until the opponent accepts an offer, or until the reply that accepts theirs has been sent.
+        self.round_modes = list(SUPPORTED_ROUND_MODES)
+        self._has_offered_round_modes = False
+        self._accepted_round_mode = None  # opponent's offered mode, accepted with the first reply
+        self._commit_reveal_round = None  # CommitRevealRound once playing commit-reveal rounds
+
+        # The whole game state is one small array of integers, laid out as state_codec.STATE_FIELD_NAMES:
+        # player 1's turn, no round winner, no stage, no moves, no points, and no move choices until a stage is set
+        self._fields = rps_engine.new_fields()
+
+        # Set to a match_log.MatchRecorder to record every round, for appending to a match log
+        self.match_recorder = None
+
+        # Name sent with the opening state, which the match server keeps stats under; None to stay unnamed
+        self.player_name = None
+
+        # This match's own random streams for regenerating options, one per player, started on first use
+        self.regen_seed = regen_seed if regen_seed is not None else new_regen_seed()
+        self._regen_streams = {}
+
+    @property
+    def state(self) -> dict:
+        """
+        The game's state as a nested dict, which is what JSON messages carry.
+        Built on each access, so changing the returned dict doesn't change the game; assign a whole state instead.
         """
-        _INITIAL_PLAYER_STATE = {
-            'score': 0,
-            'move_choices': None,
-            'current_move': ''  # one of the R/P/S options
-        }
+        return state_codec.fields_to_state(self._fields)
 
-        self._INITIAL_STAGE = ''
+    @state.setter
+    def state(self, new_state: dict):
+        self._fields = list(state_codec.state_to_fields(new_state))
 
-        self.state = {
-            'whose_turn': PLAYER_1,  # 1 or 2 (player 1 or player 2)
-            'round_winner': '',
-            'stage': self._INITIAL_STAGE,  # one of the constant STAGE options
-            'player': {  # language limitation: have to hard-code player strings for dict keys
-                '1': copy.deepcopy(_INITIAL_PLAYER_STATE),
-                '2': copy.deepcopy(_INITIAL_PLAYER_STATE)
-            }
-        }
+    def display(self, *values, **print_kwargs):
+        """
+        Wrapper for print() that respects show_output
+        """
+        if self.show_output:
+            print(*values, **print_kwargs)
 
     def handle_endgame(self):
         """
         Shows final score
         """
-        print('\n***Final scores***')
+        self.display('\n***Final scores***')
         self.show_scores()
 
     def set_player_move_options(self, player, updated_options: dict):
@@ -59,19 +123,28 @@ class RPSGameManager:
         :param player:
         :param updated_options:
         """
-        self.state['player'][player]['move_choices'] = updated_options
+        first_field = FIRST_MOVE_COUNT_FIELDS[player]
+        self._fields[first_field:first_field + _MOVE_COUNT] = [updated_options[move] for move in ALL_MOVES]
 
     def print_stage_info(self):
         """
         Prints info about the current stage
         """
-        stage = self.state['stage']
+        stage = self.get_stage()
         initial_move_options = STAGES[stage]
 
-        print(f'Playing on stage {stage}')
-        print(f'On {stage}, you both start with the following move options:')
-        print(initial_move_options)
-        print('')  # newline to separate this section
+        self.display(f'Playing on stage {stage}')
+        self.display(f'On {stage}, you both start with the following move options:')
+        self.display(initial_move_options)
+        self.display('')  # newline to separate this section
+
+    def get_stage(self) -> str:
+        """
+        :return: the selected stage, or an empty string if there isn't one yet
+        """
+        stage_code = self._fields[FIELD_STAGE]
+
+        return '' if stage_code == NO_VALUE_CODE else STAGE_NAMES[stage_code - 1]
 
     def set_stage(self, stage: str):
         """
@@ -79,17 +152,19 @@ class RPSGameManager:
         and notifies player 2 of stage conditions.
         :param stage: message received from player 1
         """
-        initial_move_options = STAGES[stage]
-
-        # Set the stage
-        self.state['stage'] = stage
+        # Set the stage, and initialize player move choices according to it
+        rps_engine.start_stage(self._fields, stage)
 
         # Print info about the new stage
         self.print_stage_info()
 
-        # Initialize player move choices according to the stage
-        self.set_player_move_options(PLAYER_1, copy.deepcopy(initial_move_options))
-        self.set_player_move_options(PLAYER_2, copy.deepcopy(initial_move_options))
+    def set_player_current_move(self, player: str, move: str):
+        """
+        Sets the move of the given player in game state, without using up a move option
+        :param player: 1 or 2 (player 1 or player 2)
+        :param move: one of ALL_MOVES, or the quit message
+        """
+        self._fields[CURRENT_MOVE_FIELDS[player]] = MOVE_CODES[move]
 
     def record_player_move(self, player: str, move: str):
         """
@@ -97,49 +172,101 @@ class RPSGameManager:
         :param player: 1 or 2 (player 1 or player 2)
         :param move: R, P, or S
         """
-        # Record which move was taken
-        self.state['player'][player]['current_move'] = move
-
-        # Subtract this move from the player's remaining options
-        if move != QUIT_MESSAGE:
-            self.state['player'][player]['move_choices'][move] -= 1
+        # Record which move was taken, and subtract it from the player's remaining options
+        rps_engine.record_move(self._fields, player, move)
 
     @staticmethod
-    def decode_state(state_string: str) -> dict:
+    def decode_state(state_string: Union[str, bytes]) -> dict:
         """
         Reads the game's state from a given string.
         Assumes state_string is valid.
         :param state_string: string containing game state, encoded in format used by self.encode_state
+                             with any codec in SUPPORTED_STATE_CODECS
         :return: dict describing the game's state, in the format used by encode_state()
         """
-        return json.loads(state_string)
+        return state_codec.decode_state(state_string)
+
+    def encode_state(self) -> Union[str, bytes]:
+        """
+        Creates a string holding the game's state, using the negotiated state codec.
+        A delta-1 state only holds what changed since the last exchanged state,
+        so with that codec, call this exactly once per message sent.
+        :return string version of game state (bytes for binary codecs)
+        """
+        encode_start_time = time.perf_counter() if METRICS.enabled else None
+
+        # The binary codecs use the same layout as the local state, so they pack it as it is
+        if self.state_codec == STATE_CODEC_DELTA:
+            encoded_state = self._delta_state_sync.encode_delta_fields(self._fields)
+        elif self.state_codec == STATE_CODEC_BINARY:
+            encoded_state = state_codec.encode_binary_fields(self._fields)
+        else:
+            encoded_state = state_codec.encode_json_state(self.state)
+
+        if encode_start_time is not None:
+            METRICS.state_encode_seconds.observe(time.perf_counter() - encode_start_time, self.state_codec)
+
+        return encoded_state
+
+    def negotiate_state_codec(self, incoming_message: Union[str, bytes], offered_codecs: Optional[List[str]]):
+        """
+        Chooses the codec for outgoing states based on a message from the opponent.
+        Answers the opponent's codec offer, and switches to binary as soon as the opponent uses it.
+        Binary states need GELA372 v2 framing, so a v1 opponent always gets JSON.
+        :param incoming_message: message received from the other host
+        :param offered_codecs: codecs offered in incoming_message, or None if it made no offer
+        """
+        if self.protocol_version != GELA372_VERSION_2:
+            self.state_codec = STATE_CODEC_JSON
+
+        elif state_codec.is_binary_state(incoming_message):
+            self.state_codec = STATE_CODEC_BINARY
+
+        elif state_codec.is_delta_state(incoming_message):
+            self.state_codec = STATE_CODEC_DELTA
 
-    def encode_state(self) -> str:
+        # An opponent that doesn't know about codecs echoes our own offer back, so only answer offers we didn't make
+        elif offered_codecs is not None and self._has_offered_state_codecs is False:
+            self.state_codec = state_codec.choose_state_codec(offered_codecs)
+
+    def negotiate_round_mode(self, offered_round_modes: Optional[List[str]]):
         """
-        Creates a string holding the game's state.
-        :return string version of game state
+        Picks a round mode from the opponent's offer, to accept with the first reply.
+        Like binary states, commit-reveal messages need GELA372 v2 framing.
+        :param offered_round_modes: round modes offered in the opponent's opening state, or None if it made no offer
         """
-        return json.dumps(self.state)
+        if (not isinstance(offered_round_modes, list) or self._has_offered_round_modes
+                or self.protocol_version != GELA372_VERSION_2):
+            return
 
-    def get_player_move_options(self, player: str) -> dict:
+        for round_mode in offered_round_modes:
+            if round_mode in self.round_modes:
+                self._accepted_round_mode = round_mode
+                return
+
+    def get_player_move_options(self, player: str) -> Optional[dict]:
         """
         Returns the dict of move options for a given player
         :param player: 1 for player 1, or 2 for player 2
-        :return: move options for the given player
+        :return: copy of the move options for the given player, or None if no stage is selected yet
         """
-        return self.state['player'][player]['move_choices']
+        if self._fields[FIELD_STAGE] == NO_VALUE_CODE:
+            return None
+
+        first_field = FIRST_MOVE_COUNT_FIELDS[player]
+
+        return dict(zip(ALL_MOVES, self._fields[first_field:first_field + _MOVE_COUNT]))
 
     def get_all_valid_moves(self, player: str) -> List[str]:
         """
         Returns a list of all valid move options, including quit option
         :return: list of all valid move options, including quit option
         """
-        valid_moves = []
+        first_field = FIRST_MOVE_COUNT_FIELDS[player]
 
         # List all moves of which player has > 0 remaining
-        for move in self.get_player_move_options(player):
-            if self.state['player'][player]['move_choices'][move] > 0:
-                valid_moves.append(move)
+        valid_moves = [move for move, count in zip(ALL_MOVES, self._fields[first_field:first_field + _MOVE_COUNT])
+                       if count > 0]
 
         # Allow quit message to be selected
         valid_moves.append(QUIT_MESSAGE_PRINTABLE)
@@ -151,63 +278,63 @@ class RPSGameManager:
         Shows players' remaining move options and prompts current player for a new move.
         Sets current player's move selection.
         """
-        # Show both players' remaining move options
-        local_player = self.get_local_player()
-        local_player_move_options = self.get_player_move_options(local_player)
-        print(f'Your remaining options:{local_player_move_options}')
-
         # Your turn--what's your move?
-        valid_moves = self.get_all_valid_moves(local_player)
-        validation_error_message = 'No fancy stuff in this game. You have to win using the power of prediction!'
-        move_selection = get_validated_input(TURN_PROMPT, valid_moves, validation_error_message, True)
+        valid_moves = self.show_move_options()
+        if self.move_selector is not None:
+            move_selection = self.move_selector(self, valid_moves)
+        else:
+            move_selection = get_validated_input(TURN_PROMPT, valid_moves, MOVE_VALIDATION_ERROR_MESSAGE, True)
 
         # Record the move selection
-        self.record_player_move(self.state['whose_turn'], move_selection)
+        self.record_player_move(self.get_local_player(), move_selection)
 
         return move_selection
 
-    def get_local_player_move(self) -> str:
+    def show_move_options(self) -> List[str]:
         """
-        Returns the most recent move chosen by the local player
-        :return: local player's most recent move; R, P, or S
+        Shows the local player's remaining move options before they choose a move
+        :return: list of all valid move options, including quit option
         """
         local_player = self.get_local_player()
+        if self.show_output:
+            self.display(f'Your remaining options:{self.get_player_move_options(local_player)}')
 
-        local_player_move = self.state['player'][local_player]['current_move']
+        return self.get_all_valid_moves(local_player)
 
-        return local_player_move
+    def get_local_player_move(self) -> str:
+        """
+        Returns the most recent move chosen by the local player
+        :return: local player's most recent move; R, P, or S
+        """
+        return MOVES_BY_CODE[self._fields[FIELD_CURRENT_MOVES + self._fields[FIELD_WHOSE_TURN] - 1]]
 
     def get_local_player(self) -> str:
         """
         Returns the local player's constant descriptor
         :return: the local player's constant descriptor
         """
-        return self.state['whose_turn']
+        return _PLAYERS_BY_CODE[self._fields[FIELD_WHOSE_TURN]]
+
+    def set_local_player(self, player: str):
+        """
+        Makes the given player the current player
+        :param player: a player's representative constant defined in game_constants.py
+        """
+        self._fields[FIELD_WHOSE_TURN] = PLAYER_INDEXES[player] + 1
 
     def get_opponent(self) -> str:
         """
         Returns the opponent's constant descriptor
         :return: the opponent's constant descriptor
         """
-        opponent = None
-
-        if self.state['whose_turn'] == PLAYER_2:
-            opponent = PLAYER_1
-        elif self.state['whose_turn'] == PLAYER_1:
-            opponent = PLAYER_2
-
-        return opponent
+        return _PLAYERS_BY_CODE[3 - self._fields[FIELD_WHOSE_TURN]]
 
     def get_opponent_move(self) -> str:
         """
         Returns the most recent move chosen by the opponent of the local player
         :return: opponent's most recent move; R, P, or S
         """
-        opponent = self.get_opponent()
-
-        opponent_move = self.state['player'][opponent]['current_move']
-
-        return opponent_move
+        return MOVES_BY_CODE[self._fields[FIELD_CURRENT_MOVES + 2 - self._fields[FIELD_WHOSE_TURN]]]
 
     def change_turn(self):
         """
@@ -216,45 +343,21 @@ class RPSGameManager:
         but they are processed one at a time.
         This method helps keep track of which player is being processed.
         """
-        if self.state['whose_turn'] == PLAYER_2:
-            self.state['whose_turn'] = PLAYER_1
-        elif self.state['whose_turn'] == PLAYER_1:
-            self.state['whose_turn'] = PLAYER_2
+        self._fields[FIELD_WHOSE_TURN] = 3 - self._fields[FIELD_WHOSE_TURN]
 
     def award_round_winner(self, winner: str):
         """
         Sets round winner in state and updates score
         :param winner: player who won
         """
-        # Track round winner
-        self.state['round_winner'] = winner
-
-        # Increase score of round winner, if not a tie
-        if winner != TIE:
-            self.state['player'][winner]['score'] += 1
+        rps_engine.award_round(self._fields, winner)
 
     def calculate_round_result(self):
         """
         Calculates the result of a completed round.
         Sets round_winner in state.
         """
-        local_move = self.get_local_player_move()
-        opponent_move = self.get_opponent_move()
-
-        # Check if local player won
-        if MOVE_PRIORITY[local_move] == opponent_move:
-            winner = self.get_local_player()
-
-        # Check if opponent won
-        elif MOVE_PRIORITY[opponent_move] == local_move:
-            winner = self.get_opponent()
-
-        # This round was a tie
-        else:
-            winner = TIE
-
-        # Update state
-        self.award_round_winner(winner)
+        rps_engine.resolve_round(self._fields)
 
     def get_round_winner(self) -> str:
         """
@@ -262,7 +365,7 @@ class RPSGameManager:
         :return: the most recent round's winner,
                  which could be either player, or TIE
         """
-        return self.state['round_winner']
+        return WINNERS_BY_CODE[self._fields[FIELD_ROUND_WINNER]]
 
     def get_scores(self) -> Tuple:
         """
@@ -271,8 +374,9 @@ class RPSGameManager:
                  First score is local player's,
                  second score is opponent's
         """
-        local_player_score = self.state['player'][self.get_local_player()]['score']
-        opponent_score = self.state['player'][self.get_opponent()]['score']
+        local_index = self._fields[FIELD_WHOSE_TURN] - 1
+        local_player_score = self._fields[FIELD_SCORES + local_index]
+        opponent_score = self._fields[FIELD_SCORES + 1 - local_index]
 
         return local_player_score, opponent_score
 
@@ -281,8 +385,8 @@ class RPSGameManager:
         Prints current scores for both players
         """
         local_player_score, opponent_score = self.get_scores()
-        print(f'Your score: {local_player_score}')
-        print(f'Opponent score: {opponent_score}')
+        self.display(f'Your score: {local_player_score}')
+        self.display(f'Opponent score: {opponent_score}')
 
     def count_remaining_move_options(self, player: str) -> int:
         """
@@ -290,85 +394,195 @@ class RPSGameManager:
         :param player: a player's representative constant defined in game_constants.py
         :return: sum of all remaining move options for a given player
         """
-        return sum(self.state['player'][player]['move_choices'].values())
+        return rps_engine.count_move_options(self._fields, player)
+
+    def get_regen_stream(self, player: str) -> RegenStream:
+        """
+        :param player: a player's representative constant defined in game_constants.py
+        :return: the player's stream for regenerating options in this match, started on first use
+        """
+        regen_stream = self._regen_streams.get(player)
+        if regen_stream is None:
+            regen_stream = self._regen_streams[player] = RegenStream(self.regen_seed, player)
+
+        return regen_stream
 
     def regenerate_random_option(self, player: str):
         """
-        Regenerates a random one of the given player's options
+        Regenerates a random one of the given player's options, drawn from the player's stream for this match
         :param player: a player's representative constant defined in game_constants.py
         """
-        random_option = random.choice(ALL_MOVES)
-        self.state['player'][player]['move_choices'][random_option] += REGEN_QUANTITY_EACH
+        rps_engine.regenerate_option(self._fields, player, self.get_regen_stream(player))
 
-    def handle_end_of_round(self):
+    def regenerate_if_low(self, player: str, regen_stream: Optional[RegenStream] = None) -> bool:
         """
-        Calculates and displays result of one round, after both players have taken their turn
+        Regenerates random options for a player whose remaining options have dwindled below REGEN_THRESHOLD
+        :param player: a player's representative constant defined in game_constants.py
+        :param regen_stream: stream to draw from; the player's stream for this match if None
+        :return: True if the player regenerated options
         """
-        # Award point and record round winner
-        self.calculate_round_result()
+        if regen_stream is None:
+            regen_stream = self.get_regen_stream(player)
+
+        return rps_engine.regenerate_if_low(self._fields, player, regen_stream)
+
+    def adopt_regen_seed(self, regen_seed):
+        """
+        Switches to the regen seed player 1 sent with its opening state, so both players draw from the same streams
+        :param regen_seed: seed as received, which is ignored unless it's valid
+        """
+        regen_seed = read_regen_seed(regen_seed)
+
+        if regen_seed is not None and regen_seed != self.regen_seed:
+            self.regen_seed = regen_seed
+            self._regen_streams = {}
 
-        # Display results
+    def record_round(self):
+        """
+        Adds the round that just ended to match_recorder.
+        Recorded before regenerating, since the recorder works out regeneration from the next round's counts.
+        """
+        players = (PLAYER_1, PLAYER_2)
+        self.match_recorder.stage = self.get_stage()
+        self.match_recorder.record_round(
+            {player: MOVES_BY_CODE[self._fields[CURRENT_MOVE_FIELDS[player]]] for player in players},
+            self.get_round_winner(),
+            {player: self.get_player_move_options(player) for player in players}
+        )
+
+    def show_round_result(self):
+        """
+        Shows both moves, who won the round, and the score
+        """
         # Show opponent's move choice
-        print(f'{REPLY_LINE_PREFIX}{self.get_opponent_move()}')
+        self.display(f'{REPLY_LINE_PREFIX}{self.get_opponent_move()}')
 
         # Print a newline to separate this summary section
-        print('')
+        self.display('')
 
         # Show round winner
         winner = self.get_round_winner()
         if winner != TIE:
-            print(f'Player {winner} wins this round!')
+            self.display(f'Player {winner} wins this round!')
         else:
-            print('This round was a tie!')
+            self.display('This round was a tie!')
 
         # Show current score
         self.show_scores()
 
         # Print a newline at the end of the summary section
-        print('')
+        self.display('')
+
+    def handle_end_of_round(self):
+        """
+        Calculates and displays result of one round, after both players have taken their turn
+        """
+        resolution_start_time = time.perf_counter() if METRICS.enabled else None
+
+        # Award point and record round winner
+        self.calculate_round_result()
+
+        if self.match_recorder is not None:
+            self.record_round()
+
+        if resolution_start_time is not None:
+            METRICS.round_resolution_seconds.observe(time.perf_counter() - resolution_start_time)
+
+        # Display results, unless nothing is shown, like for bots and loopback matches
+        if self.show_output:
+            self.show_round_result()
 
         # Regenerate move choices if remaining move options have dwindled too much,
         # so the game can continue until a player quits
         local_player = self.get_local_player()
-        if self.count_remaining_move_options(local_player) < REGEN_THRESHOLD:
-            for _ in range(REGEN_ITERATIONS):
-                self.regenerate_random_option(local_player)
-
-            print('\nYou randomly regenerated some options! Here are your new options:')
-            print(self.state['player'][local_player]['move_choices'])
-            print('')  # Print a newline to separate this regeneration section
+        if self.regenerate_if_low(local_player):
+            self.display('\nYou randomly regenerated some options! Here are your new options:')
+            self.display(self.get_player_move_options(local_player))
+            self.display('')  # Print a newline to separate this regeneration section
 
     def send_state_to_opponent(self, connection_socket: socket):
         """
         Sends the current state as a string through the given socket.
         :param connection_socket: socket object representing the connection
         """
-        # Encode state in outgoing message
-        outgoing_message = self.encode_state()
+        # Encode state in outgoing message.
+        # The opening message is always JSON and offers the opponent every supported codec.
+        if self._has_received_state is False and self.protocol_version == GELA372_VERSION_2:
+            outgoing_message = state_codec.encode_state_with_offer(self.state, self.round_modes, self.player_name,
+                                                                   self.regen_seed)
+            self._has_offered_state_codecs = True
+            self._has_offered_round_modes = len(self.round_modes) > 0
+        else:
+            outgoing_message = self.encode_state()
 
         # Send the response message to update other player
-        send_message(outgoing_message, connection_socket)
+        send_message(outgoing_message, connection_socket, self.protocol_version)
 
-    def handle_new_message(self, incoming_message: str, connection_socket: socket) -> EndGameCode:
+    def decode_incoming_state(self, incoming_message: Union[str, bytes]) -> tuple:
         """
-        Plays one round of the game for either player, given an existing state.
-        :param incoming_message: message received from the other host
-        :param connection_socket: socket object representing the connection
-        :return: end-game code defined in EndGameCode
+        Decodes the opponent's state and negotiates the state codec, without changing the local state
+        :param incoming_message: state message received from the other host
+        :return: the opponent's state, as fields in state_codec.STATE_FIELD_NAMES order
+        """
+        # A delta only makes sense on top of the last exchanged state, which the delta sync tracks.
+        # Binary states decode straight into fields; only JSON goes through a state dict.
+        decode_start_time = time.perf_counter() if METRICS.enabled else None
+        offered_codecs = None
+        offered_round_modes = None
+        if state_codec.is_delta_state(incoming_message):
+            new_fields = self._delta_state_sync.decode_delta_fields(incoming_message)
+        elif state_codec.is_binary_state(incoming_message):
+            new_fields = state_codec.decode_binary_fields(incoming_message)
+        else:
+            new_state = self.decode_state(incoming_message)
+
+            try:
+                offered_codecs = new_state.pop(STATE_CODEC_OFFER_KEY, None)
+                offered_round_modes = new_state.pop(ROUND_MODE_OFFER_KEY, None)
+                regen_seed = new_state.pop(REGEN_SEED_KEY, None)
+                new_fields = state_codec.state_to_fields(new_state)
+
+            except (AttributeError, KeyError, TypeError, ValueError) as error:
+                raise state_codec.StateDecodeError('received incomplete JSON state') from error
+
+            # Only player 1's opening state picks the seed
+            if self._has_received_state is False:
+                self.adopt_regen_seed(regen_seed)
+
+        if decode_start_time is not None:
+            METRICS.state_decode_seconds.observe(
+                time.perf_counter() - decode_start_time, state_codec.get_state_codec_name(incoming_message))
+
+        self._has_received_state = True
+        self.negotiate_state_codec(incoming_message, offered_codecs)
+        self.negotiate_round_mode(offered_round_modes)
+
+        return new_fields
+
+    def begin_turn(self, incoming_message: Union[str, bytes]) -> EndGameCode:
+        """
+        First half of handle_new_message(): takes in the opponent's state and, for player 1, finishes the round.
+        The local player chooses a move after this, and finish_turn() sends it.
+        :param incoming_message: state message received from the other host
+        :return: OPPONENT_QUITS, or CONTINUE if it's time for the local player's move
         """
         # Check if stage is selected already.
         # Player 2 needs to update when player 1 selects a stage.
-        changing_stage = True if self.state['stage'] is self._INITIAL_STAGE else False
-
-        # Decode state in incoming message
-        new_state = self.decode_state(incoming_message)
+        changing_stage = self._fields[FIELD_STAGE] == NO_VALUE_CODE
+        previous_fields = self._fields
 
         # Replace local state with incoming state, no questions asked
-        self.state = new_state
+        self._fields = list(self.decode_incoming_state(incoming_message))
 
         # State is received after opponent updated it for their turn. Change it back to local player's turn
         self.change_turn()
 
+        # The opponent only relays the local player's options as they were sent, so they're missing anything
+        # player 2 regenerated after sending its last move; the local copy is the up-to-date one
+        if changing_stage is False:
+            first_field = FIRST_MOVE_COUNT_FIELDS[self.get_local_player()]
+            self._fields[first_field:first_field + _MOVE_COUNT] = previous_fields[first_field:first_field + _MOVE_COUNT]
+
         # Check if opponent quit
         if self.get_opponent_move() == QUIT_MESSAGE:
             return EndGameCode.OPPONENT_QUITS
@@ -378,11 +592,25 @@ class RPSGameManager:
             self.print_stage_info()
 
         # (only player 1) calculate result and display it
-        if self.state['whose_turn'] == PLAYER_1:
+        if self.get_local_player() == PLAYER_1:
             self.handle_end_of_round()
 
-        # Get local player's next move
-        self.play_next_move()
+        return EndGameCode.CONTINUE
+
+    def finish_turn(self, connection_socket: socket) -> EndGameCode:
+        """
+        Second half of handle_new_message(): sends the local player's recorded move and, for player 2,
+        finishes the round. In commit-reveal rounds, sends a commitment to the move instead.
+        :param connection_socket: socket object representing the connection
+        :return: LOCAL_PLAYER_QUITS, or CONTINUE
+        """
+        if self._commit_reveal_round is not None:
+            return self.commit_move(connection_socket)
+
+        # Accept the opponent's round mode right before the reply, so they switch as the reply arrives
+        if self._accepted_round_mode is not None:
+            send_message(state_codec.encode_round_mode_acceptance(self._accepted_round_mode), connection_socket,
+                         self.protocol_version)
 
         # Update opponent
         self.send_state_to_opponent(connection_socket)
@@ -392,65 +620,540 @@ class RPSGameManager:
             return EndGameCode.LOCAL_PLAYER_QUITS
 
         # (only player 2) calculate result and display it
-        if self.state['whose_turn'] == PLAYER_2:
+        if self.get_local_player() == PLAYER_2:
             self.handle_end_of_round()
 
+        if self._accepted_round_mode is not None:
+            self._accepted_round_mode = None
+            self._commit_reveal_round = CommitRevealRound(self.get_local_player())
+
+        return EndGameCode.CONTINUE
+
+    def is_commit_reveal(self) -> bool:
+        """
+        :return: True once rounds are played by commit and reveal instead of relaying states
+        """
+        return self._commit_reveal_round is not None
+
+    def is_commit_reveal_message(self, incoming_message: Union[str, bytes]) -> bool:
+        """
+        Player 1 still gets player 2's relayed reply to the round in which commit-reveal was accepted,
+        so only commitments and reveals go to handle_commit_reveal_message()
+        :param incoming_message: message received from the other host
+        :return: True if the message is a commitment or reveal and commit-reveal rounds have started
+        """
+        return self._commit_reveal_round is not None and (
+            state_codec.is_commitment(incoming_message) or state_codec.is_reveal(incoming_message))
+
+    def is_local_move_due(self) -> bool:
+        """
+        In commit-reveal rounds, both players choose at once, so the local player chooses as soon as a round starts
+        instead of waiting for the opponent's move
+        :return: True if the local player should choose a move now without waiting for a message
+        """
+        return self._commit_reveal_round is not None and self._commit_reveal_round.local_reveal is None
+
+    def commit_move(self, connection_socket: socket) -> EndGameCode:
+        """
+        Commits to the local player's recorded move for a commit-reveal round,
+        and reveals it right away if the opponent has already committed.
+        Quitting is sent as a reveal on its own, since there's nothing to hide.
+        :param connection_socket: socket object representing the connection
+        :return: LOCAL_PLAYER_QUITS, or CONTINUE
+        """
+        local_player = self.get_local_player()
+        move = self.get_local_player_move()
+        first_field = FIRST_MOVE_COUNT_FIELDS[local_player]
+        move_counts = self._fields[first_field:first_field + _MOVE_COUNT]
+
+        if move == QUIT_MESSAGE:
+            send_message(state_codec.encode_reveal(local_player, move, bytes(COMMITMENT_NONCE_SIZE),
+                                                  tuple(move_counts)),
+                         connection_socket, self.protocol_version)
+
+            return EndGameCode.LOCAL_PLAYER_QUITS
+
+        # The move was already subtracted when it was recorded, but the reveal holds the counts from before it
+        move_counts[ALL_MOVES.index(move)] += 1
+        commitment = self._commit_reveal_round.commit(move, tuple(move_counts))
+
+        # The opponent may have quit and hung up while this move was chosen.
+        # Their quit, or the closed connection, is what gets received next.
+        try:
+            send_message(commitment, connection_socket, self.protocol_version)
+
+            if self._commit_reveal_round.is_ready_to_reveal():
+                send_message(self._commit_reveal_round.reveal(), connection_socket, self.protocol_version)
+
+        except ConnectionError:
+            pass
+
+        return EndGameCode.CONTINUE
+
+    def handle_commit_reveal_message(self, incoming_message: bytes, connection_socket: socket) -> Optional[EndGameCode]:
+        """
+        Takes in the opponent's commitment or reveal for a commit-reveal round.
+        A commitment is answered with the local reveal once the local player has committed too,
+        and a reveal resolves the round with the same rules as relayed rounds.
+        :param incoming_message: message received from the other host
+        :param connection_socket: socket object representing the connection
+        :return: None if the round isn't resolved yet, CONTINUE once it is, or OPPONENT_QUITS
+        """
+        commit_reveal_round = self._commit_reveal_round
+
+        try:
+            if state_codec.is_commitment(incoming_message):
+                commit_reveal_round.receive_commitment(incoming_message)
+
+                if commit_reveal_round.is_ready_to_reveal():
+                    send_message(commit_reveal_round.reveal(), connection_socket, self.protocol_version)
+
+                return None
+
+            opponent = self.get_opponent()
+            first_field = FIRST_MOVE_COUNT_FIELDS[opponent]
+            move, move_counts = commit_reveal_round.open_reveal(
+                incoming_message, tuple(self._fields[first_field:first_field + _MOVE_COUNT]))
+
+        except (CommitmentError, state_codec.StateDecodeError) as error:
+            self.display(f'\nOpponent broke the commit-reveal rules: {error}.')
+            return EndGameCode.OPPONENT_QUITS
+
+        if move == QUIT_MESSAGE:
+            self.set_player_current_move(opponent, QUIT_MESSAGE)
+            return EndGameCode.OPPONENT_QUITS
+
+        # The opponent's counts include any options they regenerated since their last reveal
+        self.set_player_move_options(opponent, dict(zip(ALL_MOVES, move_counts)))
+        self.record_player_move(opponent, move)
+        self.handle_end_of_round()
+
         return EndGameCode.CONTINUE
 
+    def handle_new_message(self, incoming_message: Union[str, bytes], connection_socket: socket) -> EndGameCode:
+        """
+        Plays one round of the game for either player, given an existing state.
+        :param incoming_message: message received from the other host
+        :param connection_socket: socket object representing the connection
+        :return: end-game code defined in EndGameCode
+        """
+        if METRICS.enabled:
+            return self._handle_new_message_measured(incoming_message, connection_socket)
+
+        endgame_code = self.begin_turn(incoming_message)
+        if endgame_code != EndGameCode.CONTINUE:
+            return endgame_code
+
+        # Get local player's next move
+        self.play_next_move()
+
+        return self.finish_turn(connection_socket)
+
+    def _handle_new_message_measured(self, incoming_message: Union[str, bytes],
+                                     connection_socket: socket) -> EndGameCode:
+        """
+        handle_new_message(), recording how long the turn took apart from choosing the move
+        :param incoming_message: message received from the other host
+        :param connection_socket: socket object representing the connection
+        :return: end-game code defined in EndGameCode
+        """
+        start_time = time.perf_counter()
+        endgame_code = self.begin_turn(incoming_message)
+        handling_time = time.perf_counter() - start_time
+
+        if endgame_code == EndGameCode.CONTINUE:
+            self.play_next_move()
+
+            start_time = time.perf_counter()
+            endgame_code = self.finish_turn(connection_socket)
+            handling_time += time.perf_counter() - start_time
+
+        METRICS.handle_message_seconds.observe(handling_time)
+
+        return endgame_code
+
+    def handle_control_message(self, incoming_message: bytes, connection_socket: socket) -> bool:
+        """
+        Handles the messages that can arrive between states: round mode acceptances, resync requests, and notices
+        :param incoming_message: message received from the other host
+        :param connection_socket: socket object representing the connection
+        :return: True if the message was one of those, rather than a state
+        """
+        # The opponent accepted a round mode offer; rounds after the one their reply finishes use it
+        if state_codec.is_round_mode_acceptance(incoming_message):
+            if self._has_offered_round_modes and (
+                    state_codec.decode_round_mode_acceptance(incoming_message) in self.round_modes):
+                self._commit_reveal_round = CommitRevealRound(self.get_local_player())
+
+            return True
+
+        # The opponent lost track of the state; send it in full and keep waiting for their move
+        if state_codec.is_resync_request(incoming_message):
+            if self._delta_state_sync.last_sent_fields is not None:
+                send_message(self._delta_state_sync.encode_snapshot(), connection_socket, self.protocol_version)
+
+            return True
+
+        if state_codec.is_notice(incoming_message):
+            self.display(f'{NOTICE_LINE_PREFIX}{state_codec.decode_notice(incoming_message)}')
+
+            return True
+
+        return False
+
+    def request_resync(self, connection_socket: socket):
+        """
+        Asks the opponent for their full state, after receiving a delta that can't be applied.
+        Their move arrives again as a snapshot, so keep waiting for it.
+        :param connection_socket: socket object representing the connection
+        """
+        send_message(self._delta_state_sync.encode_resync_request(), connection_socket, self.protocol_version)
+
+    def end_game(self, endgame_code: EndGameCode):
+        """
+        Shows how the game ended
+        :param endgame_code: LOCAL_PLAYER_QUITS or OPPONENT_QUITS
+        """
+        self.handle_endgame()
+
+        if self.match_recorder is not None:
+            self.match_recorder.quitter = (
+                self.get_local_player() if endgame_code == EndGameCode.LOCAL_PLAYER_QUITS else self.get_opponent())
+
+        if endgame_code == EndGameCode.OPPONENT_QUITS:
+            self.display('\nOpponent quit. You are the RPS master today.')
+
     def play_game(self, connection_socket: socket):
         """
         Interacts with another host until sending or receiving a quit message.
         Starts interaction by receiving.
         :param connection_socket: socket object representing the connection
         """
-        # Initialize the first message's data with the first packet's data
-        try:
-            packet_data = receive_next_packet(connection_socket)
+        # Reassemble messages from the byte stream, however the packets were split or merged in transit
+        receiver = GELA372Receiver()
 
-        except PacketUnpackError:
-            print(PACKET_RECEIVE_ERROR_MESSAGE)
-            return
+        # Receive and reply to messages from the other host until a message matches the quit message
+        while True:
+            try:
+                incoming_message_payload = receive_message_bytes(connection_socket, receiver)
+
+            except (PacketUnpackError, ConnectionError):
+                self.display(PACKET_RECEIVE_ERROR_MESSAGE)
+                return
+
+            if self.handle_incoming_message(incoming_message_payload, receiver.peer_version, connection_socket):
+                return
+
+    def handle_incoming_message(self, incoming_message_payload: bytes, peer_version: int,
+                                connection_socket: socket) -> bool:
+        """
+        Handles one whole message from the other host the way play_game() does, replying to it if it's time to.
+        Lets a caller that receives messages itself, like play_loopback_match(), drive the game one message at a time.
+        :param incoming_message_payload: raw payload of the message
+        :param peer_version: GELA372 version the message arrived in
+        :param connection_socket: socket object representing the connection
+        :return: True once the game is over
+        """
+        # Reply in whichever GELA372 version the opponent speaks
+        self.protocol_version = peer_version
+
+        if incoming_message_payload == QUIT_MESSAGE.encode():
+            return True
+
+        if self.handle_control_message(incoming_message_payload, connection_socket):
+            return False
+
+        # Process the complete message
+        try:
+            if self.is_commit_reveal_message(incoming_message_payload):
+                endgame_code = self.handle_commit_reveal_message(incoming_message_payload, connection_socket)
 
-        is_last_packet = packet_data['is_last_packet']
-        packet_payload = packet_data['payload']
-        incoming_message_payload = packet_payload
+                # Keep waiting until the round is resolved
+                if endgame_code is None:
+                    return False
 
-        # Receive and reply to messages in packets from client until a message matches the quit message
-        while incoming_message_payload != QUIT_MESSAGE:
-            # If this packet is the first of a new message, process the message that just finished transmitting.
-            # The request message payload is now completely received.
-            if is_last_packet is True:
-                # Process the complete message
+            else:
                 endgame_code = self.handle_new_message(incoming_message_payload, connection_socket)
 
-                # Check for end of game by local player
-                if endgame_code == EndGameCode.LOCAL_PLAYER_QUITS:
-                    self.handle_endgame()
+        except state_codec.StateResyncNeeded:
+            self.request_resync(connection_socket)
 
-                    return
+            return False
+
+        except state_codec.StateDecodeError:
+            self.display(PACKET_RECEIVE_ERROR_MESSAGE)
+
+            return True
+
+        # In commit-reveal rounds, choose the next move as soon as a round is resolved
+        if endgame_code == EndGameCode.CONTINUE and self.is_local_move_due():
+            self.play_next_move()
+            endgame_code = self.commit_move(connection_socket)
 
-                elif endgame_code == EndGameCode.OPPONENT_QUITS:
-                    self.handle_endgame()
-                    print('\nOpponent quit. You are the RPS master today.')
+        # Check for end of game
+        if endgame_code != EndGameCode.CONTINUE:
+            self.end_game(endgame_code)
 
+            return True
+
+        # Tell local player to wait for opponent
+        self.display(WAITING_FOR_OPPONENT_MESSAGE)
+
+        return False
+
+    def play_game_with_keyboard(self, connection_socket: socket, moves_first: bool = False, keyboard=None):
+        """
+        Same as play_game() for a person at the keyboard, but waits on the keyboard and the socket at once.
+        The opponent quitting or disconnecting, and notices, are shown right away,
+        even while the local player is still choosing a move.
+        Typing the quit message while waiting for the opponent quits right away, too.
+        Waits in one selectors call, so this takes no extra threads and doesn't poll.
+        Falls back to play_game() where the keyboard can't be watched this way, like on Windows.
+        :param connection_socket: socket object representing the connection
+        :param moves_first: True to start by choosing a move, like player 1's opening move, instead of receiving
+        :param keyboard: file the player types into; sys.stdin if None
+        """
+        keyboard = keyboard if keyboard is not None else sys.stdin
+        selector = selectors.DefaultSelector()
+
+        try:
+            selector.register(keyboard, selectors.EVENT_READ)
+
+        except (ValueError, OSError):
+            selector.close()
+
+            if moves_first:
+                self.play_next_move()
+                self.send_state_to_opponent(connection_socket)
+
+                if self.get_local_player_move() == QUIT_MESSAGE:
+                    self.display('No contest.')
                     return
 
-                # Reset to track the new message
-                incoming_message_payload = ''
+                self.display(WAITING_FOR_OPPONENT_MESSAGE)
 
-                # Tell local player to wait for opponent
-                print(WAITING_FOR_OPPONENT_MESSAGE)
+            self.play_game(connection_socket)
+            return
 
-            # Receive a packet of data from the other host
-            try:
-                packet_data = receive_next_packet(connection_socket)
+        with selector:
+            selector.register(connection_socket, selectors.EVENT_READ)
+            _KeyboardGame(self, connection_socket, keyboard, selector).run(moves_first)
+
+
+class _KeyboardGame:
+    """
+    Event loop behind RPSGameManager.play_game_with_keyboard().
+    Reacts to whichever of the keyboard and the socket has something to read.
+    """
+    def __init__(self, game_manager: RPSGameManager, connection_socket: socket, keyboard,
+                 selector: selectors.BaseSelector):
+        """
+        :param game_manager: game manager for the local player
+        :param connection_socket: socket object representing the connection; registered with selector
+        :param keyboard: file the player types into; registered with selector
+        :param selector: selector to wait on
+        """
+        self.game_manager = game_manager
+        self.connection_socket = connection_socket
+        self.keyboard = keyboard
+        self.selector = selector
+        self.receiver = GELA372Receiver()
+        self.typed_text = ''  # keyboard input that doesn't make a whole line yet
+        self.typed_ahead_lines = collections.deque()  # lines typed while waiting, to answer the next prompts
+        self.valid_moves = None  # moves the player may type now, or None while waiting for the opponent
+        self.is_opening_move = False
+        self.is_finished = False
+
+    def run(self, moves_first: bool):
+        """
+        Plays until the game ends
+        :param moves_first: True to start by choosing a move instead of receiving
+        """
+        if moves_first:
+            self.is_opening_move = True
+            self.prompt_for_move()
+
+        while not self.is_finished:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.keyboard:
+                    self.read_keyboard()
+                else:
+                    self.read_socket()
+
+                if self.is_finished:
+                    break
+
+    def prompt_for_move(self):
+        """
+        Shows the local player's options and asks for their move
+        """
+        self.valid_moves = self.game_manager.show_move_options()
+        self.game_manager.display(TURN_PROMPT, end='', flush=True)
+        self.replay_typed_ahead_lines()
+
+    def replay_typed_ahead_lines(self):
+        """
+        Answers the prompt with lines typed while waiting for the opponent, in order, like input() would
+        """
+        while self.valid_moves is not None and len(self.typed_ahead_lines) > 0 and not self.is_finished:
+            line = self.typed_ahead_lines.popleft()
+            self.game_manager.display(line)  # finish the prompt's line, as if the player had just typed it
+            self.handle_line(line)
+
+    def finish(self, endgame_code: EndGameCode):
+        """
+        Shows how the game ended and stops the loop
+        :param endgame_code: LOCAL_PLAYER_QUITS or OPPONENT_QUITS
+        """
+        self.game_manager.end_game(endgame_code)
+        self.is_finished = True
+
+    def read_keyboard(self):
+        """
+        Handles every whole line the player has typed
+        """
+        typed_bytes = os.read(self.keyboard.fileno(), BUFFER_SIZE)
 
-            except PacketUnpackError:
-                print(PACKET_RECEIVE_ERROR_MESSAGE)
+        # The keyboard closed, like with Ctrl-D, so the player can't do anything but quit,
+        # once any lines typed ahead have been played
+        if typed_bytes == b'':
+            self.selector.unregister(self.keyboard)
+
+            if self.valid_moves is None and len(self.typed_ahead_lines) > 0:
+                self.typed_ahead_lines.append(QUIT_MESSAGE)
+            else:
+                self.handle_line(QUIT_MESSAGE)
+
+            return
+
+        self.typed_text += typed_bytes.decode(errors='replace')
+
+        while '\n' in self.typed_text and not self.is_finished:
+            line, self.typed_text = self.typed_text.split('\n', 1)
+            self.handle_line(line.rstrip('\r'))
+
+    def handle_line(self, line: str):
+        """
+        Acts on one line typed by the player
+        :param line: the line, without its newline
+        """
+        game_manager = self.game_manager
+
+        # While waiting for the opponent, quitting happens right away,
+        # and anything else is kept to answer the next prompts, as typing ahead of input() would be;
+        # so is quitting after lines already kept, so those moves are played first
+        if self.valid_moves is None:
+            if line == QUIT_MESSAGE and len(self.typed_ahead_lines) == 0:
+                game_manager.record_player_move(game_manager.get_local_player(), QUIT_MESSAGE)
+                if game_manager.is_commit_reveal():
+                    game_manager.commit_move(self.connection_socket)
+                else:
+                    game_manager.send_state_to_opponent(self.connection_socket)
+                self.finish(EndGameCode.LOCAL_PLAYER_QUITS)
+            else:
+                self.typed_ahead_lines.append(line)
+
+            return
+
+        if line not in self.valid_moves:
+            game_manager.display(MOVE_VALIDATION_ERROR_MESSAGE)
+            game_manager.display('You have to choose one of these options (no typos, case-sensitive):')
+            game_manager.display(', '.join(self.valid_moves))
+            game_manager.display(TURN_PROMPT, end='', flush=True)
+            return
+
+        self.valid_moves = None
+        game_manager.record_player_move(game_manager.get_local_player(), line)
+
+        if self.is_opening_move:
+            # Nothing has been received yet, so just send the move
+            self.is_opening_move = False
+            game_manager.send_state_to_opponent(self.connection_socket)
+
+            if line == QUIT_MESSAGE:
+                game_manager.display('No contest.')
+                self.is_finished = True
+                return
+
+        else:
+            endgame_code = game_manager.finish_turn(self.connection_socket)
+
+            if endgame_code != EndGameCode.CONTINUE:
+                self.finish(endgame_code)
+                return
+
+            # Player 2 starts commit-reveal rounds right after the reply that accepts them
+            if game_manager.is_local_move_due():
+                self.prompt_for_move()
                 return
 
-            is_last_packet = packet_data['is_last_packet']
-            packet_payload = packet_data['payload']
+        game_manager.display(WAITING_FOR_OPPONENT_MESSAGE)
+
+    def read_socket(self):
+        """
+        Handles every whole message that has arrived
+        """
+        try:
+            if self.receiver.fill_from(self.connection_socket) == 0:
+                raise PacketUnpackError('connection closed')
+
+            incoming_message = self.receiver.next_message()
+            while incoming_message is not None and not self.is_finished:
+                self.handle_message(incoming_message)
+                incoming_message = self.receiver.next_message()
+
+        except (PacketUnpackError, state_codec.StateDecodeError, ConnectionError):
+            self.game_manager.display(f'\n{PACKET_RECEIVE_ERROR_MESSAGE}')
+            self.is_finished = True
+
+    def handle_message(self, incoming_message: bytes):
+        """
+        Acts on one message from the other host
+        :param incoming_message: raw payload of the message
+        """
+        game_manager = self.game_manager
+
+        # Reply in whichever GELA372 version the opponent speaks
+        game_manager.protocol_version = self.receiver.peer_version
+
+        if incoming_message == QUIT_MESSAGE.encode():
+            self.is_finished = True
+            return
+
+        if game_manager.handle_control_message(incoming_message, self.connection_socket):
+            # Ask again if a notice interrupted the player choosing a move
+            if self.valid_moves is not None and state_codec.is_notice(incoming_message):
+                game_manager.display(TURN_PROMPT, end='', flush=True)
+
+            return
+
+        # In commit-reveal rounds, the player chooses while the opponent's commitment and reveal arrive
+        if game_manager.is_commit_reveal_message(incoming_message):
+            endgame_code = game_manager.handle_commit_reveal_message(incoming_message, self.connection_socket)
+
+            if endgame_code is None:
+                return
+
+            if endgame_code != EndGameCode.CONTINUE:
+                game_manager.display('')  # end the line the player may have been typing on
+                self.finish(endgame_code)
+                return
+
+            self.prompt_for_move()
+            return
+
+        # The only state that should arrive while the player is choosing is the opponent quitting,
+        # but any state replaces the local one, and the player is asked again with up-to-date options
+        try:
+            endgame_code = game_manager.begin_turn(incoming_message)
+
+        except state_codec.StateResyncNeeded:
+            game_manager.request_resync(self.connection_socket)
+            return
+
+        if endgame_code != EndGameCode.CONTINUE:
+            game_manager.display('')  # end the line the player may have been typing on
+            self.finish(endgame_code)
+            return
 
-            # Add this packet's payload to the message text
-            incoming_message_payload += packet_payload
+        self.prompt_for_move()
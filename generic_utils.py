@@ -1,5 +1,6 @@
 # Author: Mark Mendez
 # Date: 03/02/2022
+from math import ceil
 from typing import List
 
 
@@ -48,3 +49,18 @@ def get_validated_input(
         current_input = input(prompt)
 
     return current_input
+
+
+def get_percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Finds a percentile using the nearest-rank method
+    :param sorted_values: values sorted in ascending order
+    :param percent: percentile to find, from 0 to 100
+    :return: value at the given percentile, or 0 if there are no values
+    """
+    if len(sorted_values) < 1:
+        return 0
+
+    rank = ceil(percent / 100 * len(sorted_values))
+
+    return sorted_values[max(rank, 1) - 1]
@@ -0,0 +1,535 @@
+"""
+Player stats that outlast a match, kept in a local SQLite database.
+
+The match server reports every round and every finished match to a LeaderboardWriter, which only queues them.
+A background thread adds up whatever has queued into per-player and per-stage deltas,
+then applies them as increments in one transaction, so the game loop never waits on the database
+and the totals never have to be recounted from history. Queries read the totals straight from their tables,
+which stay as small as the number of players, however many match results pile up.
+
+Only named players (see PLAYER_NAME_KEY) are counted.
+Their matchmaking ratings (see matchmaking.py) are kept here too, as the sum of every change reported.
+
+Example: python leaderboard.py --top 10
+"""
+
+import argparse
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from game_constants import *
+from matchmaking import DEFAULT_RATING
+
+DEFAULT_LEADERBOARD_PATH = 'leaderboard.sqlite3'
+LEADERBOARD_BATCH_SIZE = 5000  # most queued reports applied in one transaction
+LEADERBOARD_FLUSH_INTERVAL = 0.5  # seconds the writer waits for a batch to fill before applying it
+
+# Totals kept per player, and per player and stage. Every one is a count, so every update is an increment.
+STAT_COLUMNS = ['matches', 'match_wins', 'match_losses', 'rounds', 'round_wins', 'round_losses']
+LEADERBOARD_ORDERS = ['match_wins', 'round_wins', 'matches', 'rounds']
+_MATCHES, _MATCH_WINS, _MATCH_LOSSES, _ROUNDS, _ROUND_WINS, _ROUND_LOSSES = range(len(STAT_COLUMNS))
+
+_STAT_COLUMN_DEFINITIONS = ', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in STAT_COLUMNS)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    {_STAT_COLUMN_DEFINITIONS}
+);
+CREATE INDEX IF NOT EXISTS players_by_match_wins ON players (match_wins DESC);
+CREATE INDEX IF NOT EXISTS players_by_round_wins ON players (round_wins DESC);
+CREATE INDEX IF NOT EXISTS players_by_matches ON players (matches DESC);
+CREATE INDEX IF NOT EXISTS players_by_rounds ON players (rounds DESC);
+
+CREATE TABLE IF NOT EXISTS player_stages (
+    player_id INTEGER NOT NULL REFERENCES players,
+    stage TEXT NOT NULL,
+    {_STAT_COLUMN_DEFINITIONS},
+    PRIMARY KEY (player_id, stage)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS player_moves (
+    player_id INTEGER NOT NULL REFERENCES players,
+    move TEXT NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, move)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS match_results (
+    match_result_id INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players,
+    stage TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    rounds INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    opponent_score INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS match_results_by_player ON match_results (player_id, finished_at);
+
+CREATE TABLE IF NOT EXISTS player_ratings (
+    player_id INTEGER PRIMARY KEY REFERENCES players,
+    rating REAL NOT NULL,
+    rated_rounds INTEGER NOT NULL
+);
+"""
+
+_STAT_INCREMENTS = ', '.join(f'{column} = {column} + ?' for column in STAT_COLUMNS)
+_STAGE_UPSERT = (
+    f'INSERT INTO player_stages (player_id, stage, {", ".join(STAT_COLUMNS)}) '
+    f'VALUES (?, ?, {", ".join("?" * len(STAT_COLUMNS))}) '
+    f'ON CONFLICT (player_id, stage) DO UPDATE SET '
+    + ', '.join(f'{column} = {column} + excluded.{column}' for column in STAT_COLUMNS)
+)
+_PLAYER_UPDATE = f'UPDATE players SET {_STAT_INCREMENTS} WHERE player_id = ?'
+_MOVE_UPSERT = ('INSERT INTO player_moves (player_id, move, uses) VALUES (?, ?, ?) '
+                'ON CONFLICT (player_id, move) DO UPDATE SET uses = uses + excluded.uses')
+# Ratings start at DEFAULT_RATING, so a new player's row is that plus the first change
+_RATING_UPSERT = ('INSERT INTO player_ratings (player_id, rating, rated_rounds) VALUES (?, ? + ?, ?) '
+                  'ON CONFLICT (player_id) DO UPDATE SET rating = rating + excluded.rating - ?, '
+                  'rated_rounds = rated_rounds + excluded.rated_rounds')
+_MATCH_RESULT_INSERT = ('INSERT INTO match_results (player_id, stage, finished_at, rounds, score, opponent_score) '
+                        'VALUES (?, ?, ?, ?, ?, ?)')
+
+# Queued report kinds
+_ROUND_REPORT = 'round'
+_MATCH_REPORT = 'match'
+_RATING_REPORT = 'rating'
+_FLUSH_REQUEST = 'flush'
+_CLOSE_REQUEST = 'close'
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens the leaderboard database, creating its tables if they don't exist yet.
+    Write-ahead logging lets queries run while the writer is applying a batch.
+    :param path: path to the database
+    :return: connection to the database
+    """
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.executescript(_SCHEMA)
+
+    return connection
+
+
+class _StatsBatch:
+    """
+    Queued reports added up into one increment per player and stage, per player and move, and per player
+    """
+    def __init__(self):
+        self.stage_stats = {}  # (name, stage) -> counts in STAT_COLUMNS order
+        self.move_uses = {}  # (name, move) -> uses
+        self.match_results = []  # (name, stage, finished_at, rounds, score, opponent_score)
+        self.rating_changes = {}  # name -> [total change in rating, rated rounds]
+        self.report_count = 0
+
+    def get_stage_stats(self, name: str, stage: str) -> list:
+        """
+        :param name: player's name
+        :param stage: stage the stats are for
+        :return: the batch's counts for the player on the stage, in STAT_COLUMNS order
+        """
+        key = (name, stage)
+        stage_stats = self.stage_stats.get(key)
+
+        if stage_stats is None:
+            stage_stats = self.stage_stats[key] = [0] * len(STAT_COLUMNS)
+
+        return stage_stats
+
+    def add_round(self, stage: str, names: dict, moves: dict, winner: str):
+        """
+        :param stage: stage the round was played on
+        :param names: each player's name, or None for an unnamed player
+        :param moves: each player's move
+        :param winner: the round's winner, which could be either player, or TIE
+        """
+        for player, name in names.items():
+            if name is None:
+                continue
+
+            stage_stats = self.get_stage_stats(name, stage)
+            stage_stats[_ROUNDS] += 1
+            if winner == player:
+                stage_stats[_ROUND_WINS] += 1
+            elif winner != TIE:
+                stage_stats[_ROUND_LOSSES] += 1
+
+            move_key = (name, moves[player])
+            self.move_uses[move_key] = self.move_uses.get(move_key, 0) + 1
+
+    def add_match(self, stage: str, names: dict, scores: dict, round_count: int, finished_at: float):
+        """
+        :param stage: stage the match was played on
+        :param names: each player's name, or None for an unnamed player
+        :param scores: each player's final score
+        :param round_count: rounds the match lasted
+        :param finished_at: when the match ended, in seconds since the epoch
+        """
+        for player, name in names.items():
+            if name is None:
+                continue
+
+            opponent = PLAYER_2 if player == PLAYER_1 else PLAYER_1
+            score = scores[player]
+            opponent_score = scores[opponent]
+
+            stage_stats = self.get_stage_stats(name, stage)
+            stage_stats[_MATCHES] += 1
+            if score > opponent_score:
+                stage_stats[_MATCH_WINS] += 1
+            elif score < opponent_score:
+                stage_stats[_MATCH_LOSSES] += 1
+
+            self.match_results.append((name, stage, finished_at, round_count, score, opponent_score))
+
+    def add_rating_changes(self, changes: dict):
+        """
+        :param changes: name -> change in rating, from one round
+        """
+        for name, change in changes.items():
+            rating_change = self.rating_changes.setdefault(name, [0.0, 0])
+            rating_change[0] += change
+            rating_change[1] += 1
+
+
+class LeaderboardWriter:
+    """
+    Queues round and match reports from the game loop and applies them from a background thread, in batches
+    """
+    def __init__(self, path: str = DEFAULT_LEADERBOARD_PATH, batch_size: int = LEADERBOARD_BATCH_SIZE,
+                 flush_interval: float = LEADERBOARD_FLUSH_INTERVAL):
+        """
+        :param path: path to the database, which is created if it doesn't exist yet
+        :param batch_size: most queued reports applied in one transaction
+        :param flush_interval: seconds to wait for a batch to fill before applying it
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch_count = 0  # transactions committed so far
+
+        # Create the tables now, so a bad path fails here instead of in the background
+        connect(path).close()
+
+        self._reports = queue.SimpleQueue()
+        self._player_ids = {}  # name -> player_id, for names the writer has already seen
+        self._thread = threading.Thread(target=self._run, name='leaderboard writer', daemon=True)
+        self._thread.start()
+
+    def record_round(self, stage: str, names: dict, moves: dict, winner: str):
+        """
+        Queues a finished round. Never waits on the database.
+        :param stage: stage the round was played on
+        :param names: each player's name, or None for an unnamed player
+        :param moves: each player's move
+        :param winner: the round's winner, which could be either player, or TIE
+        """
+        self._reports.put((_ROUND_REPORT, stage, names, moves, winner))
+
+    def record_match(self, stage: str, names: dict, scores: dict, round_count: int):
+        """
+        Queues a finished match. Never waits on the database.
+        :param stage: stage the match was played on
+        :param names: each player's name, or None for an unnamed player
+        :param scores: each player's final score
+        :param round_count: rounds the match lasted
+        """
+        self._reports.put((_MATCH_REPORT, stage, names, scores, round_count, time.time()))
+
+    def record_rating_changes(self, changes: dict):
+        """
+        Queues one round's changes to players' ratings. Never waits on the database.
+        :param changes: name -> change in rating, from matchmaking.RatingBook.record_round()
+        """
+        self._reports.put((_RATING_REPORT, changes))
+
+    def flush(self):
+        """
+        Waits until every report queued so far is in the database
+        """
+        flushed = threading.Event()
+        self._reports.put((_FLUSH_REQUEST, flushed))
+        flushed.wait()
+
+    def close(self):
+        """
+        Applies every queued report, then stops the background thread
+        """
+        self._reports.put((_CLOSE_REQUEST,))
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        """
+        Background thread: gathers queued reports into batches and applies each batch in one transaction
+        """
+        connection = connect(self.path)
+        is_closing = False
+
+        try:
+            while not is_closing:
+                batch = _StatsBatch()
+                flush_requests = []
+
+                # Wait as long as it takes for the first report, then only until the batch is due
+                report = self._reports.get()
+                deadline = time.monotonic() + self.flush_interval
+
+                while True:
+                    kind = report[0]
+                    if kind == _ROUND_REPORT:
+                        batch.add_round(*report[1:])
+                    elif kind == _MATCH_REPORT:
+                        batch.add_match(*report[1:])
+                    elif kind == _RATING_REPORT:
+                        batch.add_rating_changes(report[1])
+                    elif kind == _FLUSH_REQUEST:
+                        flush_requests.append(report[1])
+                    else:
+                        is_closing = True
+
+                    batch.report_count += 1
+                    if is_closing or len(flush_requests) > 0 or batch.report_count >= self.batch_size:
+                        break
+
+                    try:
+                        report = self._reports.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._apply(connection, batch)
+
+                except sqlite3.Error as error:
+                    # Losing one batch of stats is better than stopping the game loop or losing every later batch
+                    print(f'leaderboard: dropped {batch.report_count} reports: {error}')
+
+                for flushed in flush_requests:
+                    flushed.set()
+
+        finally:
+            connection.close()
+
+    def _get_player_ids(self, connection: sqlite3.Connection, names: set) -> dict:
+        """
+        Looks up players' IDs, adding players seen for the first time. Runs inside the batch's transaction.
+        :param connection: the writer's connection
+        :param names: names of the players in the batch
+        :return: name -> player_id for every given name
+        """
+        new_names = [name for name in names if name not in self._player_ids]
+
+        if len(new_names) > 0:
+            connection.executemany('INSERT OR IGNORE INTO players (name) VALUES (?)', [(name,) for name in new_names])
+
+            for name in new_names:
+                self._player_ids[name] = connection.execute(
+                    'SELECT player_id FROM players WHERE name = ?', (name,)).fetchone()[0]
+
+        return self._player_ids
+
+    def _apply(self, connection: sqlite3.Connection, batch: _StatsBatch):
+        """
+        Adds a batch to the totals in one transaction
+        :param connection: the writer's connection
+        :param batch: reports added up since the last batch
+        """
+        if len(batch.stage_stats) == 0 and len(batch.move_uses) == 0 and len(batch.rating_changes) == 0:
+            return
+
+        # Stage totals add up to player totals, so work those out here instead of summing in SQL
+        player_stats = {}
+        for (name, _), stage_stats in batch.stage_stats.items():
+            totals = player_stats.setdefault(name, [0] * len(STAT_COLUMNS))
+            for index, count in enumerate(stage_stats):
+                totals[index] += count
+
+        # Taking the write lock up front lets another process's writer (such as another match worker's)
+        # wait its turn instead of failing when both try to upgrade a read lock
+        connection.execute('BEGIN IMMEDIATE')
+
+        try:
+            player_ids = self._get_player_ids(
+                connection, set(player_stats) | {name for name, _ in batch.move_uses} | set(batch.rating_changes))
+
+            connection.executemany(_STAGE_UPSERT, [(player_ids[name], stage, *stage_stats)
+                                                   for (name, stage), stage_stats in batch.stage_stats.items()])
+            connection.executemany(_PLAYER_UPDATE, [(*totals, player_ids[name])
+                                                    for name, totals in player_stats.items()])
+            connection.executemany(_MOVE_UPSERT, [(player_ids[name], move, uses)
+                                                  for (name, move), uses in batch.move_uses.items()])
+            connection.executemany(_MATCH_RESULT_INSERT, [(player_ids[name], *match_result)
+                                                          for name, *match_result in batch.match_results])
+            connection.executemany(_RATING_UPSERT, [(player_ids[name], DEFAULT_RATING, change, rounds, DEFAULT_RATING)
+                                                    for name, (change, rounds) in batch.rating_changes.items()])
+            connection.execute('COMMIT')
+
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+
+            # Player IDs looked up in the rolled-back transaction may not exist anymore
+            self._player_ids.clear()
+            raise
+
+        self.batch_count += 1
+
+
+class LeaderboardReader:
+    """
+    Answers leaderboard queries from the stored totals
+    """
+    def __init__(self, path: str = DEFAULT_LEADERBOARD_PATH):
+        """
+        :param path: path to the database
+        """
+        self.path = path
+        self._connection = connect(path)
+        self._connection.row_factory = sqlite3.Row
+
+    def get_top_players(self, count: int = 10, order: str = 'match_wins') -> List[sqlite3.Row]:
+        """
+        :param count: number of players to list
+        :param order: total to rank by, one of LEADERBOARD_ORDERS
+        :return: the top players' totals, best first
+        """
+        if order not in LEADERBOARD_ORDERS:
+            raise ValueError(f'cannot rank players by {order!r}')
+
+        # order is one of a few column names, each with its own index, so it's safe to put in the query
+        return self._connection.execute(
+            f'SELECT name, {", ".join(STAT_COLUMNS)} FROM players ORDER BY {order} DESC LIMIT ?', (count,)).fetchall()
+
+    def get_player(self, name: str) -> Optional[dict]:
+        """
+        :param name: player's name
+        :return: the player's totals, with their per-stage totals under 'stages' and move uses under 'moves',
+                 or None if the player has never been counted
+        """
+        player = self._connection.execute(
+            f'SELECT player_id, name, {", ".join(STAT_COLUMNS)} FROM players WHERE name = ?', (name,)).fetchone()
+
+        if player is None:
+            return None
+
+        stats = dict(player)
+        stats['stages'] = {row['stage']: dict(row) for row in self._connection.execute(
+            f'SELECT stage, {", ".join(STAT_COLUMNS)} FROM player_stages WHERE player_id = ? ORDER BY stage',
+            (player['player_id'],))}
+        stats['moves'] = {move: 0 for move in ALL_MOVES}
+        stats['moves'].update(self._connection.execute(
+            'SELECT move, uses FROM player_moves WHERE player_id = ?', (player['player_id'],)).fetchall())
+
+        rating = self._connection.execute(
+            'SELECT rating FROM player_ratings WHERE player_id = ?', (player['player_id'],)).fetchone()
+        stats['rating'] = DEFAULT_RATING if rating is None else rating['rating']
+
+        return stats
+
+    def get_ratings(self) -> dict:
+        """
+        :return: name -> (rating, rated rounds) for every rated player, for matchmaking.RatingBook
+        """
+        return {row['name']: (row['rating'], row['rated_rounds']) for row in self._connection.execute(
+            'SELECT players.name, player_ratings.rating, player_ratings.rated_rounds '
+            'FROM player_ratings JOIN players USING (player_id)')}
+
+    def get_recent_matches(self, name: str, count: int = 10) -> List[sqlite3.Row]:
+        """
+        :param name: player's name
+        :param count: number of matches to list
+        :return: the player's latest match results, newest first
+        """
+        return self._connection.execute(
+            'SELECT match_results.stage, match_results.finished_at, match_results.rounds, match_results.score, '
+            'match_results.opponent_score FROM match_results JOIN players USING (player_id) '
+            'WHERE players.name = ? ORDER BY match_results.finished_at DESC LIMIT ?',
+            (name, count)).fetchall()
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_win_rate(wins: int, matches: int) -> str:
+    """
+    :param wins: matches won
+    :param matches: matches played
+    :return: win rate as a percentage, or a dash if there are no matches
+    """
+    return f'{wins / matches:.0%}' if matches > 0 else '-'
+
+
+def print_top_players(reader: LeaderboardReader, count: int, order: str):
+    """
+    Prints the leaderboard
+    :param reader: open leaderboard
+    :param count: number of players to list
+    :param order: total to rank by, one of LEADERBOARD_ORDERS
+    """
+    print(f'{"#":>4} {"player":<{MAX_PLAYER_NAME_LENGTH}} {"matches":>8} {"won":>6} {"win %":>6} '
+          f'{"rounds":>8} {"rounds won":>11}')
+
+    for rank, player in enumerate(reader.get_top_players(count, order), start=1):
+        print(f'{rank:>4} {player["name"]:<{MAX_PLAYER_NAME_LENGTH}} {player["matches"]:>8} '
+              f'{player["match_wins"]:>6} {get_win_rate(player["match_wins"], player["matches"]):>6} '
+              f'{player["rounds"]:>8} {player["round_wins"]:>11}')
+
+
+def print_player(reader: LeaderboardReader, name: str):
+    """
+    Prints one player's totals, per-stage win rates, move uses, and latest matches
+    :param reader: open leaderboard
+    :param name: player's name
+    """
+    stats = reader.get_player(name)
+    if stats is None:
+        print(f'{name} has no matches on the leaderboard')
+        return
+
+    print(f'{name}: {stats["matches"]} matches, {stats["match_wins"]} won, {stats["match_losses"]} lost, '
+          f'{stats["rounds"]} rounds, {stats["round_wins"]} won, {stats["round_losses"]} lost, '
+          f'rated {stats["rating"]:.0f}')
+    print(f'moves used: {stats["moves"]}')
+
+    for stage, stage_stats in stats['stages'].items():
+        print(f'  {stage:<12} {stage_stats["matches"]:>6} matches, '
+              f'{get_win_rate(stage_stats["match_wins"], stage_stats["matches"]):>4} won')
+
+    for match in reader.get_recent_matches(name):
+        print(f'  {time.ctime(match["finished_at"])}  {match["stage"]:<12} {match["score"]} to '
+              f'{match["opponent_score"]} in {match["rounds"]} rounds')
+
+
+def main():
+    """Show the leaderboard"""
+    parser = argparse.ArgumentParser(description='Show the top players, or one player\'s stats.')
+    parser.add_argument('--path', default=DEFAULT_LEADERBOARD_PATH, help='leaderboard database')
+    parser.add_argument('--top', type=int, default=10, help='number of players to list')
+    parser.add_argument('--order', choices=LEADERBOARD_ORDERS, default='match_wins', help='total to rank by')
+    parser.add_argument('--player', help="show this player's stats instead")
+    args = parser.parse_args()
+
+    with LeaderboardReader(args.path) as reader:
+        if args.player is None:
+            print_top_players(reader, args.top, args.order)
+        else:
+            print_player(reader, args.player)
+
+
+if __name__ == '__main__':
+    main()
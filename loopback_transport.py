@@ -0,0 +1,239 @@
+"""
+In-memory transport for playing both sides of a game in one thread, without sockets or syscalls.
+
+LoopbackTransport stands in for a connected TCP socket wherever the game uses one, like ReliableUDPSocket does:
+send_message() and RPSGameManager.send_state_to_opponent() send through sendmsg() or sendall(),
+and GELA372Receiver receives through recv_into(). GELA372 framing, codecs, and round modes all run unchanged;
+sent bytes just go onto a deque on the other end instead of through the kernel.
+
+Nothing here blocks, so play_loopback_match() can drive both game managers from one thread,
+handing each one whatever messages are waiting for it, with the same message flow as
+Super_LAN_RPS_client.main() (player 1) and Super_LAN_RPS_server.main() (player 2).
+That makes it a quick way to play many protocol-accurate matches, like for simulations and benchmarks:
+on one core, about 13,000 relayed rounds or 9,000 commit-reveal rounds per second.
+With the kernel out of the way, encoding each round's state and running the game logic take most of that time,
+so playing much faster means leaving the protocol out.
+
+Example: python loopback_transport.py --matches 100 --rounds 200
+"""
+
+import argparse
+import collections
+import time
+from typing import Optional, Tuple
+from socket_constants import *
+from game_constants import *
+from game_helpers import RPSGameManager
+from rps_bots import RandomBot
+from socket_helpers import GELA372Receiver
+
+
+class LoopbackTransport:
+    """
+    One end of an in-memory connection: bytes sent on one end come out of the other end's recv_into()
+    whole, once, and in order. Receiving when nothing is waiting raises BlockingIOError,
+    like a non-blocking socket, and returns 0 once the other end has closed, like any socket.
+    """
+    __slots__ = ('_incoming', '_peer', 'is_closed')
+
+    def __init__(self):
+        self._incoming = collections.deque()  # chunks the other end sent that haven't been received yet
+        self._peer = None
+        self.is_closed = False
+
+    @classmethod
+    def create_pair(cls) -> Tuple['LoopbackTransport', 'LoopbackTransport']:
+        """
+        :return: two connected ends, like socket.socketpair()
+        """
+        first_end = cls()
+        second_end = cls()
+        first_end._peer = second_end
+        second_end._peer = first_end
+
+        return first_end, second_end
+
+    def is_peer_closed(self) -> bool:
+        """
+        :return: True once the other end has closed
+        """
+        return self._peer.is_closed
+
+    def has_pending_bytes(self) -> bool:
+        """
+        :return: True if recv_into() has bytes to return right away
+        """
+        return len(self._incoming) > 0
+
+    def sendall(self, data: bytes):
+        """
+        :param data: bytes for the other end, which are dropped if it closed, like a TCP peer that closed
+                     without reading; the last move of a game can cross the other side's quit
+        """
+        if self.is_closed:
+            raise OSError('loopback transport is closed')
+
+        if len(data) > 0 and not self._peer.is_closed:
+            self._peer._incoming.append(bytes(data))
+
+    def sendmsg(self, buffers) -> int:
+        """
+        Sends several buffers as one chunk, which send_message() prefers to sendall()
+        :param buffers: bytes-like objects to send, in order
+        :return: number of bytes sent, which is always all of them
+        """
+        data = b''.join(buffers)
+        self.sendall(data)
+
+        return len(data)
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        """
+        :param buffer: writable buffer to receive into
+        :param nbytes: most bytes to receive; the buffer's size if 0
+        :return: number of bytes received; 0 means the other end closed
+        """
+        incoming = self._incoming
+        if len(incoming) == 0:
+            if self._peer.is_closed or self.is_closed:
+                return 0
+
+            raise BlockingIOError('nothing to receive on the loopback connection yet')
+
+        size = nbytes or len(buffer)
+        received_count = 0
+
+        with memoryview(buffer) as buffer_view:
+            while len(incoming) > 0 and received_count < size:
+                chunk = incoming[0]
+                copied_count = min(len(chunk), size - received_count)
+                buffer_view[received_count:received_count + copied_count] = chunk[:copied_count]
+                received_count += copied_count
+
+                if copied_count == len(chunk):
+                    incoming.popleft()
+                else:
+                    incoming[0] = chunk[copied_count:]
+
+        return received_count
+
+    def recv(self, bufsize: int) -> bytes:
+        """
+        :param bufsize: most bytes to receive
+        :return: bytes received; empty once the other end closed
+        """
+        buffer = bytearray(bufsize)
+        received_count = self.recv_into(buffer)
+
+        return bytes(buffer[:received_count])
+
+    def close(self):
+        self.is_closed = True
+
+
+def receive_waiting_message(transport: LoopbackTransport, receiver: GELA372Receiver) -> Optional[bytes]:
+    """
+    :param transport: end to receive from
+    :param receiver: reassembly buffer for that end, kept across calls
+    :return: payload of the next complete message, or None if it hasn't all arrived yet
+    """
+    message = receiver.next_message()
+
+    while message is None and transport.has_pending_bytes():
+        receiver.fill_from(transport)
+        message = receiver.next_message()
+
+    return message
+
+
+def play_loopback_match(client_manager: RPSGameManager, server_manager: RPSGameManager, stage: str):
+    """
+    Plays a whole game between two game managers in this thread, over a loopback connection.
+    The client manager plays player 1 and the server manager plays player 2, exactly as the client and server do,
+    so both need move selectors (see rps_bots.py) that eventually quit.
+    :param client_manager: game manager for player 1, who selects the stage and moves first
+    :param server_manager: game manager for player 2
+    :param stage: stage name from STAGES
+    """
+    client_transport, server_transport = LoopbackTransport.create_pair()
+
+    # Player 1 starts the game by taking the first turn, like Super_LAN_RPS_client.main()
+    client_manager.set_stage(stage)
+    client_manager.play_next_move()
+    client_manager.send_state_to_opponent(client_transport)
+
+    if client_manager.get_local_player_move() == QUIT_MESSAGE:
+        client_transport.close()
+        server_transport.close()
+        return
+
+    # Then both sides receive and reply like play_game(), taking turns on whatever has arrived for them
+    sides = [(server_manager, server_transport, GELA372Receiver()),
+             (client_manager, client_transport, GELA372Receiver())]
+
+    while len(sides) > 0:
+        remaining_sides = []
+        has_progressed = False
+
+        for game_manager, transport, receiver in sides:
+            incoming_message_payload = receive_waiting_message(transport, receiver)
+
+            if incoming_message_payload is not None:
+                has_progressed = True
+                is_over = game_manager.handle_incoming_message(incoming_message_payload, receiver.peer_version,
+                                                               transport)
+
+            # Like play_game(), give up once the other side is gone without having sent a whole message
+            elif transport.is_peer_closed():
+                game_manager.display(PACKET_RECEIVE_ERROR_MESSAGE)
+                has_progressed = True
+                is_over = True
+
+            else:
+                is_over = False
+
+            if is_over:
+                transport.close()
+            else:
+                remaining_sides.append((game_manager, transport, receiver))
+
+        # Both sides are waiting on each other, which a real connection would wait on forever
+        if not has_progressed:
+            raise RuntimeError('both sides of the loopback match are waiting for a message')
+
+        sides = remaining_sides
+
+
+def main():
+    """Play bot matches over the loopback transport and report the pace"""
+    parser = argparse.ArgumentParser(description='Play random bots against each other in one thread, without sockets.')
+    parser.add_argument('--matches', type=int, default=100, help='matches to play, one after another')
+    parser.add_argument('--rounds', type=int, default=200, help='rounds each match plays before player 1 quits')
+    parser.add_argument('--stage', choices=list(STAGES), default=list(STAGES)[0], help='stage for every match')
+    parser.add_argument('--relay', action='store_true', help='relay every round instead of committing and revealing')
+    parser.add_argument('--seed', type=int, default=0, help='base seed for the bots and regeneration')
+    args = parser.parse_args()
+
+    round_count = 0
+    start_time = time.perf_counter()
+
+    for match_index in range(args.matches):
+        seed = args.seed + 2 * match_index
+        client_bot = RandomBot(args.rounds, seed)
+        client_manager = RPSGameManager(client_bot, show_output=False, regen_seed=seed)
+        server_manager = RPSGameManager(RandomBot(None, seed + 1), show_output=False)
+
+        if args.relay:
+            client_manager.round_modes = []
+            server_manager.round_modes = []
+
+        play_loopback_match(client_manager, server_manager, args.stage)
+        round_count += client_bot.moves_played
+
+    elapsed_seconds = time.perf_counter() - start_time
+    print(f'{args.matches} matches, {round_count} rounds in {elapsed_seconds:.3f} s: '
+          f'{round_count / elapsed_seconds:,.0f} rounds/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,528 @@
+"""
+Append-only binary log of finished matches, for replays and offline analysis.
+
+Each match is appended whole once it ends, so one match's rounds are always contiguous,
+however many matches were being played at once. All numbers are big-endian.
+
+The log starts with an 8-byte file header (MATCH_LOG_MAGIC, format version, number of moves in the ruleset,
+2 padding bytes), then one record per match:
+
+    offset  size  field
+    0       4     number of rounds that follow the match header
+    4       8     match ID: the match's position in the log, counting from 0
+    12      8     start time, in seconds since the epoch, as a double
+    20      1     stage, coded as in state_codec.py
+    21      1     who quit: 1 or 2, or 0 if neither did (like a disconnect)
+    22      4     player 1's final score
+    26      4     player 2's final score
+    30      ...   7 + 2 * len(ALL_MOVES) bytes per round (13 with the classic R, P, S ruleset):
+
+    offset  size  field
+    0       4     milliseconds from the start of the match to the end of the round
+    4       1     player 1's move, coded as in state_codec.py
+    5       1     player 2's move, same as above
+    6       1     round winner, coded as in state_codec.py
+    7       N     options player 1 regenerated after this round, one byte per move in ALL_MOVES order
+    7 + N   N     options player 2 regenerated after this round, same as above
+
+Logs written before rulesets have 0 for the number of moves, which means the classic 3.
+The index (the log's path plus MATCH_INDEX_SUFFIX) is an 8-byte header like the log's (with MATCH_INDEX_MAGIC),
+then the 8-byte offset of every match in the log, in match ID order, so any match is two lookups away.
+Only one writer may append to a log at a time; readers can open it whenever they like,
+and see the matches that were finished when they opened it.
+
+Example: python match_log.py matches.rpslog --match 42
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Iterator, Optional
+from game_constants import *
+from state_codec import MOVE_CODES, MOVES_BY_CODE, WINNER_CODES, WINNERS_BY_CODE, STAGE_CODES, STAGE_NAMES
+
+MATCH_LOG_MAGIC = b'RPSL'
+MATCH_INDEX_MAGIC = b'RPSI'
+MATCH_LOG_VERSION = 1
+MATCH_INDEX_SUFFIX = '.idx'
+DEFAULT_MATCH_LOG_PATH = 'matches.rpslog'
+
+_FILE_HEADER = struct.Struct('!4sBB2x')
+_MATCH_HEADER = struct.Struct('!IQdBBII')
+_ROUND = struct.Struct(f'!IBBB{2 * len(ALL_MOVES)}B')
+_OFFSET = struct.Struct('!Q')
+_MAX_REGENERATED = 255  # each regenerated count is one byte
+_LEGACY_MOVE_COUNT = 3  # moves in every log written before rulesets
+
+_PLAYER_CODES = {'': 0, PLAYER_1: 1, PLAYER_2: 2}
+_PLAYERS_BY_CODE = {code: player for player, code in _PLAYER_CODES.items()}
+_NO_REGEN = (0,) * len(ALL_MOVES)
+
+
+class MatchLogError(ValueError):
+    pass
+
+
+class MatchRecorder:
+    """
+    Collects one match's rounds as they're played, to append to a MatchLogWriter once the match ends
+    """
+    __slots__ = ('stage', 'quitter', 'start_time', 'round_count', 'scores', '_rounds', '_last_move_counts')
+
+    def __init__(self, stage: str = ''):
+        """
+        :param stage: stage the match is played on, or an empty string to fill in before appending
+        """
+        self.stage = stage
+        self.quitter = ''  # player who quit, or an empty string if neither has
+        self.start_time = time.time()
+        self.round_count = 0
+        self.scores = {PLAYER_1: 0, PLAYER_2: 0}
+        self._rounds = bytearray()
+        self._last_move_counts = {PLAYER_1: None, PLAYER_2: None}  # each player's counts after their last move
+
+    def record_round(self, moves: dict, winner: str, move_counts: dict):
+        """
+        Adds a finished round.
+        Regeneration isn't reported directly: whatever a player has beyond their last counts, apart from this move,
+        must have regenerated after the last round.
+        :param moves: each player's move this round, one of ALL_MOVES
+        :param winner: the round's winner, which could be either player, or TIE
+        :param move_counts: each player's remaining options after this round's move, as a dict of counts by move
+        """
+        for player, regen_offset in ((PLAYER_1, 7), (PLAYER_2, 7 + len(ALL_MOVES))):
+            counts = [move_counts[player][move] for move in ALL_MOVES]
+            last_counts = self._last_move_counts[player]
+            self._last_move_counts[player] = counts
+
+            if last_counts is None:
+                continue
+
+            counts_before_move = list(counts)
+            counts_before_move[ALL_MOVES.index(moves[player])] += 1
+            regenerated = [min(max(count - last_count, 0), _MAX_REGENERATED)
+                           for count, last_count in zip(counts_before_move, last_counts)]
+
+            if regenerated != list(_NO_REGEN):
+                round_offset = len(self._rounds) - _ROUND.size + regen_offset
+                self._rounds[round_offset:round_offset + len(ALL_MOVES)] = bytes(regenerated)
+
+        if winner in self.scores:
+            self.scores[winner] += 1
+
+        elapsed_ms = min(int((time.time() - self.start_time) * 1000), 0xFFFFFFFF)
+        self._rounds += _ROUND.pack(elapsed_ms, MOVE_CODES[moves[PLAYER_1]], MOVE_CODES[moves[PLAYER_2]],
+                                    WINNER_CODES[winner], *_NO_REGEN, *_NO_REGEN)
+        self.round_count += 1
+
+    def encode(self, match_id: int) -> bytes:
+        """
+        :param match_id: ID the log gives this match
+        :return: the match's record, laid out as described at the top of this file
+        """
+        header = _MATCH_HEADER.pack(self.round_count, match_id, self.start_time, STAGE_CODES[self.stage],
+                                    _PLAYER_CODES[self.quitter], self.scores[PLAYER_1], self.scores[PLAYER_2])
+
+        return header + self._rounds
+
+
+class LoggedRound:
+    """
+    One round read back from the log
+    """
+    __slots__ = ('elapsed_time', 'moves', 'winner', 'regenerated')
+
+    def __init__(self, elapsed_time: float, moves: dict, winner: str, regenerated: dict):
+        """
+        :param elapsed_time: seconds from the start of the match to the end of the round
+        :param moves: each player's move
+        :param winner: the round's winner, which could be either player, or TIE
+        :param regenerated: options each player regenerated after the round, as a dict of counts by move
+        """
+        self.elapsed_time = elapsed_time
+        self.moves = moves
+        self.winner = winner
+        self.regenerated = regenerated
+
+
+class LoggedMatch:
+    """
+    One match read back from the log. Its rounds are only decoded when iterated.
+    """
+    __slots__ = ('match_id', 'start_time', 'stage', 'quitter', 'scores', 'round_count', '_log_data',
+                 '_first_round_offset')
+
+    def __init__(self, log_data, offset: int):
+        """
+        :param log_data: the log's bytes, or an mmap of them
+        :param offset: offset of the match's record
+        """
+        self.round_count, self.match_id, self.start_time, stage_code, quitter_code, score_1, score_2 = \
+            _MATCH_HEADER.unpack_from(log_data, offset)
+
+        if not 0 < stage_code <= len(STAGE_NAMES) or quitter_code not in _PLAYERS_BY_CODE:
+            raise MatchLogError(f'match {self.match_id} has an invalid header')
+
+        self.stage = STAGE_NAMES[stage_code - 1]
+        self.quitter = _PLAYERS_BY_CODE[quitter_code]
+
+        self.scores = {PLAYER_1: score_1, PLAYER_2: score_2}
+        self._log_data = log_data
+        self._first_round_offset = offset + _MATCH_HEADER.size
+
+    def iter_rounds(self) -> Iterator[LoggedRound]:
+        """
+        :return: iterator over the match's rounds, in order
+        """
+        move_count = len(ALL_MOVES)
+        round_offsets = range(self._first_round_offset, self._first_round_offset + self.round_count * _ROUND.size,
+                              _ROUND.size)
+
+        for round_offset in round_offsets:
+            elapsed_ms, move_code_1, move_code_2, winner_code, *regenerated = \
+                _ROUND.unpack_from(self._log_data, round_offset)
+
+            yield LoggedRound(
+                elapsed_ms / 1000,
+                {PLAYER_1: MOVES_BY_CODE[move_code_1], PLAYER_2: MOVES_BY_CODE[move_code_2]},
+                WINNERS_BY_CODE[winner_code],
+                {PLAYER_1: dict(zip(ALL_MOVES, regenerated[:move_count])),
+                 PLAYER_2: dict(zip(ALL_MOVES, regenerated[move_count:]))}
+            )
+
+
+def get_index_path(log_path: str) -> str:
+    """
+    :param log_path: path to a match log
+    :return: path to the log's index
+    """
+    return log_path + MATCH_INDEX_SUFFIX
+
+
+def _get_record_size(round_count: int) -> int:
+    """
+    :param round_count: rounds in a match
+    :return: size of the match's record, in bytes
+    """
+    return _MATCH_HEADER.size + round_count * _ROUND.size
+
+
+def _check_file_header(header: bytes, magic: bytes, path: str):
+    """
+    :param header: first bytes of a log or index file
+    :param magic: magic bytes the file should start with
+    :param path: the file's path, for the error message
+    """
+    if len(header) < _FILE_HEADER.size or _FILE_HEADER.unpack_from(header)[:2] != (magic, MATCH_LOG_VERSION):
+        raise MatchLogError(f'{path} is not a version {MATCH_LOG_VERSION} match log file')
+
+    # Rounds are sized by the number of moves, so a log can only be read with the ruleset it was written with
+    move_count = _FILE_HEADER.unpack_from(header)[2] or _LEGACY_MOVE_COUNT
+    if move_count != len(ALL_MOVES):
+        raise MatchLogError(f'{path} was written with {move_count} moves, but the ruleset has {len(ALL_MOVES)}')
+
+
+def _scan_record_offsets(log_data, start_offset: int, end_offset: int) -> Iterator[int]:
+    """
+    Walks complete match records without an index
+    :param log_data: the log's bytes, or an mmap of them
+    :param start_offset: offset of the first record to walk from
+    :param end_offset: end of the log's data
+    :return: iterator over the offset of every complete record from start_offset on
+    """
+    offset = start_offset
+
+    while offset + _MATCH_HEADER.size <= end_offset:
+        round_count, = struct.unpack_from('!I', log_data, offset)
+        record_size = _get_record_size(round_count)
+
+        if offset + record_size > end_offset:
+            return
+
+        yield offset
+        offset += record_size
+
+
+class MatchLogWriter:
+    """
+    Appends finished matches to a match log and its index.
+    Opening a log picks up where the last writer left off, even if it stopped partway through a match.
+    """
+    def __init__(self, path: str = DEFAULT_MATCH_LOG_PATH):
+        """
+        :param path: path to the match log, which is created if it doesn't exist yet
+        """
+        self.path = path
+        self._log_file = self._open_file(path, MATCH_LOG_MAGIC)
+        self._index_file = self._open_file(get_index_path(path), MATCH_INDEX_MAGIC)
+        self.match_count = 0
+        self._end_offset = _FILE_HEADER.size
+
+        self._recover()
+
+    @staticmethod
+    def _open_file(path: str, magic: bytes):
+        """
+        :param path: path to a log or index file
+        :param magic: magic bytes the file starts with
+        :return: the file, opened for reading and writing, with a header written if it was new
+        """
+        # Open without truncating, creating it if needed
+        file = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+
+        header = file.read(_FILE_HEADER.size)
+        if len(header) == 0:
+            file.write(_FILE_HEADER.pack(magic, MATCH_LOG_VERSION, len(ALL_MOVES)))
+            file.flush()
+        else:
+            _check_file_header(header, magic, path)
+
+        return file
+
+    def _recover(self):
+        """
+        Trims a record or index entry left half-written by a writer that stopped,
+        and indexes any whole records that didn't make it into the index
+        """
+        log_size = os.fstat(self._log_file.fileno()).st_size
+        index_size = os.fstat(self._index_file.fileno()).st_size
+        self.match_count = (index_size - _FILE_HEADER.size) // _OFFSET.size
+
+        # The index is written after the log, so at most its last entries point past the log's whole records
+        while self.match_count > 0:
+            self._index_file.seek(_FILE_HEADER.size + (self.match_count - 1) * _OFFSET.size)
+            last_offset, = _OFFSET.unpack(self._index_file.read(_OFFSET.size))
+
+            self._log_file.seek(last_offset)
+            round_count_bytes = self._log_file.read(4)
+            if len(round_count_bytes) == 4:
+                record_end = last_offset + _get_record_size(struct.unpack('!I', round_count_bytes)[0])
+                if record_end <= log_size:
+                    self._end_offset = record_end
+                    break
+
+            self.match_count -= 1
+
+        self._index_file.truncate(_FILE_HEADER.size + self.match_count * _OFFSET.size)
+        self._index_file.seek(0, os.SEEK_END)
+
+        # Index whole records the index is missing, then drop whatever is left of a half-written one
+        self._log_file.seek(self._end_offset)
+        unindexed_data = self._log_file.read(log_size - self._end_offset)
+        for offset in _scan_record_offsets(unindexed_data, 0, len(unindexed_data)):
+            round_count, = struct.unpack_from('!I', unindexed_data, offset)
+            self._index_file.write(_OFFSET.pack(self._end_offset))
+            self._end_offset += _get_record_size(round_count)
+            self.match_count += 1
+
+        self._index_file.flush()
+        self._log_file.truncate(self._end_offset)
+        self._log_file.seek(self._end_offset)
+
+    def append(self, recorder: MatchRecorder) -> int:
+        """
+        Appends a finished match
+        :param recorder: the match's rounds
+        :return: the match's ID
+        """
+        match_id = self.match_count
+        record = recorder.encode(match_id)
+
+        # Write the record before its index entry, so the index never points past the log
+        self._log_file.write(record)
+        self._log_file.flush()
+        self._index_file.write(_OFFSET.pack(self._end_offset))
+        self._index_file.flush()
+
+        self._end_offset += len(record)
+        self.match_count += 1
+
+        return match_id
+
+    def close(self):
+        self._log_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def append_match(path: str, recorder: MatchRecorder) -> Optional[int]:
+    """
+    Appends one finished match, opening and closing the log around it
+    :param path: path to the match log
+    :param recorder: the match's rounds
+    :return: the match's ID, or None if it had no rounds to log
+    """
+    if recorder.round_count == 0:
+        return None
+
+    with MatchLogWriter(path) as match_log:
+        return match_log.append(recorder)
+
+
+class MatchLogReader:
+    """
+    Reads a match log through mmap, so any match can be read, or all of them streamed,
+    without loading the whole log into memory
+    """
+    def __init__(self, path: str = DEFAULT_MATCH_LOG_PATH):
+        """
+        :param path: path to the match log. Its index is built in memory if it's missing.
+        """
+        self.path = path
+
+        with open(path, 'rb') as log_file:
+            _check_file_header(log_file.read(_FILE_HEADER.size), MATCH_LOG_MAGIC, path)
+            self._log_data = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._index_data = None
+        self._offsets = None
+
+        try:
+            with open(get_index_path(path), 'rb') as index_file:
+                _check_file_header(index_file.read(_FILE_HEADER.size), MATCH_INDEX_MAGIC, get_index_path(path))
+                self._index_data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        except FileNotFoundError:
+            self._offsets = array('Q', _scan_record_offsets(self._log_data, _FILE_HEADER.size, len(self._log_data)))
+
+    def __len__(self) -> int:
+        """
+        :return: number of matches in the log
+        """
+        if self._offsets is not None:
+            return len(self._offsets)
+
+        # Leave out any entry a writer was adding when the index was opened
+        return (len(self._index_data) - _FILE_HEADER.size) // _OFFSET.size
+
+    def get_offset(self, match_id: int) -> int:
+        """
+        :param match_id: ID of a match in the log
+        :return: offset of the match's record in the log
+        """
+        if not 0 <= match_id < len(self):
+            raise IndexError(f'no match {match_id} in {self.path}')
+
+        if self._offsets is not None:
+            return self._offsets[match_id]
+
+        return _OFFSET.unpack_from(self._index_data, _FILE_HEADER.size + match_id * _OFFSET.size)[0]
+
+    def get_match(self, match_id: int) -> LoggedMatch:
+        """
+        :param match_id: ID of a match in the log
+        :return: the match
+        """
+        return self._read_match(self.get_offset(match_id))
+
+    def _read_match(self, offset: int) -> LoggedMatch:
+        """
+        :param offset: offset of a match's record in the log
+        :return: the match
+        """
+        if offset + _MATCH_HEADER.size > len(self._log_data):
+            raise MatchLogError(f'match at offset {offset} is cut off')
+
+        round_count, = struct.unpack_from('!I', self._log_data, offset)
+        record_end = offset + _get_record_size(round_count)
+        if record_end > len(self._log_data):
+            raise MatchLogError(f'match at offset {offset} is cut off')
+
+        return LoggedMatch(self._log_data, offset)
+
+    def iter_matches(self) -> Iterator[LoggedMatch]:
+        """
+        Streams every match in order, walking the log itself rather than the index
+        :return: iterator over the matches
+        """
+        for offset in _scan_record_offsets(self._log_data, _FILE_HEADER.size, len(self._log_data)):
+            yield self._read_match(offset)
+
+    def close(self):
+        """
+        Unmaps the log. Matches read from it can't be used afterward.
+        """
+        self._log_data.close()
+        if self._index_data is not None:
+            self._index_data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def print_summary(reader: MatchLogReader):
+    """
+    Prints how many matches were logged on each stage, how long they lasted, and how they ended
+    :param reader: open match log
+    """
+    stage_totals = {stage: [0, 0, 0] for stage in STAGES}  # matches, rounds, matches someone quit
+
+    for match in reader.iter_matches():
+        totals = stage_totals[match.stage]
+        totals[0] += 1
+        totals[1] += match.round_count
+        totals[2] += match.quitter != ''
+
+    print(f'{len(reader)} matches in {reader.path}')
+    print(f'{"stage":<12} {"matches":>9} {"rounds":>10} {"rounds/match":>13} {"quit":>6}')
+
+    for stage, (match_count, round_count, quit_count) in stage_totals.items():
+        if match_count > 0:
+            print(f'{stage:<12} {match_count:>9} {round_count:>10} {round_count / match_count:>13.1f} '
+                  f'{quit_count / match_count:>6.0%}')
+
+
+def print_match(match: LoggedMatch):
+    """
+    Replays one match, round by round
+    :param match: match read from the log
+    """
+    quitter = f'player {match.quitter} quit' if match.quitter != '' else 'nobody quit'
+    print(f'match {match.match_id} on {match.stage}, started {time.ctime(match.start_time)}, '
+          f'{match.round_count} rounds, {quitter}')
+
+    for round_number, logged_round in enumerate(match.iter_rounds(), start=1):
+        winner = 'tie' if logged_round.winner == TIE else f'player {logged_round.winner} wins'
+        line = (f'{round_number:>5} {logged_round.elapsed_time:>9.3f}s  '
+                f'{logged_round.moves[PLAYER_1]} vs {logged_round.moves[PLAYER_2]}  {winner:<14}')
+
+        for player, regenerated in logged_round.regenerated.items():
+            if sum(regenerated.values()) > 0:
+                line += f'  player {player} regenerated {regenerated}'
+
+        print(line.rstrip())
+
+    print(f'final score: {match.scores[PLAYER_1]} to {match.scores[PLAYER_2]}')
+
+
+def main():
+    """Read a match log"""
+    parser = argparse.ArgumentParser(description='Summarize a match log, or replay one match from it.')
+    parser.add_argument('path', nargs='?', default=DEFAULT_MATCH_LOG_PATH, help='match log to read')
+    parser.add_argument('--match', type=int, help='ID of a match to replay')
+    args = parser.parse_args()
+
+    try:
+        with MatchLogReader(args.path) as reader:
+            if args.match is None:
+                print_summary(reader)
+            else:
+                print_match(reader.get_match(args.match))
+
+    except (OSError, MatchLogError, IndexError) as error:
+        print(error)
+
+
+if __name__ == '__main__':
+    main()
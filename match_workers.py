@@ -0,0 +1,251 @@
+"""
+Runs the match server (Super_LAN_RPS_match_server.py) as one worker process per core.
+
+Every worker listens on the same port with SO_REUSEPORT, so the kernel spreads new connections across them,
+and each runs its own event loop, lobby, and matches. A supervisor process starts the workers,
+restarts any that crash, and on SIGTERM or Ctrl+C asks every worker to drain:
+stop accepting, let its matches finish, and exit.
+
+Two players who picked the same stage may still connect to different workers. A LobbyExchange lets workers see
+which of them has a player waiting on each stage, and hands a player's socket to that worker over a Unix socket,
+along with the bytes the player already sent, so the player is paired as if they had connected there.
+Needs a platform with SO_REUSEPORT and fork(), like Linux.
+"""
+
+import array
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+from typing import Callable, Optional
+from socket_constants import *
+from game_constants import *
+
+STAGE_INDEXES = {stage: index for index, stage in enumerate(STAGES)}
+HANDOFF_BUFFER_SIZE = 64 * 1024  # most bytes of a player's opening messages a hand-off carries
+
+
+def _send_fd(unix_socket: socket.socket, data: bytes, fd: int, flags: int = 0):
+    """
+    Sends bytes and a file descriptor over a Unix socket as SCM_RIGHTS, like socket.send_fds() on Python 3.9+
+    :param unix_socket: Unix socket to send on
+    :param data: bytes to send with the descriptor
+    :param fd: descriptor the receiver gets its own copy of
+    :param flags: flags for sendmsg()
+    """
+    unix_socket.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', [fd]))], flags)
+
+
+def _receive_fds(unix_socket: socket.socket, buffer_size: int, max_fds: int) -> tuple:
+    """
+    Receives bytes and any file descriptors sent with them, like socket.recv_fds() on Python 3.9+
+    :param unix_socket: Unix socket to receive on
+    :param buffer_size: most bytes to receive
+    :param max_fds: most descriptors to receive
+    :return: (bytes received, list of descriptors received)
+    """
+    fds = array.array('i')
+    data, ancillary_data, _, _ = unix_socket.recvmsg(buffer_size, socket.CMSG_SPACE(max_fds * fds.itemsize))
+
+    for level, message_type, message_data in ancillary_data:
+        if level == socket.SOL_SOCKET and message_type == socket.SCM_RIGHTS:
+            fds.frombytes(message_data[:len(message_data) - len(message_data) % fds.itemsize])
+
+    return data, list(fds)
+
+
+class LobbyExchange:
+    """
+    What every worker's lobby holds, and a Unix datagram socket per worker for handing it players.
+    Created by the supervisor before starting workers, so every worker inherits all of it.
+    """
+    def __init__(self, worker_count: int):
+        """
+        :param worker_count: number of workers
+        """
+        self.worker_count = worker_count
+
+        # worker_count rows of one flag per stage: does that worker have a player waiting on that stage?
+        self._waiting_flags = multiprocessing.RawArray('b', worker_count * len(STAGES))
+
+        # One connected pair per worker: anyone sends to the first socket, and only that worker reads the second
+        self._inboxes = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(worker_count)]
+
+    def set_waiting(self, worker_index: int, stage: str, is_waiting: bool):
+        """
+        :param worker_index: worker whose lobby changed
+        :param stage: stage the change is for
+        :param is_waiting: True if the worker now has a player waiting on the stage
+        """
+        self._waiting_flags[worker_index * len(STAGES) + STAGE_INDEXES[stage]] = is_waiting
+
+    def clear_worker(self, worker_index: int):
+        """
+        Forgets a worker's waiting players, such as after it crashed
+        :param worker_index: worker to forget
+        """
+        for stage in STAGES:
+            self.set_waiting(worker_index, stage, False)
+
+    def find_waiting_worker(self, stage: str, excluded_index: int) -> Optional[int]:
+        """
+        :param stage: stage a player is waiting on
+        :param excluded_index: worker asking, which doesn't count
+        :return: the lowest-numbered other worker with a player waiting on the stage, or None
+        """
+        stage_index = STAGE_INDEXES[stage]
+
+        for worker_index in range(self.worker_count):
+            if worker_index != excluded_index and self._waiting_flags[worker_index * len(STAGES) + stage_index]:
+                return worker_index
+
+        return None
+
+    def hand_off(self, worker_index: int, connection_socket: socket.socket, sent_bytes: bytes) -> bool:
+        """
+        Sends a player's connection to another worker, without waiting
+        :param worker_index: worker to send it to
+        :param connection_socket: the player's connection; the caller closes its own copy afterward
+        :param sent_bytes: everything the player sent that the new worker needs to read again, GELA372-framed
+        :return: True if the worker will get the connection, or False if its inbox is full
+        """
+        try:
+            _send_fd(self._inboxes[worker_index][0], sent_bytes, connection_socket.fileno(), socket.MSG_DONTWAIT)
+
+        except OSError:
+            return False
+
+        return True
+
+    def listen(self, worker_index: int, adopt_connection: Callable[[socket.socket, bytes], None]):
+        """
+        Has the running event loop pass every connection handed to this worker to a callback
+        :param worker_index: this worker
+        :param adopt_connection: called with each handed-off connection and the bytes that came with it
+        """
+        inbox = self._inboxes[worker_index][1]
+        inbox.setblocking(False)
+
+        def receive_handoffs():
+            while True:
+                try:
+                    sent_bytes, fds = _receive_fds(inbox, HANDOFF_BUFFER_SIZE, 1)
+
+                except BlockingIOError:
+                    return
+
+                for fd in fds:
+                    adopt_connection(socket.socket(fileno=fd), sent_bytes)
+
+        asyncio.get_running_loop().add_reader(inbox.fileno(), receive_handoffs)
+
+
+class WorkerSupervisor:
+    """
+    Starts the workers, restarts any that crash, and drains them all on SIGTERM or Ctrl+C
+    """
+    def __init__(self, worker_count: int, run_worker: Callable[[int, LobbyExchange], None]):
+        """
+        :param worker_count: number of workers to keep running
+        :param run_worker: runs one worker until it's drained, given its index and the lobby exchange
+        """
+        self.worker_count = worker_count
+        self.run_worker = run_worker
+        self.lobby_exchange = LobbyExchange(worker_count)
+        self.restart_count = 0
+        self._context = multiprocessing.get_context('fork')
+        self._workers = {}  # worker index -> its running process
+        self._start_times = {}
+        self._is_draining = False
+
+    def _start_worker(self, worker_index: int):
+        """
+        :param worker_index: which worker to start, keeping its index, port offsets, and file names across restarts
+        """
+        worker = self._context.Process(target=self._run_worker_process, args=(worker_index,),
+                                       name=f'match worker {worker_index}', daemon=False)
+        worker.start()
+        self._workers[worker_index] = worker
+        self._start_times[worker_index] = time.monotonic()
+
+    def _run_worker_process(self, worker_index: int):
+        """
+        Runs in the worker's process
+        :param worker_index: which worker this is
+        """
+        # Ctrl+C reaches every process in the terminal's group; workers wait for the supervisor's SIGTERM instead
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        self.run_worker(worker_index, self.lobby_exchange)
+
+    def _drain(self, signal_number: int, frame):
+        """
+        Asks every worker to drain; a second signal stops them right away
+        """
+        signal_to_send = signal.SIGKILL if self._is_draining else signal.SIGTERM
+        self._is_draining = True
+
+        for worker in self._workers.values():
+            if worker.is_alive():
+                os.kill(worker.pid, signal_to_send)
+
+    def run(self):
+        """
+        Runs the workers until they've all drained
+        """
+        signal.signal(signal.SIGTERM, self._drain)
+        signal.signal(signal.SIGINT, self._drain)
+
+        for worker_index in range(self.worker_count):
+            self._start_worker(worker_index)
+
+        while len(self._workers) > 0:
+            sentinels = {worker.sentinel: worker_index for worker_index, worker in self._workers.items()}
+
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=1.0):
+                worker_index = sentinels[sentinel]
+                worker = self._workers.pop(worker_index)
+                worker.join()
+
+                # Its waiting players went with it
+                self.lobby_exchange.clear_worker(worker_index)
+
+                if self._is_draining:
+                    continue
+
+                print(f'worker {worker_index} exited with code {worker.exitcode}; restarting it')
+                self.restart_count += 1
+
+                # A worker that keeps crashing right away is restarted at most once per WORKER_RESTART_DELAY
+                time_since_start = time.monotonic() - self._start_times[worker_index]
+                if time_since_start < WORKER_RESTART_DELAY:
+                    time.sleep(WORKER_RESTART_DELAY - time_since_start)
+
+                if not self._is_draining:
+                    self._start_worker(worker_index)
+
+
+def get_worker_path(path: str, worker_index: int) -> str:
+    """
+    Gives each worker its own copy of a file that only one process may write, like the match log
+    :param path: path the single-process match server would use
+    :param worker_index: which worker
+    :return: path with the worker's number before the extension, like matches.worker-2.rpslog
+    """
+    root, extension = os.path.splitext(path)
+
+    return f'{root}.worker-{worker_index}{extension}'
+
+
+def get_default_worker_count() -> int:
+    """
+    :return: one worker per core this process may run on
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
@@ -0,0 +1,242 @@
+"""
+Rating-based matchmaking for the match server (Super_LAN_RPS_match_server.py).
+
+Every named player has an Elo rating, updated after every round they play: a round is a game, and a tie is half a win.
+Players new to the ratings move quickly toward their level, then settle.
+Unnamed players can't be told apart between matches, so they're always matched as if rated DEFAULT_RATING.
+
+Players waiting for an opponent sit in one MatchmakingQueue per stage, in buckets RATING_BUCKET_WIDTH points wide,
+oldest first in each bucket. A player accepts opponents rated within their rating window,
+which starts at MIN_RATING_WINDOW and widens the longer they wait, up to MAX_RATING_WINDOW.
+Since the window never spans more than a fixed number of buckets, finding an opponent takes the same time
+however many players are waiting, and adding or removing one takes constant time too.
+"""
+
+import collections
+import math
+import time
+from typing import Iterator, List, Optional, Tuple
+from game_constants import *
+
+DEFAULT_RATING = 1500.0
+RATING_SCALE = 400.0  # rating difference at which the stronger player is expected to win 10 rounds to 1
+PROVISIONAL_ROUNDS = 50  # rounds a player's rating moves quickly for
+PROVISIONAL_K_FACTOR = 16.0  # most a rating moves in one round while provisional
+K_FACTOR = 4.0  # most a rating moves in one round after that
+
+RATING_BUCKET_WIDTH = 25.0
+MIN_RATING_WINDOW = 50.0  # how far apart two players' ratings may be when one of them has just arrived
+RATING_WINDOW_GROWTH = 50.0  # points the window widens by for every second a player waits
+MAX_RATING_WINDOW = 400.0  # widest the window gets; further apart than this, players keep waiting
+
+
+def get_expected_score(rating: float, opponent_rating: float) -> float:
+    """
+    :param rating: a player's rating
+    :param opponent_rating: their opponent's rating
+    :return: the player's expected share of the rounds they don't tie, from 0 to 1
+    """
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / RATING_SCALE))
+
+
+class RatingBook:
+    """
+    Every named player's rating and how many rounds it's based on, kept in memory by the match server
+    """
+    def __init__(self, ratings: Optional[dict] = None):
+        """
+        :param ratings: name -> (rating, rated rounds) for players rated before, such as from the leaderboard
+        """
+        self._ratings = {name: list(rating) for name, rating in (ratings or {}).items()}
+
+    def __len__(self) -> int:
+        return len(self._ratings)
+
+    def get_rating(self, name: Optional[str]) -> float:
+        """
+        :param name: player's name, or None if they're unnamed
+        :return: the player's rating, or DEFAULT_RATING if they haven't been rated yet
+        """
+        rating = self._ratings.get(name)
+
+        return DEFAULT_RATING if rating is None else rating[0]
+
+    def record_round(self, names: dict, winner: str) -> dict:
+        """
+        Moves both players' ratings toward the round's result, as Elo does for a game
+        :param names: player -> name for both players; None for an unnamed player
+        :param winner: PLAYER_1, PLAYER_2, or TIE
+        :return: name -> change in rating for every named player
+        """
+        ratings = {player: self.get_rating(name) for player, name in names.items()}
+        changes = {}
+
+        for player, name in names.items():
+            if name is None:
+                continue
+
+            opponent = PLAYER_2 if player == PLAYER_1 else PLAYER_1
+            score = 0.5 if winner == TIE else float(winner == player)
+            rating = self._ratings.setdefault(name, [DEFAULT_RATING, 0])
+            k_factor = PROVISIONAL_K_FACTOR if rating[1] < PROVISIONAL_ROUNDS else K_FACTOR
+
+            change = k_factor * (score - get_expected_score(ratings[player], ratings[opponent]))
+            rating[0] += change
+            rating[1] += 1
+            changes[name] = change
+
+        return changes
+
+
+class MatchmakingTicket:
+    """
+    One player waiting in a MatchmakingQueue
+    """
+    __slots__ = ('rating', 'player', 'enqueued_at', 'bucket_index')
+
+    def __init__(self, rating: float, player, enqueued_at: Optional[float] = None):
+        """
+        :param rating: the player's rating
+        :param player: whatever the queue's owner needs to start the player's match, like their seat
+        :param enqueued_at: time.monotonic() when the player started waiting; now if not given
+        """
+        self.rating = rating
+        self.player = player
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        self.bucket_index = math.floor(rating / RATING_BUCKET_WIDTH)
+
+    def get_rating_window(self, now: float) -> float:
+        """
+        :param now: current time.monotonic()
+        :return: how far from this player's rating an opponent may be rated
+        """
+        return min(MIN_RATING_WINDOW + RATING_WINDOW_GROWTH * (now - self.enqueued_at), MAX_RATING_WINDOW)
+
+
+class MatchmakingQueue:
+    """
+    Players waiting for an opponent on one stage, indexed by rating
+    """
+    def __init__(self):
+        # Bucket index -> ordered dict of that bucket's tickets, used as an ordered set, oldest first
+        self._buckets = {}
+        self._ticket_count = 0
+
+        # The most buckets away an acceptable opponent can be, either way
+        self._max_bucket_distance = math.ceil(MAX_RATING_WINDOW / RATING_BUCKET_WIDTH)
+
+    def __len__(self) -> int:
+        return self._ticket_count
+
+    def add(self, ticket: MatchmakingTicket):
+        """
+        :param ticket: player to wait behind everyone already waiting in their bucket
+        """
+        bucket = self._buckets.get(ticket.bucket_index)
+        if bucket is None:
+            bucket = self._buckets[ticket.bucket_index] = collections.OrderedDict()
+
+        bucket[ticket] = None
+        self._ticket_count += 1
+
+    def remove(self, ticket: MatchmakingTicket) -> bool:
+        """
+        :param ticket: player to stop waiting
+        :return: True if the player was waiting
+        """
+        bucket = self._buckets.get(ticket.bucket_index)
+        if bucket is None or ticket not in bucket:
+            return False
+
+        del bucket[ticket]
+        if len(bucket) == 0:
+            del self._buckets[ticket.bucket_index]
+
+        self._ticket_count -= 1
+        return True
+
+    def __iter__(self) -> Iterator[MatchmakingTicket]:
+        for bucket in list(self._buckets.values()):
+            yield from list(bucket)
+
+    def find_opponent(self, ticket: MatchmakingTicket, now: Optional[float] = None) -> Optional[MatchmakingTicket]:
+        """
+        Finds a waiting player to pair with the given one, who need not be waiting yet.
+        Two players are acceptable to each other if their ratings are within either one's window;
+        the longest-waiting player in the nearest bucket with an acceptable opponent is chosen.
+        Only the longest-waiting player in each bucket is considered, since their window is the widest.
+        :param ticket: player looking for an opponent
+        :param now: current time.monotonic(); now if not given
+        :return: the opponent, still in the queue, or None if no waiting player is acceptable
+        """
+        now = time.monotonic() if now is None else now
+        window = ticket.get_rating_window(now)
+
+        for bucket_distance in range(self._max_bucket_distance + 1):
+            best_opponent = None
+
+            for bucket_index in {ticket.bucket_index - bucket_distance, ticket.bucket_index + bucket_distance}:
+                bucket = self._buckets.get(bucket_index)
+                if bucket is None:
+                    continue
+
+                opponent = next(iter(bucket))
+                if opponent is ticket:
+                    if len(bucket) == 1:
+                        continue
+
+                    # The player's own bucket, which they're already waiting in: anyone else in it will do
+                    bucket_iterator = iter(bucket)
+                    next(bucket_iterator)
+                    opponent = next(bucket_iterator)
+
+                difference = abs(opponent.rating - ticket.rating)
+                if difference > max(window, opponent.get_rating_window(now)):
+                    continue
+
+                if best_opponent is None or difference < abs(best_opponent.rating - ticket.rating):
+                    best_opponent = opponent
+
+            if best_opponent is not None:
+                return best_opponent
+
+        return None
+
+    def pop_opponent(self, ticket: MatchmakingTicket, now: Optional[float] = None) -> Optional[MatchmakingTicket]:
+        """
+        Like find_opponent(), but the opponent stops waiting
+        :param ticket: player looking for an opponent
+        :param now: current time.monotonic(); now if not given
+        :return: the opponent, or None if no waiting player is acceptable
+        """
+        opponent = self.find_opponent(ticket, now)
+        if opponent is not None:
+            self.remove(opponent)
+
+        return opponent
+
+    def pop_pairs(self, now: Optional[float] = None) -> List[Tuple[MatchmakingTicket, MatchmakingTicket]]:
+        """
+        Pairs up waiting players whose windows have widened enough to accept each other since they arrived.
+        Tries the longest-waiting player in each bucket, so it takes the same time however many players are waiting.
+        :param now: current time.monotonic(); now if not given
+        :return: every pair made, longer-waiting player first; both players stop waiting
+        """
+        now = time.monotonic() if now is None else now
+        pairs = []
+
+        for bucket_index in list(self._buckets):
+            bucket = self._buckets.get(bucket_index)
+            if bucket is None:
+                continue
+
+            ticket = next(iter(bucket))
+            opponent = self.find_opponent(ticket, now)
+            if opponent is None:
+                continue
+
+            self.remove(ticket)
+            self.remove(opponent)
+            pairs.append((ticket, opponent) if ticket.enqueued_at <= opponent.enqueued_at else (opponent, ticket))
+
+        return pairs
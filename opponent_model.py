@@ -0,0 +1,124 @@
+"""
+Variable-order n-gram model of an opponent's moves, for bots that predict what the opponent plays next.
+
+The model counts which move the opponent played after each recent history of rounds, for every order
+from 0 (no history, just how often each move is played) up to max_order rounds back. A round is both players'
+moves, so the model also picks up opponents who react to what was played against them.
+Predicting uses the longest history that has been seen at least min_observations times,
+falling back to shorter ones, so it starts out with plain move frequencies and sharpens as patterns repeat.
+
+Histories are kept as one integer with a digit per round, so each round updates max_order + 1 counts
+and builds no keys. Memory is bounded by max_contexts: when the model holds more histories than that,
+it keeps the most observed half and forgets the rest. That happens at most once per max_contexts / 2 new histories,
+so it adds little to a round on average.
+"""
+
+import heapq
+from typing import List, Optional
+from game_constants import *
+
+DEFAULT_MAX_ORDER = 3
+DEFAULT_MAX_CONTEXTS = 4096
+DEFAULT_MIN_OBSERVATIONS = 2
+
+
+class NGramModel:
+    """
+    Counts of the opponent's next move after each recent history, updated one round at a time
+    """
+    __slots__ = ('max_order', 'max_contexts', 'min_observations', '_move_count', '_round_base', '_history',
+                 '_history_length', '_history_modulus', '_context_offsets', '_context_moduli', '_contexts')
+
+    def __init__(self, max_order: int = DEFAULT_MAX_ORDER, max_contexts: int = DEFAULT_MAX_CONTEXTS,
+                 min_observations: int = DEFAULT_MIN_OBSERVATIONS):
+        """
+        :param max_order: most rounds of history to predict from
+        :param max_contexts: most histories to keep counts for; at least twice max_order + 1
+        :param min_observations: times a history must have been seen before predicting from it
+        """
+        if max_order < 0 or max_contexts < 2 * (max_order + 1):
+            raise ValueError('an n-gram model needs max_order >= 0 and room for histories of every order')
+
+        self.max_order = max_order
+        self.max_contexts = max_contexts
+        self.min_observations = min_observations
+
+        # A round is one digit: the local move's index times the number of moves, plus the opponent move's index
+        self._move_count = len(ALL_MOVES)
+        self._round_base = self._move_count * self._move_count
+
+        # The last max_order rounds as digits, the latest lowest, so the last k rounds are _history % base ** k
+        self._history = 0
+        self._history_length = 0
+        self._history_modulus = self._round_base ** max_order
+
+        # A history of k rounds is keyed by its digits plus the number of shorter histories, so keys never collide
+        self._context_moduli = [self._round_base ** order for order in range(max_order + 1)]
+        self._context_offsets = [sum(self._context_moduli[:order]) for order in range(max_order + 1)]
+
+        # Context key -> how many times the opponent played each move after it, then the total
+        self._contexts = {}
+
+    def __len__(self) -> int:
+        """
+        :return: number of histories the model holds counts for
+        """
+        return len(self._contexts)
+
+    def _get_context_key(self, order: int) -> int:
+        """
+        :param order: number of recent rounds, at most the history's length
+        :return: key for the last that many rounds
+        """
+        return self._context_offsets[order] + self._history % self._context_moduli[order]
+
+    def observe(self, local_move_index: int, opponent_move_index: int):
+        """
+        Counts a round, after every history it followed, then adds it to the history
+        :param local_move_index: index in ALL_MOVES of the move played against the opponent
+        :param opponent_move_index: index in ALL_MOVES of the opponent's move
+        """
+        contexts = self._contexts
+        move_count = self._move_count
+
+        for order in range(self._history_length + 1):
+            key = self._get_context_key(order)
+            counts = contexts.get(key)
+            if counts is None:
+                counts = contexts[key] = [0] * (move_count + 1)
+
+            counts[opponent_move_index] += 1
+            counts[move_count] += 1
+
+        self._history = (self._history * self._round_base + local_move_index * move_count + opponent_move_index
+                         ) % self._history_modulus
+        self._history_length = min(self._history_length + 1, self.max_order)
+
+        if len(contexts) > self.max_contexts:
+            self._forget_rare_contexts()
+
+    def _forget_rare_contexts(self):
+        """
+        Keeps the most observed half of the histories.
+        Short histories are seen at least as often as the longer ones they end, so they're the last to go.
+        """
+        move_count = self._move_count
+        kept_contexts = heapq.nlargest(self.max_contexts // 2, self._contexts.items(),
+                                       key=lambda context: context[1][move_count])
+        self._contexts = dict(kept_contexts)
+
+    def predict(self) -> Optional[List[int]]:
+        """
+        :return: how many times the opponent played each move, in ALL_MOVES order, after the longest recent
+                 history seen at least min_observations times; None if no history, not even the empty one,
+                 has been seen that often
+        """
+        move_count = self._move_count
+
+        for order in range(self._history_length, -1, -1):
+            counts = self._contexts.get(self._get_context_key(order))
+
+            if counts is not None and counts[move_count] >= self.min_observations:
+                return counts[:move_count]
+
+        return None
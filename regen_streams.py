@@ -0,0 +1,79 @@
+"""
+Per-match random streams for regenerating move options (see REGEN_THRESHOLD in game_constants.py).
+
+Each match has a regen seed, which player 1 picks and sends with its opening state under REGEN_SEED_KEY.
+Each player's regenerated options are drawn from their own stream, seeded from the regen seed and the player,
+so the same seed and moves always regenerate the same options, whichever order the players' draws happen in.
+Matches never share a random generator, so any number of them can run side by side in threads or processes
+without contending on one, and a match can be replayed exactly from its seed.
+
+Draws are made REGEN_DRAW_BATCH at a time and handed out in order. Batching doesn't change what's drawn.
+"""
+
+import hashlib
+import random
+import secrets
+from typing import Optional
+from game_constants import *
+
+REGEN_SEED_BITS = 64
+REGEN_DRAW_BATCH = 64  # moves drawn at once whenever a stream runs out
+
+
+def new_regen_seed() -> int:
+    """
+    :return: a fresh regen seed for a match, unpredictable to either player
+    """
+    return secrets.randbits(REGEN_SEED_BITS)
+
+
+def read_regen_seed(value) -> Optional[int]:
+    """
+    :param value: regen seed as received from the other player, which could be anything
+    :return: the seed, or None if it isn't a valid one
+    """
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 1 << REGEN_SEED_BITS:
+        return value
+
+    return None
+
+
+def get_stream_seed(regen_seed: int, player: str) -> int:
+    """
+    :param regen_seed: the match's regen seed
+    :param player: PLAYER_1 or PLAYER_2
+    :return: seed for that player's stream, the same on every machine and Python version
+    """
+    digest = hashlib.blake2b(f'{regen_seed}:{player}'.encode(), digest_size=REGEN_SEED_BITS // 8).digest()
+
+    return int.from_bytes(digest, 'big')
+
+
+class RegenStream:
+    """
+    One player's regeneration draws for one match
+    """
+    __slots__ = ('_random', '_draws', '_next_draw')
+
+    def __init__(self, regen_seed: int, player: str):
+        """
+        :param regen_seed: the match's regen seed
+        :param player: PLAYER_1 or PLAYER_2
+        """
+        self._random = random.Random(get_stream_seed(regen_seed, player))
+        self._draws = []
+        self._next_draw = 0
+
+    def draw(self) -> str:
+        """
+        :return: the next move to regenerate, uniformly from ALL_MOVES
+        """
+        if self._next_draw == len(self._draws):
+            self._draws = self._random.choices(ALL_MOVES, k=REGEN_DRAW_BATCH)
+            self._next_draw = 0
+
+        move = self._draws[self._next_draw]
+        self._next_draw += 1
+
+        return move
+
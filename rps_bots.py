@@ -0,0 +1,265 @@
+"""
+Headless players for Super LAN Rock-Paper-Scissors.
+A bot is a move selector: pass one to RPSGameManager(move_selector=...) and it plays instead of prompting.
+"""
+
+import random
+from typing import List, Optional
+from game_constants import *
+from opponent_model import DEFAULT_MAX_CONTEXTS, DEFAULT_MAX_ORDER, NGramModel
+from rps_solver import LimitedMoveSolver, load_solver
+from rulesets import OUTCOME_LOSS, OUTCOME_WIN
+
+
+def get_playable_moves(valid_moves: List[str]) -> List[str]:
+    """
+    Removes the quit option from a list of valid moves
+    :param valid_moves: valid moves offered by RPSGameManager, including the quit option
+    :return: moves that would actually be played
+    """
+    return [move for move in valid_moves if move in ALL_MOVES]
+
+
+class RandomBot:
+    """
+    Plays a random remaining move every turn
+    """
+    def __init__(self, max_rounds: Optional[int] = None, seed: Optional[int] = None):
+        """
+        :param max_rounds: quits after playing this many moves; plays forever if None
+        :param seed: seed for this bot's own random stream, for repeatable runs
+        """
+        self.max_rounds = max_rounds
+        self.moves_played = 0
+        self._random = random.Random(seed)
+
+    def __call__(self, game_manager, valid_moves: List[str]) -> str:
+        """
+        :param game_manager: RPSGameManager asking for a move
+        :param valid_moves: valid moves, including the quit option
+        :return: the chosen move
+        """
+        playable_moves = get_playable_moves(valid_moves)
+
+        if len(playable_moves) == 0 or (self.max_rounds is not None and self.moves_played >= self.max_rounds):
+            return QUIT_MESSAGE
+
+        self.moves_played += 1
+
+        return self._random.choice(playable_moves)
+
+
+class ScriptedBot:
+    """
+    Plays a fixed sequence of moves, then quits.
+    A scripted move that has run out is replaced with the first remaining move.
+    """
+    def __init__(self, script: List[str], repeat: bool = False, max_rounds: Optional[int] = None):
+        """
+        :param script: moves to play, in order
+        :param repeat: if True, starts the script over instead of quitting when it runs out
+        :param max_rounds: quits after playing this many moves; no extra limit if None
+        """
+        self.script = script
+        self.repeat = repeat
+        self.max_rounds = max_rounds
+        self.moves_played = 0
+
+    def __call__(self, game_manager, valid_moves: List[str]) -> str:
+        """
+        :param game_manager: RPSGameManager asking for a move
+        :param valid_moves: valid moves, including the quit option
+        :return: the chosen move
+        """
+        playable_moves = get_playable_moves(valid_moves)
+        script_finished = self.moves_played >= len(self.script) and not self.repeat
+        round_limit_reached = self.max_rounds is not None and self.moves_played >= self.max_rounds
+
+        if len(playable_moves) == 0 or len(self.script) == 0 or script_finished or round_limit_reached:
+            return QUIT_MESSAGE
+
+        scripted_move = self.script[self.moves_played % len(self.script)]
+        self.moves_played += 1
+
+        if scripted_move == QUIT_MESSAGE:
+            return QUIT_MESSAGE
+
+        return scripted_move if scripted_move in playable_moves else playable_moves[0]
+
+
+class SolverBot:
+    """
+    Plays the equilibrium strategy for both players' remaining counts, from rps_solver.py
+    """
+    def __init__(self, solver: Optional[LimitedMoveSolver] = None, max_rounds: Optional[int] = None,
+                 seed: Optional[int] = None):
+        """
+        :param solver: solver to look strategies up in; loads the saved tables if None
+        :param max_rounds: quits after playing this many moves; plays forever if None
+        :param seed: seed for sampling moves from the strategy, for repeatable runs
+        """
+        self.solver = solver if solver is not None else load_solver()
+        self.max_rounds = max_rounds
+        self.moves_played = 0
+        self._random = random.Random(seed)
+
+    def __call__(self, game_manager, valid_moves: List[str]) -> str:
+        """
+        :param game_manager: RPSGameManager asking for a move
+        :param valid_moves: valid moves, including the quit option
+        :return: the chosen move
+        """
+        if len(get_playable_moves(valid_moves)) == 0 or (
+                self.max_rounds is not None and self.moves_played >= self.max_rounds):
+            return QUIT_MESSAGE
+
+        local_player = game_manager.get_local_player()
+        my_options = game_manager.get_player_move_options(local_player)
+        opponent_options = game_manager.get_player_move_options(game_manager.get_opponent())
+
+        # Player 2 moves after seeing player 1's state, which already has player 1's move subtracted.
+        # Add it back, so the bot plays the simultaneous game instead of peeking.
+        # Commit-reveal rounds are simultaneous already, and the last move seen is from the round before.
+        opponent_move = game_manager.get_opponent_move()
+        if local_player == PLAYER_2 and opponent_move in ALL_MOVES and not game_manager.is_commit_reveal():
+            opponent_options[opponent_move] += 1
+
+        my_counts = tuple(my_options[move] for move in ALL_MOVES)
+        opponent_counts = tuple(opponent_options[move] for move in ALL_MOVES)
+
+        # Player 1 sees player 2's counts before player 2 regenerates, so average over how that could turn out
+        strategy = [0.0] * len(ALL_MOVES)
+        for opponent_outcome, probability in self.solver.get_regen_outcomes(opponent_counts):
+            for move_index, move_probability in enumerate(self.solver.get_strategy(my_counts, opponent_outcome)):
+                strategy[move_index] += probability * move_probability
+
+        self.moves_played += 1
+
+        return self._random.choices(ALL_MOVES, weights=strategy)[0]
+
+
+class NGramBot:
+    """
+    Predicts the opponent's next move with an n-gram model of their past moves (see opponent_model.py),
+    narrowed down to the moves they have left, and plays the remaining move that scores best against the prediction
+    """
+    # How much the opponent's remaining counts weigh against the model's counts, in observations
+    COUNTS_PRIOR_WEIGHT = 1.0
+
+    def __init__(self, max_order: int = DEFAULT_MAX_ORDER, max_contexts: int = DEFAULT_MAX_CONTEXTS,
+                 max_rounds: Optional[int] = None, seed: Optional[int] = None):
+        """
+        :param max_order: most rounds of history to predict from
+        :param max_contexts: most histories the model keeps counts for
+        :param max_rounds: quits after playing this many moves; plays forever if None
+        :param seed: seed for breaking ties between equally good moves, for repeatable runs
+        """
+        self.model = NGramModel(max_order, max_contexts)
+        self.max_rounds = max_rounds
+        self.moves_played = 0
+        self._random = random.Random(seed)
+        self._move_indexes = {move: index for index, move in enumerate(ALL_MOVES)}
+        self._last_move_index = None  # own move from the last round, until the opponent's move in it is known
+
+        # payoffs[a][b] is 1 if move a beats move b, -1 if it loses, or 0 for a tie
+        self._payoffs = [[1 if RULESET.get_outcome(move, opponent_move) == OUTCOME_WIN else
+                          -1 if RULESET.get_outcome(move, opponent_move) == OUTCOME_LOSS else 0
+                          for opponent_move in ALL_MOVES] for move in ALL_MOVES]
+
+    def predict_opponent(self, opponent_options: dict) -> List[float]:
+        """
+        :param opponent_options: the opponent's remaining move counts, as the local player sees them
+        :return: weight of each move in ALL_MOVES order, for how likely the opponent is to play it next
+        """
+        opponent_counts = [opponent_options[move] for move in ALL_MOVES]
+        total_count = sum(opponent_counts)
+        model_counts = self.model.predict() or [0] * len(ALL_MOVES)
+
+        # Moves the opponent has run out of can't be played, unless they're about to regenerate some.
+        # Until the model has seen enough, expect them to spend moves in proportion to how many they have.
+        weights = [0.0] * len(ALL_MOVES)
+        for move_index, count in enumerate(opponent_counts):
+            if count > 0 or total_count < REGEN_THRESHOLD:
+                weights[move_index] = model_counts[move_index] + self.COUNTS_PRIOR_WEIGHT * (
+                    count / total_count if total_count > 0 else 1 / len(ALL_MOVES))
+
+        return weights
+
+    def __call__(self, game_manager, valid_moves: List[str]) -> str:
+        """
+        :param game_manager: RPSGameManager asking for a move
+        :param valid_moves: valid moves, including the quit option
+        :return: the chosen move
+        """
+        playable_moves = get_playable_moves(valid_moves)
+
+        if len(playable_moves) == 0 or (self.max_rounds is not None and self.moves_played >= self.max_rounds):
+            return QUIT_MESSAGE
+
+        opponent_options = game_manager.get_player_move_options(game_manager.get_opponent())
+        opponent_move = game_manager.get_opponent_move()
+
+        # Player 2 relaying rounds sees player 1's move for this round already, like SolverBot;
+        # set it aside until after choosing, so the bot plays the simultaneous game instead of peeking.
+        # Otherwise, the opponent's last move is from the round the bot last played in, if any.
+        is_peeking = (game_manager.get_local_player() == PLAYER_2 and opponent_move in ALL_MOVES
+                      and not game_manager.is_commit_reveal())
+        if is_peeking:
+            opponent_options[opponent_move] += 1
+        elif self._last_move_index is not None and opponent_move in ALL_MOVES:
+            self.model.observe(self._last_move_index, self._move_indexes[opponent_move])
+
+        weights = self.predict_opponent(opponent_options)
+
+        # Expected score of each remaining move against the prediction; ties are broken at random
+        best_moves = []
+        best_score = None
+        for move in playable_moves:
+            payoffs = self._payoffs[self._move_indexes[move]]
+            score = sum(weight * payoff for weight, payoff in zip(weights, payoffs))
+
+            if best_score is None or score > best_score + 1e-9:
+                best_moves = [move]
+                best_score = score
+            elif score >= best_score - 1e-9:
+                best_moves.append(move)
+
+        move = best_moves[0] if len(best_moves) == 1 else self._random.choice(best_moves)
+        self.moves_played += 1
+
+        if is_peeking:
+            self.model.observe(self._move_indexes[move], self._move_indexes[opponent_move])
+            self._last_move_index = None
+        else:
+            self._last_move_index = self._move_indexes[move]
+
+        return move
+
+
+# Bot names accepted on the command line
+BOT_KINDS = ['random', 'scripted', 'solver', 'ngram']
+
+
+def make_bot(kind: str, script: Optional[List[str]] = None, max_rounds: Optional[int] = None,
+             seed: Optional[int] = None):
+    """
+    Creates a bot by name
+    :param kind: one of BOT_KINDS
+    :param script: moves for a scripted bot
+    :param max_rounds: quits after playing this many moves; no limit if None
+    :param seed: seed for bots that make random choices
+    :return: move selector for RPSGameManager
+    """
+    if kind == 'random':
+        return RandomBot(max_rounds, seed)
+
+    if kind == 'scripted':
+        return ScriptedBot(script or [], repeat=max_rounds is not None, max_rounds=max_rounds)
+
+    if kind == 'solver':
+        return SolverBot(max_rounds=max_rounds, seed=seed)
+
+    if kind == 'ngram':
+        return NGramBot(max_rounds=max_rounds, seed=seed)
+
+    raise ValueError(f'unknown bot kind: {kind}')
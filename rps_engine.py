@@ -0,0 +1,299 @@
+"""
+The game's rules as plain functions of its state, with no printing, prompting, or sockets.
+
+A state is the game's fields, laid out as state_codec.STATE_FIELD_NAMES: the same integers RPSGameManager keeps
+and the binary codecs pack. step() plays one round with both players' moves and returns the next state,
+along with events saying what happened, for the caller to show, log, or ignore.
+step_many() plays a round of each of many matches in one call, and step_rounds() plays many rounds of one match,
+so a server or analysis tool can advance thousands of matches without formatting a single string.
+
+Regenerated options are drawn from each player's RegenStream (regen_streams.py), which the caller keeps with
+the match's state, so rounds are repeatable from the match's regen seed and play out exactly as they would
+between two networked players with that seed. Apart from those draws, a step changes nothing but the state it returns.
+
+RPSGameManager plays each player's half of a round with the in-place functions below,
+so the networked game and the engine share one set of rules.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+from game_constants import *
+from regen_streams import RegenStream
+from state_codec import (FIELD_ROUND_WINNER, FIELD_STAGE, FIELD_CURRENT_MOVES, FIELD_SCORES,
+                         FIELD_MOVE_COUNTS, MOVE_CODES, STAGE_CODES, STATE_FIELD_NAMES, WINNER_CODES)
+
+# Events in the list each step returns, as (event, player) tuples
+EVENT_ROUND_RESOLVED = 'round_resolved'  # the player is the round's winner: PLAYER_1, PLAYER_2, or TIE
+EVENT_OPTIONS_REGENERATED = 'options_regenerated'  # the player ran low and regenerated some options
+EVENT_PLAYER_QUIT = 'player_quit'  # the player quit, which ends the match
+
+PLAYER_INDEXES = {PLAYER_1: 0, PLAYER_2: 1}
+_MOVE_COUNT = len(ALL_MOVES)
+
+# Index of each player's fields in the state, worked out once rather than on every move
+CURRENT_MOVE_FIELDS = {player: FIELD_CURRENT_MOVES + index for player, index in PLAYER_INDEXES.items()}
+SCORE_FIELDS = {player: FIELD_SCORES + index for player, index in PLAYER_INDEXES.items()}
+FIRST_MOVE_COUNT_FIELDS = {player: FIELD_MOVE_COUNTS + index * _MOVE_COUNT for player, index in PLAYER_INDEXES.items()}
+MOVE_COUNT_FIELDS = {
+    player: {move: first_field + move_index for move_index, move in enumerate(ALL_MOVES)}
+    for player, first_field in FIRST_MOVE_COUNT_FIELDS.items()
+}
+
+# Player 1's turn, and zero (no value yet) for everything else
+INITIAL_FIELDS = (1,) + (0,) * (len(STATE_FIELD_NAMES) - 1)
+
+_QUIT_CODE = MOVE_CODES[QUIT_MESSAGE]
+
+# The ruleset's outcome matrix by move code, so a round is decided with one lookup, without decoding either move:
+# _ROUND_OUTCOMES[player 1's move code * _MOVE_CODE_STRIDE + player 2's move code], a rulesets.OUTCOME_* constant.
+# Move codes are single bytes, so any code (like a quit that slipped through) lands on a tie instead of out of range.
+_MOVE_CODE_STRIDE = 256
+
+
+def _build_round_outcomes() -> bytes:
+    """
+    :return: the ruleset's outcome matrix, indexed by move codes
+    """
+    round_outcomes = bytearray(_MOVE_CODE_STRIDE * _MOVE_CODE_STRIDE)
+
+    for move in ALL_MOVES:
+        for opponent_move in ALL_MOVES:
+            round_outcomes[MOVE_CODES[move] * _MOVE_CODE_STRIDE + MOVE_CODES[opponent_move]] = \
+                RULESET.get_outcome(move, opponent_move)
+
+    return bytes(round_outcomes)
+
+
+_ROUND_OUTCOMES = _build_round_outcomes()
+
+# Round winner by player 1's outcome (tie, win, loss)
+_WINNERS_BY_OUTCOME = (TIE, PLAYER_1, PLAYER_2)
+
+
+class IllegalMoveError(ValueError):
+    pass
+
+
+def new_fields(stage: Optional[str] = None) -> List[int]:
+    """
+    :param stage: stage name from STAGES to start on, or None to leave the stage for player 1 to choose
+    :return: a new game's state, as a list to change in place
+    """
+    fields = list(INITIAL_FIELDS)
+
+    if stage is not None:
+        start_stage(fields, stage)
+
+    return fields
+
+
+def new_regen_streams(regen_seed: int) -> Dict[str, RegenStream]:
+    """
+    :param regen_seed: the match's regen seed
+    :return: each player's regen stream for the match, to pass to step() with every round
+    """
+    return {player: RegenStream(regen_seed, player) for player in PLAYER_INDEXES}
+
+
+def start_stage(fields: List[int], stage: str):
+    """
+    Sets the stage, and gives both players its starting move options
+    :param fields: state to change in place
+    :param stage: stage name from STAGES
+    """
+    move_counts = [STAGES[stage][move] for move in ALL_MOVES]
+    fields[FIELD_STAGE] = STAGE_CODES[stage]
+
+    for first_field in FIRST_MOVE_COUNT_FIELDS.values():
+        fields[first_field:first_field + _MOVE_COUNT] = move_counts
+
+
+def record_move(fields: List[int], player: str, move: str):
+    """
+    Sets a player's move, using up one of that move's options
+    :param fields: state to change in place
+    :param player: PLAYER_1 or PLAYER_2
+    :param move: one of ALL_MOVES, or the quit message
+    """
+    fields[CURRENT_MOVE_FIELDS[player]] = MOVE_CODES[move]
+
+    if move != QUIT_MESSAGE:
+        fields[MOVE_COUNT_FIELDS[player][move]] -= 1
+
+
+def award_round(fields: List[int], winner: str):
+    """
+    Sets the round's winner and gives them a point
+    :param fields: state to change in place
+    :param winner: PLAYER_1, PLAYER_2, or TIE
+    """
+    fields[FIELD_ROUND_WINNER] = WINNER_CODES[winner]
+
+    if winner != TIE:
+        fields[SCORE_FIELDS[winner]] += 1
+
+
+def resolve_round(fields: List[int]) -> str:
+    """
+    Decides the round from both players' current moves, and awards it
+    :param fields: state to change in place
+    :return: the round's winner: PLAYER_1, PLAYER_2, or TIE
+    """
+    outcome = _ROUND_OUTCOMES[fields[FIELD_CURRENT_MOVES] * _MOVE_CODE_STRIDE + fields[FIELD_CURRENT_MOVES + 1]]
+    winner = _WINNERS_BY_OUTCOME[outcome]
+    award_round(fields, winner)
+
+    return winner
+
+
+def count_move_options(fields: Sequence[int], player: str) -> int:
+    """
+    :param fields: state
+    :param player: PLAYER_1 or PLAYER_2
+    :return: sum of all remaining move options for the player
+    """
+    first_field = FIRST_MOVE_COUNT_FIELDS[player]
+
+    return sum(fields[first_field:first_field + _MOVE_COUNT])
+
+
+def regenerate_option(fields: List[int], player: str, regen_stream: RegenStream):
+    """
+    Regenerates one random option for a player
+    :param fields: state to change in place
+    :param player: PLAYER_1 or PLAYER_2
+    :param regen_stream: the player's regen stream for this match
+    """
+    fields[MOVE_COUNT_FIELDS[player][regen_stream.draw()]] += REGEN_QUANTITY_EACH
+
+
+def regenerate_if_low(fields: List[int], player: str, regen_stream: RegenStream) -> bool:
+    """
+    Regenerates random options for a player whose remaining options have dwindled below REGEN_THRESHOLD,
+    so the game can continue until a player quits
+    :param fields: state to change in place
+    :param player: PLAYER_1 or PLAYER_2
+    :param regen_stream: the player's regen stream for this match
+    :return: True if the player regenerated options
+    """
+    if count_move_options(fields, player) >= REGEN_THRESHOLD:
+        return False
+
+    for _ in range(REGEN_ITERATIONS):
+        regenerate_option(fields, player, regen_stream)
+
+    return True
+
+
+def is_over(fields: Sequence[int]) -> bool:
+    """
+    :param fields: state
+    :return: True once a player has quit
+    """
+    return fields[FIELD_CURRENT_MOVES] == _QUIT_CODE or fields[FIELD_CURRENT_MOVES + 1] == _QUIT_CODE
+
+
+def play_round(fields: List[int], move_1: str, move_2: str, regen_streams: Dict[str, RegenStream]) -> list:
+    """
+    Plays one round in place; step() without copying the state.
+    Either player quitting ends the match instead, without playing the other player's move.
+    :param fields: state to change in place
+    :param move_1: player 1's move: one of ALL_MOVES they have an option for, or the quit message
+    :param move_2: player 2's move, likewise
+    :param regen_streams: each player's regen stream for this match, like from new_regen_streams()
+    :return: events, as (event, player) tuples
+    :raises IllegalMoveError: if the match is already over, or a player doesn't have the move
+    """
+    if is_over(fields):
+        raise IllegalMoveError('the match is already over')
+
+    moves = ((PLAYER_1, move_1), (PLAYER_2, move_2))
+
+    if move_1 == QUIT_MESSAGE or move_2 == QUIT_MESSAGE:
+        events = []
+        for player, move in moves:
+            if move == QUIT_MESSAGE:
+                fields[CURRENT_MOVE_FIELDS[player]] = _QUIT_CODE
+                events.append((EVENT_PLAYER_QUIT, player))
+
+        return events
+
+    for player, move in moves:
+        move_field = MOVE_COUNT_FIELDS[player].get(move)
+        if move_field is None or fields[move_field] <= 0:
+            raise IllegalMoveError(f'player {player} has no {move!r} to play')
+
+        # record_move(), with the move's field already looked up
+        fields[CURRENT_MOVE_FIELDS[player]] = MOVE_CODES[move]
+        fields[move_field] -= 1
+
+    events = [(EVENT_ROUND_RESOLVED, resolve_round(fields))]
+
+    # Each player regenerates from their own stream, so the order they do it in doesn't matter
+    for player, _ in moves:
+        if regenerate_if_low(fields, player, regen_streams[player]):
+            events.append((EVENT_OPTIONS_REGENERATED, player))
+
+    return events
+
+
+def step(fields: Sequence[int], move_1: str, move_2: str,
+         regen_streams: Dict[str, RegenStream]) -> Tuple[tuple, list]:
+    """
+    Plays one round, with both players' moves at once
+    :param fields: state, which is left as it is
+    :param move_1: player 1's move: one of ALL_MOVES they have an option for, or the quit message
+    :param move_2: player 2's move, likewise
+    :param regen_streams: each player's regen stream for this match, like from new_regen_streams()
+    :return: the next state, and events as (event, player) tuples
+    :raises IllegalMoveError: if the match is already over, or a player doesn't have the move
+    """
+    next_fields = list(fields)
+    events = play_round(next_fields, move_1, move_2, regen_streams)
+
+    return tuple(next_fields), events
+
+
+def step_many(states: Sequence[Sequence[int]], moves: Sequence[Tuple[str, str]],
+              regen_streams: Sequence[Dict[str, RegenStream]]) -> Tuple[List[tuple], List[list]]:
+    """
+    Plays one round of each of many matches, like step() on each
+    :param states: each match's state, which are left as they are
+    :param moves: each match's (player 1's move, player 2's move), in the same order
+    :param regen_streams: each match's regen streams, in the same order
+    :return: each match's next state, and each match's events
+    :raises IllegalMoveError: if a match is already over, or a player doesn't have their move
+    """
+    if not len(states) == len(moves) == len(regen_streams):
+        raise ValueError('step_many() needs a pair of moves and regen streams for every state')
+
+    next_states = []
+    all_events = []
+
+    for fields, (move_1, move_2), match_regen_streams in zip(states, moves, regen_streams):
+        next_fields = list(fields)
+        all_events.append(play_round(next_fields, move_1, move_2, match_regen_streams))
+        next_states.append(tuple(next_fields))
+
+    return next_states, all_events
+
+
+def step_rounds(fields: Sequence[int], moves: Sequence[Tuple[str, str]],
+                regen_streams: Dict[str, RegenStream]) -> Tuple[tuple, List[list]]:
+    """
+    Plays many rounds of one match in order, like step() on each, stopping early if a player quits
+    :param fields: state, which is left as it is
+    :param moves: each round's (player 1's move, player 2's move)
+    :param regen_streams: each player's regen stream for this match
+    :return: the state after the last round played, and each played round's events
+    :raises IllegalMoveError: if the match is already over, or a player doesn't have their move
+    """
+    next_fields = list(fields)
+    all_events = []
+
+    for move_1, move_2 in moves:
+        all_events.append(play_round(next_fields, move_1, move_2, regen_streams))
+
+        if is_over(next_fields):
+            break
+
+    return tuple(next_fields), all_events
@@ -0,0 +1,154 @@
+"""
+Gateway that relays many players to the match server (Super_LAN_RPS_match_server.py) over one connection.
+
+Players run the regular client and connect here instead of to the match server.
+Each player gets a GELA372 channel on the gateway's one multiplexed connection to the match server,
+so the match server holds one socket for the gateway instead of one per player.
+Messages are relayed whole; the gateway only reframes them, in whichever GELA372 version each player speaks.
+
+Example: python rps_gateway.py --port 8012 --server-port 8011
+"""
+
+import argparse
+import asyncio
+from socket_constants import *
+from socket_helpers import ChannelMultiplexer, GELA372Channel, GELA372Receiver, frame_message, \
+    receive_message_bytes_async
+
+DEFAULT_GATEWAY_PORT = SERVER_PORT + 1
+
+
+class RelayedPlayer:
+    """
+    One player's connection to the gateway and the channel that carries it to the match server
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, channel: GELA372Channel):
+        """
+        :param reader: stream the player's bytes arrive on
+        :param writer: stream to the player
+        :param channel: the player's channel to the match server
+        """
+        self.reader = reader
+        self.writer = writer
+        self.channel = channel
+        self.receiver = GELA372Receiver(BUFFER_SIZE)
+        self.protocol_version = GELA372_DEFAULT_VERSION
+
+    async def relay_to_server(self):
+        """
+        Forwards the player's messages to the match server until the player disconnects
+        """
+        while True:
+            message = await receive_message_bytes_async(self.reader, self.receiver)
+
+            # Reply in whichever GELA372 version this player speaks
+            self.protocol_version = self.receiver.peer_version
+
+            await self.channel.send(message)
+
+    async def relay_to_player(self):
+        """
+        Forwards the match server's messages to the player until the match server closes the channel
+        """
+        while True:
+            message = await self.channel.receive()
+
+            self.writer.writelines(frame_message(message, self.protocol_version))
+            await self.writer.drain()
+
+    async def relay(self):
+        """
+        Relays both ways until either side is finished, then closes both
+        """
+        tasks = [asyncio.ensure_future(self.relay_to_server()), asyncio.ensure_future(self.relay_to_player())]
+
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            # Collect whichever relay failed, since a disconnect is how every relay ends
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            self.channel.close()
+            self.writer.close()
+
+
+class Gateway:
+    """
+    Accepts players and relays each one over a channel of one connection to the match server
+    """
+    def __init__(self, server_host: str, server_port: int):
+        """
+        :param server_host: match server host
+        :param server_port: match server port
+        """
+        self.server_host = server_host
+        self.server_port = server_port
+        self.multiplexer = None
+        self._connect_lock = None  # created by serve(), inside the event loop
+
+    async def get_multiplexer(self) -> ChannelMultiplexer:
+        """
+        :return: the multiplexer for the connection to the match server, connecting first if there isn't a live one
+        """
+        # Players who arrive while connecting wait for the one connection attempt instead of making their own
+        async with self._connect_lock:
+            if self.multiplexer is None or self.multiplexer.is_closed:
+                reader, writer = await asyncio.open_connection(self.server_host, self.server_port)
+                self.multiplexer = ChannelMultiplexer(reader, writer)
+                asyncio.ensure_future(self.multiplexer.run())
+
+        return self.multiplexer
+
+    async def handle_player(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Relays one player until either the player or the match server is finished
+        :param reader: stream the player's bytes arrive on
+        :param writer: stream to the player
+        """
+        try:
+            multiplexer = await self.get_multiplexer()
+            channel = multiplexer.open_channel()
+
+        except OSError:
+            writer.close()
+            return
+
+        await RelayedPlayer(reader, writer, channel).relay()
+
+    async def serve(self, port: int):
+        """
+        Accepts players forever
+        :param port: port to listen on
+        """
+        self._connect_lock = asyncio.Lock()
+        server = await asyncio.start_server(self.handle_player, port=port, backlog=MATCH_SERVER_BACKLOG)
+
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    """Be a gateway"""
+    parser = argparse.ArgumentParser(description='Relay many players to the match server over one connection.')
+    parser.add_argument('--port', type=int, default=DEFAULT_GATEWAY_PORT, help='port players connect to')
+    parser.add_argument('--server-host', default=SERVER_NAME, help='match server host')
+    parser.add_argument('--server-port', type=int, default=SERVER_PORT, help='match server port')
+    args = parser.parse_args()
+
+    print(f'relaying players on port {args.port} to {args.server_host}:{args.server_port}')
+
+    try:
+        asyncio.run(Gateway(args.server_host, args.server_port).serve(args.port))
+
+    except KeyboardInterrupt:
+        pass
+
+    print('\nGateway stopped.')
+
+
+if __name__ == '__main__':
+    main()
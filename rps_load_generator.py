@@ -0,0 +1,195 @@
+"""
+Load generator for the match server (Super_LAN_RPS_match_server.py).
+Opens N concurrent bot matches, each made of two headless bot clients,
+and reports throughput, wire bytes per round, and round-trip latency percentiles.
+
+Example: python rps_load_generator.py --matches 200 --rounds 50
+"""
+
+import argparse
+import threading
+import time
+from socket import create_connection, socket
+from typing import List, Optional
+from socket_constants import *
+from game_constants import *
+from game_helpers import RPSGameManager
+from generic_utils import get_percentile
+from rps_bots import RandomBot
+
+
+class CountingSocket:
+    """
+    Wraps a socket and counts the bytes that pass through it, including GELA372 framing
+    """
+    def __init__(self, wrapped_socket: socket):
+        """
+        :param wrapped_socket: connected socket to count bytes for
+        """
+        self._wrapped_socket = wrapped_socket
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        # Only offer scatter-gather sends if the real socket has them, so send_message() falls back the same way
+        if hasattr(wrapped_socket, 'sendmsg'):
+            self.sendmsg = self._sendmsg
+
+    def _sendmsg(self, buffers) -> int:
+        sent_count = self._wrapped_socket.sendmsg(buffers)
+        self.bytes_sent += sent_count
+        return sent_count
+
+    def sendall(self, data: bytes):
+        self._wrapped_socket.sendall(data)
+        self.bytes_sent += len(data)
+
+    def recv_into(self, buffer) -> int:
+        received_count = self._wrapped_socket.recv_into(buffer)
+        self.bytes_received += received_count
+        return received_count
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped_socket, name)
+
+
+class MeasuredGameManager(RPSGameManager):
+    """
+    Game manager for a bot seat that times every round trip to the server
+    """
+    def __init__(self, bot, regen_seed: Optional[int] = None):
+        """
+        :param bot: move selector that plays for this seat
+        :param regen_seed: seed for regenerating this seat's options; a fresh one if None
+        """
+        super().__init__(move_selector=bot, show_output=False, regen_seed=regen_seed)
+        self.round_trip_times = []
+        self._sent_at = None
+
+    def send_state_to_opponent(self, connection_socket):
+        self._sent_at = time.perf_counter()
+        super().send_state_to_opponent(connection_socket)
+
+    def handle_new_message(self, incoming_message, connection_socket):
+        if self._sent_at is not None:
+            self.round_trip_times.append(time.perf_counter() - self._sent_at)
+            self._sent_at = None
+
+        return super().handle_new_message(incoming_message, connection_socket)
+
+
+class SeatResult:
+    """
+    Measurements from one bot seat
+    """
+    def __init__(self):
+        self.round_trip_times = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.error = None
+
+
+def run_bot_seat(host: str, port: int, stage: str, rounds: int, seed: int, result: SeatResult,
+                 player_name: Optional[str] = None):
+    """
+    Plays one bot seat to the end, the same way Super_LAN_RPS_client.main() plays a person's seat
+    :param host: match server host
+    :param port: match server port
+    :param stage: stage to select
+    :param rounds: bot quits after this many rounds
+    :param seed: seed for the bot's moves and regenerated options
+    :param result: receives this seat's measurements
+    :param player_name: name for the match server's leaderboard, or None to play unnamed
+    """
+    try:
+        connection_socket = CountingSocket(create_connection((host, port)))
+
+    except OSError as error:
+        result.error = error
+        return
+
+    game_manager = MeasuredGameManager(RandomBot(rounds, seed), seed)
+    game_manager.player_name = player_name
+
+    try:
+        game_manager.set_stage(stage)
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(connection_socket)
+        game_manager.play_game(connection_socket)
+
+    except OSError as error:
+        result.error = error
+
+    finally:
+        connection_socket.close()
+
+    result.round_trip_times = game_manager.round_trip_times
+    result.bytes_sent = connection_socket.bytes_sent
+    result.bytes_received = connection_socket.bytes_received
+
+
+def print_report(results: List[SeatResult], elapsed_seconds: float):
+    """
+    Prints throughput and latency figures for a finished run
+    :param results: measurements from every seat
+    :param elapsed_seconds: wall-clock duration of the run
+    """
+    round_trip_times = sorted(sample for result in results for sample in result.round_trip_times)
+    total_bytes = sum(result.bytes_sent + result.bytes_received for result in results)
+    error_count = sum(1 for result in results if result.error is not None)
+
+    # Both seats of a match make one round trip per round
+    round_count = len(round_trip_times) / 2
+
+    print(f'seats: {len(results)} ({error_count} with errors)')
+    print(f'elapsed: {elapsed_seconds:.3f} s')
+    print(f'rounds: {round_count:.0f}')
+
+    if round_count == 0:
+        return
+
+    print(f'rounds/sec: {round_count / elapsed_seconds:.1f}')
+    print(f'bytes/round: {total_bytes / round_count:.1f}')
+
+    for percent in (50, 95, 99):
+        print(f'p{percent} round trip: {get_percentile(round_trip_times, percent) * 1000:.3f} ms')
+
+
+def main():
+    """Generate load"""
+    parser = argparse.ArgumentParser(description='Play many bot matches against a match server at once.')
+    parser.add_argument('--host', default=SERVER_NAME, help='match server host')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='match server port')
+    parser.add_argument('--matches', type=int, default=10, help='number of concurrent matches')
+    parser.add_argument('--rounds', type=int, default=100, help='rounds each match plays before a bot quits')
+    parser.add_argument('--stage', choices=list(STAGES), default=list(STAGES)[0],
+                        help='stage every bot selects, so all of them can be paired')
+    parser.add_argument('--seed', type=int, default=0, help='base seed for the bots\' moves')
+    parser.add_argument('--players', type=int, default=0,
+                        help='spread the seats over this many named players on the leaderboard; 0 to play unnamed')
+    args = parser.parse_args()
+
+    seat_count = 2 * args.matches
+    results = [SeatResult() for _ in range(seat_count)]
+    threads = [
+        threading.Thread(
+            target=run_bot_seat,
+            args=(args.host, args.port, args.stage, args.rounds, args.seed + seat_index, results[seat_index],
+                  f'bot-{seat_index % args.players}' if args.players > 0 else None),
+            daemon=True)
+        for seat_index in range(seat_count)
+    ]
+
+    print(f'playing {args.matches} matches of {args.rounds} rounds against {args.host}:{args.port}')
+
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed_seconds = time.perf_counter() - start_time
+
+    print_report(results, elapsed_seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Counters and histograms for the game and socket hot paths, exported in the Prometheus text format.
+
+Everything is recorded into METRICS, which starts disabled. Every instrumented spot checks METRICS.enabled first,
+so while metrics are off, the hot path pays one attribute lookup and skips even reading the clock.
+Turn them on with start_metrics_export(), which also serves them over HTTP, writes them to a file, or both:
+
+    rps_bytes_sent_total / rps_bytes_received_total           GELA372 bytes, framing included
+    rps_messages_sent_total / rps_messages_received_total     whole GELA372 messages
+    rps_packets_per_message                                   v1 packets or v2 frames per message sent
+    rps_receive_calls_per_message                             recv() calls or stream reads per message received
+    rps_peer_wait_seconds                                     time spent waiting on the peer for a message
+    rps_state_encode_seconds / rps_state_decode_seconds       by codec
+    rps_handle_message_seconds                                handle_new_message(), without choosing the move
+    rps_round_resolution_seconds / rps_rounds_total           both players' moves in, round awarded
+    rps_rounds_per_second                                     rounds since the previous export, per second
+
+Counters are plain integers shared by every thread, and counts that a histogram already keeps, like rounds,
+are read from the histogram rather than counted again. The match server updates them from one event loop,
+but when players run on several threads of one process, a race may very rarely lose an increment.
+
+Example: python Super_LAN_RPS_match_server.py --metrics-port 9100, then curl localhost:9100/metrics
+"""
+
+import argparse
+import atexit
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_METRICS_INTERVAL = 10.0  # seconds between writes of the metrics file
+
+# Seconds, from a microsecond encode up to a player taking their time to choose a move
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 64, 256, 1024)
+
+
+def _format_value(value: float) -> str:
+    """
+    :param value: a metric's value or bucket bound
+    :return: the value as Prometheus writes it
+    """
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: List[Tuple[str, str]]) -> str:
+    """
+    :param labels: label names and values
+    :return: label set in Prometheus syntax, or an empty string if there are no labels
+    """
+    if len(labels) == 0:
+        return ''
+
+    escaped_labels = [(name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                      for name, value in labels]
+
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped_labels) + '}'
+
+
+class Counter:
+    """
+    Count that only goes up
+    """
+    def __init__(self, name: str, help_text: str, counted_histogram: Optional['Histogram'] = None):
+        """
+        :param name: metric name, ending in _total
+        :param help_text: one-line description
+        :param counted_histogram: if given, the count is how many values this histogram observed,
+                                  so the hot path doesn't pay to keep the same count twice
+        """
+        self.name = name
+        self.help_text = help_text
+        self.counted_histogram = counted_histogram
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        """
+        :param amount: how much to add
+        """
+        self.value += amount
+
+    def get(self) -> int:
+        """
+        :return: the count so far
+        """
+        if self.counted_histogram is not None:
+            return self.counted_histogram.get_count()
+
+        return self.value
+
+    def render(self) -> List[str]:
+        """
+        :return: lines of the Prometheus text format
+        """
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter',
+                f'{self.name} {_format_value(self.get())}']
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets, optionally split by the value of one label
+    """
+    def __init__(self, name: str, help_text: str, buckets: tuple, label_name: Optional[str] = None):
+        """
+        :param name: metric name
+        :param help_text: one-line description
+        :param buckets: upper bounds of the buckets, in increasing order; +Inf is added
+        :param label_name: name of the label that splits the distribution, or None for a single one
+        """
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_name = label_name
+        self.series = {}  # label value -> [count per bucket (not cumulative; the last is +Inf), sum]
+
+    def observe(self, value: float, label_value: str = ''):
+        """
+        :param value: observed value
+        :param label_value: value of the label, if the histogram has one
+        """
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0]
+
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def get_count(self, label_value: str = '') -> int:
+        """
+        :param label_value: value of the label, if the histogram has one
+        :return: number of values observed so far
+        """
+        series = self.series.get(label_value)
+
+        return 0 if series is None else sum(series[0])
+
+    def render(self) -> List[str]:
+        """
+        :return: lines of the Prometheus text format, with cumulative buckets as Prometheus expects
+        """
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+
+        for label_value, (bucket_counts, total) in sorted(self.series.items()):
+            labels = [] if self.label_name is None else [(self.label_name, label_value)]
+            cumulative_count = 0
+
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative_count += bucket_count
+                bucket_labels = _format_labels(labels + [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative_count}')
+
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative_count}')
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Every metric the game records, plus whether recording is on
+    """
+    def __init__(self):
+        self.enabled = False
+
+        self.bytes_sent = Counter('rps_bytes_sent_total', 'GELA372 bytes sent, framing included.')
+        self.bytes_received = Counter('rps_bytes_received_total', 'GELA372 bytes received, framing included.')
+        self.packets_per_message = Histogram('rps_packets_per_message',
+                                             'GELA372 v1 packets or v2 frames per message sent.', COUNT_BUCKETS)
+        self.receive_calls_per_message = Histogram('rps_receive_calls_per_message',
+                                                   'Socket receives or stream reads per message received.',
+                                                   COUNT_BUCKETS)
+        self.peer_wait_seconds = Histogram('rps_peer_wait_seconds',
+                                           'Seconds spent waiting on the peer for the rest of a message.',
+                                           LATENCY_BUCKETS)
+        self.state_encode_seconds = Histogram('rps_state_encode_seconds', 'Seconds to encode a game state.',
+                                              LATENCY_BUCKETS, 'codec')
+        self.state_decode_seconds = Histogram('rps_state_decode_seconds', 'Seconds to decode a game state.',
+                                              LATENCY_BUCKETS, 'codec')
+        self.handle_message_seconds = Histogram('rps_handle_message_seconds',
+                                                'Seconds handling a state message, not counting choosing a move.',
+                                                LATENCY_BUCKETS)
+        self.round_resolution_seconds = Histogram('rps_round_resolution_seconds',
+                                                  'Seconds to resolve a round once both moves are in.',
+                                                  LATENCY_BUCKETS)
+        self.messages_sent = Counter('rps_messages_sent_total', 'Whole GELA372 messages sent.',
+                                     self.packets_per_message)
+        self.messages_received = Counter('rps_messages_received_total', 'Whole GELA372 messages received.',
+                                         self.receive_calls_per_message)
+        self.rounds = Counter('rps_rounds_total', 'Rounds resolved.', self.round_resolution_seconds)
+
+        self._metrics = [self.bytes_sent, self.bytes_received, self.messages_sent, self.messages_received,
+                         self.packets_per_message, self.receive_calls_per_message, self.peer_wait_seconds,
+                         self.state_encode_seconds, self.state_decode_seconds, self.handle_message_seconds,
+                         self.round_resolution_seconds, self.rounds]
+        self._last_export = (time.monotonic(), 0)  # (when, rounds so far) at the previous export
+        self._export_lock = threading.Lock()
+
+    def record_sent_message(self, buffers: List[bytes]):
+        """
+        Counts a message that was just sent
+        :param buffers: the message's framed buffers, a header or flag and a payload per packet
+        """
+        self.bytes_sent.value += sum(map(len, buffers))
+        self.packets_per_message.observe(len(buffers) // 2)
+
+    def record_received_message(self, received_byte_count: int, receive_call_count: int, wait_start_time: float):
+        """
+        Counts a message that was just received
+        :param received_byte_count: bytes received while waiting for the message
+        :param receive_call_count: receives it took; 0 if the message had already arrived with an earlier one
+        :param wait_start_time: time.perf_counter() when waiting for the message began
+        """
+        self.bytes_received.value += received_byte_count
+        self.receive_calls_per_message.observe(receive_call_count)
+
+        if receive_call_count > 0:
+            self.peer_wait_seconds.observe(time.perf_counter() - wait_start_time)
+
+    def render(self) -> str:
+        """
+        :return: every metric in the Prometheus text format
+        """
+        with self._export_lock:
+            now = time.monotonic()
+            round_count = self.rounds.get()
+            last_export_time, last_round_count = self._last_export
+            self._last_export = (now, round_count)
+
+        rounds_per_second = (round_count - last_round_count) / max(now - last_export_time, 1e-9)
+
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+
+        lines += ['# HELP rps_rounds_per_second Rounds resolved per second since the previous export.',
+                  '# TYPE rps_rounds_per_second gauge',
+                  f'rps_rounds_per_second {_format_value(float(rounds_per_second))}']
+
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, path: str):
+        """
+        Writes every metric to a file in the Prometheus text format,
+        replacing the file all at once so a reader never sees half of it
+        :param path: path to write, like a node_exporter textfile collector's *.prom file
+        """
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(self.render())
+
+        os.replace(temporary_path, path)
+
+
+METRICS = MetricsRegistry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /metrics with every metric
+    """
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are routine; don't print a line for each one
+        pass
+
+
+def serve_metrics(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Serves the metrics at http://host:port/metrics from a background thread
+    :param port: port to listen on
+    :param host: address to listen on; only this machine by default
+    :return: the running server
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics server', daemon=True).start()
+
+    return server
+
+
+def write_metrics_periodically(path: str, interval: float = DEFAULT_METRICS_INTERVAL):
+    """
+    Writes the metrics file every interval from a background thread, and once more when the process exits
+    :param path: path to write
+    :param interval: seconds between writes
+    """
+    def write_forever():
+        while True:
+            time.sleep(interval)
+            METRICS.write_file(path)
+
+    threading.Thread(target=write_forever, name='metrics writer', daemon=True).start()
+    atexit.register(METRICS.write_file, path)
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the options that turn metrics on
+    :param parser: a script's argument parser
+    """
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics at localhost:PORT/metrics')
+    parser.add_argument('--metrics-file', help='write Prometheus metrics to this file, and again at exit')
+    parser.add_argument('--metrics-interval', type=float, default=DEFAULT_METRICS_INTERVAL,
+                        help='seconds between writes of --metrics-file')
+
+
+def start_metrics_export(args: argparse.Namespace):
+    """
+    Turns metrics on and starts exporting them, if the options added by add_metrics_arguments() ask for it
+    :param args: parsed options
+    """
+    if args.metrics_port is None and args.metrics_file is None:
+        return
+
+    METRICS.enabled = True
+
+    if args.metrics_port is not None:
+        serve_metrics(args.metrics_port)
+        print(f'serving metrics at http://localhost:{args.metrics_port}/metrics')
+
+    if args.metrics_file is not None:
+        write_metrics_periodically(args.metrics_file, args.metrics_interval)
@@ -0,0 +1,349 @@
+"""
+Monte Carlo simulator for tuning STAGES and the REGEN_* constants.
+
+Plays millions of headless matches at once as NumPy arrays, using the same rules as rps_engine.py:
+moves are spent like record_move(), rounds are resolved like resolve_round()
+(through the ruleset's outcome matrix), and a player whose remaining options drop below
+the regen threshold regenerates random options like regenerate_if_low().
+The real game only ends when someone quits, so a simulated match ends when a player reaches a target score.
+
+Needs NumPy (pip install numpy).
+
+Example: python rps_simulator.py --games 1000000 --target-score 5
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, Optional
+from game_constants import *
+import rps_engine
+from rulesets import OUTCOME_LOSS, OUTCOME_WIN
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# How simulated players choose among their remaining moves
+MOVE_POLICIES = ['uniform', 'weighted']
+
+# Outcome of a round from player 1's perspective
+_PLAYER_1_WINS = 1
+_PLAYER_2_WINS = -1
+
+
+def build_outcome_matrix() -> 'np.ndarray':
+    """
+    Converts the ruleset's compiled outcomes to player 1's side
+    :return: outcome[a, b] is 1 if move a beats move b, -1 if it loses, or 0 for a tie,
+             with moves indexed in ALL_MOVES order
+    """
+    compiled_outcomes = np.frombuffer(RULESET.outcomes, dtype=np.uint8).reshape(len(ALL_MOVES), len(ALL_MOVES))
+    outcome = np.zeros(compiled_outcomes.shape, dtype=np.int8)
+    outcome[compiled_outcomes == OUTCOME_WIN] = _PLAYER_1_WINS
+    outcome[compiled_outcomes == OUTCOME_LOSS] = _PLAYER_2_WINS
+
+    return outcome
+
+
+def choose_moves(move_counts: 'np.ndarray', policy: str, rng: 'np.random.Generator') -> 'np.ndarray':
+    """
+    Picks one remaining move for every player of every game
+    :param move_counts: (players x moves x games) remaining move counts
+    :param policy: 'uniform' picks any remaining move with equal chance,
+                   'weighted' picks in proportion to how many of each move remain
+    :param rng: random generator
+    :return: (players x games) move indexes; len(ALL_MOVES) for a player with no moves left
+    """
+    weights = move_counts if policy == 'weighted' else (move_counts > 0).astype(move_counts.dtype)
+    total_weights = sum_moves(weights)
+
+    # Pick the k-th unit of weight, then find which move it falls in by walking the running total.
+    # Moves are few and games are many, so loop over moves and let each step cover every game.
+    thresholds = (rng.random(total_weights.shape, dtype=np.float32) * total_weights).astype(weights.dtype)
+
+    running_weights = weights[:, 0, :].copy()
+    moves = (running_weights <= thresholds).astype(np.int8)
+    for move_index in range(1, weights.shape[1]):
+        running_weights += weights[:, move_index, :]
+        moves += running_weights <= thresholds
+
+    return moves
+
+
+def sum_moves(move_counts: 'np.ndarray') -> 'np.ndarray':
+    """
+    Totals move counts row by row, which is much faster than reducing over the short middle axis
+    :param move_counts: (players x moves x games) move counts
+    :return: (players x games) totals
+    """
+    totals = move_counts[:, 0, :].copy()
+    for move_index in range(1, move_counts.shape[1]):
+        totals += move_counts[:, move_index, :]
+
+    return totals
+
+
+def simulate_stage(stage_move_counts: Dict[str, int], game_count: int, max_rounds: int, target_score: int,
+                   policy: str = 'uniform', regen_threshold: int = REGEN_THRESHOLD,
+                   regen_quantity: int = REGEN_QUANTITY_EACH, regen_iterations: int = REGEN_ITERATIONS,
+                   rng: Optional['np.random.Generator'] = None) -> dict:
+    """
+    Plays many matches on one stage at once.
+    Arrays keep games on their last axis, so every per-move step is a handful of whole-row operations.
+    :param stage_move_counts: starting move counts, like a value of STAGES
+    :param game_count: number of matches
+    :param max_rounds: matches still going after this many rounds are left unfinished
+    :param target_score: a match ends when a player reaches this score
+    :param policy: one of MOVE_POLICIES
+    :param regen_threshold: like REGEN_THRESHOLD
+    :param regen_quantity: like REGEN_QUANTITY_EACH
+    :param regen_iterations: like REGEN_ITERATIONS
+    :param rng: random generator; a fresh unseeded one if None
+    :return: dict with per-game arrays 'winner' (0 unfinished, 1, or 2) and 'length' (rounds played),
+             and totals 'rounds', 'tie_rounds', and 'regen_events' (one per player per regenerating round)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    move_count = len(ALL_MOVES)
+
+    # Pad the outcome table with a row and column of ties for players who ran out of moves
+    flat_outcomes = np.zeros((move_count + 1, move_count + 1), dtype=np.int8)
+    flat_outcomes[:move_count, :move_count] = build_outcome_matrix()
+    flat_outcomes = flat_outcomes.ravel()
+
+    initial_counts = np.array([stage_move_counts[move] for move in ALL_MOVES], dtype=np.int16)
+
+    # Arrays for games still being played; finished games are dropped as they pile up
+    move_counts = np.repeat(np.repeat(initial_counts[np.newaxis, :, np.newaxis], 2, axis=0), game_count, axis=2)
+    scores = np.zeros((2, game_count), dtype=np.int32)
+    is_active = np.ones(game_count, dtype=bool)
+    game_ids = np.arange(game_count)
+
+    winners = np.zeros(game_count, dtype=np.int8)
+    lengths = np.full(game_count, max_rounds, dtype=np.int32)
+    total_rounds = 0
+    tie_rounds = 0
+    regen_events = 0
+    active_count = game_count
+
+    for round_number in range(1, max_rounds + 1):
+        if active_count == 0:
+            break
+
+        # Both players pick and spend a move
+        moves = choose_moves(move_counts, policy, rng)
+        for move_index in range(move_count):
+            move_counts[:, move_index, :] -= moves == move_index
+
+        # A player with no moves left can only quit, which leaves the match unfinished
+        is_stuck = (moves == move_count).any(axis=0) & is_active
+
+        # Resolve the round with one lookup per game
+        outcomes = flat_outcomes[moves[0] * (move_count + 1) + moves[1]]
+        player_1_wins = (outcomes == _PLAYER_1_WINS) & is_active
+        player_2_wins = (outcomes == _PLAYER_2_WINS) & is_active
+        scores[0] += player_1_wins
+        scores[1] += player_2_wins
+
+        played_count = active_count - int(is_stuck.sum())
+        total_rounds += played_count
+        tie_rounds += played_count - int(player_1_wins.sum()) - int(player_2_wins.sum())
+
+        # Regenerate random options for every player running low
+        needs_regen = sum_moves(move_counts) < regen_threshold
+        needs_regen &= is_active
+        regen_count = int(needs_regen.sum())
+        regen_events += regen_count
+
+        # Only draw random options for the players that need them, adding straight into the flat array
+        if regen_count > 0:
+            regen_players, regen_games = np.nonzero(needs_regen)
+            regen_offsets = regen_players * (move_count * len(game_ids)) + regen_games
+            flat_move_counts = move_counts.reshape(-1)
+
+            for _ in range(regen_iterations):
+                regenerated_moves = rng.integers(0, move_count, size=regen_count)
+                flat_move_counts[regen_offsets + regenerated_moves * len(game_ids)] += regen_quantity
+
+        # Record games that just finished
+        has_winner = (scores >= target_score).any(axis=0)
+        is_finished = (has_winner | is_stuck) & is_active
+        if is_finished.any():
+            finished_ids = game_ids[is_finished]
+            winners[finished_ids] = np.where(
+                has_winner[is_finished], np.where(scores[0, is_finished] >= target_score, 1, 2), 0)
+            lengths[finished_ids] = round_number
+
+            is_active &= ~is_finished
+            active_count = int(is_active.sum())
+
+            # Drop finished games once they make up a quarter of the arrays
+            if active_count < 0.75 * len(game_ids):
+                game_ids = game_ids[is_active]
+                # Keep the array contiguous, since regeneration writes through a flat view of it
+                move_counts = np.ascontiguousarray(move_counts[:, :, is_active])
+                scores = scores[:, is_active]
+                is_active = is_active[is_active]
+
+    return {
+        'winner': winners,
+        'length': lengths,
+        'rounds': total_rounds,
+        'tie_rounds': tie_rounds,
+        'regen_events': regen_events,
+    }
+
+
+def simulate_stage_in_batches(stage_move_counts: Dict[str, int], game_count: int, batch_size: int, max_rounds: int,
+                              target_score: int, policy: str = 'uniform', regen_threshold: int = REGEN_THRESHOLD,
+                              regen_quantity: int = REGEN_QUANTITY_EACH, regen_iterations: int = REGEN_ITERATIONS,
+                              rng: Optional['np.random.Generator'] = None) -> dict:
+    """
+    Same as simulate_stage(), but plays at most batch_size matches at once to bound memory
+    :param batch_size: most matches simulated at once
+    (other parameters and return value are as in simulate_stage())
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    batch_results = []
+    remaining_games = game_count
+    while remaining_games > 0:
+        batch_game_count = min(batch_size, remaining_games)
+        batch_results.append(simulate_stage(
+            stage_move_counts, batch_game_count, max_rounds, target_score, policy,
+            regen_threshold, regen_quantity, regen_iterations, rng))
+        remaining_games -= batch_game_count
+
+    results = {
+        'winner': np.concatenate([batch['winner'] for batch in batch_results]),
+        'length': np.concatenate([batch['length'] for batch in batch_results]),
+    }
+    for total_name in ('rounds', 'tie_rounds', 'regen_events'):
+        results[total_name] = sum(batch[total_name] for batch in batch_results)
+
+    return results
+
+
+def summarize_results(results: dict) -> dict:
+    """
+    :param results: output of simulate_stage()
+    :return: win rates, game length percentiles, and regen frequency
+    """
+    winners = results['winner']
+    game_count = len(winners)
+    finished_lengths = results['length'][winners != 0]
+    round_count = max(results['rounds'], 1)
+
+    summary = {
+        'games': game_count,
+        'player_1_win_rate': float((winners == 1).sum()) / game_count,
+        'player_2_win_rate': float((winners == 2).sum()) / game_count,
+        'unfinished_rate': float((winners == 0).sum()) / game_count,
+        'tie_round_rate': results['tie_rounds'] / round_count,
+        'regens_per_100_rounds': 100 * results['regen_events'] / round_count,
+        'mean_length': float(finished_lengths.mean()) if len(finished_lengths) > 0 else 0.0,
+    }
+
+    for percent in (50, 90, 99):
+        summary[f'p{percent}_length'] = (
+            float(np.percentile(finished_lengths, percent)) if len(finished_lengths) > 0 else 0.0)
+
+    return summary
+
+
+def simulate_with_engine(stage: str, game_count: int, max_rounds: int, target_score: int,
+                         rng: Optional[random.Random] = None) -> float:
+    """
+    Plays matches through rps_engine.step_many(), a round of every unfinished match per call,
+    as a speed reference for simulate_stage().
+    Uses the default REGEN_* constants and the uniform policy.
+    :param stage: stage name from STAGES
+    :param game_count: number of matches
+    :param max_rounds: matches still going after this many rounds are abandoned
+    :param target_score: a match ends when a player reaches this score
+    :param rng: random generator for regen seeds and moves; a fresh unseeded one if None
+    :return: seconds taken
+    """
+    rng = rng if rng is not None else random.Random()
+    start_time = time.perf_counter()
+    players = (PLAYER_1, PLAYER_2)
+    move_fields = [[rps_engine.MOVE_COUNT_FIELDS[player][move] for move in ALL_MOVES] for player in players]
+    score_fields = [rps_engine.SCORE_FIELDS[player] for player in players]
+
+    states = [tuple(rps_engine.new_fields(stage))] * game_count
+    regen_streams = [rps_engine.new_regen_streams(rng.getrandbits(64)) for _ in range(game_count)]
+
+    for _ in range(max_rounds):
+        if len(states) == 0:
+            break
+
+        moves = [tuple(rng.choice([move for move, field in zip(ALL_MOVES, player_move_fields) if fields[field] > 0])
+                       for player_move_fields in move_fields)
+                 for fields in states]
+        states, _ = rps_engine.step_many(states, moves, regen_streams)
+
+        # Drop finished matches
+        unfinished_indexes = [index for index, fields in enumerate(states)
+                              if max(fields[field] for field in score_fields) < target_score]
+        states = [states[index] for index in unfinished_indexes]
+        regen_streams = [regen_streams[index] for index in unfinished_indexes]
+
+    return time.perf_counter() - start_time
+
+
+def main():
+    """Simulate matches on every stage and print a summary table"""
+    if np is None:
+        print('The simulator needs NumPy. Install it with: pip install numpy')
+        return
+
+    parser = argparse.ArgumentParser(description='Simulate many matches to tune stages and regen rules.')
+    parser.add_argument('--games', type=int, default=1000000, help='matches per stage')
+    parser.add_argument('--batch-size', type=int, default=1000000, help='matches simulated per batch')
+    parser.add_argument('--max-rounds', type=int, default=500, help='matches longer than this are unfinished')
+    parser.add_argument('--target-score', type=int, default=5, help='a match ends when a player reaches this')
+    parser.add_argument('--policy', choices=MOVE_POLICIES, default='uniform', help='how players pick moves')
+    parser.add_argument('--stage', action='append', choices=list(STAGES), help='stage to simulate (repeatable)')
+    parser.add_argument('--regen-threshold', type=int, default=REGEN_THRESHOLD,
+                        help='players regenerate once their options total less than this')
+    parser.add_argument('--regen-quantity', type=int, default=REGEN_QUANTITY_EACH,
+                        help='options each regeneration draw adds')
+    parser.add_argument('--regen-iterations', type=int, default=REGEN_ITERATIONS,
+                        help='regeneration draws each time a player runs low')
+    parser.add_argument('--seed', type=int, help='seed for repeatable runs')
+    parser.add_argument('--compare-games', type=int, default=0,
+                        help='also time this many matches through rps_engine.step_many(), for reference')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    stages = args.stage or list(STAGES)
+
+    print(f'{"stage":<11} {"games":>9} {"P1 win":>7} {"P2 win":>7} {"unfin":>6} {"tie rd":>7} '
+          f'{"mean len":>8} {"p50":>5} {"p90":>5} {"p99":>5} {"regen/100":>9} {"games/s":>10}')
+
+    for stage in stages:
+        start_time = time.perf_counter()
+
+        results = simulate_stage_in_batches(
+            STAGES[stage], args.games, args.batch_size, args.max_rounds, args.target_score, args.policy,
+            args.regen_threshold, args.regen_quantity, args.regen_iterations, rng)
+
+        elapsed_seconds = time.perf_counter() - start_time
+
+        summary = summarize_results(results)
+        print(f'{stage:<11} {summary["games"]:>9} {summary["player_1_win_rate"]:>7.2%} '
+              f'{summary["player_2_win_rate"]:>7.2%} {summary["unfinished_rate"]:>6.2%} '
+              f'{summary["tie_round_rate"]:>7.2%} {summary["mean_length"]:>8.2f} {summary["p50_length"]:>5.0f} '
+              f'{summary["p90_length"]:>5.0f} {summary["p99_length"]:>5.0f} '
+              f'{summary["regens_per_100_rounds"]:>9.2f} {args.games / elapsed_seconds:>10.0f}')
+
+    if args.compare_games > 0:
+        elapsed_seconds = simulate_with_engine(stages[0], args.compare_games, args.max_rounds, args.target_score,
+                                               random.Random(args.seed))
+        print(f'\nrps_engine.step_many() on {stages[0]}: {args.compare_games / elapsed_seconds:.0f} games/s')
+
+
+if __name__ == '__main__':
+    main()
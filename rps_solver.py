@@ -0,0 +1,457 @@
+"""
+Game-theoretic solver for Super LAN Rock-Paper-Scissors.
+
+Unlike plain RPS, each player has a limited number of each move, refilled at random by regeneration,
+so the best mixed strategy depends on both players' remaining counts.
+The solver treats the next `horizon` rounds as a zero-sum stochastic game scored +1 per round won and -1 per round lost.
+Each state (my counts, opponent counts, rounds left) is a matrix game over the moves both players still have,
+whose payoffs are this round's result plus the expected value of the state it leads to, regeneration included.
+States are solved by dynamic programming with a bounded LRU memo.
+
+Solving every state takes around a second, far too long between moves, so `python rps_solver.py` precomputes the strategy for every state reachable
+on each stage and saves the tables; SolverBot loads them at startup and answers each move with a table lookup.
+
+Example: python rps_solver.py --horizon 20
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+from game_constants import *
+from rulesets import OUTCOME_LOSS, OUTCOME_TIE, OUTCOME_WIN
+
+
+DEFAULT_SOLVER_HORIZON = 20
+DEFAULT_SOLVER_MEMO_SIZE = 1 << 20  # states kept in the LRU memo
+
+# Saved next to this file by default, since it depends on the rules in game_constants.py
+DEFAULT_SOLVER_TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rps_solver_tables.json')
+
+# Probabilities and best-response checks allow this much floating-point error
+_TOLERANCE = 1e-9
+
+# Remaining count of each move, in ALL_MOVES order
+MoveCounts = Tuple[int, ...]
+
+# A mixed strategy: probability of each move, in ALL_MOVES order
+Strategy = Tuple[float, ...]
+
+
+def _solve_linear_system(coefficients: List[List[float]], constants: List[float]) -> Optional[List[float]]:
+    """
+    Solves a small square linear system by Gaussian elimination with partial pivoting
+    :param coefficients: square matrix of coefficients; modified in place
+    :param constants: right-hand side; modified in place
+    :return: the solution, or None if the system is singular
+    """
+    size = len(constants)
+
+    for pivot_index in range(size):
+        best_row = max(range(pivot_index, size), key=lambda row: abs(coefficients[row][pivot_index]))
+        if abs(coefficients[best_row][pivot_index]) < _TOLERANCE:
+            return None
+
+        coefficients[pivot_index], coefficients[best_row] = coefficients[best_row], coefficients[pivot_index]
+        constants[pivot_index], constants[best_row] = constants[best_row], constants[pivot_index]
+
+        pivot_row = coefficients[pivot_index]
+        for row in range(pivot_index + 1, size):
+            factor = coefficients[row][pivot_index] / pivot_row[pivot_index]
+            if factor != 0:
+                for column in range(pivot_index, size):
+                    coefficients[row][column] -= factor * pivot_row[column]
+                constants[row] -= factor * constants[pivot_index]
+
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        remainder = constants[row] - sum(coefficients[row][column] * solution[column] for column in range(row + 1, size))
+        solution[row] = remainder / coefficients[row][row]
+
+    return solution
+
+
+def _solve_equalizing_strategy(payoffs: List[List[float]]) -> Optional[Tuple[List[float], float]]:
+    """
+    Finds the row strategy that gives every column of a square game the same payoff
+    :param payoffs: square payoff matrix to the row player
+    :return: the strategy and that payoff, or None if there isn't exactly one such strategy
+    """
+    size = len(payoffs)
+
+    # Unknowns are each row's probability, then the value: every column pays the value, and probabilities sum to 1
+    coefficients = [[payoffs[row][column] for row in range(size)] + [-1.0] for column in range(size)]
+    coefficients.append([1.0] * size + [0.0])
+    solution = _solve_linear_system(coefficients, [0.0] * size + [1.0])
+
+    if solution is None:
+        return None
+
+    return solution[:size], solution[size]
+
+
+def solve_matrix_game(payoffs: List[List[float]]) -> Tuple[float, List[float], List[float]]:
+    """
+    Finds an equilibrium of a two-player zero-sum game.
+    Every such game has one on some square submatrix where both players equalize the other's payoffs
+    (Shapley-Snow), so this checks square submatrices from smallest to largest, which is quick for a few moves.
+    :param payoffs: payoffs[i][j] to the row player when row i meets column j
+    :return: the game's value to the row player, the row player's strategy, and the column player's strategy
+    """
+    row_count = len(payoffs)
+    column_count = len(payoffs[0])
+    transposed_payoffs = [[-payoffs[row][column] for row in range(row_count)] for column in range(column_count)]
+
+    for size in range(1, min(row_count, column_count) + 1):
+        for rows in combinations(range(row_count), size):
+            for columns in combinations(range(column_count), size):
+                row_solution = _solve_equalizing_strategy([[payoffs[row][column] for column in columns] for row in rows])
+                if row_solution is None or min(row_solution[0]) < -_TOLERANCE:
+                    continue
+
+                column_solution = _solve_equalizing_strategy(
+                    [[transposed_payoffs[column][row] for row in rows] for column in columns])
+                if column_solution is None or min(column_solution[0]) < -_TOLERANCE:
+                    continue
+
+                value = row_solution[1]
+                row_strategy = [0.0] * row_count
+                for row, probability in zip(rows, row_solution[0]):
+                    row_strategy[row] = max(probability, 0.0)
+                column_strategy = [0.0] * column_count
+                for column, probability in zip(columns, column_solution[0]):
+                    column_strategy[column] = max(probability, 0.0)
+
+                # Neither player may have a better reply anywhere in the full game
+                if any(sum(payoffs[row][column] * column_strategy[column] for column in range(column_count)) >
+                       value + _TOLERANCE for row in range(row_count)):
+                    continue
+                if any(sum(payoffs[row][column] * row_strategy[row] for row in range(row_count)) <
+                       value - _TOLERANCE for column in range(column_count)):
+                    continue
+
+                return value, row_strategy, column_strategy
+
+    raise ArithmeticError('no equilibrium found; the payoffs may not be finite')
+
+
+# Payoff to the player whose move is first, by ruleset outcome
+_PAYOFFS = {OUTCOME_WIN: 1, OUTCOME_LOSS: -1, OUTCOME_TIE: 0}
+
+
+def get_round_payoff(move: str, opponent_move: str) -> int:
+    """
+    :param move: one of ALL_MOVES
+    :param opponent_move: one of ALL_MOVES
+    :return: 1 if move wins the round, -1 if it loses, or 0 for a tie
+    """
+    return _PAYOFFS[RULESET.get_outcome(move, opponent_move)]
+
+
+class LimitedMoveSolver:
+    """
+    Computes equilibrium strategies over the (my counts, opponent counts) state space,
+    for given regeneration rules and look-ahead
+    """
+    def __init__(self, horizon: int = DEFAULT_SOLVER_HORIZON, regen_threshold: int = REGEN_THRESHOLD,
+                 regen_quantity: int = REGEN_QUANTITY_EACH, regen_iterations: int = REGEN_ITERATIONS,
+                 memo_size: Optional[int] = DEFAULT_SOLVER_MEMO_SIZE):
+        """
+        :param horizon: number of rounds to look ahead
+        :param regen_threshold: a player regenerates when their total remaining options drop below this
+        :param regen_quantity: options added to a random move per regeneration draw
+        :param regen_iterations: regeneration draws each time a player regenerates
+        :param memo_size: most states the LRU memo keeps; unbounded if None
+        """
+        self.horizon = horizon
+        self.regen_threshold = regen_threshold
+        self.regen_quantity = regen_quantity
+        self.regen_iterations = regen_iterations
+
+        # Strategy for each (my counts, opponent counts) at the full horizon, filled by precompute_stage() or loading
+        self.strategy_table: Dict[Tuple[MoveCounts, MoveCounts], Strategy] = {}
+
+        self._solve_state = lru_cache(maxsize=memo_size)(self._solve_state_uncached)
+        self.get_regen_outcomes = lru_cache(maxsize=memo_size)(self._get_regen_outcomes_uncached)
+
+    def get_rules(self) -> dict:
+        """
+        :return: everything the solutions depend on, to check that saved tables still apply
+        """
+        return {
+            'moves': ALL_MOVES,
+            'move_beats': {move: list(defeated_moves) for move, defeated_moves in MOVE_BEATS.items()},
+            'horizon': self.horizon,
+            'regen_threshold': self.regen_threshold,
+            'regen_quantity': self.regen_quantity,
+            'regen_iterations': self.regen_iterations,
+        }
+
+    def _get_regen_outcomes_uncached(self, counts: MoveCounts) -> List[Tuple[MoveCounts, float]]:
+        """
+        Use self.get_regen_outcomes(), which is memoized.
+        :param counts: a player's counts right after playing a move
+        :return: each possible set of counts once the round is over, with its probability
+        """
+        if sum(counts) >= self.regen_threshold:
+            return [(counts, 1.0)]
+
+        # Each draw adds regen_quantity to a uniformly random move, as in RPSGameManager.regenerate_random_option()
+        outcomes = {counts: 1.0}
+        for _ in range(self.regen_iterations):
+            next_outcomes = {}
+            for outcome, probability in outcomes.items():
+                for move_index in range(len(ALL_MOVES)):
+                    regenerated = list(outcome)
+                    regenerated[move_index] += self.regen_quantity
+                    regenerated = tuple(regenerated)
+                    next_outcomes[regenerated] = next_outcomes.get(regenerated, 0.0) + probability / len(ALL_MOVES)
+            outcomes = next_outcomes
+
+        return list(outcomes.items())
+
+    def _get_next_counts(self, counts: MoveCounts, move_index: int) -> List[Tuple[MoveCounts, float]]:
+        """
+        :param counts: a player's counts before the round
+        :param move_index: index in ALL_MOVES of the move they play
+        :return: each possible set of counts after the round, with its probability
+        """
+        played = list(counts)
+        played[move_index] -= 1
+
+        return self.get_regen_outcomes(tuple(played))
+
+    def _solve_state_uncached(self, my_counts: MoveCounts, opponent_counts: MoveCounts,
+                              rounds_left: int) -> Tuple[float, Strategy, Strategy]:
+        """
+        Solves one state of the stochastic game. Use self._solve_state(), which is memoized.
+        :param my_counts: the row player's counts
+        :param opponent_counts: the column player's counts
+        :param rounds_left: rounds still to play
+        :return: the state's value to the row player, and both players' strategies over ALL_MOVES
+        """
+        no_moves = (0.0,) * len(ALL_MOVES)
+
+        # The game is zero-sum and symmetric, so each unordered pair of counts is only solved once
+        if opponent_counts < my_counts:
+            value, opponent_strategy, my_strategy = self._solve_state(opponent_counts, my_counts, rounds_left)
+            return -value, my_strategy, opponent_strategy
+
+        my_moves = [index for index, count in enumerate(my_counts) if count > 0]
+        opponent_moves = [index for index, count in enumerate(opponent_counts) if count > 0]
+
+        if rounds_left == 0 or len(my_moves) == 0 or len(opponent_moves) == 0:
+            return 0.0, no_moves, no_moves
+
+        payoffs = []
+        for my_move in my_moves:
+            my_next_counts = self._get_next_counts(my_counts, my_move)
+            payoff_row = []
+
+            for opponent_move in opponent_moves:
+                opponent_next_counts = self._get_next_counts(opponent_counts, opponent_move)
+
+                future_value = 0.0
+                if rounds_left > 1:
+                    for my_outcome, my_probability in my_next_counts:
+                        for opponent_outcome, opponent_probability in opponent_next_counts:
+                            outcome_value = self._solve_state(my_outcome, opponent_outcome, rounds_left - 1)[0]
+                            future_value += my_probability * opponent_probability * outcome_value
+
+                round_payoff = get_round_payoff(ALL_MOVES[my_move], ALL_MOVES[opponent_move])
+                payoff_row.append(round_payoff + future_value)
+
+            payoffs.append(payoff_row)
+
+        value, my_move_strategy, opponent_move_strategy = solve_matrix_game(payoffs)
+
+        my_strategy = list(no_moves)
+        for move_index, probability in zip(my_moves, my_move_strategy):
+            my_strategy[move_index] = probability
+        opponent_strategy = list(no_moves)
+        for move_index, probability in zip(opponent_moves, opponent_move_strategy):
+            opponent_strategy[move_index] = probability
+
+        return value, tuple(my_strategy), tuple(opponent_strategy)
+
+    def solve(self, my_counts: MoveCounts, opponent_counts: MoveCounts) -> Tuple[float, Strategy]:
+        """
+        Solves a state from scratch (using the memo), ignoring the strategy table
+        :param my_counts: the local player's counts, in ALL_MOVES order
+        :param opponent_counts: the opponent's counts, in ALL_MOVES order
+        :return: expected score difference over the next `horizon` rounds, and the local player's strategy
+        """
+        value, my_strategy, _ = self._solve_state(tuple(my_counts), tuple(opponent_counts), self.horizon)
+
+        return value, my_strategy
+
+    def get_strategy(self, my_counts: MoveCounts, opponent_counts: MoveCounts) -> Strategy:
+        """
+        Looks up the local player's equilibrium strategy, solving and remembering it if the tables don't have it
+        :param my_counts: the local player's counts, in ALL_MOVES order
+        :param opponent_counts: the opponent's counts, in ALL_MOVES order
+        :return: probability of each move, in ALL_MOVES order
+        """
+        key = (tuple(my_counts), tuple(opponent_counts))
+        strategy = self.strategy_table.get(key)
+
+        if strategy is None:
+            strategy = self.solve(*key)[1]
+            self.strategy_table[key] = strategy
+
+        return strategy
+
+    def find_reachable_states(self, stage: str) -> List[Tuple[MoveCounts, MoveCounts]]:
+        """
+        :param stage: stage name from STAGES
+        :return: every (my counts, opponent counts) a match on the stage can reach
+        """
+        initial_counts = tuple(STAGES[stage][move] for move in ALL_MOVES)
+        initial_state = (initial_counts, initial_counts)
+        reachable = {initial_state}
+        frontier = [initial_state]
+
+        while frontier:
+            my_counts, opponent_counts = frontier.pop()
+
+            for my_move in range(len(ALL_MOVES)):
+                if my_counts[my_move] == 0:
+                    continue
+
+                for opponent_move in range(len(ALL_MOVES)):
+                    if opponent_counts[opponent_move] == 0:
+                        continue
+
+                    for my_outcome, _ in self._get_next_counts(my_counts, my_move):
+                        for opponent_outcome, _ in self._get_next_counts(opponent_counts, opponent_move):
+                            next_state = (my_outcome, opponent_outcome)
+                            if next_state not in reachable:
+                                reachable.add(next_state)
+                                frontier.append(next_state)
+
+        return sorted(reachable)
+
+    def precompute_stage(self, stage: str) -> int:
+        """
+        Fills the strategy table for every state reachable on a stage
+        :param stage: stage name from STAGES
+        :return: number of states in the stage's table
+        """
+        states = self.find_reachable_states(stage)
+
+        for my_counts, opponent_counts in states:
+            self.get_strategy(my_counts, opponent_counts)
+
+        return len(states)
+
+    def save_tables(self, path: str = DEFAULT_SOLVER_TABLES_PATH):
+        """
+        Writes the strategy table to a JSON file
+        :param path: file to write
+        """
+        strategies = {
+            _format_state_key(my_counts, opponent_counts): strategy
+            for (my_counts, opponent_counts), strategy in self.strategy_table.items()
+        }
+
+        with open(path, 'w') as tables_file:
+            json.dump({'rules': self.get_rules(), 'strategies': strategies}, tables_file)
+
+    def load_tables(self, path: str = DEFAULT_SOLVER_TABLES_PATH) -> bool:
+        """
+        Adds strategies from a file written by save_tables(), if it was solved with the same rules
+        :param path: file to read
+        :return: True if the tables were loaded
+        """
+        try:
+            with open(path) as tables_file:
+                tables = json.load(tables_file)
+
+        except (OSError, ValueError):
+            return False
+
+        if tables.get('rules') != json.loads(json.dumps(self.get_rules())):
+            return False
+
+        for key, strategy in tables['strategies'].items():
+            self.strategy_table[_parse_state_key(key)] = tuple(strategy)
+
+        return True
+
+
+def _format_state_key(my_counts: MoveCounts, opponent_counts: MoveCounts) -> str:
+    """
+    :return: JSON object key for a state, like '3,3,2/2,3,3'
+    """
+    return ','.join(map(str, my_counts)) + '/' + ','.join(map(str, opponent_counts))
+
+
+def _parse_state_key(key: str) -> Tuple[MoveCounts, MoveCounts]:
+    """
+    :param key: key made by _format_state_key()
+    :return: (my counts, opponent counts)
+    """
+    my_part, opponent_part = key.split('/')
+
+    return tuple(map(int, my_part.split(','))), tuple(map(int, opponent_part.split(',')))
+
+
+def load_solver(horizon: int = DEFAULT_SOLVER_HORIZON, path: str = DEFAULT_SOLVER_TABLES_PATH) -> LimitedMoveSolver:
+    """
+    Loads a solver's saved tables, or precomputes every stage and tries to save them for next time
+    :param horizon: rounds to look ahead
+    :param path: tables file
+    :return: solver with a strategy for every reachable state
+    """
+    solver = LimitedMoveSolver(horizon=horizon)
+
+    if not solver.load_tables(path):
+        for stage in STAGES:
+            solver.precompute_stage(stage)
+
+        try:
+            solver.save_tables(path)
+        except OSError:
+            pass
+
+    return solver
+
+
+def main():
+    """Precompute and save the solver's strategy tables for every stage"""
+    parser = argparse.ArgumentParser(description='Precompute equilibrium strategies for every stage.')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_SOLVER_HORIZON, help='rounds to look ahead')
+    parser.add_argument('--output', default=DEFAULT_SOLVER_TABLES_PATH, help='file to save the tables to')
+    args = parser.parse_args()
+
+    solver = LimitedMoveSolver(horizon=args.horizon)
+
+    for stage in STAGES:
+        start_time = time.perf_counter()
+        state_count = solver.precompute_stage(stage)
+        initial_counts = tuple(STAGES[stage][move] for move in ALL_MOVES)
+        opening_strategy = solver.get_strategy(initial_counts, initial_counts)
+
+        print(f'{stage:<12} {state_count:>6} states in {time.perf_counter() - start_time:7.2f} s, opening strategy: ' +
+              ' '.join(f'{move} {probability:.3f}' for move, probability in zip(ALL_MOVES, opening_strategy)))
+
+    solver.save_tables(args.output)
+    print(f'saved {len(solver.strategy_table)} strategies to {args.output}')
+
+    # Show what a lookup costs once the tables are loaded
+    loaded_solver = LimitedMoveSolver(horizon=args.horizon)
+    loaded_solver.load_tables(args.output)
+    keys = list(loaded_solver.strategy_table)
+    chooser = random.Random(0)
+    start_time = time.perf_counter()
+    for my_counts, opponent_counts in keys:
+        chooser.choices(ALL_MOVES, weights=loaded_solver.get_strategy(my_counts, opponent_counts))
+    print(f'lookup and move choice: {(time.perf_counter() - start_time) / len(keys) * 1e6:.2f} us per move')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Watches a live match on the match server (Super_LAN_RPS_match_server.py), printing every round as it's resolved.
+
+With no match ID, watches whichever live match has the most spectators.
+Asking for a match that isn't live gets a list of live ones instead.
+
+Example: python rps_spectator.py 42
+"""
+
+import argparse
+from socket import create_connection
+from typing import Optional
+from socket_constants import *
+from game_constants import *
+from socket_helpers import GELA372Receiver, PacketUnpackError, receive_message_bytes, send_message
+import state_codec
+
+
+def get_player_label(update: dict, player: str) -> str:
+    """
+    :param update: spectator update
+    :param player: a player's representative constant defined in game_constants.py
+    :return: the player's name, or which player they are if they didn't send a name
+    """
+    name = update['names'].get(player)
+
+    return name if name is not None else f'Player {player}'
+
+
+def describe_update(update: dict) -> str:
+    """
+    :param update: spectator update
+    :return: lines describing the latest round, or how the match ended
+    """
+    labels = {player: get_player_label(update, player) for player in (PLAYER_1, PLAYER_2)}
+    scores = update['scores']
+    score_text = f'{labels[PLAYER_1]} {scores[PLAYER_1]} - {scores[PLAYER_2]} {labels[PLAYER_2]}'
+
+    if update['finished']:
+        quitter = update['quitter']
+        ending_text = f'{labels[quitter]} quit' if quitter in labels else 'A player left'
+
+        return f'{ending_text} after {update["round"]} rounds. Final score: {score_text}'
+
+    moves = update['moves']
+    winner = update['round_winner']
+    winner_text = 'Tie' if winner not in labels else f'{labels[winner]} wins the round'
+
+    return (f'Match {update["match"]} on {update["stage"]}, round {update["round"]}: '
+            f'{labels[PLAYER_1]} played {moves[PLAYER_1]}, {labels[PLAYER_2]} played {moves[PLAYER_2]}. '
+            f'{winner_text}. Score: {score_text}')
+
+
+def watch(host: str, port: int, match_id: Optional[int]):
+    """
+    Prints a live match until it ends or the match server disconnects
+    :param host: match server host
+    :param port: match server port
+    :param match_id: ID of the match to watch, or None for the most-watched live match
+    """
+    connection_socket = create_connection((host, port))
+    receiver = GELA372Receiver()
+
+    try:
+        send_message(state_codec.encode_watch_request(match_id), connection_socket)
+
+        while True:
+            message = receive_message_bytes(connection_socket, receiver)
+
+            if state_codec.is_notice(message):
+                print(f'{NOTICE_LINE_PREFIX}{state_codec.decode_notice(message)}')
+
+            elif state_codec.is_spectator_update(message):
+                update = state_codec.decode_spectator_update(message)
+                print(describe_update(update))
+
+                if update['finished']:
+                    break
+
+    except PacketUnpackError:
+        # The match server closes the connection once there's nothing (more) to watch
+        pass
+
+    finally:
+        connection_socket.close()
+
+
+def main():
+    """Be a spectator"""
+    parser = argparse.ArgumentParser(description='Watch a live match on the match server.')
+    parser.add_argument('match_id', nargs='?', type=int, help='match to watch; the most-watched one if not given')
+    parser.add_argument('--host', default=SERVER_NAME, help='match server host')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='match server port')
+    args = parser.parse_args()
+
+    watch(args.host, args.port, args.match_id)
+
+    print('\nConnection closed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Parameter sweep for stage balance analysis.
+
+Takes a range for each move's starting count and for each REGEN_* constant, and simulates every combination
+with rps_simulator.py across a process pool that uses every core.
+Each finished combination is printed and appended to a JSON lines file right away,
+so an interrupted sweep picks up where it left off when run again with the same options.
+A summary table of every combination is printed at the end.
+
+Ranges are written as a single value (2), an inclusive range (1:4), or a range with a step (2:8:2).
+
+Needs NumPy (pip install numpy).
+
+Example: python rps_sweep.py --counts R=1:3 P=1:3 S=1:3 --regen-threshold 2:4 --games 100000
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+from game_constants import *
+import rps_simulator
+from rps_simulator import MOVE_POLICIES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_SWEEP_RESULTS_PATH = 'sweep_results.jsonl'
+DEFAULT_COUNT_RANGE = '1:3'
+
+# Summary columns: name in summarize_results(), heading, width, and number format
+SUMMARY_COLUMNS = [
+    ('player_1_win_rate', 'P1 win', 7, '.2%'),
+    ('unfinished_rate', 'unfin', 6, '.2%'),
+    ('tie_round_rate', 'tie rd', 7, '.2%'),
+    ('mean_length', 'mean len', 8, '.2f'),
+    ('p50_length', 'p50', 5, '.0f'),
+    ('p90_length', 'p90', 5, '.0f'),
+    ('p99_length', 'p99', 5, '.0f'),
+    ('regens_per_100_rounds', 'regen/100', 9, '.2f'),
+]
+
+
+def parse_range(text: str) -> List[int]:
+    """
+    :param text: a single value, lo:hi (inclusive), or lo:hi:step
+    :return: the values in the range
+    """
+    try:
+        parts = [int(part) for part in text.split(':')]
+
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'not a range: {text!r}')
+
+    if len(parts) == 1:
+        return parts
+
+    if len(parts) in (2, 3) and (len(parts) == 2 or parts[2] > 0) and parts[0] <= parts[1]:
+        step = parts[2] if len(parts) == 3 else 1
+        return list(range(parts[0], parts[1] + 1, step))
+
+    raise argparse.ArgumentTypeError(f'not a range: {text!r}')
+
+
+def parse_count_ranges(count_texts: List[str]) -> Dict[str, List[int]]:
+    """
+    :param count_texts: items like R=1:3, one per move at most
+    :return: starting-count values for every move in ALL_MOVES; moves not given use DEFAULT_COUNT_RANGE
+    """
+    count_ranges = {move: parse_range(DEFAULT_COUNT_RANGE) for move in ALL_MOVES}
+
+    for count_text in count_texts:
+        move, separator, range_text = count_text.partition('=')
+        if separator == '' or move not in ALL_MOVES:
+            raise argparse.ArgumentTypeError(f'expected MOVE=RANGE with MOVE one of {ALL_MOVES}: {count_text!r}')
+
+        count_ranges[move] = parse_range(range_text)
+
+    return count_ranges
+
+
+def build_grid(count_ranges: Dict[str, List[int]], regen_thresholds: List[int], regen_quantities: List[int],
+               regen_iterations: List[int]) -> List[dict]:
+    """
+    :return: every combination of the given values, as parameter dicts for run_sweep_point()
+    """
+    grid = []
+    move_count_values = [count_ranges[move] for move in ALL_MOVES]
+
+    for counts in itertools.product(*move_count_values):
+        # A stage where nobody has any moves can't be played
+        if sum(counts) == 0:
+            continue
+
+        for regen_threshold, regen_quantity, regen_iteration_count in itertools.product(
+                regen_thresholds, regen_quantities, regen_iterations):
+            grid.append({
+                'counts': dict(zip(ALL_MOVES, counts)),
+                'regen_threshold': regen_threshold,
+                'regen_quantity': regen_quantity,
+                'regen_iterations': regen_iteration_count,
+            })
+
+    return grid
+
+
+def get_point_key(point: dict) -> str:
+    """
+    :param point: parameter dict from build_grid()
+    :return: string that identifies the point in a results file
+    """
+    return json.dumps([point['counts'], point['regen_threshold'], point['regen_quantity'], point['regen_iterations']],
+                      sort_keys=True)
+
+
+def run_sweep_point(point: dict, settings: dict) -> dict:
+    """
+    Simulates one parameter combination. Runs in a worker process.
+    :param point: parameter dict from build_grid()
+    :param settings: games, batch_size, max_rounds, target_score, policy, and seed shared by the whole sweep
+    :return: results line for the point, holding its parameters, the sweep settings, and its summary
+    """
+    start_time = time.perf_counter()
+
+    # Seed each point by its parameters, so its results don't depend on the rest of the grid or which worker ran it
+    seed = [settings['seed'], *[point['counts'][move] for move in ALL_MOVES],
+            point['regen_threshold'], point['regen_quantity'], point['regen_iterations']]
+
+    results = rps_simulator.simulate_stage_in_batches(
+        point['counts'], settings['games'], settings['batch_size'], settings['max_rounds'], settings['target_score'],
+        settings['policy'], point['regen_threshold'], point['regen_quantity'], point['regen_iterations'],
+        np.random.default_rng(seed))
+
+    return {
+        'point': point,
+        'settings': settings,
+        'summary': rps_simulator.summarize_results(results),
+        'seconds': time.perf_counter() - start_time,
+    }
+
+
+def load_finished_points(path: str, settings: dict) -> Dict[str, dict]:
+    """
+    Reads the results of an earlier run, to resume it
+    :param path: JSON lines results file
+    :param settings: this run's settings; results made with other settings are ignored
+    :return: results lines by point key
+    """
+    finished_points = {}
+
+    try:
+        with open(path) as results_file:
+            for line in results_file:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short if a run was killed mid-write
+                    continue
+
+                if result.get('settings') == settings:
+                    finished_points[get_point_key(result['point'])] = result
+
+    except FileNotFoundError:
+        pass
+
+    return finished_points
+
+
+def format_row(result: dict) -> str:
+    """
+    :param result: results line from run_sweep_point()
+    :return: one line of the summary table
+    """
+    point = result['point']
+    counts = ' '.join(f'{point["counts"][move]:>2}' for move in ALL_MOVES)
+    regen = f'{point["regen_threshold"]:>3} {point["regen_quantity"]:>3} {point["regen_iterations"]:>3}'
+    summary = ' '.join(f'{result["summary"][name]:>{width}{number_format}}'
+                       for name, _, width, number_format in SUMMARY_COLUMNS)
+
+    return f'{counts}  {regen}  {summary}'
+
+
+def format_heading() -> str:
+    """
+    :return: heading line for format_row()
+    """
+    counts = ' '.join(f'{move:>2}' for move in ALL_MOVES)
+    summary = ' '.join(f'{heading:>{width}}' for _, heading, width, _ in SUMMARY_COLUMNS)
+
+    return f'{counts}  thr qty itr  {summary}'
+
+
+def main():
+    """Sweep stage and regen parameters"""
+    if np is None:
+        print('The sweep needs NumPy. Install it with: pip install numpy')
+        return
+
+    parser = argparse.ArgumentParser(description='Simulate every combination of stage counts and regen rules.')
+    parser.add_argument('--counts', nargs='*', default=[], metavar='MOVE=RANGE',
+                        help=f'starting-count range per move, like R=1:3 (default {DEFAULT_COUNT_RANGE} for each)')
+    parser.add_argument('--regen-threshold', type=parse_range, default=[REGEN_THRESHOLD], metavar='RANGE')
+    parser.add_argument('--regen-quantity', type=parse_range, default=[REGEN_QUANTITY_EACH], metavar='RANGE')
+    parser.add_argument('--regen-iterations', type=parse_range, default=[REGEN_ITERATIONS], metavar='RANGE')
+    parser.add_argument('--games', type=int, default=100000, help='matches per combination')
+    parser.add_argument('--batch-size', type=int, default=1000000, help='matches simulated at once per worker')
+    parser.add_argument('--max-rounds', type=int, default=500, help='matches longer than this are unfinished')
+    parser.add_argument('--target-score', type=int, default=5, help='a match ends when a player reaches this')
+    parser.add_argument('--policy', choices=MOVE_POLICIES, default='uniform', help='how players pick moves')
+    parser.add_argument('--seed', type=int, default=0, help='base seed; each combination gets its own stream')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--output', default=DEFAULT_SWEEP_RESULTS_PATH, help='JSON lines file to append results to')
+    parser.add_argument('--sort', choices=[name for name, _, _, _ in SUMMARY_COLUMNS],
+                        help='sort the final table by this column')
+    args = parser.parse_args()
+
+    try:
+        count_ranges = parse_count_ranges(args.counts)
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+
+    grid = build_grid(count_ranges, args.regen_threshold, args.regen_quantity, args.regen_iterations)
+    settings = {
+        'games': args.games,
+        'batch_size': args.batch_size,
+        'max_rounds': args.max_rounds,
+        'target_score': args.target_score,
+        'policy': args.policy,
+        'seed': args.seed,
+    }
+
+    finished_points = load_finished_points(args.output, settings)
+    pending_points = [point for point in grid if get_point_key(point) not in finished_points]
+
+    print(f'{len(grid)} combinations, {len(grid) - len(pending_points)} already in {args.output}, '
+          f'{len(pending_points)} to run on {args.workers} workers')
+    print(format_heading())
+
+    start_time = time.perf_counter()
+    finished_count = len(grid) - len(pending_points)
+
+    # Keep a few points queued per worker rather than submitting the whole grid at once,
+    # so an interrupted run doesn't have to wait for or cancel a long queue
+    point_queue = iter(pending_points)
+    in_flight = set()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, open(args.output, 'a') as results_file:
+        try:
+            while True:
+                for point in itertools.islice(point_queue, 2 * args.workers - len(in_flight)):
+                    in_flight.add(executor.submit(run_sweep_point, point, settings))
+
+                if len(in_flight) == 0:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    result = future.result()
+                    results_file.write(json.dumps(result) + '\n')
+                    results_file.flush()
+
+                    finished_points[get_point_key(result['point'])] = result
+                    finished_count += 1
+                    print(f'{format_row(result)}  [{finished_count}/{len(grid)}]')
+
+        except KeyboardInterrupt:
+            for future in in_flight:
+                future.cancel()
+            print(f'\nInterrupted. Run the same command again to resume from {args.output}.')
+            return
+
+    elapsed_seconds = time.perf_counter() - start_time
+    run_count = len(pending_points)
+    print(f'\nran {run_count} combinations in {elapsed_seconds:.1f} s '
+          f'({run_count * args.games / max(elapsed_seconds, 1e-9):.0f} games/s)')
+
+    # Summary of the whole grid, including points finished by earlier runs
+    grid_results = [finished_points[get_point_key(point)] for point in grid]
+    if args.sort is not None:
+        grid_results.sort(key=lambda result: result['summary'][args.sort])
+
+    print('\n' + format_heading())
+    for result in grid_results:
+        print(format_row(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Rulesets: which moves there are, which moves beat which, and the stages players choose from.
+
+A ruleset is plain data, either one of BUILT_IN_RULESETS or a JSON file of the same shape:
+
+    {
+        "name": "rpsls",
+        "moves": ["R", "P", "S", "L", "K"],
+        "move_names": {"R": "Rock", ...},
+        "beats": {"R": ["S", "L"], ...},
+        "stages": {"HEAVEN": {"R": 3, ...}, "CASTLE": 2, ...}
+    }
+
+Instead of "beats", "cycle" lists every move once, in an order where each move beats the half of the moves
+that follow it, wrapping around (this is how RPS-7 and RPS-15 are built). Any two moves that don't beat each other tie.
+A stage gives each move's starting count, or one count for every move; moves it leaves out start with none.
+
+compile_ruleset() checks a ruleset once, when it's loaded, and compiles it into an outcome matrix and
+a bitmask per move of the moves it beats, so resolving a round is one lookup however many moves there are.
+game_constants.py loads the ruleset named by RULESET_NAME, and everything else follows from its ALL_MOVES and STAGES.
+"""
+
+import json
+import re
+from typing import Dict, List, Tuple
+
+# Outcomes in Ruleset.outcomes, from the first move's side
+OUTCOME_TIE = 0
+OUTCOME_WIN = 1
+OUTCOME_LOSS = 2
+
+MAX_MOVES = 28  # delta-1 states flag which of their 7 + 2 * moves fields changed in 64 bits (see state_codec.py)
+MAX_MOVE_COUNT = 65535  # counts travel as 2-byte numbers (see state_codec.py)
+_MOVE_PATTERN = re.compile(r'[A-Za-z0-9]+')  # typed at the move prompt, so nothing that could look like \q
+
+BUILT_IN_RULESETS = {
+    'rps': {
+        'name': 'rps',
+        'moves': ['R', 'P', 'S'],
+        'move_names': {'R': 'Rock', 'P': 'Paper', 'S': 'Scissors'},
+        'beats': {'R': ['S'], 'P': ['R'], 'S': ['P']},
+        'stages': {
+            'HEAVEN': {'R': 3, 'P': 3, 'S': 3},
+            'OFFICE': {'R': 1, 'P': 2, 'S': 2},
+            'RAINFOREST': {'R': 2, 'P': 3, 'S': 1},
+            'MOUNTAIN': {'R': 2, 'P': 1, 'S': 1},
+            'ASTEROID': {'R': 3, 'P': 1, 'S': 2},
+            'ARMORY': {'R': 2, 'P': 1, 'S': 3},
+        },
+    },
+    'rpsls': {
+        'name': 'rpsls',
+        'moves': ['R', 'P', 'S', 'L', 'K'],
+        'move_names': {'R': 'Rock', 'P': 'Paper', 'S': 'Scissors', 'L': 'Lizard', 'K': 'Spock'},
+        'beats': {'R': ['S', 'L'], 'P': ['R', 'K'], 'S': ['P', 'L'], 'L': ['P', 'K'], 'K': ['R', 'S']},
+        'stages': {
+            'HEAVEN': 3,
+            'OFFICE': {'R': 1, 'P': 2, 'S': 2, 'L': 1, 'K': 1},
+            'LABORATORY': {'R': 1, 'P': 1, 'S': 2, 'L': 3, 'K': 2},
+            'STARSHIP': {'R': 2, 'P': 1, 'S': 1, 'L': 1, 'K': 3},
+        },
+    },
+    'rps7': {
+        'name': 'rps7',
+        'moves': ['R', 'F', 'S', 'G', 'P', 'A', 'W'],
+        'move_names': {'R': 'Rock', 'F': 'Fire', 'S': 'Scissors', 'G': 'Sponge', 'P': 'Paper', 'A': 'Air',
+                       'W': 'Water'},
+        'cycle': ['R', 'F', 'S', 'G', 'P', 'A', 'W'],
+        'stages': {
+            'HEAVEN': 2,
+            'VOLCANO': {'R': 2, 'F': 3, 'S': 1, 'G': 1, 'P': 1, 'A': 2, 'W': 1},
+            'OCEAN': {'R': 1, 'F': 1, 'S': 1, 'G': 3, 'P': 1, 'A': 1, 'W': 3},
+        },
+    },
+    'rps15': {
+        'name': 'rps15',
+        'moves': ['R', 'F', 'S', 'N', 'H', 'T', 'O', 'G', 'P', 'A', 'W', 'D', 'V', 'L', 'U'],
+        'move_names': {'R': 'Rock', 'F': 'Fire', 'S': 'Scissors', 'N': 'Snake', 'H': 'Human', 'T': 'Tree',
+                       'O': 'Wolf', 'G': 'Sponge', 'P': 'Paper', 'A': 'Air', 'W': 'Water', 'D': 'Dragon',
+                       'V': 'Devil', 'L': 'Lightning', 'U': 'Gun'},
+        'cycle': ['R', 'F', 'S', 'N', 'H', 'T', 'O', 'G', 'P', 'A', 'W', 'D', 'V', 'L', 'U'],
+        'stages': {
+            'HEAVEN': 1,
+            'ARENA': 2,
+        },
+    },
+}
+
+
+class RulesetError(ValueError):
+    pass
+
+
+class Ruleset:
+    """
+    A checked ruleset, compiled for resolving rounds by lookup
+    """
+    def __init__(self, name: str, moves: List[str], move_names: Dict[str, str], beats: Dict[str, Tuple[str, ...]],
+                 stages: Dict[str, Dict[str, int]]):
+        """
+        Use compile_ruleset(), which checks the ruleset first.
+        :param name: ruleset's name
+        :param moves: every move, in the order moves are coded in
+        :param move_names: each move's full name
+        :param beats: move -> the moves it beats
+        :param stages: stage name -> each move's starting count
+        """
+        self.name = name
+        self.moves = moves
+        self.move_names = move_names
+        self.beats = beats
+        self.stages = stages
+        self.move_indexes = {move: index for index, move in enumerate(moves)}
+
+        # beat_masks[a] has bit b set if move a beats move b
+        self.beat_masks = [sum(1 << self.move_indexes[defeated] for defeated in beats[move]) for move in moves]
+
+        # outcomes[a * len(moves) + b] is move a's outcome against move b
+        move_count = len(moves)
+        self.outcomes = bytes(
+            OUTCOME_WIN if self.beat_masks[move] >> opponent_move & 1 else
+            OUTCOME_LOSS if self.beat_masks[opponent_move] >> move & 1 else OUTCOME_TIE
+            for move in range(move_count) for opponent_move in range(move_count))
+
+    def get_outcome(self, move: str, opponent_move: str) -> int:
+        """
+        :param move: a move
+        :param opponent_move: the move it's played against
+        :return: OUTCOME_WIN, OUTCOME_LOSS, or OUTCOME_TIE, for the first move
+        """
+        return self.outcomes[self.move_indexes[move] * len(self.moves) + self.move_indexes[opponent_move]]
+
+    def describe_move_counts(self) -> str:
+        """
+        :return: how to read a stage's counts, like 'R, P, and S show how many of Rock, Paper, and Scissors'
+        """
+        return (f'{join_words(self.moves)} show how many of '
+                f'{join_words([self.move_names[move] for move in self.moves])}')
+
+
+def join_words(words: List[str]) -> str:
+    """
+    :param words: words to list
+    :return: the words joined like 'R, P, and S'
+    """
+    if len(words) < 3:
+        return ' and '.join(words)
+
+    return f'{", ".join(words[:-1])}, and {words[-1]}'
+
+
+def _read_moves(definition: dict) -> List[str]:
+    """
+    :param definition: ruleset definition
+    :return: its moves, checked
+    """
+    moves = definition.get('moves')
+    if not isinstance(moves, list) or not 2 <= len(moves) <= MAX_MOVES:
+        raise RulesetError(f'a ruleset needs a list of 2 to {MAX_MOVES} moves')
+
+    for move in moves:
+        if not isinstance(move, str) or _MOVE_PATTERN.fullmatch(move) is None:
+            raise RulesetError(f'moves must be letters and digits: {move!r}')
+
+    if len(set(moves)) != len(moves):
+        raise RulesetError(f'moves must be unique: {moves}')
+
+    return moves
+
+
+def _read_beats(definition: dict, moves: List[str]) -> Dict[str, Tuple[str, ...]]:
+    """
+    :param definition: ruleset definition
+    :param moves: its moves, already checked
+    :return: move -> the moves it beats, checked
+    """
+    if 'cycle' in definition:
+        cycle = definition['cycle']
+        if not isinstance(cycle, list) or sorted(cycle) != sorted(moves) or len(cycle) % 2 == 0:
+            raise RulesetError('a cycle must list every move once, and have an odd number of moves')
+
+        half = len(cycle) // 2
+        return {move: tuple(cycle[(index + offset) % len(cycle)] for offset in range(1, half + 1))
+                for index, move in enumerate(cycle)}
+
+    beats = definition.get('beats')
+    if not isinstance(beats, dict):
+        raise RulesetError('a ruleset needs either beats or a cycle')
+
+    checked_beats = {}
+    for move in moves:
+        defeated_moves = beats.get(move, [])
+        if not isinstance(defeated_moves, list) or len(set(defeated_moves)) != len(defeated_moves):
+            raise RulesetError(f'{move} must beat a list of distinct moves')
+
+        for defeated_move in defeated_moves:
+            if defeated_move not in moves or defeated_move == move:
+                raise RulesetError(f'{move} cannot beat {defeated_move!r}')
+
+        checked_beats[move] = tuple(defeated_moves)
+
+    unknown_moves = set(beats) - set(moves)
+    if len(unknown_moves) > 0:
+        raise RulesetError(f'beats lists moves the ruleset does not have: {sorted(unknown_moves)}')
+
+    for move, defeated_moves in checked_beats.items():
+        for defeated_move in defeated_moves:
+            if move in checked_beats[defeated_move]:
+                raise RulesetError(f'{move} and {defeated_move} cannot both beat each other')
+
+    return checked_beats
+
+
+def _read_stages(definition: dict, moves: List[str]) -> Dict[str, Dict[str, int]]:
+    """
+    :param definition: ruleset definition
+    :param moves: its moves, already checked
+    :return: stage name -> each move's starting count, checked
+    """
+    stages = definition.get('stages')
+    if not isinstance(stages, dict) or len(stages) == 0 or len(stages) > 255:
+        raise RulesetError('a ruleset needs 1 to 255 stages')
+
+    checked_stages = {}
+    for stage, counts in stages.items():
+        if not isinstance(stage, str) or stage == '':
+            raise RulesetError(f'stage names must be non-empty strings: {stage!r}')
+
+        if isinstance(counts, int):
+            counts = {move: counts for move in moves}
+        if not isinstance(counts, dict) or not set(counts) <= set(moves):
+            raise RulesetError(f'{stage} must give counts for the ruleset\'s moves only')
+
+        checked_counts = {move: counts.get(move, 0) for move in moves}
+        for move, count in checked_counts.items():
+            if not isinstance(count, int) or isinstance(count, bool) or not 0 <= count <= MAX_MOVE_COUNT:
+                raise RulesetError(f'{stage} gives {move} an invalid count: {count!r}')
+
+        if sum(checked_counts.values()) == 0:
+            raise RulesetError(f'{stage} gives players no moves')
+
+        checked_stages[stage] = checked_counts
+
+    return checked_stages
+
+
+def compile_ruleset(definition: dict) -> Ruleset:
+    """
+    Checks a ruleset definition and compiles it
+    :param definition: ruleset as data, shaped like the ones in BUILT_IN_RULESETS
+    :return: the compiled ruleset
+    :raises RulesetError: if the definition isn't a valid ruleset
+    """
+    if not isinstance(definition, dict):
+        raise RulesetError('a ruleset must be a JSON object')
+
+    moves = _read_moves(definition)
+    beats = _read_beats(definition, moves)
+    stages = _read_stages(definition, moves)
+
+    move_names = definition.get('move_names', {})
+    if not isinstance(move_names, dict):
+        raise RulesetError('move_names must map moves to names')
+    move_names = {move: str(move_names.get(move, move)) for move in moves}
+
+    return Ruleset(str(definition.get('name', 'custom')), moves, move_names, beats, stages)
+
+
+def load_ruleset(name_or_path: str) -> Ruleset:
+    """
+    :param name_or_path: name of one of BUILT_IN_RULESETS, or the path to a ruleset JSON file
+    :return: the compiled ruleset
+    :raises RulesetError: if the ruleset isn't valid or can't be read
+    """
+    definition = BUILT_IN_RULESETS.get(name_or_path)
+
+    if definition is None:
+        try:
+            with open(name_or_path) as ruleset_file:
+                definition = json.load(ruleset_file)
+
+        except (OSError, ValueError) as error:
+            raise RulesetError(f'{name_or_path!r} is not a built-in ruleset or a readable ruleset file: {error}')
+
+    return compile_ruleset(definition)
@@ -17,3 +17,63 @@ SERVER_PORT = PORT_NUMBER  # arbitrary port > 1023 (source: previous assignment
 # and a receiver accumulates packets until detecting a flag of 1.
 GELA372_LAST_PACKET_FALSE = '0'
 GELA372_LAST_PACKET_TRUE = '1'
+
+# GELA372 v2 sends each message as one length-prefixed frame instead of flagged packets,
+# so a receiver can cut whole messages out of a TCP byte stream however it was split or merged.
+# A v2 frame starts with a magic byte that is never a v1 "last packet" flag,
+# then a flags byte, then the payload length as a 4-byte big-endian int.
+GELA372_VERSION_1 = 1
+GELA372_VERSION_2 = 2
+GELA372_V2_MAGIC = b'G'
+GELA372_V2_HEADER_FORMAT = '!cBI'  # magic, flags, payload length
+GELA372_V2_MAX_PAYLOAD_SIZE = 16 * 1024 * 1024  # reject garbage lengths instead of buffering forever
+
+# A v2 frame with the channel flag set carries a 4-byte big-endian channel ID right after its header,
+# so one connection, like a gateway's connection relaying many players, can carry many matches at once.
+# Channel messages are cut into fragments, every one but the last flagged "more fragments",
+# so fragments from different channels can interleave and one channel's long message never holds up the rest.
+# A frame with the close flag and no payload closes its channel; each side sends one, and the ID is free once both have.
+GELA372_V2_FLAG_CHANNEL = 0x01
+GELA372_V2_FLAG_MORE_FRAGMENTS = 0x02
+GELA372_V2_FLAG_CLOSE_CHANNEL = 0x04
+GELA372_CHANNEL_ID_FORMAT = '!I'
+GELA372_MAX_FRAGMENT_SIZE = 16 * 1024
+GELA372_MAX_CHANNEL_BACKLOG = 1024 * 1024  # bytes a channel may have waiting to be read before it's closed
+
+# Version used when this host speaks first.
+# Set this to GELA372_VERSION_1 to play against a peer running the original GELA372-only code.
+# A host that receives first always replies in whichever version its peer used.
+GELA372_DEFAULT_VERSION = GELA372_VERSION_2
+
+# Max queued connection requests for the match server, which expects many players connecting at once
+MATCH_SERVER_BACKLOG = 4096
+
+# Spectator updates are encoded and framed once per round and shared by every spectator of the match.
+# The match keeps its latest updates for spectators that fall behind; one further behind than that skips to the newest.
+# Each spectator's connection buffers at most SPECTATOR_WRITE_BUFFER_LIMIT bytes before it counts as behind.
+SPECTATOR_HISTORY_LENGTH = 16
+SPECTATOR_WRITE_BUFFER_LIMIT = 4 * 1024
+MAX_LISTED_LIVE_MATCHES = 20  # live match IDs named to a spectator who asked for a match that isn't live
+
+# With --workers, the match server runs one worker process per core, all accepting on the same port (SO_REUSEPORT).
+# Waiting players are handed, socket and all, to the lowest-numbered worker with players waiting on their stage.
+LOBBY_SWEEP_INTERVAL = 0.25  # seconds between pairing waiting players whose rating windows have widened
+WORKER_RESTART_DELAY = 1.0  # least seconds between starting a worker and restarting it, so a crash loop can't spin
+DRAIN_TIMEOUT = 60.0  # seconds a draining worker lets its matches finish before cutting them off
+
+# The optional UDP transport (udp_transport.py) carries the same GELA372 byte stream in sequenced datagrams.
+# Every datagram starts with a type, a sequence number, and a cumulative ack (next sequence number expected).
+# Data and close datagrams are acknowledged and retransmitted with a backed-off timer until they are,
+# so a lost datagram costs one short timeout instead of stalling behind TCP's slower recovery.
+UDP_PACKET_DATA = 0
+UDP_PACKET_ACK = 1
+UDP_PACKET_CLOSE = 2
+UDP_HEADER_FORMAT = '!BII'  # type, sequence number, cumulative ack
+UDP_MAX_PAYLOAD_SIZE = 1200  # fits in one unfragmented IP packet on any common link
+UDP_SEND_WINDOW = 64  # unacknowledged datagrams allowed in flight before sending waits
+UDP_RECEIVE_WINDOW = 256  # datagrams buffered ahead of a gap before later ones are dropped
+UDP_INITIAL_RETRANSMIT_TIMEOUT = 0.2  # seconds, until a round trip has been measured
+UDP_MIN_RETRANSMIT_TIMEOUT = 0.02  # seconds; far below TCP's 200 ms floor, since rounds are short and LAN RTTs tiny
+UDP_MAX_RETRANSMIT_TIMEOUT = 2.0  # seconds
+UDP_MAX_RETRANSMITS = 12  # the peer is considered gone after this many unanswered retransmits of one datagram
+UDP_CLOSE_LINGER = 1.0  # seconds close() waits for the peer to acknowledge what's still in flight
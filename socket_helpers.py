@@ -1,68 +1,779 @@
 # Author: Mark Mendez
 # Date: 02/23/2022
 
+import asyncio
+import collections
+import struct
+import time
+from rps_metrics import METRICS
 from socket import socket
 from socket_constants import *
 from math import ceil
+from typing import Awaitable, Callable, List, Optional, Tuple, Union
+
+
+# Linux refuses sendmsg() calls with more than IOV_MAX (1024) buffers
+_MAX_BUFFERS_PER_SENDMSG = 512
+
+_V2_HEADER = struct.Struct(GELA372_V2_HEADER_FORMAT)
+_V2_CHANNEL_HEADER = struct.Struct(GELA372_V2_HEADER_FORMAT + GELA372_CHANNEL_ID_FORMAT[1:])
+_CHANNEL_ID = struct.Struct(GELA372_CHANNEL_ID_FORMAT)
+_V2_MAGIC_BYTE = GELA372_V2_MAGIC[0]
+_V1_FLAG_BYTES = (GELA372_LAST_PACKET_FALSE.encode()[0], GELA372_LAST_PACKET_TRUE.encode()[0])
 
 
 class PacketUnpackError(Exception):
     pass
 
 
-def send_message(outgoing_message: str, connection_socket: socket):
+def _send_buffers(buffers: List[bytes], connection_socket: socket):
     """
-    Sends a given message through a given socket,
-    Segmenting data to respect window size (known through a constant global buffer size).
-    Segmentation is done according to the made-up GELA372 protocol.
-    In GELA372, the first byte of every packet is a "last packet" flag,
-    and a receiver accumulates packets until detecting a flag of 1.
-    :param outgoing_message: message to send to the other host
+    Sends several buffers back-to-back as one contiguous byte stream.
+    Uses scatter-gather sendmsg() where the platform has it, so the buffers are never joined in memory,
+    and falls back to a single sendall() elsewhere.
+    :param buffers: bytes-like objects to send, in order
     :param connection_socket: socket object representing the connection
     """
+    if not hasattr(connection_socket, 'sendmsg'):
+        connection_socket.sendall(b''.join(buffers))
+        return
+
+    views = [memoryview(buffer) for buffer in buffers if len(buffer) > 0]
+    next_view = 0
+
+    while next_view < len(views):
+        sent = connection_socket.sendmsg(views[next_view:next_view + _MAX_BUFFERS_PER_SENDMSG])
+
+        # Skip every buffer that was sent completely, then trim the one that was sent partially
+        while next_view < len(views) and sent >= len(views[next_view]):
+            sent -= len(views[next_view])
+            next_view += 1
+
+        if sent > 0:
+            views[next_view] = views[next_view][sent:]
+
+
+def _build_v1_packets(outgoing_message: bytes) -> List[bytes]:
+    """
+    Splits a message into GELA372 v1 packets.
+    In GELA372 v1, the first byte of every packet is a "last packet" flag,
+    and a receiver accumulates packets until detecting a flag of 1.
+    :param outgoing_message: message to send to the other host, encoded as UTF-8
+    :return: flag and payload buffers for every packet, in sending order
+    """
     # Determine number of packets
     # (sacrificing the first byte of each packet to the "last packet" flag
     # and rounding up because there are no partial packets).
     payload_size = BUFFER_SIZE - 1
-    packet_count = ceil(len(outgoing_message) / payload_size)
+    packet_count = max(ceil(len(outgoing_message) / payload_size), 1)
 
-    # Send all but the last packet
-    for packet_index in range(packet_count - 1):
-        # Use the first packet byte for the flag, which is 0 in this loop
-        last_packet_flag = GELA372_LAST_PACKET_FALSE
+    not_last_flag = GELA372_LAST_PACKET_FALSE.encode()
+    last_flag = GELA372_LAST_PACKET_TRUE.encode()
 
-        # Get the next segment of the message
+    payload_view = memoryview(outgoing_message)
+    buffers = []
+    for packet_index in range(packet_count):
+        # Get the next segment of the message.
+        # Segments are cut on bytes, so every packet but the last fills exactly BUFFER_SIZE bytes,
+        # which is how receivers find where it ends; they join the segments before decoding the message.
         slice_start = packet_index * payload_size
         slice_end = slice_start + payload_size
-        message_payload = outgoing_message[slice_start:slice_end]
 
-        # Assemble the packet in GELA372 format
-        packet_raw_string = last_packet_flag + message_payload
+        is_last_packet = packet_index == packet_count - 1
+        buffers.append(last_flag if is_last_packet else not_last_flag)
+        buffers.append(payload_view[slice_start:slice_end])
+
+    return buffers
+
+
+def frame_message(outgoing_message: Union[str, bytes], version: int = GELA372_DEFAULT_VERSION) -> List[bytes]:
+    """
+    Frames a message according to the made-up GELA372 protocol, without sending it.
+    In GELA372 v1, the message is segmented to respect window size (known through a constant global buffer size),
+    and the first byte of every packet is a "last packet" flag.
+    In GELA372 v2, the message is sent as one frame with a length header.
+    :param outgoing_message: message to send to the other host
+    :param version: GELA372 version to frame the message with
+    :return: buffers to send back-to-back, in order
+    """
+    payload = outgoing_message.encode() if isinstance(outgoing_message, str) else outgoing_message
+
+    if version == GELA372_VERSION_1:
+        return _build_v1_packets(payload)
+
+    # Assemble the frame in GELA372 v2 format
+    header = _V2_HEADER.pack(GELA372_V2_MAGIC, 0, len(payload))
+
+    return [header, payload]
+
+
+def _build_channel_fragments(outgoing_message: Union[str, bytes], channel_id: int) -> List[List[bytes]]:
+    """
+    Cuts a message into GELA372 v2 channel frames of at most GELA372_MAX_FRAGMENT_SIZE payload bytes each
+    :param outgoing_message: message to send on the channel
+    :param channel_id: channel to send it on
+    :return: header and payload buffers for every fragment, in sending order
+    """
+    payload = outgoing_message.encode() if isinstance(outgoing_message, str) else outgoing_message
+    fragment_count = max(ceil(len(payload) / GELA372_MAX_FRAGMENT_SIZE), 1)
+
+    payload_view = memoryview(payload)
+    fragments = []
+    for fragment_index in range(fragment_count):
+        fragment_payload = payload_view[fragment_index * GELA372_MAX_FRAGMENT_SIZE:
+                                        (fragment_index + 1) * GELA372_MAX_FRAGMENT_SIZE]
+
+        flags = GELA372_V2_FLAG_CHANNEL
+        if fragment_index < fragment_count - 1:
+            flags |= GELA372_V2_FLAG_MORE_FRAGMENTS
+
+        header = _V2_CHANNEL_HEADER.pack(GELA372_V2_MAGIC, flags, len(fragment_payload), channel_id)
+        fragments.append([header, fragment_payload])
+
+    return fragments
+
+
+def frame_channel_message(outgoing_message: Union[str, bytes], channel_id: int) -> List[bytes]:
+    """
+    Frames a message for one channel of a multiplexed GELA372 v2 connection, without sending it
+    :param outgoing_message: message to send on the channel
+    :param channel_id: channel to send it on
+    :return: buffers to send back-to-back, in order
+    """
+    return [buffer for fragment in _build_channel_fragments(outgoing_message, channel_id) for buffer in fragment]
+
+
+def frame_channel_close(channel_id: int) -> List[bytes]:
+    """
+    Frames the message that closes one channel of a multiplexed GELA372 v2 connection
+    :param channel_id: channel to close
+    :return: buffers to send back-to-back, in order
+    """
+    flags = GELA372_V2_FLAG_CHANNEL | GELA372_V2_FLAG_CLOSE_CHANNEL
+
+    return [_V2_CHANNEL_HEADER.pack(GELA372_V2_MAGIC, flags, 0, channel_id)]
+
+
+def send_message(
+        outgoing_message: Union[str, bytes], connection_socket: socket, version: int = GELA372_DEFAULT_VERSION):
+    """
+    Sends a given message through a given socket, framed according to the made-up GELA372 protocol.
+    :param outgoing_message: message to send to the other host
+    :param connection_socket: socket object representing the connection
+    :param version: GELA372 version to frame the message with
+    """
+    buffers = frame_message(outgoing_message, version)
+    _send_buffers(buffers, connection_socket)
+
+    if METRICS.enabled:
+        METRICS.record_sent_message(buffers)
+
+    # print(f'DEBUG: sent whole message: {outgoing_message}')
+
+
+class GELA372Receiver:
+    """
+    Reassembles whole GELA372 messages out of a byte stream, however TCP split or merged the sends.
+    Incoming bytes are received directly into one reusable bytearray and parsed in place,
+    so the only copy made is the finished payload handed to the caller.
+    Understands both v1 packets and v2 frames and remembers which version the peer spoke last.
+    On a multiplexed connection, next_channel_message() reassembles each channel's fragments separately.
+    """
+    def __init__(self, capacity: int = 4 * BUFFER_SIZE):
+        """
+        :param capacity: initial buffer size in bytes; the buffer grows if a frame needs more
+        """
+        self._buffer = bytearray(capacity)
+        self._start = 0  # index of the first byte that hasn't been parsed yet
+        self._end = 0  # index one past the last byte received
+        self._v1_payload = bytearray()  # payloads of the v1 packets received so far for an unfinished message
+        self._channel_payloads = {}  # channel ID -> fragments received so far for that channel's unfinished message
+        self.peer_version = None  # GELA372 version of the most recent complete message
+
+    def _reserve(self, size: int):
+        """
+        Makes room for at least size more bytes after the received data,
+        first by moving unparsed bytes to the front of the buffer, then by growing it
+        :param size: number of bytes that must fit
+        """
+        if len(self._buffer) - self._end >= size:
+            return
+
+        unparsed_size = self._end - self._start
+
+        if unparsed_size + size <= len(self._buffer):
+            self._buffer[:unparsed_size] = self._buffer[self._start:self._end]
+        else:
+            grown_buffer = bytearray(max(2 * len(self._buffer), unparsed_size + size))
+            grown_buffer[:unparsed_size] = self._buffer[self._start:self._end]
+            self._buffer = grown_buffer
+
+        self._start = 0
+        self._end = unparsed_size
+
+    def fill_from(self, connection_socket: socket) -> int:
+        """
+        Receives whatever bytes are available from a socket straight into the buffer
+        :param connection_socket: socket object representing the connection
+        :return: number of bytes received; 0 means the peer closed the connection
+        """
+        self._reserve(BUFFER_SIZE)
+        receive_end = len(self._buffer)
+
+        # A v1 last packet ends wherever the bytes run out, so v1 packets are received one at a time,
+        # like the original GELA372 receiver did, rather than cut off wherever the buffer happens to fill
+        if self._start < self._end:
+            if self._buffer[self._start] in _V1_FLAG_BYTES:
+                receive_end = self._start + BUFFER_SIZE
+
+        elif self.peer_version != GELA372_VERSION_2 or len(self._v1_payload) > 0:
+            receive_end = self._end + BUFFER_SIZE
+
+        with memoryview(self._buffer) as buffer_view:
+            received_count = connection_socket.recv_into(buffer_view[self._end:receive_end])
+
+        self._end += received_count
+
+        return received_count
+
+    def feed(self, data: bytes):
+        """
+        Appends bytes that were received some other way, such as from an asyncio stream
+        :param data: bytes received from the peer
+        """
+        self._reserve(len(data))
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def get_unparsed_bytes(self) -> bytes:
+        """
+        Copies the bytes received but not yet parsed into a message,
+        such as to hand the connection to another process along with them.
+        A v1 message that's only partly parsed isn't included.
+        :return: the unparsed bytes
+        """
+        return bytes(self._buffer[self._start:self._end])
+
+    def _parse_v2_frame(self) -> Optional[Tuple[int, Optional[int], bytes]]:
+        """
+        Parses the v2 frame that starts at the first unparsed byte
+        :return: the frame's flags, channel ID (None if it has none), and payload,
+                 or None if more bytes are needed first
+        """
+        if self._end - self._start < _V2_HEADER.size:
+            return None
+
+        _, flags, payload_size = _V2_HEADER.unpack_from(self._buffer, self._start)
+        if payload_size > GELA372_V2_MAX_PAYLOAD_SIZE:
+            raise PacketUnpackError(f'received frame of {payload_size} bytes, which is too large')
+
+        channel_id = None
+        payload_start = self._start + _V2_HEADER.size
+
+        if flags & GELA372_V2_FLAG_CHANNEL:
+            if self._end - self._start < _V2_CHANNEL_HEADER.size:
+                return None
+
+            channel_id, = _CHANNEL_ID.unpack_from(self._buffer, payload_start)
+            payload_start += _CHANNEL_ID.size
+
+        frame_end = payload_start + payload_size
+        if frame_end > self._end:
+            # Make sure the rest of the frame will fit without growing piece by piece
+            self._reserve(frame_end - self._end)
+            return None
+
+        with memoryview(self._buffer) as buffer_view:
+            payload = bytes(buffer_view[payload_start:frame_end])
+
+        self._start = frame_end
+        self.peer_version = GELA372_VERSION_2
+
+        return flags, channel_id, payload
+
+    def is_channel_frame_next(self) -> Optional[bool]:
+        """
+        Tells a plain connection from a multiplexed one by its first frame
+        :return: True if the next unparsed frame belongs to a channel, False if it doesn't,
+                 or None if more bytes are needed to tell
+        """
+        if self._start == self._end:
+            return None
+
+        if self._buffer[self._start] != _V2_MAGIC_BYTE:
+            return False
+
+        if self._end - self._start < _V2_HEADER.size:
+            return None
+
+        _, flags, _ = _V2_HEADER.unpack_from(self._buffer, self._start)
+
+        return bool(flags & GELA372_V2_FLAG_CHANNEL)
+
+    def next_channel_message(self) -> Optional[Tuple[int, Optional[bytes]]]:
+        """
+        Parses the next complete message out of the received channel frames.
+        Fragments are reassembled per channel, so channels whose fragments interleave don't wait on each other.
+        :return: channel ID and payload of the next complete message, with a payload of None if the peer closed
+                 that channel, or None if more bytes are needed first
+        """
+        while self._start < self._end:
+            if self._buffer[self._start] != _V2_MAGIC_BYTE:
+                raise PacketUnpackError('received a v1 packet on a multiplexed connection')
+
+            frame = self._parse_v2_frame()
+            if frame is None:
+                return None
+
+            flags, channel_id, payload = frame
+            if channel_id is None:
+                raise PacketUnpackError('received a frame without a channel on a multiplexed connection')
+
+            if flags & GELA372_V2_FLAG_CLOSE_CHANNEL:
+                self._channel_payloads.pop(channel_id, None)
+                return channel_id, None
+
+            unfinished_payload = self._channel_payloads.get(channel_id)
+
+            if flags & GELA372_V2_FLAG_MORE_FRAGMENTS:
+                if unfinished_payload is None:
+                    unfinished_payload = self._channel_payloads[channel_id] = bytearray()
+
+                if len(unfinished_payload) + len(payload) > GELA372_V2_MAX_PAYLOAD_SIZE:
+                    raise PacketUnpackError(f'received a message on channel {channel_id} that is too large')
+
+                unfinished_payload += payload
+                continue
+
+            if unfinished_payload is not None:
+                del self._channel_payloads[channel_id]
+                unfinished_payload += payload
+                payload = bytes(unfinished_payload)
+
+            return channel_id, payload
+
+        return None
+
+    def next_message(self) -> Optional[bytes]:
+        """
+        Parses the next complete message out of the received bytes
+        :return: payload of the next complete message, or None if more bytes are needed first
+        """
+        while self._start < self._end:
+            first_byte = self._buffer[self._start]
 
-        # Send this packet
-        connection_socket.send(packet_raw_string.encode())
+            if first_byte == _V2_MAGIC_BYTE:
+                frame = self._parse_v2_frame()
+                if frame is None:
+                    return None
 
-    # Send the last packet, with the "last packet" flag set
-    last_packet_flag = GELA372_LAST_PACKET_TRUE
-    message_payload = outgoing_message[-payload_size:len(outgoing_message)]
-    packet_raw_string = last_packet_flag + message_payload
-    connection_socket.send(packet_raw_string.encode())
+                _, channel_id, payload = frame
+                if channel_id is not None:
+                    raise PacketUnpackError('received a channel frame on a connection without channels')
 
-    # print(f'DEBUG: sent whole message: {packet_raw_string}')
+                return payload
+
+            if first_byte not in _V1_FLAG_BYTES:
+                raise PacketUnpackError('received invalid packet flag')
+
+            # v1 packets have no length header.
+            # Every packet but the last fills a whole buffer, so wait for all of it;
+            # the last packet is whatever arrived, as the original GELA372 receiver assumed.
+            is_last_packet = first_byte == _V1_FLAG_BYTES[1]
+            packet_end = self._start + BUFFER_SIZE
+            if packet_end > self._end:
+                if not is_last_packet:
+                    return None
+
+                packet_end = self._end
+
+            with memoryview(self._buffer) as buffer_view:
+                self._v1_payload += buffer_view[self._start + 1:packet_end]
+
+            self._start = packet_end
+
+            if is_last_packet:
+                payload = bytes(self._v1_payload)
+                self._v1_payload.clear()
+                self.peer_version = GELA372_VERSION_1
+
+                return payload
+
+        return None
+
+
+def receive_message_bytes(connection_socket: socket, receiver: GELA372Receiver) -> bytes:
+    """
+    Receives the next complete GELA372 message from the given socket
+    :param connection_socket: socket object representing the connection
+    :param receiver: reassembly buffer for this connection, kept across calls
+    :return: raw payload of the message
+    """
+    wait_start_time = time.perf_counter() if METRICS.enabled else None
+    received_byte_count = receive_call_count = 0
+    message = receiver.next_message()
+
+    while message is None:
+        fill_count = receiver.fill_from(connection_socket)
+        if fill_count == 0:
+            raise PacketUnpackError('connection closed before a complete message arrived')
+
+        received_byte_count += fill_count
+        receive_call_count += 1
+        message = receiver.next_message()
+
+    if wait_start_time is not None:
+        METRICS.record_received_message(received_byte_count, receive_call_count, wait_start_time)
+
+    return message
+
+
+async def receive_message_bytes_async(reader: asyncio.StreamReader, receiver: GELA372Receiver) -> bytes:
+    """
+    Receives the next complete GELA372 message from an asyncio stream, without blocking the event loop
+    :param reader: stream the peer's bytes arrive on
+    :param receiver: reassembly buffer for this connection, kept across calls
+    :return: raw payload of the message
+    """
+    wait_start_time = time.perf_counter() if METRICS.enabled else None
+    received_byte_count = receive_call_count = 0
+    message = receiver.next_message()
+
+    while message is None:
+        data = await reader.read(BUFFER_SIZE)
+        if len(data) == 0:
+            raise PacketUnpackError('connection closed before a complete message arrived')
+
+        received_byte_count += len(data)
+        receive_call_count += 1
+        receiver.feed(data)
+        message = receiver.next_message()
+
+    if wait_start_time is not None:
+        METRICS.record_received_message(received_byte_count, receive_call_count, wait_start_time)
+
+    return message
+
+
+class GELA372Channel:
+    """
+    One channel of a multiplexed GELA372 v2 connection: a message stream for one player or match,
+    sharing the connection with every other channel.
+    Messages that arrive for the channel wait here until it reads them, so a slow reader holds up only itself.
+    """
+    def __init__(self, multiplexer: 'ChannelMultiplexer', channel_id: int):
+        """
+        :param multiplexer: multiplexer for the connection the channel belongs to
+        :param channel_id: the channel's ID, unique on its connection
+        """
+        self.multiplexer = multiplexer
+        self.channel_id = channel_id
+        self.has_sent_close = False
+        self.has_received_close = False  # also set if the connection itself is lost
+        self._incoming = collections.deque()  # complete messages waiting to be read
+        self._incoming_size = 0
+        self._message_arrived = asyncio.Event()
+        self._outgoing = collections.deque()  # fragments waiting for their turn on the connection
+
+    def at_eof(self) -> bool:
+        """
+        :return: True if no more messages can arrive on this channel and every one that did has been read
+        """
+        return (self.has_received_close or self.has_sent_close) and len(self._incoming) == 0
+
+    def deliver(self, message: bytes):
+        """
+        Queues a message that arrived for this channel, or closes the channel if it has fallen too far behind
+        :param message: payload of the message
+        """
+        if self.has_sent_close:
+            return
+
+        # A channel that's keeping up may receive any message, however long; one that isn't may only fall so far behind
+        if len(self._incoming) > 0 and self._incoming_size + len(message) > GELA372_MAX_CHANNEL_BACKLOG:
+            self.close()
+            return
+
+        self._incoming.append(message)
+        self._incoming_size += len(message)
+        self._message_arrived.set()
+
+    def deliver_close(self):
+        """
+        Records that the peer closed this channel, or that the connection was lost
+        """
+        self.has_received_close = True
+        self._message_arrived.set()
+
+    async def receive(self) -> bytes:
+        """
+        Waits for the channel's next message
+        :return: payload of the message
+        """
+        while len(self._incoming) == 0:
+            if self.at_eof():
+                raise PacketUnpackError('channel closed before a complete message arrived')
+
+            self._message_arrived.clear()
+            await self._message_arrived.wait()
+
+        message = self._incoming.popleft()
+        self._incoming_size -= len(message)
+
+        return message
+
+    async def send(self, outgoing_message: Union[str, bytes]):
+        """
+        Sends a message on the channel
+        :param outgoing_message: message to send
+        """
+        if self.has_sent_close or self.has_received_close:
+            raise ConnectionResetError(f'channel {self.channel_id} is closed')
+
+        await self.multiplexer.send_fragments(self, _build_channel_fragments(outgoing_message, self.channel_id))
+
+    def close(self):
+        """
+        Closes the channel. Messages already queued to send still go out first.
+        """
+        self.multiplexer.close_channel(self)
+
+
+class ChannelMultiplexer:
+    """
+    Carries many GELA372 channels over one asyncio connection.
+    The side that connected opens channels, and the side that accepted gets each one through a callback
+    as its first message arrives, so the two sides never pick the same ID.
+    Fragments of long messages are sent round-robin across channels, so one channel's long message
+    delays the others by at most a fragment at a time instead of by the whole message.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 receiver: Optional[GELA372Receiver] = None):
+        """
+        :param reader: stream the peer's bytes arrive on
+        :param writer: stream to the peer
+        :param receiver: reassembly buffer that may already hold the connection's first bytes; a new one if None
+        """
+        self.reader = reader
+        self.writer = writer
+        self.receiver = receiver if receiver is not None else GELA372Receiver()
+        self.channels = {}  # channel ID -> GELA372Channel
+        self.is_closed = False
+        self._next_channel_id = 1
+        self._ready_channels = collections.deque()  # channels with fragments waiting, in round-robin order
+        self._fragments_ready = asyncio.Event()
+        self._drain_lock = asyncio.Lock()  # only one drain() may wait at a time before Python 3.10
+        self._writer_task = None
+        self._channel_tasks = set()
+
+    def open_channel(self) -> GELA372Channel:
+        """
+        :return: a new channel, which the peer learns about when its first message arrives
+        """
+        if self.is_closed:
+            raise ConnectionResetError('multiplexed connection is closed')
+
+        while self._next_channel_id in self.channels:
+            self._next_channel_id = self._next_channel_id % 0xFFFFFFFF + 1
+
+        channel = GELA372Channel(self, self._next_channel_id)
+        self.channels[channel.channel_id] = channel
+        self._next_channel_id = self._next_channel_id % 0xFFFFFFFF + 1
+
+        return channel
+
+    def close_channel(self, channel: GELA372Channel):
+        """
+        Sends the close message for a channel once its queued fragments are out,
+        and forgets the channel once the peer has closed it too
+        :param channel: channel to close
+        """
+        if channel.has_sent_close:
+            return
+
+        channel.has_sent_close = True
+        channel._incoming.clear()
+        channel._incoming_size = 0
+
+        if not self.is_closed:
+            self._queue_fragments(channel, [frame_channel_close(channel.channel_id)])
+
+        self._forget_channel_if_closed(channel)
+
+    def _forget_channel_if_closed(self, channel: GELA372Channel):
+        """
+        Frees a channel's ID once both sides have closed it and its last fragment has gone out
+        :param channel: channel that may be finished
+        """
+        if channel.has_sent_close and channel.has_received_close and len(channel._outgoing) == 0:
+            if self.channels.get(channel.channel_id) is channel:
+                del self.channels[channel.channel_id]
+
+    def _queue_fragments(self, channel: GELA372Channel, fragments: List[List[bytes]]):
+        """
+        Queues fragments behind the channel's earlier ones, for the writer task to send round-robin
+        :param channel: channel sending the fragments
+        :param fragments: buffers for each fragment, from _build_channel_fragments()
+        """
+        if len(channel._outgoing) == 0:
+            self._ready_channels.append(channel)
+
+        channel._outgoing.extend(fragments)
+        self._fragments_ready.set()
+
+        if self._writer_task is None:
+            self._writer_task = asyncio.ensure_future(self._write_fragments())
+
+    async def send_fragments(self, channel: GELA372Channel, fragments: List[List[bytes]]):
+        """
+        Sends a channel's fragments. A single fragment with nothing else waiting goes straight out;
+        anything else takes turns with the other channels.
+        :param channel: channel sending the fragments
+        :param fragments: buffers for each fragment, from _build_channel_fragments()
+        """
+        if self.is_closed:
+            raise ConnectionResetError('multiplexed connection is closed')
+
+        if len(fragments) == 1 and len(self._ready_channels) == 0:
+            self.writer.writelines(fragments[0])
+            await self._drain()
+            return
+
+        self._queue_fragments(channel, fragments)
+
+    async def _write_fragments(self):
+        """
+        Writes queued fragments one at a time, taking turns between channels, until the connection closes
+        """
+        try:
+            while True:
+                await self._fragments_ready.wait()
+                self._fragments_ready.clear()
+
+                while len(self._ready_channels) > 0:
+                    channel = self._ready_channels.popleft()
+                    self.writer.writelines(channel._outgoing.popleft())
+
+                    if len(channel._outgoing) > 0:
+                        self._ready_channels.append(channel)
+                    else:
+                        self._forget_channel_if_closed(channel)
+
+                    # Let the connection catch up before the next turn, so no channel can queue far ahead
+                    await self._drain()
+
+        except ConnectionError:
+            self.close()
+
+    async def _drain(self):
+        """
+        Waits for the writer's buffer to empty, one waiter at a time,
+        since the writer task and channels sending straight out may all be draining at once
+        """
+        async with self._drain_lock:
+            await self.writer.drain()
+
+    async def run(self, on_new_channel: Optional[Callable[[GELA372Channel], Awaitable]] = None):
+        """
+        Reads the connection and hands each message to its channel until the connection closes.
+        Never waits on a channel's reader, so one channel that stops reading doesn't stall the rest.
+        :param on_new_channel: coroutine function run in its own task for each channel the peer opens;
+                               channels the peer opens are ignored if None
+        """
+        try:
+            while True:
+                channel_message = self.receiver.next_channel_message()
+
+                while channel_message is None:
+                    data = await self.reader.read(GELA372_MAX_FRAGMENT_SIZE)
+                    if len(data) == 0:
+                        return
+
+                    self.receiver.feed(data)
+                    channel_message = self.receiver.next_channel_message()
+
+                channel_id, message = channel_message
+                channel = self.channels.get(channel_id)
+
+                if message is None:
+                    if channel is not None:
+                        channel.deliver_close()
+                        self._forget_channel_if_closed(channel)
+
+                    continue
+
+                if channel is None:
+                    if on_new_channel is None:
+                        continue
+
+                    channel = GELA372Channel(self, channel_id)
+                    self.channels[channel_id] = channel
+
+                    task = asyncio.ensure_future(on_new_channel(channel))
+                    self._channel_tasks.add(task)
+                    task.add_done_callback(self._channel_tasks.discard)
+
+                channel.deliver(message)
+
+        except (PacketUnpackError, ConnectionError):
+            pass
+
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Closes the connection and every channel on it
+        """
+        if self.is_closed:
+            return
+
+        self.is_closed = True
+        self.writer.close()
+
+        if self._writer_task is not None and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+
+        for channel in self.channels.values():
+            channel._outgoing.clear()
+            channel.deliver_close()
+
+        self.channels.clear()
+        self._ready_channels.clear()
+
+
+def receive_message(connection_socket: socket, receiver: GELA372Receiver) -> str:
+    """
+    Receives the next complete GELA372 message from the given socket as text.
+    The payload is decoded only once it's complete, so multi-byte characters split across packets survive.
+    :param connection_socket: socket object representing the connection
+    :param receiver: reassembly buffer for this connection, kept across calls
+    :return: text of the message
+    """
+    try:
+        return receive_message_bytes(connection_socket, receiver).decode()
+
+    except UnicodeDecodeError as error:
+        raise PacketUnpackError('received message that is not valid UTF-8') from error
 
 
 def receive_next_packet(connection_socket: socket) -> dict:
     """
     Receives the next packet of data from the given socket
-    and parses the data according to the made-up GELA372 protocol.
-    In GELA372, the first byte of every packet is a "last packet" flag,
+    and parses the data according to the made-up GELA372 v1 protocol.
+    In GELA372 v1, the first byte of every packet is a "last packet" flag,
     and a receiver accumulates packets until detecting a flag of 1.
+    This assumes every recv() returns exactly one packet; prefer receive_message(), which doesn't.
     :param connection_socket: socket object representing the connection
     :return: packet data in the form
              {'is_last_packet': bool, 'payload': str}
     """
     # Receive a packet of raw byte message and decode it into a string
-    incoming_message_packet = connection_socket.recv(BUFFER_SIZE).decode()
+    incoming_packet_bytes = connection_socket.recv(BUFFER_SIZE)
+    if METRICS.enabled:
+        METRICS.bytes_received.inc(len(incoming_packet_bytes))
+
+    incoming_message_packet = incoming_packet_bytes.decode()
     # print(f'DEBUG: received whole message: {incoming_message_packet}')
 
     # Check last packet flag using the GELA372 protocol.
@@ -0,0 +1,192 @@
+"""
+Fans each live match's rounds out to its spectators for the match server.
+
+A match publishes one update per round to its MatchBroadcast. The update is encoded once,
+and framed at most once per GELA372 version, so thousands of spectators cost one encode and one buffer,
+not one each. Publishing never waits on a spectator: it writes the shared buffer straight to every spectator
+whose connection has room, and leaves the rest to their own sender tasks.
+
+A spectator's connection buffers only SPECTATOR_WRITE_BUFFER_LIMIT bytes. Once it's full,
+the spectator's sender task keeps its place in the match's shared history of recent updates and catches up from there.
+A spectator that falls further behind than the history reaches skips straight to the newest update,
+which holds the whole match so far, so a slow spectator costs the match nothing and still sees the right score.
+"""
+
+import asyncio
+import collections
+from typing import Dict, Optional
+from socket_constants import *
+from game_constants import *
+from socket_helpers import PacketUnpackError, frame_message
+import state_codec
+
+
+class SpectatorUpdate:
+    """
+    One encoded spectator update, shared by every spectator of a match
+    """
+    __slots__ = ('payload', '_frames')
+
+    def __init__(self, payload: bytes):
+        """
+        :param payload: encoded update, from state_codec.encode_spectator_update()
+        """
+        self.payload = payload
+        self._frames = {}  # GELA372 version -> the whole framed message as one buffer
+
+    def get_frame(self, version: int) -> bytes:
+        """
+        Frames the update the first time a spectator speaking the given version needs it
+        :param version: GELA372 version to frame the update with
+        :return: the framed update, ready to write to a connection
+        """
+        frame = self._frames.get(version)
+        if frame is None:
+            frame = self._frames[version] = b''.join(frame_message(self.payload, version))
+
+        return frame
+
+
+class _Spectator:
+    """
+    One spectator's place in a match's updates
+    """
+    __slots__ = ('seat', 'next_sequence', 'wakeup')
+
+    def __init__(self, seat, next_sequence: int):
+        """
+        :param seat: the spectator's seat
+        :param next_sequence: sequence number of the next update to send
+        """
+        self.seat = seat
+        self.next_sequence = next_sequence
+        self.wakeup = None  # future the spectator's sender waits on while caught up
+
+
+class MatchBroadcast:
+    """
+    A live match's recent updates and the spectators watching them
+    """
+    def __init__(self, match_id: int, history_length: int = SPECTATOR_HISTORY_LENGTH):
+        """
+        :param match_id: ID spectators ask for the match by
+        :param history_length: updates kept for spectators that fall behind
+        """
+        self.match_id = match_id
+        self.updates = collections.deque(maxlen=history_length)
+        self.published_count = 0  # updates published so far; the next one gets this sequence number
+        self.is_finished = False
+        self.spectator_count = 0
+        self.skipped_update_count = 0  # updates spectators skipped over for having fallen too far behind
+        self._caught_up_spectators = set()  # spectators with nothing left to send, waiting for the next update
+
+    def publish(self, update: dict, is_final: bool = False):
+        """
+        Encodes an update once and sends it to every spectator that's caught up. Never waits on a spectator:
+        one whose connection is backed up is left to its own sender, which catches up from the history.
+        :param update: the match so far
+        :param is_final: True if the match is over; spectators are disconnected once they've been sent this update
+        """
+        spectator_update = SpectatorUpdate(state_codec.encode_spectator_update(update))
+        self.updates.append(spectator_update)
+        self.published_count += 1
+        self.is_finished = is_final
+
+        # Writing straight to every caught-up connection spares waking a task per spectator every round
+        fallen_behind = []
+        for spectator in self._caught_up_spectators:
+            if spectator.seat.send_update_nowait(spectator_update):
+                spectator.next_sequence += 1
+            else:
+                fallen_behind.append(spectator)
+
+        # Once the match is over, every sender wakes up to finish
+        if is_final:
+            fallen_behind = list(self._caught_up_spectators)
+
+        for spectator in fallen_behind:
+            self._caught_up_spectators.discard(spectator)
+            spectator.wakeup.set_result(None)
+
+    async def _send_updates(self, spectator: _Spectator):
+        """
+        Sends a spectator whatever updates publish() couldn't send it right away, until the final update
+        :param spectator: the spectator to send to
+        """
+        while True:
+            if spectator.next_sequence == self.published_count:
+                if self.is_finished:
+                    return
+
+                spectator.wakeup = asyncio.get_running_loop().create_future()
+                self._caught_up_spectators.add(spectator)
+                await spectator.wakeup
+                continue
+
+            oldest_sequence = self.published_count - len(self.updates)
+
+            # Too far behind for the history; every update holds the whole match, so skip to the newest
+            if spectator.next_sequence < oldest_sequence:
+                self.skipped_update_count += self.published_count - 1 - spectator.next_sequence
+                spectator.next_sequence = self.published_count - 1
+
+            update = self.updates[spectator.next_sequence - oldest_sequence]
+            spectator.next_sequence += 1
+            await spectator.seat.send_update(update)
+
+    async def watch(self, seat):
+        """
+        Streams the match to a spectator, starting from the newest update, until the match ends or the spectator leaves.
+        Spectators don't send anything after their watch request, so any message or EOF counts as leaving.
+        :param seat: the spectator's seat, which has already sent its watch request
+        """
+        spectator = _Spectator(seat, max(self.published_count - 1, 0))
+        self.spectator_count += 1
+        sender = asyncio.ensure_future(self._send_updates(spectator))
+        listener = asyncio.ensure_future(seat.receive_message())
+
+        try:
+            done, _ = await asyncio.wait({sender, listener}, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                # The spectator leaving shows up as one of these; either way, the spectator is done
+                try:
+                    task.result()
+                except (PacketUnpackError, ConnectionError):
+                    pass
+
+        finally:
+            sender.cancel()
+            listener.cancel()
+            self._caught_up_spectators.discard(spectator)
+            self.spectator_count -= 1
+            seat.close()
+
+
+def find_broadcast(broadcasts: Dict[int, MatchBroadcast], match_id: Optional[int]) -> Optional[MatchBroadcast]:
+    """
+    :param broadcasts: live matches by ID
+    :param match_id: ID a spectator asked for, or None for the most-watched live match
+    :return: the match to watch, or None if it isn't live
+    """
+    if match_id is None:
+        return max(broadcasts.values(), key=lambda broadcast: broadcast.spectator_count, default=None)
+
+    if not isinstance(match_id, int) or isinstance(match_id, bool):
+        return None
+
+    return broadcasts.get(match_id)
+
+
+def describe_live_matches(broadcasts: Dict[int, MatchBroadcast]) -> str:
+    """
+    :param broadcasts: live matches by ID
+    :return: notice text naming some live matches a spectator could watch instead
+    """
+    if len(broadcasts) == 0:
+        return 'No matches are live right now.'
+
+    listed_ids = [str(match_id) for match_id in list(broadcasts)[:MAX_LISTED_LIVE_MATCHES]]
+    more_text = f' and {len(broadcasts) - len(listed_ids)} more' if len(broadcasts) > len(listed_ids) else ''
+
+    return f'That match is not live. Live matches: {", ".join(listed_ids)}{more_text}.'
@@ -0,0 +1,652 @@
+"""
+Encodes and decodes game state for the wire.
+
+JSON is the original format: the whole nested state dict, around 240 bytes.
+binary-1 packs the same information into a fixed 26-byte layout (all big-endian):
+
+    offset  size  field
+    0       1     layout version (BINARY_STATE_VERSION; JSON always starts with '{', so the two never clash)
+    1       1     whose_turn: 1 or 2
+    2       1     round_winner: 0 none yet, 1 or 2 for a player, 3 for a tie
+    3       1     stage: 0 none selected yet, otherwise 1 + its index in STAGES
+    4       1     player 1's current move: 0 none yet, 1 + its index in ALL_MOVES, or 255 for quit
+    5       1     player 2's current move, same as above
+    6       4     player 1's score
+    10      4     player 2's score
+    14      2N    player 1's remaining count of each of the N moves, 2 bytes each (in ALL_MOVES order)
+    14+2N   2N    player 2's remaining counts, same as above
+
+delta-1 sends only the fields that changed since the last state the sender sent on the connection.
+Each direction has its own base, so states that cross on the wire can't leave the two ends on different bases:
+
+    offset  size  field
+    0       1     layout version (DELTA_STATE_VERSION)
+    1       4     sequence number of this sender's message, counting from 0
+    5       M     bit mask of the fields that follow, bit i for STATE_FIELD_NAMES[i]: 2 bytes for up to 16 fields
+                  (the classic R, P, S ruleset has 13), 4 bytes for up to 32, and 8 for up to 64
+    5+M     ...   each changed field, sized as in binary-1, in STATE_FIELD_NAMES order
+
+A delta with every bit set is a full snapshot, sent when a connection starts using delta-1
+and whenever the receiver asks to resync, which it does if a sequence number is skipped
+or it has no state to apply a delta to:
+
+    offset  size  field
+    0       1     layout version (RESYNC_REQUEST_VERSION)
+    1       4     sequence number of the last message the receiver applied
+
+Players who agree on commit-reveal rounds (see ROUND_MODE_COMMIT_REVEAL) exchange these instead of states
+after the opening round. A commitment is the SHA-256 digest of the exact reveal message that follows it:
+
+    offset  size  field
+    0       1     layout version (COMMITMENT_VERSION)
+    1       32    SHA-256 digest of the sender's reveal for this round
+
+    offset  size  field
+    0       1     layout version (REVEAL_VERSION)
+    1       1     sender's role: 1 or 2, so a player can't commit to and reveal the opponent's own move back to them
+    2       1     move, coded as in binary-1 (255 to quit, which is sent without a commitment)
+    3       16    random nonce (COMMITMENT_NONCE_SIZE)
+    19      2N    sender's remaining count of each move before this move, as in binary-1
+
+Stage and move indexes follow the order of STAGES and ALL_MOVES, so both players need the same game_constants.py.
+"""
+
+import json
+import struct
+from typing import List, Optional, Tuple, Union
+from game_constants import *
+
+
+BINARY_STATE_VERSION = 1
+DELTA_STATE_VERSION = 2
+RESYNC_REQUEST_VERSION = 3
+COMMITMENT_VERSION = 4
+REVEAL_VERSION = 5
+
+# Fields of the binary layouts, in order. RPSGameManager keeps its state in this same layout.
+STATE_FIELD_NAMES = [
+    'whose_turn', 'round_winner', 'stage', 'player_1_move', 'player_2_move', 'player_1_score', 'player_2_score'
+] + [f'player_1_{move}_count' for move in ALL_MOVES] + [f'player_2_{move}_count' for move in ALL_MOVES]
+_FIELD_FORMATS = 'BBBBBII' + 'H' * 2 * len(ALL_MOVES)
+_FIELD_BITS = [1 << index for index in range(len(STATE_FIELD_NAMES))]
+_ALL_FIELDS_MASK = (1 << len(STATE_FIELD_NAMES)) - 1
+
+# Index of the first field of each kind. Per-player fields are player 1's, then player 2's.
+FIELD_WHOSE_TURN = 0
+FIELD_ROUND_WINNER = 1
+FIELD_STAGE = 2
+FIELD_CURRENT_MOVES = 3
+FIELD_SCORES = 5
+FIELD_MOVE_COUNTS = 7  # player 1's counts in ALL_MOVES order, then player 2's
+
+_BINARY_STATE = struct.Struct('!B' + _FIELD_FORMATS)
+_DELTA_HEADER = struct.Struct('!BI' + ('H' if len(STATE_FIELD_NAMES) <= 16 else
+                                        'I' if len(STATE_FIELD_NAMES) <= 32 else 'Q'))
+_RESYNC_REQUEST = struct.Struct('!BI')
+_COMMITMENT = struct.Struct('!B32s')
+_REVEAL = struct.Struct(f'!BBB{COMMITMENT_NONCE_SIZE}s' + 'H' * len(ALL_MOVES))
+_SEQUENCE_MODULUS = 1 << 32
+
+# Struct and field indexes for the changed fields of each mask, built as masks are first seen
+_delta_body_layouts = {}
+
+STAGE_NAMES = list(STAGES)
+
+NO_VALUE_CODE = 0
+_TIE_CODE = 3
+_QUIT_CODE = 255
+
+WINNER_CODES = {'': NO_VALUE_CODE, PLAYER_1: 1, PLAYER_2: 2, TIE: _TIE_CODE}
+WINNERS_BY_CODE = {code: winner for winner, code in WINNER_CODES.items()}
+
+MOVE_CODES = {'': NO_VALUE_CODE, QUIT_MESSAGE: _QUIT_CODE}
+MOVE_CODES.update({move: index + 1 for index, move in enumerate(ALL_MOVES)})
+MOVES_BY_CODE = {code: move for move, code in MOVE_CODES.items()}
+
+STAGE_CODES = {'': NO_VALUE_CODE}
+STAGE_CODES.update({stage: index + 1 for index, stage in enumerate(STAGE_NAMES)})
+
+PLAYER_CODES = {PLAYER_1: 1, PLAYER_2: 2}
+PLAYERS_BY_CODE = {code: player for player, code in PLAYER_CODES.items()}
+
+_NO_MOVE_COUNTS = (0,) * len(ALL_MOVES)
+
+# encode_notice() output always starts like this, which no state does
+_NOTICE_PREFIX = json.dumps({NOTICE_KEY: ''})[:len(NOTICE_KEY) + 3].encode()
+_ROUND_MODE_ACCEPTANCE_PREFIX = json.dumps({ROUND_MODE_ACCEPT_KEY: ''})[:len(ROUND_MODE_ACCEPT_KEY) + 3].encode()
+_SPECTATOR_UPDATE_PREFIX = json.dumps({SPECTATE_KEY: ''})[:len(SPECTATE_KEY) + 3].encode()
+
+
+class StateDecodeError(ValueError):
+    pass
+
+
+class StateResyncNeeded(Exception):
+    pass
+
+
+def encode_json_state(state: dict) -> str:
+    """
+    :param state: game state in the format used by RPSGameManager
+    :return: state as a JSON string
+    """
+    return json.dumps(state)
+
+
+def state_to_fields(state: dict) -> tuple:
+    """
+    Flattens a state into the fields of the binary layouts, in STATE_FIELD_NAMES order
+    :param state: game state in the format used by RPSGameManager
+    :return: tuple of small integers
+    """
+    players = state['player']
+    player_1 = players[PLAYER_1]
+    player_2 = players[PLAYER_2]
+
+    # Move choices are None until a stage is selected
+    move_counts = []
+    for player_data in (player_1, player_2):
+        move_choices = player_data['move_choices']
+        move_counts.extend(_NO_MOVE_COUNTS if move_choices is None else [move_choices[move] for move in ALL_MOVES])
+
+    return (
+        int(state['whose_turn']),
+        WINNER_CODES[state['round_winner']],
+        STAGE_CODES[state['stage']],
+        MOVE_CODES[player_1['current_move']],
+        MOVE_CODES[player_2['current_move']],
+        player_1['score'],
+        player_2['score'],
+        *move_counts
+    )
+
+
+def fields_to_state(fields: tuple) -> dict:
+    """
+    Rebuilds a state from the fields of the binary layouts
+    :param fields: tuple in STATE_FIELD_NAMES order, as returned by state_to_fields()
+    :return: game state in the format used by RPSGameManager
+    """
+    try:
+        whose_turn, winner_code, stage_code, move_code_1, move_code_2, score_1, score_2 = fields[:7]
+        move_counts = fields[7:]
+
+        stage = '' if stage_code == NO_VALUE_CODE else STAGE_NAMES[stage_code - 1]
+        round_winner = WINNERS_BY_CODE[winner_code]
+        current_moves = [MOVES_BY_CODE[move_code_1], MOVES_BY_CODE[move_code_2]]
+
+    except (ValueError, IndexError, KeyError) as error:
+        raise StateDecodeError('received malformed binary state') from error
+
+    # Move choices are None until a stage is selected
+    move_count = len(ALL_MOVES)
+    has_stage = stage != ''
+
+    return {
+        'whose_turn': str(whose_turn),
+        'round_winner': round_winner,
+        'stage': stage,
+        'player': {
+            PLAYER_1: {
+                'score': score_1,
+                'move_choices': dict(zip(ALL_MOVES, move_counts[:move_count])) if has_stage else None,
+                'current_move': current_moves[0]
+            },
+            PLAYER_2: {
+                'score': score_2,
+                'move_choices': dict(zip(ALL_MOVES, move_counts[move_count:])) if has_stage else None,
+                'current_move': current_moves[1]
+            }
+        }
+    }
+
+
+def validate_fields(fields: tuple) -> tuple:
+    """
+    Checks that every code in decoded fields means something, without building a state dict
+    :param fields: tuple in STATE_FIELD_NAMES order
+    :return: the same fields
+    """
+    if (len(fields) != len(STATE_FIELD_NAMES) or
+            fields[FIELD_WHOSE_TURN] not in PLAYERS_BY_CODE or
+            fields[FIELD_ROUND_WINNER] not in WINNERS_BY_CODE or
+            fields[FIELD_STAGE] > len(STAGE_NAMES) or
+            fields[FIELD_CURRENT_MOVES] not in MOVES_BY_CODE or
+            fields[FIELD_CURRENT_MOVES + 1] not in MOVES_BY_CODE):
+        raise StateDecodeError('received malformed binary state')
+
+    return fields
+
+
+def encode_binary_fields(fields) -> bytes:
+    """
+    :param fields: sequence in STATE_FIELD_NAMES order
+    :return: state in the binary-1 layout
+    """
+    return _BINARY_STATE.pack(BINARY_STATE_VERSION, *fields)
+
+
+def decode_binary_fields(message: bytes) -> tuple:
+    """
+    :param message: state in the binary-1 layout
+    :return: validated fields, in STATE_FIELD_NAMES order
+    """
+    try:
+        fields = _BINARY_STATE.unpack(message)[1:]
+
+    except struct.error as error:
+        raise StateDecodeError('received malformed binary state') from error
+
+    return validate_fields(fields)
+
+
+def encode_binary_state(state: dict) -> bytes:
+    """
+    :param state: game state in the format used by RPSGameManager
+    :return: state in the binary-1 layout
+    """
+    return encode_binary_fields(state_to_fields(state))
+
+
+def decode_binary_state(message: bytes) -> dict:
+    """
+    :param message: state in the binary-1 layout
+    :return: game state in the format used by RPSGameManager
+    """
+    return fields_to_state(decode_binary_fields(message))
+
+
+def _get_delta_body_layout(mask: int) -> Tuple[struct.Struct, List[int]]:
+    """
+    :param mask: bit mask of changed fields
+    :return: struct for those fields' values, and the fields' indexes
+    """
+    body_layout = _delta_body_layouts.get(mask)
+
+    if body_layout is None:
+        field_indexes = [index for index in range(len(STATE_FIELD_NAMES)) if mask & (1 << index)]
+        body_struct = struct.Struct('!' + ''.join(_FIELD_FORMATS[index] for index in field_indexes))
+        body_layout = (body_struct, field_indexes)
+        _delta_body_layouts[mask] = body_layout
+
+    return body_layout
+
+
+class DeltaStateSync:
+    """
+    Tracks the last state sent and received on one connection, to send and apply delta-1 messages.
+    Each direction is diffed against its own last state, just as each counts its own sequence numbers.
+    Keep one per connection, and route every delta-1 message sent or received on it through here.
+    """
+    __slots__ = ('last_sent_fields', 'last_received_fields', 'next_sent_sequence', 'expected_received_sequence')
+
+    def __init__(self):
+        self.last_sent_fields = None  # fields of the last state this end sent, which the next one is diffed against
+        self.last_received_fields = None  # fields of the last state received, which the next delta applies to
+        self.next_sent_sequence = 0
+        self.expected_received_sequence = 0
+
+    def encode_fields(self, fields: tuple, mask: int) -> bytes:
+        """
+        :param fields: fields of the state to send
+        :param mask: which fields to include
+        :return: delta-1 message
+        """
+        body_struct, field_indexes = _get_delta_body_layout(mask)
+        message = (_DELTA_HEADER.pack(DELTA_STATE_VERSION, self.next_sent_sequence, mask) +
+                   body_struct.pack(*[fields[index] for index in field_indexes]))
+
+        self.next_sent_sequence = (self.next_sent_sequence + 1) % _SEQUENCE_MODULUS
+        self.last_sent_fields = fields
+
+        return message
+
+    def encode_delta(self, state: dict) -> bytes:
+        """
+        Encodes only what changed since the last state sent, or a snapshot if nothing was sent yet
+        :param state: game state in the format used by RPSGameManager
+        :return: delta-1 message
+        """
+        return self.encode_delta_fields(state_to_fields(state))
+
+    def encode_delta_fields(self, fields) -> bytes:
+        """
+        Same as encode_delta(), for a state already in STATE_FIELD_NAMES order
+        :param fields: sequence of the state's fields; copied, so the caller may keep changing it
+        :return: delta-1 message
+        """
+        fields = tuple(fields)
+
+        if self.last_sent_fields is None:
+            mask = _ALL_FIELDS_MASK
+        else:
+            mask = 0
+            for index, (value, sent_value) in enumerate(zip(fields, self.last_sent_fields)):
+                if value != sent_value:
+                    mask |= _FIELD_BITS[index]
+
+        return self.encode_fields(fields, mask)
+
+    def encode_snapshot(self) -> bytes:
+        """
+        Re-sends the last sent state in full, to answer a resync request
+        :return: delta-1 message with every field
+        """
+        return self.encode_fields(self.last_sent_fields, _ALL_FIELDS_MASK)
+
+    def encode_resync_request(self) -> bytes:
+        """
+        :return: message asking the other end for a full snapshot
+        """
+        last_applied_sequence = self.expected_received_sequence - 1
+
+        return _RESYNC_REQUEST.pack(RESYNC_REQUEST_VERSION, last_applied_sequence % _SEQUENCE_MODULUS)
+
+    def decode_delta(self, message: bytes) -> dict:
+        """
+        Applies a received delta-1 message to the last state received
+        :param message: delta-1 message
+        :return: the sender's state, in the format used by RPSGameManager
+        """
+        return fields_to_state(self.decode_delta_fields(message))
+
+    def decode_delta_fields(self, message: bytes) -> tuple:
+        """
+        Same as decode_delta(), without building a state dict
+        :param message: delta-1 message
+        :return: the sender's validated fields, in STATE_FIELD_NAMES order
+        """
+        try:
+            _, sequence, mask = _DELTA_HEADER.unpack_from(message)
+            body_struct, field_indexes = _get_delta_body_layout(mask)
+            changed_values = body_struct.unpack_from(message, _DELTA_HEADER.size)
+
+        except struct.error as error:
+            raise StateDecodeError('received malformed delta state') from error
+
+        is_snapshot = mask == _ALL_FIELDS_MASK
+
+        if not is_snapshot and (self.last_received_fields is None or sequence != self.expected_received_sequence):
+            raise StateResyncNeeded(f'cannot apply delta {sequence}; expected {self.expected_received_sequence}')
+
+        if is_snapshot:
+            fields = changed_values
+        else:
+            fields = list(self.last_received_fields)
+            for index, value in zip(field_indexes, changed_values):
+                fields[index] = value
+            fields = tuple(fields)
+
+        validate_fields(fields)
+
+        self.last_received_fields = fields
+        self.expected_received_sequence = (sequence + 1) % _SEQUENCE_MODULUS
+
+        return fields
+
+
+def is_binary_state(message: Union[str, bytes]) -> bool:
+    """
+    :param message: encoded state
+    :return: True if the message uses a binary layout rather than JSON
+    """
+    return isinstance(message, (bytes, bytearray)) and len(message) > 0 and message[0] == BINARY_STATE_VERSION
+
+
+def is_delta_state(message: Union[str, bytes]) -> bool:
+    """
+    :param message: encoded state
+    :return: True if the message is a delta-1 state, which only a DeltaStateSync can decode
+    """
+    return isinstance(message, (bytes, bytearray)) and len(message) > 0 and message[0] == DELTA_STATE_VERSION
+
+
+def get_state_codec_name(message: Union[str, bytes]) -> str:
+    """
+    :param message: encoded state
+    :return: the codec the state was encoded with, one of SUPPORTED_STATE_CODECS
+    """
+    if is_delta_state(message):
+        return STATE_CODEC_DELTA
+
+    return STATE_CODEC_BINARY if is_binary_state(message) else STATE_CODEC_JSON
+
+
+def is_resync_request(message: Union[str, bytes]) -> bool:
+    """
+    :param message: message received from the other end
+    :return: True if the other end asked for a full snapshot instead of sending a state
+    """
+    return isinstance(message, (bytes, bytearray)) and len(message) > 0 and message[0] == RESYNC_REQUEST_VERSION
+
+
+def encode_notice(text: str) -> str:
+    """
+    :param text: message for the player
+    :return: notice message (see NOTICE_KEY)
+    """
+    return json.dumps({NOTICE_KEY: text})
+
+
+def is_notice(message: Union[str, bytes]) -> bool:
+    """
+    :param message: message received from the other end
+    :return: True if the message is a notice for the player rather than a state
+    """
+    return isinstance(message, (bytes, bytearray)) and message.startswith(_NOTICE_PREFIX)
+
+
+def decode_notice(message: bytes) -> str:
+    """
+    :param message: notice message
+    :return: the notice's text
+    """
+    try:
+        return str(json.loads(message)[NOTICE_KEY])
+
+    except (ValueError, KeyError, TypeError) as error:
+        raise StateDecodeError('received malformed notice') from error
+
+
+def encode_watch_request(match_id: Optional[int] = None) -> str:
+    """
+    :param match_id: ID of the match to watch, or None for the most-watched live match
+    :return: watch request message (see WATCH_KEY)
+    """
+    return json.dumps({WATCH_KEY: match_id})
+
+
+def encode_spectator_update(update: dict) -> bytes:
+    """
+    :param update: the match so far, as built by the match server
+    :return: spectator update message (see SPECTATE_KEY)
+    """
+    return json.dumps({SPECTATE_KEY: update}, separators=(',', ':')).encode()
+
+
+def is_spectator_update(message: Union[str, bytes]) -> bool:
+    """
+    :param message: message received from the match server
+    :return: True if the message is a spectator update
+    """
+    return isinstance(message, (bytes, bytearray)) and message.startswith(_SPECTATOR_UPDATE_PREFIX)
+
+
+def decode_spectator_update(message: bytes) -> dict:
+    """
+    :param message: spectator update message
+    :return: the match so far, as built by the match server
+    """
+    try:
+        update = json.loads(message)[SPECTATE_KEY]
+
+    except (ValueError, KeyError, TypeError) as error:
+        raise StateDecodeError('received malformed spectator update') from error
+
+    if not isinstance(update, dict):
+        raise StateDecodeError('received malformed spectator update')
+
+    return update
+
+
+def encode_round_mode_acceptance(round_mode: str) -> str:
+    """
+    :param round_mode: offered round mode being accepted, from SUPPORTED_ROUND_MODES
+    :return: acceptance message (see ROUND_MODE_ACCEPT_KEY)
+    """
+    return json.dumps({ROUND_MODE_ACCEPT_KEY: round_mode})
+
+
+def is_round_mode_acceptance(message: Union[str, bytes]) -> bool:
+    """
+    :param message: message received from the other end
+    :return: True if the other end accepted a round mode rather than sending a state
+    """
+    return isinstance(message, (bytes, bytearray)) and message.startswith(_ROUND_MODE_ACCEPTANCE_PREFIX)
+
+
+def decode_round_mode_acceptance(message: bytes) -> str:
+    """
+    :param message: acceptance message
+    :return: the accepted round mode
+    """
+    try:
+        return str(json.loads(message)[ROUND_MODE_ACCEPT_KEY])
+
+    except (ValueError, KeyError, TypeError) as error:
+        raise StateDecodeError('received malformed round mode acceptance') from error
+
+
+def encode_commitment(digest: bytes) -> bytes:
+    """
+    :param digest: SHA-256 digest of the reveal being committed to
+    :return: commitment message
+    """
+    return _COMMITMENT.pack(COMMITMENT_VERSION, digest)
+
+
+def is_commitment(message: Union[str, bytes]) -> bool:
+    """
+    :param message: message received from the other end
+    :return: True if the message commits to a move for a commit-reveal round
+    """
+    return isinstance(message, (bytes, bytearray)) and len(message) > 0 and message[0] == COMMITMENT_VERSION
+
+
+def decode_commitment(message: bytes) -> bytes:
+    """
+    :param message: commitment message
+    :return: digest of the reveal the sender committed to
+    """
+    try:
+        _, digest = _COMMITMENT.unpack(message)
+
+    except struct.error as error:
+        raise StateDecodeError('received malformed commitment') from error
+
+    return digest
+
+
+def encode_reveal(player: str, move: str, nonce: bytes, move_counts: tuple) -> bytes:
+    """
+    :param player: sender's role, PLAYER_1 or PLAYER_2
+    :param move: move being revealed, or the quit message
+    :param nonce: COMMITMENT_NONCE_SIZE random bytes
+    :param move_counts: sender's remaining options before the move, in ALL_MOVES order
+    :return: reveal message
+    """
+    return _REVEAL.pack(REVEAL_VERSION, PLAYER_CODES[player], MOVE_CODES[move], nonce, *move_counts)
+
+
+def is_reveal(message: Union[str, bytes]) -> bool:
+    """
+    :param message: message received from the other end
+    :return: True if the message reveals a move for a commit-reveal round
+    """
+    return isinstance(message, (bytes, bytearray)) and len(message) > 0 and message[0] == REVEAL_VERSION
+
+
+def decode_reveal(message: bytes) -> Tuple[str, str, bytes, tuple]:
+    """
+    :param message: reveal message
+    :return: the sender's role (PLAYER_1 or PLAYER_2), the revealed move (one of ALL_MOVES, or the quit message),
+             the nonce, and the sender's remaining options before the move, in ALL_MOVES order
+    """
+    try:
+        _, player_code, move_code, nonce, *move_counts = _REVEAL.unpack(message)
+        player = PLAYERS_BY_CODE[player_code]
+        move = MOVES_BY_CODE[move_code]
+
+    except (struct.error, KeyError) as error:
+        raise StateDecodeError('received malformed reveal') from error
+
+    if move == '':
+        raise StateDecodeError('received malformed reveal')
+
+    return player, move, nonce, tuple(move_counts)
+
+
+def decode_state(message: Union[str, bytes]) -> dict:
+    """
+    Decodes a state in whichever codec it was encoded with
+    :param message: encoded state
+    :return: game state in the format used by RPSGameManager,
+             plus STATE_CODEC_OFFER_KEY if the sender offered codecs
+    """
+    if is_binary_state(message):
+        return decode_binary_state(message)
+
+    try:
+        return json.loads(message)
+
+    except ValueError as error:
+        raise StateDecodeError('received malformed JSON state') from error
+
+
+def encode_state(state: dict, codec: str = STATE_CODEC_JSON) -> Union[str, bytes]:
+    """
+    :param state: game state in the format used by RPSGameManager
+    :param codec: one of SUPPORTED_STATE_CODECS
+    :return: encoded state
+    """
+    if codec == STATE_CODEC_BINARY:
+        return encode_binary_state(state)
+
+    return encode_json_state(state)
+
+
+def encode_state_with_offer(state: dict, round_modes: Optional[List[str]] = None,
+                            player_name: Optional[str] = None, regen_seed: Optional[int] = None) -> str:
+    """
+    Encodes an opening state as JSON and offers every supported codec, and the given round modes, to the receiver
+    :param state: game state in the format used by RPSGameManager
+    :param round_modes: round modes to offer; SUPPORTED_ROUND_MODES if None
+    :param player_name: the sender's player name, if it has one
+    :param regen_seed: the match's regen seed, if the sender picks it
+    :return: JSON string
+    """
+    round_modes = SUPPORTED_ROUND_MODES if round_modes is None else round_modes
+
+    offer_state = dict(state)
+    offer_state[STATE_CODEC_OFFER_KEY] = SUPPORTED_STATE_CODECS
+    if len(round_modes) > 0:
+        offer_state[ROUND_MODE_OFFER_KEY] = round_modes
+    if player_name is not None:
+        offer_state[PLAYER_NAME_KEY] = player_name
+    if regen_seed is not None:
+        offer_state[REGEN_SEED_KEY] = regen_seed
+
+    return encode_json_state(offer_state)
+
+
+def choose_state_codec(offered_codecs: List[str]) -> str:
+    """
+    Picks the codec to answer an offer with
+    :param offered_codecs: codecs the other player offered, most preferred first
+    :return: the first offered codec that's also supported here, or JSON
+    """
+    for codec in offered_codecs:
+        if codec in SUPPORTED_STATE_CODECS:
+            return codec
+
+    return STATE_CODEC_JSON
@@ -0,0 +1,77 @@
+"""
+Tests for the microbenchmark suite in benchmark_suite.py: every benchmark runs, and regressions fail the run
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import benchmark_suite
+import socket_helpers
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        benchmarks = (benchmark_suite.build_framing_benchmarks([socket_helpers.BUFFER_SIZE]) +
+                      benchmark_suite.build_codec_benchmarks() + benchmark_suite.build_round_benchmarks())
+        buffer_size = socket_helpers.BUFFER_SIZE
+
+        for benchmark in benchmarks:
+            with self.subTest(benchmark.name):
+                result = benchmark_suite.run_benchmark(benchmark, min_time=0, repeat=1)
+
+                self.assertGreater(result['ns_per_op'], 0)
+                self.assertGreaterEqual(result['alloc_bytes_per_op'], 0)
+                self.assertEqual(socket_helpers.BUFFER_SIZE, buffer_size)
+
+    def test_framed_sizes_count_the_framing(self):
+        benchmarks = {benchmark.name: benchmark for benchmark in benchmark_suite.build_framing_benchmarks([256])}
+        v2_benchmark = next(benchmark for name, benchmark in benchmarks.items() if name.startswith('gela372.v2.10B'))
+
+        self.assertGreater(v2_benchmark.wire_bytes, 10)
+        self.assertEqual(benchmark_suite.format_size(100 * 1000), '100KB')
+        self.assertEqual(len(benchmark_suite.build_message(1000)), 1000)
+
+
+class TestBaselines(unittest.TestCase):
+    def run_suite(self, *arguments) -> int:
+        """
+        Runs the suite's command line on the round benchmarks, quickly
+        :param arguments: extra command-line arguments
+        :return: exit code
+        """
+        argv = ['benchmark_suite.py', '--filter', 'round.calculate', '--min-time', '0', '--repeat', '1', *arguments]
+
+        with mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(io.StringIO()):
+            try:
+                benchmark_suite.main()
+            except SystemExit as exit_error:
+                return exit_error.code
+
+        return 0
+
+    def test_runs_slower_than_the_baseline_fail(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baselines.json')
+
+            self.assertEqual(self.run_suite('--baseline', path, '--save-baseline'), 0)
+            self.assertEqual(list(benchmark_suite.load_baselines(path)), ['round.calculate_round_result'])
+
+            with open(path) as baseline_file:
+                saved = json.load(baseline_file)
+            saved['benchmarks']['round.calculate_round_result']['ns_per_op'] = 1e-3
+            with open(path, 'w') as baseline_file:
+                json.dump(saved, baseline_file)
+
+            self.assertEqual(self.run_suite('--baseline', path), 1)
+
+    def test_missing_baseline_compares_nothing(self):
+        self.assertEqual(benchmark_suite.load_baselines(os.path.join(tempfile.gettempdir(), 'no-such-baseline')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
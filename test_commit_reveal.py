@@ -0,0 +1,151 @@
+"""
+Tests for commit-reveal rounds in commit_reveal.py, including opponents who try to cheat them
+"""
+
+import socket
+import threading
+import unittest
+from commit_reveal import CommitmentError, CommitRevealRound
+from game_constants import *
+from rps_bots import RandomBot
+import state_codec
+from test_game_helpers import RecordingGameManager
+
+STAGE_COUNTS = tuple(STAGES['HEAVEN'][move] for move in ALL_MOVES)
+
+
+class TestCommitRevealRound(unittest.TestCase):
+    def setUp(self):
+        self.rounds = {PLAYER_1: CommitRevealRound(PLAYER_1), PLAYER_2: CommitRevealRound(PLAYER_2)}
+
+    def exchange_commitments(self, move_2: str = 'S', counts_2: tuple = STAGE_COUNTS) -> tuple:
+        """
+        Commits both players to their moves, player 1 to 'R', and delivers the commitments
+        :param move_2: player 2's move
+        :param counts_2: player 2's counts to commit to
+        :return: player 2's reveal, then player 1's, neither delivered yet
+        """
+        self.rounds[PLAYER_2].receive_commitment(self.rounds[PLAYER_1].commit('R', STAGE_COUNTS))
+        self.rounds[PLAYER_1].receive_commitment(self.rounds[PLAYER_2].commit(move_2, counts_2))
+
+        self.assertTrue(self.rounds[PLAYER_1].is_ready_to_reveal())
+
+        return self.rounds[PLAYER_2].reveal(), self.rounds[PLAYER_1].reveal()
+
+    def test_honest_reveal_opens(self):
+        reveal_2, reveal_1 = self.exchange_commitments()
+
+        self.assertEqual(self.rounds[PLAYER_1].open_reveal(reveal_2, STAGE_COUNTS), ('S', STAGE_COUNTS))
+        self.assertEqual(self.rounds[PLAYER_2].open_reveal(reveal_1, STAGE_COUNTS), ('R', STAGE_COUNTS))
+
+    def test_reveal_of_another_move_is_rejected(self):
+        reveal_2, _ = self.exchange_commitments()
+        _, _, nonce, counts = state_codec.decode_reveal(reveal_2)
+
+        with self.assertRaises(CommitmentError):
+            self.rounds[PLAYER_1].open_reveal(state_codec.encode_reveal(PLAYER_2, 'P', nonce, counts), STAGE_COUNTS)
+
+    def test_echoed_commitment_is_rejected(self):
+        commitment = self.rounds[PLAYER_1].commit('R', STAGE_COUNTS)
+
+        with self.assertRaises(CommitmentError):
+            self.rounds[PLAYER_1].receive_commitment(commitment)
+
+    def test_echoed_reveal_is_rejected(self):
+        _, reveal_1 = self.exchange_commitments()
+
+        with self.assertRaises(CommitmentError):
+            self.rounds[PLAYER_1].open_reveal(reveal_1, STAGE_COUNTS)
+
+    def test_reveal_before_both_commit_is_rejected(self):
+        self.rounds[PLAYER_2].commit('S', STAGE_COUNTS)
+
+        with self.assertRaises(CommitmentError):
+            self.rounds[PLAYER_1].open_reveal(self.rounds[PLAYER_2].reveal(), STAGE_COUNTS)
+
+    def test_reveal_of_counts_the_opponent_does_not_have_is_rejected(self):
+        reveal_2, _ = self.exchange_commitments(counts_2=(9, 9, 9))
+
+        with self.assertRaises(CommitmentError):
+            self.rounds[PLAYER_1].open_reveal(reveal_2, STAGE_COUNTS)
+
+    def test_reveal_of_a_move_that_ran_out_is_rejected(self):
+        reveal_2, _ = self.exchange_commitments(move_2='S', counts_2=(3, 3, 0))
+
+        with self.assertRaises(CommitmentError):
+            self.rounds[PLAYER_1].open_reveal(reveal_2, (3, 3, 0))
+
+    def test_one_regeneration_is_allowed_only_when_running_low(self):
+        tracked_counts = (1, 1, 0)
+        regenerated_counts = (1, 2, 1)
+        reveal_2, _ = self.exchange_commitments(counts_2=regenerated_counts)
+        self.assertEqual(self.rounds[PLAYER_1].open_reveal(reveal_2, tracked_counts), ('S', regenerated_counts))
+
+        for tracked_counts, revealed_counts in (((2, 1, 0), (2, 2, 1)), ((1, 1, 0), (1, 3, 2))):
+            self.rounds = {PLAYER_1: CommitRevealRound(PLAYER_1), PLAYER_2: CommitRevealRound(PLAYER_2)}
+            reveal_2, _ = self.exchange_commitments(counts_2=revealed_counts)
+
+            with self.assertRaises(CommitmentError):
+                self.rounds[PLAYER_1].open_reveal(reveal_2, tracked_counts)
+
+
+class InflatingBot(RandomBot):
+    """
+    Plays randomly, but gives itself extra options once commit-reveal rounds have started
+    """
+    def __call__(self, game_manager, valid_moves):
+        if self.moves_played > 0:
+            game_manager.set_player_move_options(game_manager.get_local_player(), {move: 9 for move in ALL_MOVES})
+
+        return super().__call__(game_manager, valid_moves)
+
+
+class TestCommitRevealGame(unittest.TestCase):
+    def play(self, local_bot, opponent_bot) -> tuple:
+        """
+        Plays player 1 against player 2 over a connection
+        :param local_bot: player 1's move selector
+        :param opponent_bot: player 2's move selector
+        :return: player 1's game manager, then player 2's, once the game is over
+        """
+        local_socket, opponent_socket = socket.socketpair()
+        opponent_manager = RecordingGameManager(move_selector=opponent_bot)
+        opponent_thread = threading.Thread(target=opponent_manager.play_game, args=(opponent_socket,))
+        opponent_thread.start()
+
+        game_manager = RecordingGameManager(move_selector=local_bot)
+        game_manager.set_stage('HEAVEN')
+        game_manager.play_next_move()
+        game_manager.send_state_to_opponent(local_socket)
+        game_manager.play_game(local_socket)
+        local_socket.close()
+
+        opponent_thread.join(5)
+        opponent_socket.close()
+        self.assertFalse(opponent_thread.is_alive())
+
+        return game_manager, opponent_manager
+
+    def test_honest_opponents_play_commit_reveal_rounds(self):
+        game_manager, _ = self.play(RandomBot(seed=1), RandomBot(100, seed=2))
+
+        self.assertTrue(game_manager.is_commit_reveal())
+        self.assertEqual(game_manager.get_opponent_move(), QUIT_MESSAGE)
+        tie_count = sum('was a tie' in line for line in game_manager.displayed_lines)
+        self.assertEqual(sum(game_manager.get_scores()) + tie_count, 100)
+
+    def test_quitting_while_the_opponent_commits_ends_their_game_cleanly(self):
+        for seed in range(10):
+            _, opponent_manager = self.play(RandomBot(20, seed=seed), RandomBot(seed=seed + 1))
+
+            # Player 2 commits its next move as soon as a round ends, so it may be sending when player 1 hangs up
+            self.assertIn('Opponent quit', opponent_manager.displayed_lines[-1])
+
+    def test_opponent_revealing_options_it_does_not_have_is_stopped(self):
+        game_manager, _ = self.play(RandomBot(seed=1), InflatingBot(seed=2))
+
+        self.assertTrue(any('broke the commit-reveal rules' in line for line in game_manager.displayed_lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests for RPSGameManager's game state and rules in game_helpers.py
+"""
+
+import os
+import socket
+import sys
+import threading
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from rps_bots import ScriptedBot
+
+
+def make_game_manager(stage: str = 'HEAVEN') -> RPSGameManager:
+    """
+    :param stage: stage to play on
+    :return: quiet game manager for player 1, with the stage set
+    """
+    game_manager = RPSGameManager(show_output=False)
+    game_manager.set_stage(stage)
+
+    return game_manager
+
+
+class RecordingGameManager(RPSGameManager):
+    """
+    Game manager that keeps what it would have shown, and the local player's moves, instead of printing them
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.displayed_lines = []
+        self.local_moves = []
+
+    def display(self, *values, **print_kwargs):
+        self.displayed_lines.append(' '.join(str(value) for value in values))
+
+    def record_player_move(self, player: str, move: str):
+        if player == self.get_local_player():
+            self.local_moves.append(move)
+
+        super().record_player_move(player, move)
+
+
+class TestMatchState(unittest.TestCase):
+    def test_state_dict_round_trips(self):
+        game_manager = make_game_manager('ASTEROID')
+        game_manager.record_player_move(PLAYER_1, 'S')
+
+        other_game_manager = RPSGameManager(show_output=False)
+        other_game_manager.state = game_manager.state
+
+        self.assertEqual(other_game_manager.state, game_manager.state)
+        self.assertEqual(other_game_manager.get_stage(), 'ASTEROID')
+        self.assertEqual(other_game_manager.get_player_move_options(PLAYER_1), dict(STAGES['ASTEROID'], S=1))
+
+    def test_changing_a_returned_state_leaves_the_game_alone(self):
+        game_manager = make_game_manager()
+        game_manager.state['player'][PLAYER_1]['move_choices']['R'] = 99
+
+        self.assertEqual(game_manager.get_player_move_options(PLAYER_1), STAGES['HEAVEN'])
+
+    def test_spending_moves_leaves_the_stage_alone(self):
+        stage_move_counts = dict(STAGES['OFFICE'])
+        game_manager = make_game_manager('OFFICE')
+        game_manager.record_player_move(PLAYER_1, 'R')
+        game_manager.record_player_move(PLAYER_2, 'P')
+
+        self.assertEqual(STAGES['OFFICE'], stage_move_counts)
+        self.assertEqual(game_manager.get_player_move_options(PLAYER_1)['R'], stage_move_counts['R'] - 1)
+        self.assertEqual(game_manager.get_player_move_options(PLAYER_2)['P'], stage_move_counts['P'] - 1)
+
+    def test_round_goes_to_the_winning_move(self):
+        for move_1, move_2, winner, scores in (('R', 'S', PLAYER_1, (1, 0)), ('R', 'P', PLAYER_2, (0, 1)),
+                                               ('P', 'P', TIE, (0, 0))):
+            game_manager = make_game_manager()
+            game_manager.record_player_move(PLAYER_1, move_1)
+            game_manager.record_player_move(PLAYER_2, move_2)
+            game_manager.calculate_round_result()
+
+            self.assertEqual(game_manager.get_round_winner(), winner)
+            self.assertEqual(game_manager.get_scores(), scores)
+
+
+@unittest.skipIf(sys.platform == 'win32', 'the keyboard is only watched alongside the socket where pipes can be')
+class TestKeyboardGame(unittest.TestCase):
+    def setUp(self):
+        self.local_socket, self.opponent_socket = socket.socketpair()
+        keyboard_fd, self.typing_fd = os.pipe()
+        self.keyboard = os.fdopen(keyboard_fd)
+
+    def tearDown(self):
+        self.local_socket.close()
+        self.opponent_socket.close()
+        self.keyboard.close()
+        os.close(self.typing_fd)
+
+    def test_lines_typed_while_waiting_answer_the_next_prompts(self):
+        opponent_manager = RPSGameManager(move_selector=ScriptedBot(['R'], repeat=True), show_output=False)
+        opponent_manager.set_local_player(PLAYER_2)
+        opponent_thread = threading.Thread(target=opponent_manager.play_game, args=(self.opponent_socket,))
+        opponent_thread.start()
+
+        game_manager = RecordingGameManager()
+        game_manager.set_stage('HEAVEN')
+
+        # Everything is typed before the first prompt, including a typo
+        os.write(self.typing_fd, f'R\nP\nX\nS\n{QUIT_MESSAGE}\n'.encode())
+        game_manager.play_game_with_keyboard(self.local_socket, moves_first=True, keyboard=self.keyboard)
+        opponent_thread.join(5)
+
+        self.assertEqual(game_manager.local_moves, ['R', 'P', 'S', QUIT_MESSAGE])
+        self.assertFalse(opponent_thread.is_alive())
+
+    def test_opponent_leaving_shows_while_the_player_is_choosing(self):
+        opponent_manager = RPSGameManager(move_selector=ScriptedBot(['R']), show_output=False)
+        opponent_manager.set_stage('HEAVEN')
+        opponent_manager.play_next_move()
+        opponent_manager.send_state_to_opponent(self.opponent_socket)
+        self.opponent_socket.close()
+
+        # Returns without anything typed
+        game_manager = RecordingGameManager()
+        game_manager.play_game_with_keyboard(self.local_socket, keyboard=self.keyboard)
+
+        self.assertEqual(game_manager.local_moves, [])
+        self.assertIn(PACKET_RECEIVE_ERROR_MESSAGE, game_manager.displayed_lines[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Tests for the leaderboard in leaderboard.py: batched writes from the game loop, and the totals they add up to
+"""
+
+import os
+import tempfile
+import unittest
+from game_constants import *
+from leaderboard import LeaderboardReader, LeaderboardWriter
+
+
+class TestLeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'leaderboard.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play_match(self, writer: LeaderboardWriter, names: dict, moves: list, stage: str = 'HEAVEN'):
+        """
+        Reports a match's rounds, then the match
+        :param writer: open leaderboard writer
+        :param names: each player's name, or None for an unnamed player
+        :param moves: (player 1's move, player 2's move, winner) for each round
+        :param stage: stage the match is played on
+        """
+        scores = {PLAYER_1: 0, PLAYER_2: 0}
+
+        for move_1, move_2, winner in moves:
+            writer.record_round(stage, names, {PLAYER_1: move_1, PLAYER_2: move_2}, winner)
+            if winner in scores:
+                scores[winner] += 1
+
+        writer.record_match(stage, names, scores, len(moves))
+
+    def test_totals_add_up_across_matches_and_stages(self):
+        names = {PLAYER_1: 'ana', PLAYER_2: 'bo'}
+
+        with LeaderboardWriter(self.path) as writer:
+            self.play_match(writer, names, [('R', 'S', PLAYER_1), ('P', 'R', PLAYER_1), ('R', 'P', PLAYER_2),
+                                            ('S', 'P', PLAYER_1)])
+            self.play_match(writer, names, [('R', 'P', PLAYER_2)], stage='MOUNTAIN')
+
+        with LeaderboardReader(self.path) as reader:
+            ana = reader.get_player('ana')
+            self.assertEqual((ana['matches'], ana['match_wins'], ana['match_losses']), (2, 1, 1))
+            self.assertEqual((ana['rounds'], ana['round_wins'], ana['round_losses']), (5, 3, 2))
+            self.assertEqual(ana['moves'], {'R': 3, 'P': 1, 'S': 1})
+            self.assertEqual(ana['stages']['MOUNTAIN']['match_losses'], 1)
+            self.assertEqual(ana['stages']['HEAVEN']['match_wins'], 1)
+
+            self.assertEqual([player['name'] for player in reader.get_top_players(order='round_wins')], ['ana', 'bo'])
+
+            finish_times = [match['finished_at'] for match in reader.get_recent_matches('bo')]
+            self.assertEqual(finish_times, sorted(finish_times, reverse=True))
+            self.assertEqual(len(reader.get_recent_matches('bo', count=1)), 1)
+
+    def test_unnamed_players_are_not_counted(self):
+        with LeaderboardWriter(self.path) as writer:
+            self.play_match(writer, {PLAYER_1: 'ana', PLAYER_2: None}, [('R', 'S', PLAYER_1)])
+
+        with LeaderboardReader(self.path) as reader:
+            self.assertEqual([player['name'] for player in reader.get_top_players()], ['ana'])
+            self.assertIsNone(reader.get_player('bo'))
+
+    def test_reports_are_applied_in_batches(self):
+        names = {PLAYER_1: 'ana', PLAYER_2: 'bo'}
+
+        with LeaderboardWriter(self.path, batch_size=100, flush_interval=60) as writer:
+            for _ in range(50):
+                self.play_match(writer, names, [('R', 'S', PLAYER_1)] * 9)
+
+            # Flushing applies what has queued without waiting for the interval
+            writer.flush()
+            self.assertLessEqual(writer.batch_count, 6)
+
+            with LeaderboardReader(self.path) as reader:
+                self.assertEqual(reader.get_player('bo')['rounds'], 450)
+                self.assertEqual(reader.get_player('bo')['match_losses'], 50)
+
+    def test_ranking_by_an_unknown_total_is_refused(self):
+        with LeaderboardReader(self.path) as reader:
+            with self.assertRaises(ValueError):
+                reader.get_top_players(order='name; DROP TABLE players')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests for the in-memory loopback transport in loopback_transport.py, and for whole matches played over it
+"""
+
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from loopback_transport import LoopbackTransport, play_loopback_match
+from rps_bots import RandomBot
+from socket_helpers import GELA372Receiver, receive_message_bytes, send_message
+from test_regen_streams import play_bot_match
+
+
+class TestLoopbackTransport(unittest.TestCase):
+    def test_bytes_arrive_in_order_however_they_are_read(self):
+        first_end, second_end = LoopbackTransport.create_pair()
+        first_end.sendall(b'abc')
+        first_end.sendmsg([b'de', b'', b'fgh'])
+
+        buffer = bytearray(4)
+        self.assertEqual(second_end.recv_into(buffer), 4)
+        self.assertEqual(buffer, b'abcd')
+        self.assertEqual(second_end.recv(2), b'ef')
+        self.assertEqual(second_end.recv(100), b'gh')
+
+        with self.assertRaises(BlockingIOError):
+            second_end.recv(100)
+
+    def test_closing_ends_the_stream_for_the_other_end(self):
+        first_end, second_end = LoopbackTransport.create_pair()
+        first_end.sendall(b'last')
+        first_end.close()
+
+        self.assertEqual(second_end.recv(100), b'last')
+        self.assertEqual(second_end.recv(100), b'')
+
+        # What's sent to a closed end is dropped, and a closed end can't send
+        second_end.sendall(b'too late')
+        with self.assertRaises(OSError):
+            first_end.sendall(b'after closing')
+
+    def test_gela372_messages_cross_it_unchanged(self):
+        first_end, second_end = LoopbackTransport.create_pair()
+        receiver = GELA372Receiver()
+        messages = ['x' * size for size in (0, 10, 10000)]
+
+        for message in messages:
+            send_message(message, first_end)
+
+        self.assertEqual([receive_message_bytes(second_end, receiver).decode() for _ in messages], messages)
+
+
+class TestLoopbackMatch(unittest.TestCase):
+    def test_matches_play_out_as_they_do_over_a_socket(self):
+        for round_modes in ([], SUPPORTED_ROUND_MODES):
+            # The same bots, seeds, and stage as play_bot_match()
+            client_manager = RPSGameManager(RandomBot(200, seed=1), show_output=False, regen_seed=1234)
+            server_manager = RPSGameManager(RandomBot(seed=2), show_output=False, regen_seed=1235)
+            for game_manager in (client_manager, server_manager):
+                game_manager.round_modes = list(round_modes)
+
+            play_loopback_match(client_manager, server_manager, 'MOUNTAIN')
+            socket_client_manager, _ = play_bot_match(1234, round_modes)
+
+            self.assertEqual(client_manager.is_commit_reveal(), len(round_modes) > 0)
+            self.assertEqual(client_manager.move_selector.moves_played, 200)
+            self.assertEqual(client_manager.get_scores(), tuple(reversed(server_manager.get_scores())))
+            self.assertEqual(client_manager.get_scores(), socket_client_manager.get_scores())
+
+    def test_player_1_quitting_right_away_ends_the_match(self):
+        client_manager = RPSGameManager(RandomBot(0), show_output=False)
+        server_manager = RPSGameManager(RandomBot(), show_output=False)
+
+        play_loopback_match(client_manager, server_manager, 'HEAVEN')
+
+        self.assertEqual(server_manager.move_selector.moves_played, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests for the binary match log in match_log.py: writing, reading back, and recovering from a writer that stopped
+"""
+
+import os
+import tempfile
+import unittest
+from game_constants import *
+from match_log import MatchLogError, MatchLogReader, MatchLogWriter, MatchRecorder, append_match, get_index_path
+
+
+def counts_of(rock: int, paper: int, scissors: int) -> dict:
+    """
+    :return: counts by move, for the classic moves
+    """
+    return dict(zip(ALL_MOVES, (rock, paper, scissors)))
+
+
+def make_recorder() -> MatchRecorder:
+    """
+    :return: recorder of a three-round match in which player 1 regenerates after the first round, then quits
+    """
+    recorder = MatchRecorder('MOUNTAIN')
+    recorder.record_round({PLAYER_1: 'R', PLAYER_2: 'S'}, PLAYER_1,
+                          {PLAYER_1: counts_of(1, 1, 1), PLAYER_2: counts_of(1, 1, 0)})
+    recorder.record_round({PLAYER_1: 'P', PLAYER_2: 'R'}, PLAYER_1,
+                          {PLAYER_1: counts_of(2, 1, 2), PLAYER_2: counts_of(0, 1, 0)})
+    recorder.record_round({PLAYER_1: 'R', PLAYER_2: 'P'}, PLAYER_2,
+                          {PLAYER_1: counts_of(1, 1, 2), PLAYER_2: counts_of(0, 0, 0)})
+    recorder.quitter = PLAYER_1
+
+    return recorder
+
+
+class TestMatchLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'matches.rpslog')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_match_reads_back_as_recorded(self):
+        self.assertEqual(append_match(self.path, make_recorder()), 0)
+
+        with MatchLogReader(self.path) as reader:
+            match = reader.get_match(0)
+
+            self.assertEqual((match.stage, match.quitter, match.round_count), ('MOUNTAIN', PLAYER_1, 3))
+            self.assertEqual(match.scores, {PLAYER_1: 2, PLAYER_2: 1})
+
+            rounds = list(match.iter_rounds())
+            self.assertEqual([logged_round.moves[PLAYER_1] for logged_round in rounds], ['R', 'P', 'R'])
+            self.assertEqual([logged_round.winner for logged_round in rounds], [PLAYER_1, PLAYER_1, PLAYER_2])
+            self.assertEqual(rounds[0].regenerated[PLAYER_1], counts_of(1, 1, 1))
+            self.assertEqual(rounds[0].regenerated[PLAYER_2], counts_of(0, 0, 0))
+            self.assertEqual(rounds[1].regenerated[PLAYER_1], counts_of(0, 0, 0))
+
+    def test_matches_read_the_same_with_or_without_the_index(self):
+        with MatchLogWriter(self.path) as writer:
+            for round_count in range(1, 6):
+                recorder = MatchRecorder('HEAVEN')
+                for _ in range(round_count):
+                    recorder.record_round({PLAYER_1: 'R', PLAYER_2: 'R'}, TIE,
+                                          {PLAYER_1: counts_of(9, 9, 9), PLAYER_2: counts_of(9, 9, 9)})
+                writer.append(recorder)
+
+        with MatchLogReader(self.path) as reader:
+            indexed_round_counts = [reader.get_match(match_id).round_count for match_id in range(len(reader))]
+            self.assertEqual(indexed_round_counts, [1, 2, 3, 4, 5])
+            self.assertEqual([match.match_id for match in reader.iter_matches()], [0, 1, 2, 3, 4])
+
+            with self.assertRaises(IndexError):
+                reader.get_match(5)
+
+        os.remove(get_index_path(self.path))
+        with MatchLogReader(self.path) as reader:
+            self.assertEqual([reader.get_match(match_id).round_count for match_id in range(len(reader))],
+                             indexed_round_counts)
+
+    def test_writer_drops_a_half_written_match_and_carries_on(self):
+        append_match(self.path, make_recorder())
+        with open(self.path, 'ab') as log_file:
+            log_file.write(make_recorder().encode(1)[:-5])
+
+        self.assertEqual(append_match(self.path, make_recorder()), 1)
+
+        with MatchLogReader(self.path) as reader:
+            self.assertEqual(len(reader), 2)
+            self.assertEqual([match.round_count for match in reader.iter_matches()], [3, 3])
+
+    def test_writer_indexes_whole_matches_the_index_is_missing(self):
+        append_match(self.path, make_recorder())
+        with open(self.path, 'ab') as log_file:
+            log_file.write(make_recorder().encode(1))
+
+        self.assertEqual(append_match(self.path, make_recorder()), 2)
+        with MatchLogReader(self.path) as reader:
+            self.assertEqual(reader.get_match(2).match_id, 2)
+
+    def test_empty_match_is_not_logged(self):
+        self.assertIsNone(append_match(self.path, MatchRecorder('HEAVEN')))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_other_files_are_not_read_as_logs(self):
+        with open(self.path, 'wb') as other_file:
+            other_file.write(b'not a match log')
+
+        with self.assertRaises(MatchLogError):
+            MatchLogReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Tests for the match server's referee, with clients speaking the original JSON protocol over real connections
+"""
+
+import asyncio
+import json
+import unittest
+from typing import Optional
+from game_constants import *
+from socket_helpers import GELA372Receiver, PacketUnpackError, frame_message, receive_message_bytes_async
+from Super_LAN_RPS_match_server import MatchServer
+
+
+class JSONClient:
+    """
+    A client that sends hand-built states, so it can break the rules on purpose.
+    Like every client of the match server, it believes it's player 1.
+    """
+    def __init__(self, stage: str):
+        """
+        :param stage: stage to choose
+        """
+        self.stage = stage
+        self.move_choices = dict(STAGES[stage])
+        self.reader = None
+        self.writer = None
+        self.receiver = GELA372Receiver()
+
+    async def connect(self, port: int):
+        """
+        :param port: match server's port on this host
+        """
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+
+    async def send_move(self, move: str, reported_choices: Optional[dict] = None):
+        """
+        :param move: move to play
+        :param reported_choices: move choices to report instead of the honest ones
+        """
+        if move != QUIT_MESSAGE:
+            self.move_choices[move] -= 1
+
+        state = {
+            'whose_turn': PLAYER_1,
+            'round_winner': '',
+            'stage': self.stage,
+            'player': {
+                PLAYER_1: {'score': 0, 'current_move': move,
+                           'move_choices': self.move_choices if reported_choices is None else reported_choices},
+                PLAYER_2: {'score': 0, 'current_move': '', 'move_choices': dict(STAGES[self.stage])},
+            },
+        }
+        self.writer.writelines(frame_message(json.dumps(state)))
+        await self.writer.drain()
+
+    async def receive_opponent(self) -> Optional[dict]:
+        """
+        :return: the opponent's player data from the next state, or None once the server closes the connection
+        """
+        while True:
+            try:
+                incoming_message = await receive_message_bytes_async(self.reader, self.receiver)
+            except (PacketUnpackError, ConnectionError):
+                return None
+
+            # Skip anything that isn't a JSON state, like notices
+            try:
+                state = json.loads(incoming_message)
+            except ValueError:
+                continue
+
+            return state['player'][PLAYER_2]
+
+    def close(self):
+        self.writer.close()
+
+
+class TestReferee(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.listener = await asyncio.start_server(MatchServer().handle_connection, '127.0.0.1', 0)
+        port = self.listener.sockets[0].getsockname()[1]
+
+        self.client_1 = JSONClient('HEAVEN')
+        self.client_2 = JSONClient('HEAVEN')
+        await self.client_1.connect(port)
+        await self.client_2.connect(port)
+
+    async def asyncTearDown(self):
+        self.client_1.close()
+        self.client_2.close()
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def play_round(self, move_1: str, move_2: str, reported_choices_2: Optional[dict] = None) -> tuple:
+        """
+        :param move_1: client 1's move
+        :param move_2: client 2's move
+        :param reported_choices_2: move choices client 2 reports instead of the honest ones
+        :return: the opponent data each client receives after both moves
+        """
+        await self.client_1.send_move(move_1)
+        await self.client_2.send_move(move_2, reported_choices_2)
+
+        return await asyncio.wait_for(
+            asyncio.gather(self.client_1.receive_opponent(), self.client_2.receive_opponent()), 5)
+
+    async def test_each_client_receives_the_other_ones_move(self):
+        for move_1, move_2 in (('R', 'S'), ('P', 'P'), ('S', 'R')):
+            opponent_of_1, opponent_of_2 = await self.play_round(move_1, move_2)
+
+            self.assertEqual(opponent_of_1['current_move'], move_2)
+            self.assertEqual(opponent_of_1['move_choices'], self.client_2.move_choices)
+            self.assertEqual(opponent_of_2['current_move'], move_1)
+            self.assertEqual(opponent_of_2['move_choices'], self.client_1.move_choices)
+
+        # Scores come back as they stood before the round, since each client awards the round itself
+        self.assertEqual(opponent_of_1['score'], 0)
+        self.assertEqual(opponent_of_2['score'], 1)
+
+        await self.client_1.send_move(QUIT_MESSAGE)
+        opponent_of_2 = await asyncio.wait_for(self.client_2.receive_opponent(), 5)
+        self.assertEqual(opponent_of_2['current_move'], QUIT_MESSAGE)
+
+    async def test_client_reporting_counts_it_was_not_dealt_is_stopped(self):
+        opponent_of_1, _ = await self.play_round('R', 'S', {'R': 9, 'P': 9, 'S': 9})
+
+        self.assertEqual(opponent_of_1['current_move'], QUIT_MESSAGE)
+        self.assertIsNone(await asyncio.wait_for(self.client_2.receive_opponent(), 5))
+
+    async def test_client_playing_a_move_it_has_none_of_is_stopped(self):
+        for move_1 in ('R', 'P', 'S'):
+            await self.play_round(move_1, 'R')
+
+        # Claims to still have no rocks after playing one more
+        opponent_of_1, _ = await self.play_round('R', 'R', dict(self.client_2.move_choices, R=0))
+
+        self.assertEqual(opponent_of_1['current_move'], QUIT_MESSAGE)
+        self.assertIsNone(await asyncio.wait_for(self.client_2.receive_opponent(), 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests for match_workers.py: the lobby table workers share, handing players between workers, and restarting workers
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import tempfile
+import unittest
+from match_workers import LobbyExchange, WorkerSupervisor, get_worker_path
+
+
+@unittest.skipIf(sys.platform == 'win32', 'workers need Unix sockets and fork()')
+class TestLobbyExchange(unittest.TestCase):
+    def test_waiting_workers_are_found_by_stage(self):
+        lobby_exchange = LobbyExchange(3)
+        lobby_exchange.set_waiting(1, 'OFFICE', True)
+        lobby_exchange.set_waiting(2, 'OFFICE', True)
+
+        self.assertEqual(lobby_exchange.find_waiting_worker('OFFICE', 0), 1)
+        self.assertEqual(lobby_exchange.find_waiting_worker('OFFICE', 1), 2)
+        self.assertIsNone(lobby_exchange.find_waiting_worker('HEAVEN', 0))
+
+        lobby_exchange.clear_worker(1)
+        self.assertEqual(lobby_exchange.find_waiting_worker('OFFICE', 0), 2)
+
+    def test_handed_off_player_keeps_their_connection_and_what_they_sent(self):
+        lobby_exchange = LobbyExchange(2)
+        player_socket, server_socket = socket.socketpair()
+        adopted = []
+
+        async def adopt_handoff():
+            lobby_exchange.listen(1, lambda connection_socket, sent_bytes: adopted.append((connection_socket,
+                                                                                          sent_bytes)))
+            self.assertTrue(lobby_exchange.hand_off(1, server_socket, b'opening state'))
+            server_socket.close()
+
+            while len(adopted) == 0:
+                await asyncio.sleep(0.01)
+
+        try:
+            asyncio.run(asyncio.wait_for(adopt_handoff(), 5))
+            adopted_socket, sent_bytes = adopted[0]
+
+            self.assertEqual(sent_bytes, b'opening state')
+            adopted_socket.sendall(b'paired')
+            self.assertEqual(player_socket.recv(16), b'paired')
+            adopted_socket.close()
+
+        finally:
+            player_socket.close()
+
+
+def exit_worker(marker_path: str):
+    """
+    Worker that crashes the first time it runs, then asks the supervisor to drain and exits
+    :param marker_path: file that records the first run
+    """
+    if not os.path.exists(marker_path):
+        open(marker_path, 'w').close()
+        os._exit(3)
+
+    os.kill(os.getppid(), signal.SIGTERM)
+    os._exit(0)
+
+
+@unittest.skipIf(not hasattr(os, 'fork'), 'workers need fork()')
+class TestWorkerSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.signal_handlers = {signal_number: signal.getsignal(signal_number)
+                                for signal_number in (signal.SIGTERM, signal.SIGINT)}
+
+    def tearDown(self):
+        for signal_number, handler in self.signal_handlers.items():
+            signal.signal(signal_number, handler)
+
+    def test_crashed_worker_is_restarted_until_drained(self):
+        with tempfile.TemporaryDirectory() as directory:
+            marker_path = os.path.join(directory, 'started')
+            supervisor = WorkerSupervisor(1, lambda worker_index, lobby_exchange: exit_worker(marker_path))
+            supervisor.run()
+
+        self.assertEqual(supervisor.restart_count, 1)
+
+
+class TestWorkerPaths(unittest.TestCase):
+    def test_each_worker_gets_its_own_file(self):
+        self.assertEqual(get_worker_path('matches.rpslog', 2), 'matches.worker-2.rpslog')
+        self.assertEqual(get_worker_path('logs/stats', 0), 'logs/stats.worker-0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests for the ratings and the widening matchmaking window in matchmaking.py
+"""
+
+import unittest
+from game_constants import *
+from matchmaking import (DEFAULT_RATING, K_FACTOR, MAX_RATING_WINDOW, MIN_RATING_WINDOW, PROVISIONAL_K_FACTOR,
+                         PROVISIONAL_ROUNDS, RATING_BUCKET_WIDTH, RATING_WINDOW_GROWTH, MatchmakingQueue,
+                         MatchmakingTicket, RatingBook)
+
+
+class TestRatingBook(unittest.TestCase):
+    def test_upset_moves_the_provisional_player_further(self):
+        rating_book = RatingBook({'ana': (1600.0, PROVISIONAL_ROUNDS)})
+        changes = rating_book.record_round({PLAYER_1: 'ana', PLAYER_2: 'bo'}, PLAYER_2)
+
+        # bo is provisional, so moves faster than ana, who is settled
+        self.assertLess(changes['ana'], 0)
+        self.assertAlmostEqual(changes['bo'], -changes['ana'] * PROVISIONAL_K_FACTOR / K_FACTOR)
+        self.assertAlmostEqual(rating_book.get_rating('ana'), 1600.0 + changes['ana'])
+
+    def test_tie_between_equals_changes_nothing(self):
+        rating_book = RatingBook()
+        changes = rating_book.record_round({PLAYER_1: 'ana', PLAYER_2: 'bo'}, TIE)
+
+        self.assertEqual(changes, {'ana': 0.0, 'bo': 0.0})
+        self.assertEqual(len(rating_book), 2)
+
+    def test_unnamed_players_are_not_rated(self):
+        rating_book = RatingBook()
+        changes = rating_book.record_round({PLAYER_1: 'ana', PLAYER_2: None}, PLAYER_1)
+
+        self.assertEqual(list(changes), ['ana'])
+        self.assertEqual(rating_book.get_rating(None), DEFAULT_RATING)
+
+
+class TestMatchmakingQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = MatchmakingQueue()
+
+    def enqueue(self, rating: float, enqueued_at: float = 0.0) -> MatchmakingTicket:
+        """
+        :param rating: the waiting player's rating
+        :param enqueued_at: when they started waiting
+        :return: their ticket, now in the queue
+        """
+        ticket = MatchmakingTicket(rating, f'player rated {rating}', enqueued_at)
+        self.queue.add(ticket)
+
+        return ticket
+
+    def test_window_widens_with_waiting_up_to_the_cap(self):
+        ticket = MatchmakingTicket(DEFAULT_RATING, None, enqueued_at=10.0)
+
+        self.assertEqual(ticket.get_rating_window(10.0), MIN_RATING_WINDOW)
+        self.assertEqual(ticket.get_rating_window(12.0), MIN_RATING_WINDOW + 2 * RATING_WINDOW_GROWTH)
+        self.assertEqual(ticket.get_rating_window(1000.0), MAX_RATING_WINDOW)
+
+    def test_far_apart_players_are_paired_once_their_windows_reach(self):
+        low_ticket = self.enqueue(1500.0)
+        high_ticket = self.enqueue(1700.0, enqueued_at=1.0)
+
+        self.assertEqual(self.queue.pop_pairs(now=1.0), [])
+        self.assertEqual(self.queue.pop_pairs(now=3.0), [(low_ticket, high_ticket)])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_players_further_apart_than_the_cap_keep_waiting(self):
+        self.enqueue(1000.0)
+        self.enqueue(1000.0 + MAX_RATING_WINDOW + RATING_BUCKET_WIDTH)
+
+        self.assertEqual(self.queue.pop_pairs(now=1000.0), [])
+        self.assertEqual(len(self.queue), 2)
+
+    def test_nearest_rating_then_longest_wait_is_chosen(self):
+        self.enqueue(1540.0)
+        first_near_ticket = self.enqueue(1510.0, enqueued_at=1.0)
+        self.enqueue(1510.0, enqueued_at=2.0)
+
+        newcomer = MatchmakingTicket(1500.0, None, enqueued_at=3.0)
+        self.assertIs(self.queue.pop_opponent(newcomer, now=3.0), first_near_ticket)
+        self.assertEqual(len(self.queue), 2)
+
+    def test_waiting_player_is_not_their_own_opponent(self):
+        ticket = self.enqueue(1500.0)
+        self.assertIsNone(self.queue.find_opponent(ticket, now=0.0))
+
+        other_ticket = self.enqueue(1500.0)
+        self.assertIs(self.queue.find_opponent(ticket, now=0.0), other_ticket)
+
+    def test_removing_twice_is_harmless(self):
+        ticket = self.enqueue(1500.0)
+
+        self.assertTrue(self.queue.remove(ticket))
+        self.assertFalse(self.queue.remove(ticket))
+        self.assertEqual(list(self.queue), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for the n-gram opponent model in opponent_model.py, and for NGramBot playing with it
+"""
+
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from loopback_transport import play_loopback_match
+from opponent_model import NGramModel
+from rps_bots import NGramBot, ScriptedBot
+
+
+class TestNGramModel(unittest.TestCase):
+    def test_repeated_pattern_is_predicted(self):
+        model = NGramModel(max_order=2)
+        self.assertIsNone(model.predict())
+
+        # The opponent plays R, P, S, R, P, S, ... whatever is played against them
+        for round_number in range(30):
+            model.observe(0, round_number % 3)
+
+        self.assertEqual(model.predict(), [9, 0, 0])
+
+    def test_reactive_opponent_is_predicted(self):
+        model = NGramModel(max_order=1)
+
+        # The opponent always plays what would have beaten the local player's last move
+        counters = {0: 1, 1: 2, 2: 0}
+        opponent_move = 0
+        for local_move in [0, 2, 1] * 5:
+            model.observe(local_move, opponent_move)
+            opponent_move = counters[local_move]
+
+        # The last local move was 1, which 2 beats
+        prediction = model.predict()
+        self.assertEqual(prediction, [0, 0, prediction[2]])
+        self.assertGreater(prediction[2], 0)
+
+    def test_memory_stays_bounded(self):
+        model = NGramModel(max_order=3, max_contexts=64)
+
+        for round_number in range(5000):
+            model.observe(round_number * 7 % 3, round_number * 11 % 3 if round_number % 5 else round_number % 2)
+            self.assertLessEqual(len(model), 64)
+
+        # The empty history is seen every round, so it's never forgotten
+        self.assertIsNotNone(model.predict())
+
+    def test_too_little_room_is_refused(self):
+        for max_order, max_contexts in ((-1, 64), (3, 7)):
+            with self.assertRaises(ValueError):
+                NGramModel(max_order, max_contexts)
+
+
+class TestNGramBot(unittest.TestCase):
+    def test_beats_a_cycling_opponent_from_either_seat(self):
+        for round_modes in ([], SUPPORTED_ROUND_MODES):
+            for bot_player in (PLAYER_1, PLAYER_2):
+                ngram_bot = NGramBot(max_rounds=300, seed=5)
+                cycling_bot = ScriptedBot(['R', 'P', 'S'], repeat=True, max_rounds=300)
+
+                bots = (ngram_bot, cycling_bot) if bot_player == PLAYER_1 else (cycling_bot, ngram_bot)
+                client_manager = RPSGameManager(bots[0], show_output=False, regen_seed=11)
+                server_manager = RPSGameManager(bots[1], show_output=False)
+                for game_manager in (client_manager, server_manager):
+                    game_manager.round_modes = list(round_modes)
+
+                play_loopback_match(client_manager, server_manager, 'HEAVEN')
+                bot_score, opponent_score = client_manager.get_scores()
+                if bot_player == PLAYER_2:
+                    bot_score, opponent_score = opponent_score, bot_score
+
+                self.assertGreater(bot_score, 2 * opponent_score, (round_modes, bot_player))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Tests for the seeded per-match regeneration streams in regen_streams.py, alone and in bot games
+"""
+
+import random
+import socket
+import threading
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from regen_streams import REGEN_SEED_BITS, RegenStream, get_stream_seed, read_regen_seed
+from rps_bots import RandomBot
+
+
+def play_bot_match(regen_seed: int, round_modes: list, round_count: int = 200) -> tuple:
+    """
+    Plays two random bots against each other on MOUNTAIN, which runs low on options quickly
+    :param regen_seed: player 1's regen seed; player 2 starts with a different one
+    :param round_modes: round modes both players support
+    :param round_count: moves player 1 plays before quitting
+    :return: player 1's game manager, then player 2's, once the match is over
+    """
+    client_socket, server_socket = socket.socketpair()
+    client_manager = RPSGameManager(RandomBot(round_count, seed=1), show_output=False, regen_seed=regen_seed)
+    server_manager = RPSGameManager(RandomBot(seed=2), show_output=False, regen_seed=regen_seed + 1)
+    for game_manager in (client_manager, server_manager):
+        game_manager.round_modes = list(round_modes)
+
+    server_thread = threading.Thread(target=server_manager.play_game, args=(server_socket,))
+    server_thread.start()
+
+    client_manager.set_stage('MOUNTAIN')
+    client_manager.play_next_move()
+    client_manager.send_state_to_opponent(client_socket)
+    client_manager.play_game(client_socket)
+    client_socket.close()
+
+    server_thread.join(10)
+    server_socket.close()
+
+    return client_manager, server_manager
+
+
+class TestRegenStream(unittest.TestCase):
+    def test_batched_draws_match_drawing_one_at_a_time(self):
+        regen_stream = RegenStream(42, PLAYER_1)
+        unbatched_random = random.Random(get_stream_seed(42, PLAYER_1))
+
+        self.assertEqual([regen_stream.draw() for _ in range(150)],
+                         [unbatched_random.choices(ALL_MOVES)[0] for _ in range(150)])
+
+    def test_each_player_and_seed_has_its_own_stream(self):
+        def draw_many(regen_seed: int, player: str) -> list:
+            regen_stream = RegenStream(regen_seed, player)
+            return [regen_stream.draw() for _ in range(40)]
+
+        self.assertEqual(draw_many(42, PLAYER_1), draw_many(42, PLAYER_1))
+        self.assertNotEqual(draw_many(42, PLAYER_1), draw_many(42, PLAYER_2))
+        self.assertNotEqual(draw_many(42, PLAYER_1), draw_many(43, PLAYER_1))
+
+    def test_only_valid_seeds_are_read(self):
+        self.assertEqual(read_regen_seed(7), 7)
+
+        for value in (-1, 1 << REGEN_SEED_BITS, True, '7', 7.0, None):
+            self.assertIsNone(read_regen_seed(value))
+
+
+class TestRegenInGames(unittest.TestCase):
+    def test_player_2_adopts_player_1s_seed_and_the_match_replays(self):
+        first_run = play_bot_match(1234, SUPPORTED_ROUND_MODES)
+        second_run = play_bot_match(1234, SUPPORTED_ROUND_MODES)
+
+        self.assertEqual(first_run[1].regen_seed, 1234)
+        self.assertEqual(first_run[0].get_scores(), second_run[0].get_scores())
+        self.assertEqual(first_run[1].get_scores(), second_run[1].get_scores())
+
+    def test_player_2_keeps_what_it_regenerated_in_relayed_rounds(self):
+        for round_modes in ([], SUPPORTED_ROUND_MODES):
+            client_manager, server_manager = play_bot_match(99, round_modes)
+
+            # Neither player runs out of moves and has to quit early.
+            # In commit-reveal rounds, player 2 may have chosen its next move before player 1's quit arrived.
+            self.assertEqual(client_manager.move_selector.moves_played, 200)
+            self.assertIn(server_manager.move_selector.moves_played, (200, 201))
+            self.assertEqual(client_manager.get_scores(), tuple(reversed(server_manager.get_scores())))
+
+
+if __name__ == '__main__':
+    unittest.main()
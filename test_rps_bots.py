@@ -0,0 +1,60 @@
+"""
+Tests for the headless bots in rps_bots.py, including a whole bot-against-bot game over a real connection
+"""
+
+import socket
+import threading
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from rps_bots import RandomBot, ScriptedBot
+
+VALID_MOVES = ['R', 'S', QUIT_MESSAGE_PRINTABLE]
+
+
+class TestBots(unittest.TestCase):
+    def test_random_bot_plays_only_remaining_moves_then_quits(self):
+        bot = RandomBot(max_rounds=50, seed=1)
+
+        self.assertEqual({bot(None, VALID_MOVES) for _ in range(50)}, {'R', 'S'})
+        self.assertEqual(bot(None, VALID_MOVES), QUIT_MESSAGE)
+
+    def test_random_bot_with_a_seed_repeats_itself(self):
+        first_bot = RandomBot(seed=7)
+        second_bot = RandomBot(seed=7)
+
+        self.assertEqual([first_bot(None, VALID_MOVES) for _ in range(20)],
+                         [second_bot(None, VALID_MOVES) for _ in range(20)])
+
+    def test_scripted_bot_replaces_moves_that_ran_out(self):
+        bot = ScriptedBot(['R', 'P', 'S'])
+
+        self.assertEqual([bot(None, VALID_MOVES) for _ in range(4)], ['R', 'R', 'S', QUIT_MESSAGE])
+
+
+class TestBotGame(unittest.TestCase):
+    def test_two_bots_finish_a_game_over_a_connection(self):
+        client_socket, server_socket = socket.socketpair()
+        client_manager = RPSGameManager(move_selector=RandomBot(30, seed=1), show_output=False)
+        server_manager = RPSGameManager(move_selector=RandomBot(seed=2), show_output=False)
+
+        # Player 2 waits for player 1's first move, like Super_LAN_RPS_server.main()
+        server_thread = threading.Thread(target=server_manager.play_game, args=(server_socket,))
+        server_thread.start()
+
+        client_manager.set_stage('OFFICE')
+        client_manager.play_next_move()
+        client_manager.send_state_to_opponent(client_socket)
+        client_manager.play_game(client_socket)
+        client_socket.close()
+
+        server_thread.join(10)
+        server_socket.close()
+
+        self.assertFalse(server_thread.is_alive())
+        self.assertEqual(client_manager.get_scores(), tuple(reversed(server_manager.get_scores())))
+        self.assertEqual(client_manager.move_selector.moves_played, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
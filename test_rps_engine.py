@@ -0,0 +1,114 @@
+"""
+Tests for the pure game engine in rps_engine.py, including that it plays exactly like networked games
+"""
+
+import itertools
+import unittest
+from game_constants import *
+from loopback_transport import play_loopback_match
+from rps_bots import RandomBot
+import rps_engine
+from rps_engine import (EVENT_OPTIONS_REGENERATED, EVENT_PLAYER_QUIT, EVENT_ROUND_RESOLVED, IllegalMoveError,
+                        new_fields, new_regen_streams, step, step_many, step_rounds)
+from test_game_helpers import RecordingGameManager
+
+
+def get_scores(fields) -> tuple:
+    """
+    :param fields: engine state
+    :return: player 1's score, then player 2's
+    """
+    return tuple(fields[rps_engine.SCORE_FIELDS[player]] for player in (PLAYER_1, PLAYER_2))
+
+
+def get_move_options(fields, player: str) -> dict:
+    """
+    :param fields: engine state
+    :param player: PLAYER_1 or PLAYER_2
+    :return: the player's remaining options, as a dict of counts by move
+    """
+    first_field = rps_engine.FIRST_MOVE_COUNT_FIELDS[player]
+
+    return dict(zip(ALL_MOVES, fields[first_field:first_field + len(ALL_MOVES)]))
+
+
+class TestStep(unittest.TestCase):
+    def test_step_resolves_a_round_without_changing_the_state_given(self):
+        fields = tuple(new_fields('HEAVEN'))
+        next_fields, events = step(fields, 'R', 'S', new_regen_streams(1))
+
+        self.assertEqual(fields, tuple(new_fields('HEAVEN')))
+        self.assertEqual(events, [(EVENT_ROUND_RESOLVED, PLAYER_1)])
+        self.assertEqual(get_scores(next_fields), (1, 0))
+        self.assertEqual(get_move_options(next_fields, PLAYER_1), dict(STAGES['HEAVEN'], R=2))
+        self.assertEqual(get_move_options(next_fields, PLAYER_2), dict(STAGES['HEAVEN'], S=2))
+
+    def test_running_low_regenerates_options(self):
+        # MOUNTAIN starts with 4 options, so a player is low after two moves
+        regen_streams = new_regen_streams(1)
+        next_fields, events = step(new_fields('MOUNTAIN'), 'R', 'R', regen_streams)
+        self.assertEqual(events, [(EVENT_ROUND_RESOLVED, TIE)])
+
+        next_fields, events = step(next_fields, 'P', 'P', regen_streams)
+        self.assertEqual(events, [(EVENT_ROUND_RESOLVED, TIE), (EVENT_OPTIONS_REGENERATED, PLAYER_1),
+                                  (EVENT_OPTIONS_REGENERATED, PLAYER_2)])
+        for player in (PLAYER_1, PLAYER_2):
+            self.assertEqual(sum(get_move_options(next_fields, player).values()),
+                             2 + REGEN_ITERATIONS * REGEN_QUANTITY_EACH)
+
+    def test_quitting_ends_the_match(self):
+        next_fields, events = step(new_fields('HEAVEN'), 'R', QUIT_MESSAGE, new_regen_streams(1))
+
+        self.assertEqual(events, [(EVENT_PLAYER_QUIT, PLAYER_2)])
+        self.assertEqual(get_move_options(next_fields, PLAYER_1), STAGES['HEAVEN'])
+        self.assertTrue(rps_engine.is_over(next_fields))
+
+        with self.assertRaises(IllegalMoveError):
+            step(next_fields, 'R', 'R', new_regen_streams(1))
+
+    def test_moves_a_player_does_not_have_are_illegal(self):
+        fields = new_fields('OFFICE')
+        fields, _ = step(fields, 'R', 'P', new_regen_streams(1))
+
+        for move_1, move_2 in (('R', 'P'), ('P', 'X')):
+            with self.assertRaises(IllegalMoveError):
+                step(fields, move_1, move_2, new_regen_streams(1))
+
+    def test_step_many_steps_each_match_like_step(self):
+        states = [new_fields(stage) for stage in STAGES]
+        moves = [('R', 'P'), ('P', 'S'), ('S', 'R'), ('R', 'R'), ('P', 'S'), ('S', 'S')]
+
+        next_states, all_events = step_many(states, moves, [new_regen_streams(seed) for seed in range(len(states))])
+
+        for seed, (fields, (move_1, move_2)) in enumerate(zip(states, moves)):
+            self.assertEqual((next_states[seed], all_events[seed]),
+                             step(fields, move_1, move_2, new_regen_streams(seed)))
+
+        with self.assertRaises(ValueError):
+            step_many(states, moves[:1], [new_regen_streams(0)])
+
+
+class TestEngineMatchesGames(unittest.TestCase):
+    def test_replaying_a_game_gives_the_same_scores_and_options(self):
+        for round_modes in ([], SUPPORTED_ROUND_MODES):
+            for stage in STAGES:
+                client_manager = RecordingGameManager(RandomBot(100, seed=3), regen_seed=77)
+                server_manager = RecordingGameManager(RandomBot(seed=4))
+                for game_manager in (client_manager, server_manager):
+                    game_manager.round_modes = list(round_modes)
+
+                play_loopback_match(client_manager, server_manager, stage)
+                # In relayed rounds, player 2 never gets to move after player 1 quits
+                moves = list(itertools.zip_longest(client_manager.local_moves, server_manager.local_moves,
+                                                   fillvalue=QUIT_MESSAGE))
+                fields, all_events = step_rounds(new_fields(stage), moves, new_regen_streams(77))
+
+                self.assertEqual(len(all_events), len(moves))
+                self.assertIn((EVENT_PLAYER_QUIT, PLAYER_1), all_events[-1])
+                self.assertEqual(get_scores(fields), client_manager.get_scores())
+                self.assertEqual(get_move_options(fields, PLAYER_1),
+                                 client_manager.get_player_move_options(PLAYER_1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests for the Prometheus metrics in rps_metrics.py, and for the socket hot path that records them
+"""
+
+import socket
+import unittest
+import urllib.request
+from rps_metrics import METRICS, Counter, Histogram, serve_metrics
+from socket_helpers import GELA372Receiver, receive_message, send_message
+
+
+class TestMetricTypes(unittest.TestCase):
+    def test_histogram_renders_cumulative_buckets_per_label(self):
+        histogram = Histogram('rps_test_seconds', 'Test.', (0.1, 1.0), 'codec')
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, 'json')
+        histogram.observe(0.05, 'binary')
+
+        lines = histogram.render()
+
+        self.assertIn('rps_test_seconds_bucket{codec="json",le="0.1"} 1', lines)
+        self.assertIn('rps_test_seconds_bucket{codec="json",le="1.0"} 3', lines)
+        self.assertIn('rps_test_seconds_bucket{codec="json",le="+Inf"} 4', lines)
+        self.assertIn('rps_test_seconds_count{codec="json"} 4', lines)
+        self.assertIn('rps_test_seconds_sum{codec="json"} 6.05', lines)
+        self.assertIn('rps_test_seconds_count{codec="binary"} 1', lines)
+
+    def test_counter_can_read_its_count_from_a_histogram(self):
+        histogram = Histogram('rps_test_rounds', 'Test.', (1, 2))
+        counter = Counter('rps_test_total', 'Test.', histogram)
+        histogram.observe(1)
+        histogram.observe(3)
+
+        self.assertEqual(counter.get(), 2)
+        self.assertEqual(counter.render()[-1], 'rps_test_total 2')
+
+    def test_label_values_are_escaped(self):
+        histogram = Histogram('rps_test', 'Test.', (1,), 'codec')
+        histogram.observe(0, 'a"b\\c')
+
+        self.assertIn('rps_test_count{codec="a\\"b\\\\c"} 1', histogram.render())
+
+
+class TestSocketMetrics(unittest.TestCase):
+    def setUp(self):
+        self.was_enabled = METRICS.enabled
+        self.sending_socket, self.receiving_socket = socket.socketpair()
+
+    def tearDown(self):
+        METRICS.enabled = self.was_enabled
+        self.sending_socket.close()
+        self.receiving_socket.close()
+
+    def exchange_message(self, message: str):
+        """
+        Sends a message one way and receives it
+        :param message: message to send
+        """
+        send_message(message, self.sending_socket)
+        self.assertEqual(receive_message(self.receiving_socket, GELA372Receiver()), message)
+
+    def test_messages_are_counted_only_while_enabled(self):
+        METRICS.enabled = False
+        counts_before = (METRICS.bytes_sent.get(), METRICS.messages_sent.get(), METRICS.messages_received.get())
+        self.exchange_message('unseen')
+        self.assertEqual((METRICS.bytes_sent.get(), METRICS.messages_sent.get(), METRICS.messages_received.get()),
+                         counts_before)
+
+        METRICS.enabled = True
+        bytes_sent, bytes_received = METRICS.bytes_sent.get(), METRICS.bytes_received.get()
+        self.exchange_message('x' * 5000)
+
+        self.assertEqual(METRICS.messages_sent.get(), counts_before[1] + 1)
+        self.assertEqual(METRICS.messages_received.get(), counts_before[2] + 1)
+        self.assertGreater(METRICS.bytes_sent.get() - bytes_sent, 5000)
+        self.assertEqual(METRICS.bytes_sent.get() - bytes_sent, METRICS.bytes_received.get() - bytes_received)
+
+    def test_metrics_are_served_over_http(self):
+        server = serve_metrics(0)
+
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics', timeout=5) as response:
+                body = response.read().decode()
+
+            self.assertIn('# TYPE rps_rounds_total counter', body)
+            self.assertIn('rps_rounds_per_second ', body)
+
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Tests for the NumPy Monte Carlo simulator in rps_simulator.py, which are skipped without NumPy
+"""
+
+import unittest
+from game_constants import *
+import rps_simulator
+from rps_simulator import np
+
+
+@unittest.skipIf(np is None, 'the simulator needs NumPy')
+class TestSimulator(unittest.TestCase):
+    def test_every_move_beats_and_loses_to_the_same_number_of_moves(self):
+        outcome = rps_simulator.build_outcome_matrix()
+
+        self.assertTrue((outcome == -outcome.T).all())
+        self.assertTrue((outcome.diagonal() == 0).all())
+        self.assertEqual(set((outcome == 1).sum(axis=1)), {(len(ALL_MOVES) - 1) // 2})
+
+    def test_seeded_simulations_repeat(self):
+        first_results, second_results = [
+            rps_simulator.simulate_stage(STAGES['HEAVEN'], 500, 100, 5, rng=np.random.default_rng(4))
+            for _ in range(2)]
+
+        self.assertTrue((first_results['winner'] == second_results['winner']).all())
+        self.assertTrue((first_results['length'] == second_results['length']).all())
+
+    def test_players_starting_alike_win_alike(self):
+        summary = rps_simulator.summarize_results(
+            rps_simulator.simulate_stage(STAGES['HEAVEN'], 20000, 100, 5, rng=np.random.default_rng(1)))
+
+        self.assertEqual(summary['unfinished_rate'], 0)
+        self.assertAlmostEqual(summary['player_1_win_rate'], 0.5, delta=0.03)
+        self.assertGreaterEqual(summary['mean_length'], 5)
+
+    def test_without_regeneration_players_run_out_of_moves(self):
+        stage_move_counts = STAGES['MOUNTAIN']
+        move_total = sum(stage_move_counts.values())
+        results = rps_simulator.simulate_stage(stage_move_counts, 1000, 100, 100, regen_threshold=0,
+                                               rng=np.random.default_rng(2))
+
+        self.assertEqual(results['regen_events'], 0)
+        self.assertTrue((results['winner'] == 0).all())
+        self.assertTrue((results['length'] == move_total + 1).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
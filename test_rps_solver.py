@@ -0,0 +1,73 @@
+"""
+Tests for the equilibrium solver in rps_solver.py and the bot that plays its strategies
+"""
+
+import os
+import tempfile
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from rps_bots import SolverBot
+from rps_solver import LimitedMoveSolver, solve_matrix_game
+
+
+class TestMatrixGame(unittest.TestCase):
+    def test_classic_game_is_fair_and_uniform(self):
+        value, row_strategy, column_strategy = solve_matrix_game([[0, -1, 1], [1, 0, -1], [-1, 1, 0]])
+
+        self.assertAlmostEqual(value, 0)
+        for probability in row_strategy + column_strategy:
+            self.assertAlmostEqual(probability, 1 / 3)
+
+    def test_dominant_rows_and_columns_are_played_for_sure(self):
+        value, row_strategy, column_strategy = solve_matrix_game([[1, 2], [0, 1]])
+
+        self.assertAlmostEqual(value, 1)
+        self.assertEqual(row_strategy, [1.0, 0.0])
+        self.assertEqual(column_strategy, [1.0, 0.0])
+
+
+class TestLimitedMoveSolver(unittest.TestCase):
+    def setUp(self):
+        self.solver = LimitedMoveSolver(horizon=4)
+
+    def test_players_with_the_same_counts_are_even(self):
+        for counts in ((3, 3, 3), (2, 1, 1), (1, 2, 2)):
+            value, strategy = self.solver.solve(counts, counts)
+
+            self.assertAlmostEqual(value, 0)
+            self.assertAlmostEqual(sum(strategy), 1)
+
+    def test_moves_that_ran_out_are_never_played(self):
+        _, strategy = self.solver.solve((0, 2, 1), (2, 2, 2))
+
+        self.assertEqual(strategy[0], 0)
+        self.assertAlmostEqual(sum(strategy), 1)
+
+    def test_saved_tables_load_only_under_the_same_rules(self):
+        self.solver.precompute_stage('MOUNTAIN')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tables.json')
+            self.solver.save_tables(path)
+
+            loaded_solver = LimitedMoveSolver(horizon=4)
+            self.assertTrue(loaded_solver.load_tables(path))
+            self.assertEqual(loaded_solver.strategy_table.keys(), self.solver.strategy_table.keys())
+
+            self.assertFalse(LimitedMoveSolver(horizon=5).load_tables(path))
+
+
+class TestSolverBot(unittest.TestCase):
+    def test_bot_plays_only_remaining_moves(self):
+        game_manager = RPSGameManager(show_output=False)
+        game_manager.set_stage('MOUNTAIN')
+        game_manager.set_player_move_options(PLAYER_1, {'R': 0, 'P': 1, 'S': 1})
+        bot = SolverBot(LimitedMoveSolver(horizon=4), seed=3)
+
+        for _ in range(50):
+            self.assertIn(bot(game_manager, ['P', 'S', QUIT_MESSAGE_PRINTABLE]), ('P', 'S'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests for the parameter sweep in rps_sweep.py
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import unittest
+from game_constants import *
+import rps_sweep
+from rps_simulator import np
+
+SETTINGS = {'games': 200, 'batch_size': 100, 'max_rounds': 50, 'target_score': 3, 'policy': 'uniform', 'seed': 0}
+
+
+class TestGrid(unittest.TestCase):
+    def test_ranges_are_inclusive_and_stepped(self):
+        self.assertEqual(rps_sweep.parse_range('2'), [2])
+        self.assertEqual(rps_sweep.parse_range('1:4'), [1, 2, 3, 4])
+        self.assertEqual(rps_sweep.parse_range('2:8:3'), [2, 5, 8])
+
+        for text in ('3:1', '1:4:0', 'a:b', '1:2:3:4'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                rps_sweep.parse_range(text)
+
+    def test_grid_covers_every_playable_combination(self):
+        count_ranges = {move: [0, 1] for move in ALL_MOVES}
+        grid = rps_sweep.build_grid(count_ranges, [2, 3], [1], [1, 2])
+
+        self.assertEqual(len(grid), (2 ** len(ALL_MOVES) - 1) * 2 * 1 * 2)
+        self.assertNotIn({move: 0 for move in ALL_MOVES}, [point['counts'] for point in grid])
+        self.assertEqual(len({rps_sweep.get_point_key(point) for point in grid}), len(grid))
+
+
+class TestResume(unittest.TestCase):
+    def test_only_finished_lines_from_the_same_settings_are_resumed(self):
+        grid = rps_sweep.build_grid({move: [1] for move in ALL_MOVES}, [2, 3], [1], [1])
+        lines = [json.dumps({'point': grid[0], 'settings': SETTINGS, 'summary': {}}),
+                 json.dumps({'point': grid[1], 'settings': dict(SETTINGS, games=1), 'summary': {}}),
+                 json.dumps({'point': grid[1], 'settings': SETTINGS, 'summary': {}})[:-5]]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.jsonl')
+            with open(path, 'w') as results_file:
+                results_file.write('\n'.join(lines))
+
+            finished_points = rps_sweep.load_finished_points(path, SETTINGS)
+            self.assertEqual(list(finished_points), [rps_sweep.get_point_key(grid[0])])
+
+            self.assertEqual(rps_sweep.load_finished_points(os.path.join(directory, 'missing.jsonl'), SETTINGS), {})
+
+    @unittest.skipIf(np is None, 'the sweep needs NumPy')
+    def test_points_are_seeded_by_their_own_parameters(self):
+        point = rps_sweep.build_grid({move: [2] for move in ALL_MOVES}, [3], [1], [2])[0]
+
+        first_result = rps_sweep.run_sweep_point(point, SETTINGS)
+        second_result = rps_sweep.run_sweep_point(point, SETTINGS)
+
+        self.assertEqual(first_result['summary'], second_result['summary'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests for checking and compiling rulesets in rulesets.py
+"""
+
+import copy
+import json
+import os
+import tempfile
+import unittest
+from rulesets import (BUILT_IN_RULESETS, MAX_MOVES, OUTCOME_LOSS, OUTCOME_TIE, OUTCOME_WIN, RulesetError,
+                      compile_ruleset, load_ruleset)
+
+
+class TestCompiledRulesets(unittest.TestCase):
+    def test_every_built_in_ruleset_is_fair(self):
+        for name, definition in BUILT_IN_RULESETS.items():
+            ruleset = compile_ruleset(definition)
+            mirrored_outcomes = {OUTCOME_TIE: OUTCOME_TIE, OUTCOME_WIN: OUTCOME_LOSS, OUTCOME_LOSS: OUTCOME_WIN}
+
+            for move in ruleset.moves:
+                self.assertEqual(ruleset.get_outcome(move, move), OUTCOME_TIE, name)
+
+                # With every built-in ruleset, each move beats as many moves as beat it
+                outcomes = [ruleset.get_outcome(move, opponent_move) for opponent_move in ruleset.moves]
+                self.assertEqual(outcomes.count(OUTCOME_WIN), outcomes.count(OUTCOME_LOSS), name)
+
+                for opponent_move in ruleset.moves:
+                    self.assertEqual(ruleset.get_outcome(opponent_move, move),
+                                     mirrored_outcomes[ruleset.get_outcome(move, opponent_move)], name)
+
+    def test_classic_ruleset_plays_like_rock_paper_scissors(self):
+        ruleset = load_ruleset('rps')
+
+        self.assertEqual(ruleset.get_outcome('R', 'S'), OUTCOME_WIN)
+        self.assertEqual(ruleset.get_outcome('R', 'P'), OUTCOME_LOSS)
+        self.assertEqual(ruleset.describe_move_counts(), 'R, P, and S show how many of Rock, Paper, and Scissors')
+
+    def test_cycle_beats_the_following_half(self):
+        ruleset = compile_ruleset({'moves': ['A', 'B', 'C', 'D', 'E'], 'cycle': ['A', 'B', 'C', 'D', 'E'],
+                                   'stages': {'ONLY': 1}})
+
+        self.assertEqual(ruleset.beats['A'], ('B', 'C'))
+        self.assertEqual(ruleset.beats['E'], ('A', 'B'))
+        self.assertEqual(ruleset.beat_masks[0], 0b00110)
+
+    def test_stage_counts_are_filled_in(self):
+        ruleset = compile_ruleset({'moves': ['X', 'Y'], 'beats': {'X': ['Y']},
+                                   'stages': {'EVEN': 2, 'LOPSIDED': {'X': 4}}})
+
+        self.assertEqual(ruleset.stages, {'EVEN': {'X': 2, 'Y': 2}, 'LOPSIDED': {'X': 4, 'Y': 0}})
+        self.assertEqual(ruleset.name, 'custom')
+        self.assertEqual(ruleset.move_names, {'X': 'X', 'Y': 'Y'})
+
+
+class TestRulesetChecks(unittest.TestCase):
+    def assert_invalid(self, **changes):
+        """
+        Checks that the classic ruleset, with the given changes, is refused
+        :param changes: top-level keys to replace, or to remove if None
+        """
+        definition = copy.deepcopy(BUILT_IN_RULESETS['rps'])
+        for key, value in changes.items():
+            if value is None:
+                del definition[key]
+            else:
+                definition[key] = value
+
+        with self.assertRaises(RulesetError):
+            compile_ruleset(definition)
+
+    def test_invalid_rulesets_are_refused(self):
+        self.assert_invalid(moves=['R'])
+        self.assert_invalid(moves=['R', 'P', 'S', 'R'])
+        self.assert_invalid(moves=['R', 'P', '\\q'])
+        self.assert_invalid(moves=[f'M{index}' for index in range(MAX_MOVES + 1)])
+        self.assert_invalid(beats={'R': ['S'], 'P': ['R'], 'S': ['P', 'R']})
+        self.assert_invalid(beats={'R': ['S'], 'P': ['R'], 'S': ['P'], 'L': ['R']})
+        self.assert_invalid(beats={'R': ['R']})
+        self.assert_invalid(beats=None)
+        self.assert_invalid(beats=None, cycle=['R', 'P'])
+        self.assert_invalid(stages={})
+        self.assert_invalid(stages={'EMPTY': 0})
+        self.assert_invalid(stages={'NEGATIVE': {'R': -1}})
+        self.assert_invalid(stages={'UNKNOWN': {'L': 1}})
+
+    def test_ruleset_files_load_like_built_ins(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rpsls.json')
+            with open(path, 'w') as ruleset_file:
+                json.dump(BUILT_IN_RULESETS['rpsls'], ruleset_file)
+
+            self.assertEqual(load_ruleset(path).outcomes, load_ruleset('rpsls').outcomes)
+
+            with self.assertRaises(RulesetError):
+                load_ruleset(os.path.join(directory, 'missing.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+Tests for GELA372 framing and reassembly in socket_helpers.py, over real connected sockets
+"""
+
+import asyncio
+import socket
+import unittest
+from socket_constants import *
+from socket_helpers import (ChannelMultiplexer, GELA372Receiver, PacketUnpackError, frame_channel_close,
+                            frame_channel_message, receive_message, receive_message_bytes, send_message)
+
+
+def receive_all(sending_socket: socket.socket, receiving_socket: socket.socket) -> bytes:
+    """
+    Ends the sending side, then receives everything it sent
+    :param sending_socket: end that has finished sending
+    :param receiving_socket: end to receive from
+    :return: every byte sent
+    """
+    sending_socket.shutdown(socket.SHUT_WR)
+    chunks = []
+
+    chunk = receiving_socket.recv(BUFFER_SIZE)
+    while len(chunk) > 0:
+        chunks.append(chunk)
+        chunk = receiving_socket.recv(BUFFER_SIZE)
+
+    return b''.join(chunks)
+
+
+class TestGELA372Framing(unittest.TestCase):
+    def setUp(self):
+        self.sending_socket, self.receiving_socket = socket.socketpair()
+
+    def tearDown(self):
+        self.sending_socket.close()
+        self.receiving_socket.close()
+
+    def test_v2_message_arriving_a_byte_at_a_time_is_reassembled(self):
+        send_message('a' * 5000, self.sending_socket, GELA372_VERSION_2)
+        receiver = GELA372Receiver()
+
+        for byte in receive_all(self.sending_socket, self.receiving_socket)[:-1]:
+            receiver.feed(bytes([byte]))
+            self.assertIsNone(receiver.next_message())
+
+        receiver.feed(b'a')
+        self.assertEqual(receiver.next_message(), b'a' * 5000)
+        self.assertEqual(receiver.peer_version, GELA372_VERSION_2)
+
+    def test_v2_messages_arriving_together_are_split(self):
+        for message in ('first', '', 'third'):
+            send_message(message, self.sending_socket, GELA372_VERSION_2)
+
+        receiver = GELA372Receiver()
+        receiver.feed(receive_all(self.sending_socket, self.receiving_socket))
+
+        self.assertEqual([receiver.next_message() for _ in range(3)], [b'first', b'', b'third'])
+        self.assertIsNone(receiver.next_message())
+
+    def test_v1_multibyte_message_fills_every_packet_but_the_last(self):
+        message = 'é' * 1500  # 3000 bytes, so packets cut through characters
+        send_message(message, self.sending_socket, GELA372_VERSION_1)
+        sent_bytes = receive_all(self.sending_socket, self.receiving_socket)
+
+        flags = sent_bytes[::BUFFER_SIZE].decode()
+        self.assertEqual(flags, GELA372_LAST_PACKET_FALSE * (len(flags) - 1) + GELA372_LAST_PACKET_TRUE)
+
+        receiver = GELA372Receiver()
+        receiver.feed(sent_bytes)
+        self.assertEqual(receiver.next_message().decode(), message)
+        self.assertEqual(receiver.peer_version, GELA372_VERSION_1)
+
+    def test_receiver_follows_a_peer_switching_versions(self):
+        receiver = GELA372Receiver()
+
+        for version, message in ((GELA372_VERSION_1, '½' * 700), (GELA372_VERSION_2, 'v2'),
+                                 (GELA372_VERSION_1, 'v1 again'), (GELA372_VERSION_2, '½' * 700)):
+            send_message(message, self.sending_socket, version)
+            self.assertEqual(receive_message(self.receiving_socket, receiver), message)
+            self.assertEqual(receiver.peer_version, version)
+
+    def test_invalid_packet_flag_is_rejected(self):
+        self.sending_socket.sendall(b'x not a packet')
+
+        with self.assertRaises(PacketUnpackError):
+            receive_message_bytes(self.receiving_socket, GELA372Receiver())
+
+    def test_closed_connection_before_a_whole_message_is_an_error(self):
+        self.sending_socket.sendall(GELA372_V2_MAGIC + b'\x00\x00\x00\x00\x10half')
+        self.sending_socket.close()
+
+        with self.assertRaises(PacketUnpackError):
+            receive_message_bytes(self.receiving_socket, GELA372Receiver())
+
+
+class TestChannels(unittest.TestCase):
+    def test_interleaved_fragments_are_reassembled_per_channel(self):
+        long_message = bytes(range(256)) * 200  # several fragments
+        long_frames = frame_channel_message(long_message, 1)
+        fragment_starts = range(0, len(long_frames), 2)
+        self.assertGreater(len(fragment_starts), 2)
+
+        receiver = GELA372Receiver()
+        for fragment_index, fragment_start in enumerate(fragment_starts):
+            receiver.feed(b''.join(long_frames[fragment_start:fragment_start + 2]))
+
+            if fragment_index == 0:
+                receiver.feed(b''.join(frame_channel_message('short', 2)))
+
+        receiver.feed(b''.join(frame_channel_close(1)))
+
+        self.assertEqual(receiver.next_channel_message(), (2, b'short'))
+        self.assertEqual(receiver.next_channel_message(), (1, long_message))
+        self.assertEqual(receiver.next_channel_message(), (1, None))
+        self.assertIsNone(receiver.next_channel_message())
+
+    def test_plain_receiver_rejects_channel_frames(self):
+        receiver = GELA372Receiver()
+        receiver.feed(b''.join(frame_channel_message('for a channel', 1)))
+
+        with self.assertRaises(PacketUnpackError):
+            receiver.next_message()
+
+
+class TestChannelMultiplexer(unittest.IsolatedAsyncioTestCase):
+    async def test_channels_share_one_connection(self):
+        async def echo(channel):
+            try:
+                while True:
+                    await channel.send(await channel.receive())
+            except PacketUnpackError:
+                channel.close()
+
+        async def serve(reader, writer):
+            await ChannelMultiplexer(reader, writer).run(echo)
+
+        listener = await asyncio.start_server(serve, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', listener.sockets[0].getsockname()[1])
+        multiplexer = ChannelMultiplexer(reader, writer)
+        reading_task = asyncio.ensure_future(multiplexer.run())
+
+        try:
+            long_channel = multiplexer.open_channel()
+            short_channel = multiplexer.open_channel()
+            long_message = b'x' * (4 * GELA372_MAX_FRAGMENT_SIZE)
+
+            await long_channel.send(long_message)
+            await short_channel.send('short')
+
+            self.assertEqual(await asyncio.wait_for(short_channel.receive(), 5), b'short')
+            self.assertEqual(await asyncio.wait_for(long_channel.receive(), 5), long_message)
+
+            # Closing a channel leaves the others open
+            long_channel.close()
+            await short_channel.send('still open')
+            self.assertEqual(await asyncio.wait_for(short_channel.receive(), 5), b'still open')
+
+        finally:
+            multiplexer.close()
+            reading_task.cancel()
+            listener.close()
+            await listener.wait_closed()
+
+
+if __name__ == '__main__':
+    unittest.main()
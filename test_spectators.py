@@ -0,0 +1,137 @@
+"""
+Tests for spectator fan-out in spectators.py, with seats that fill up on command
+"""
+
+import asyncio
+import unittest
+from socket_constants import *
+from spectators import MatchBroadcast, SpectatorUpdate, describe_live_matches, find_broadcast
+import state_codec
+
+
+class FakeSeat:
+    """
+    Spectator seat whose connection has room until told otherwise, and which keeps every update sent to it
+    """
+    def __init__(self):
+        self.updates = []
+        self.has_room = True
+        self.is_closed = False
+        self.room_made = asyncio.Event()
+        self.left = asyncio.get_running_loop().create_future()
+
+    def get_rounds_seen(self) -> list:
+        """
+        :return: the round number of each update sent, in order
+        """
+        return [state_codec.decode_spectator_update(update.payload)['round'] for update in self.updates]
+
+    def send_update_nowait(self, update: SpectatorUpdate) -> bool:
+        if self.has_room:
+            self.updates.append(update)
+
+        return self.has_room
+
+    async def send_update(self, update: SpectatorUpdate):
+        if not self.has_room:
+            await self.room_made.wait()
+
+        self.updates.append(update)
+
+    async def receive_message(self) -> bytes:
+        return await self.left
+
+    def close(self):
+        self.is_closed = True
+
+
+async def let_tasks_run():
+    """
+    Gives every ready task a few turns
+    """
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TestMatchBroadcast(unittest.IsolatedAsyncioTestCase):
+    async def test_caught_up_spectators_share_each_update(self):
+        broadcast = MatchBroadcast(7)
+        seats = [FakeSeat() for _ in range(3)]
+        watchers = [asyncio.ensure_future(broadcast.watch(seat)) for seat in seats]
+        await let_tasks_run()
+
+        for round_number in range(1, 4):
+            broadcast.publish({'round': round_number})
+        broadcast.publish({'round': 4}, is_final=True)
+        await asyncio.wait_for(asyncio.gather(*watchers), 5)
+
+        for seat in seats:
+            self.assertEqual(seat.get_rounds_seen(), [1, 2, 3, 4])
+            self.assertTrue(seat.is_closed)
+
+        # One encoded update, and one framed buffer per version, for every spectator
+        self.assertIs(seats[0].updates[0], seats[2].updates[0])
+        self.assertIs(seats[0].updates[0].get_frame(GELA372_VERSION_2),
+                      seats[1].updates[0].get_frame(GELA372_VERSION_2))
+        self.assertEqual(broadcast.spectator_count, 0)
+
+    async def test_spectator_that_falls_far_behind_skips_to_the_newest_update(self):
+        broadcast = MatchBroadcast(7, history_length=4)
+        slow_seat, fast_seat = FakeSeat(), FakeSeat()
+        watchers = [asyncio.ensure_future(broadcast.watch(seat)) for seat in (slow_seat, fast_seat)]
+        await let_tasks_run()
+
+        slow_seat.has_room = False
+        for round_number in range(1, 11):
+            broadcast.publish({'round': round_number})
+        await let_tasks_run()
+
+        self.assertEqual(fast_seat.get_rounds_seen(), list(range(1, 11)))
+        self.assertEqual(slow_seat.get_rounds_seen(), [])
+
+        slow_seat.has_room = True
+        slow_seat.room_made.set()
+        await let_tasks_run()
+        broadcast.publish({'round': 11}, is_final=True)
+        await asyncio.wait_for(asyncio.gather(*watchers), 5)
+
+        # By the time the slow spectator's sender ran, round 1 had left the history, so it skipped to round 10
+        self.assertEqual(slow_seat.get_rounds_seen(), [10, 11])
+        self.assertEqual(broadcast.skipped_update_count, 9)
+        self.assertEqual(fast_seat.get_rounds_seen(), list(range(1, 12)))
+
+    async def test_late_spectator_starts_from_the_newest_update(self):
+        broadcast = MatchBroadcast(7)
+        broadcast.publish({'round': 1})
+        broadcast.publish({'round': 2})
+
+        seat = FakeSeat()
+        watcher = asyncio.ensure_future(broadcast.watch(seat))
+        await let_tasks_run()
+        seat.left.set_result(b'bye')
+        await asyncio.wait_for(watcher, 5)
+
+        self.assertEqual(seat.get_rounds_seen(), [2])
+        self.assertTrue(seat.is_closed)
+
+
+class TestFindBroadcast(unittest.TestCase):
+    def test_spectators_get_the_match_they_ask_for_or_the_most_watched(self):
+        broadcasts = {match_id: MatchBroadcast(match_id) for match_id in range(3)}
+        broadcasts[1].spectator_count = 5
+
+        self.assertIs(find_broadcast(broadcasts, 2), broadcasts[2])
+        self.assertIs(find_broadcast(broadcasts, None), broadcasts[1])
+        self.assertIsNone(find_broadcast(broadcasts, 3))
+        self.assertIsNone(find_broadcast(broadcasts, True))
+        self.assertIsNone(find_broadcast({}, None))
+
+    def test_notice_lists_live_matches(self):
+        self.assertEqual(describe_live_matches({}), 'No matches are live right now.')
+
+        broadcasts = {match_id: MatchBroadcast(match_id) for match_id in range(MAX_LISTED_LIVE_MATCHES + 2)}
+        self.assertTrue(describe_live_matches(broadcasts).endswith(' and 2 more.'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Tests for the state codecs in state_codec.py, and for how a game treats states it can't decode
+"""
+
+import socket
+import unittest
+from game_constants import *
+from game_helpers import RPSGameManager
+from rps_bots import ScriptedBot
+from socket_helpers import send_message
+import state_codec
+
+
+def make_state(stage: str = 'RAINFOREST', move: str = 'P') -> dict:
+    """
+    :param stage: stage player 1 chose
+    :param move: player 1's opening move
+    :return: player 1's state as it sends its opening move
+    """
+    game_manager = RPSGameManager(move_selector=ScriptedBot([move]), show_output=False)
+    game_manager.set_stage(stage)
+    game_manager.play_next_move()
+
+    return game_manager.state
+
+
+class RecordingGameManager(RPSGameManager):
+    """
+    Game manager that keeps what it would have shown instead of printing it
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.displayed_lines = []
+
+    def display(self, *values, **print_kwargs):
+        self.displayed_lines.append(' '.join(str(value) for value in values))
+
+
+class TestBinaryState(unittest.TestCase):
+    def test_binary_state_decodes_to_the_same_state_as_json(self):
+        for stage in STAGES:
+            state = make_state(stage)
+            binary_message = state_codec.encode_state(state, STATE_CODEC_BINARY)
+
+            self.assertTrue(state_codec.is_binary_state(binary_message))
+            self.assertEqual(state_codec.decode_state(binary_message),
+                             state_codec.decode_state(state_codec.encode_state(state, STATE_CODEC_JSON)))
+
+    def test_binary_state_is_smaller_than_json(self):
+        state = make_state()
+
+        self.assertLess(len(state_codec.encode_state(state, STATE_CODEC_BINARY)),
+                        len(state_codec.encode_state(state, STATE_CODEC_JSON).encode()) // 4)
+
+    def test_malformed_states_are_rejected(self):
+        binary_message = state_codec.encode_state(make_state(), STATE_CODEC_BINARY)
+
+        for message in (binary_message[:-1], binary_message + b'\x00', b'{"whose_turn": 1', b'\xff\xfe'):
+            with self.assertRaises(state_codec.StateDecodeError):
+                state_codec.decode_state(message)
+
+    def test_first_offered_codec_both_players_support_is_chosen(self):
+        self.assertEqual(state_codec.choose_state_codec(['binary-99', STATE_CODEC_BINARY, STATE_CODEC_JSON]),
+                         STATE_CODEC_BINARY)
+        self.assertEqual(state_codec.choose_state_codec(['binary-99']), STATE_CODEC_JSON)
+
+
+class TestDeltaState(unittest.TestCase):
+    def setUp(self):
+        self.sender_sync = state_codec.DeltaStateSync()
+        self.receiver_sync = state_codec.DeltaStateSync()
+        self.states = [make_state('RAINFOREST', move) for move in ALL_MOVES]
+
+    def test_deltas_carry_only_changed_fields(self):
+        snapshot = self.sender_sync.encode_delta(self.states[0])
+        delta = self.sender_sync.encode_delta(self.states[1])
+
+        self.assertLess(len(delta), len(snapshot))
+        self.assertEqual(self.receiver_sync.decode_delta(snapshot), self.states[0])
+        self.assertEqual(self.receiver_sync.decode_delta(delta), self.states[1])
+
+    def test_deltas_crossing_on_the_wire_apply_on_both_ends(self):
+        first_end, second_end = self.sender_sync, self.receiver_sync
+        second_end.decode_delta(first_end.encode_delta(self.states[0]))
+        first_end.decode_delta(second_end.encode_delta(self.states[1]))
+
+        # Both ends send before either receives the other's message
+        first_message = first_end.encode_delta(self.states[2])
+        second_message = second_end.encode_delta(self.states[0])
+
+        self.assertEqual(second_end.decode_delta(first_message), self.states[2])
+        self.assertEqual(first_end.decode_delta(second_message), self.states[0])
+
+    def test_lost_delta_is_recovered_with_a_snapshot(self):
+        self.receiver_sync.decode_delta(self.sender_sync.encode_delta(self.states[0]))
+        self.sender_sync.encode_delta(self.states[1])  # lost on the way
+        skipping_delta = self.sender_sync.encode_delta(self.states[2])
+
+        with self.assertRaises(state_codec.StateResyncNeeded):
+            self.receiver_sync.decode_delta(skipping_delta)
+
+        self.assertTrue(state_codec.is_resync_request(self.receiver_sync.encode_resync_request()))
+        self.assertEqual(self.receiver_sync.decode_delta(self.sender_sync.encode_snapshot()), self.states[2])
+        self.assertEqual(self.receiver_sync.decode_delta(self.sender_sync.encode_delta(self.states[0])),
+                         self.states[0])
+
+    def test_delta_without_a_base_needs_a_resync(self):
+        self.sender_sync.encode_delta(self.states[0])
+
+        with self.assertRaises(state_codec.StateResyncNeeded):
+            self.receiver_sync.decode_delta(self.sender_sync.encode_delta(self.states[1]))
+
+    def test_malformed_delta_is_rejected(self):
+        with self.assertRaises(state_codec.StateDecodeError):
+            self.receiver_sync.decode_delta(self.sender_sync.encode_delta(self.states[0])[:-1])
+
+
+class TestUndecodableState(unittest.TestCase):
+    def test_game_ends_on_a_state_it_cannot_decode(self):
+        binary_message = state_codec.encode_state(make_state(), STATE_CODEC_BINARY)
+
+        for message in (b'{"whose_turn": 1', b'{"stage": "HEAVEN"}', binary_message[:-1]):
+            sending_socket, receiving_socket = socket.socketpair()
+            game_manager = RecordingGameManager(move_selector=ScriptedBot(['R']))
+
+            send_message(message, sending_socket)
+            game_manager.play_game(receiving_socket)
+
+            self.assertIn(PACKET_RECEIVE_ERROR_MESSAGE, game_manager.displayed_lines[-1])
+
+            sending_socket.close()
+            receiving_socket.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for the reliable UDP transport in udp_transport.py, over loopback with simulated loss and reordering
+"""
+
+import socket
+import unittest
+from socket_constants import *
+from socket_helpers import GELA372Receiver, PacketUnpackError, receive_message_bytes, send_message
+from udp_transport import ReliableUDPSocket
+
+
+def make_udp_pair(**options) -> tuple:
+    """
+    :param options: keyword arguments for both ReliableUDPSocket()s
+    :return: two ReliableUDPSockets connected to each other on loopback
+    """
+    udp_sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    for udp_socket in udp_sockets:
+        udp_socket.bind(('127.0.0.1', 0))
+
+    udp_sockets[0].connect(udp_sockets[1].getsockname())
+    udp_sockets[1].connect(udp_sockets[0].getsockname())
+
+    return tuple(ReliableUDPSocket(udp_socket, seed=index, **options) for index, udp_socket in enumerate(udp_sockets))
+
+
+class TestReliableUDPSocket(unittest.TestCase):
+    def test_messages_arrive_whole_and_in_order_despite_loss_and_reordering(self):
+        sending_socket, receiving_socket = make_udp_pair(loss_rate=0.2, reorder_rate=0.2)
+        receiver = GELA372Receiver()
+        messages = [bytes([index]) * (index * 100) for index in range(30)]
+
+        try:
+            for message in messages:
+                send_message(message, sending_socket)
+
+            self.assertEqual([receive_message_bytes(receiving_socket, receiver) for _ in messages], messages)
+            self.assertGreater(sending_socket.simulated_loss_count, 0)
+            self.assertGreater(sending_socket.retransmit_count, 0)
+
+        finally:
+            sending_socket.close()
+            receiving_socket.close()
+
+    def test_message_longer_than_a_datagram_is_reassembled(self):
+        sending_socket, receiving_socket = make_udp_pair()
+        message = bytes(range(256)) * (4 * UDP_MAX_PAYLOAD_SIZE // 256)
+
+        try:
+            send_message(message, sending_socket)
+            self.assertEqual(receive_message_bytes(receiving_socket, GELA372Receiver()), message)
+
+        finally:
+            sending_socket.close()
+            receiving_socket.close()
+
+    def test_peer_closing_ends_the_byte_stream(self):
+        sending_socket, receiving_socket = make_udp_pair()
+        send_message('last words', sending_socket)
+        sending_socket.close()
+        receiver = GELA372Receiver()
+
+        try:
+            self.assertEqual(receive_message_bytes(receiving_socket, receiver), b'last words')
+
+            with self.assertRaises(PacketUnpackError):
+                receive_message_bytes(receiving_socket, receiver)
+
+        finally:
+            receiving_socket.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,407 @@
+"""
+Optional UDP transport for peer-to-peer games, with just enough reliability for one message per turn.
+
+ReliableUDPSocket stands in for a connected TCP socket wherever the game uses one:
+send_message() and RPSGameManager.send_state_to_opponent() send through sendall(),
+receive_message_bytes() and play_game() receive through recv_into(),
+and play_game_with_keyboard() waits on fileno() with a selector.
+GELA372 framing rides on top unchanged; only the byte stream underneath moves to datagrams.
+
+Each datagram carries a sequence number. The receiver acknowledges every datagram right away,
+drops duplicates, and holds early arrivals until the gap before them is filled, so bytes come out in order.
+The sender retransmits anything unacknowledged on a timer fitted to the measured round-trip time,
+the same way TCP does, but with a much lower floor, since there is never more than a message or two in flight.
+A background thread runs the acknowledgments and timers, so they keep going while a person is typing a move.
+"""
+
+import random
+import select
+import socket as socket_module
+import struct
+import threading
+import time
+from typing import Optional, Tuple
+from socket_constants import *
+
+_UDP_HEADER = struct.Struct(UDP_HEADER_FORMAT)
+_MAX_DATAGRAM_SIZE = _UDP_HEADER.size + UDP_MAX_PAYLOAD_SIZE
+_REORDER_HOLD_TIME = 0.005  # seconds a datagram held back to simulate reordering waits for another to pass it
+
+
+class _UnackedDatagram:
+    """
+    A sent datagram waiting to be acknowledged
+    """
+    __slots__ = ('datagram', 'sent_at', 'deadline', 'retransmit_count')
+
+    def __init__(self, datagram: bytes, sent_at: float, deadline: float):
+        """
+        :param datagram: the whole datagram, header included
+        :param sent_at: time it was first sent
+        :param deadline: time to retransmit it if it's still unacknowledged
+        """
+        self.datagram = datagram
+        self.sent_at = sent_at
+        self.deadline = deadline
+        self.retransmit_count = 0
+
+
+class ReliableUDPSocket:
+    """
+    A connected UDP socket that looks like a connected TCP socket to the game:
+    bytes sent with sendall() come out of the peer's recv_into() whole, once, and in order.
+    For testing on loopback, it can also drop and reorder its own outgoing datagrams on purpose.
+    """
+    def __init__(self, udp_socket: socket_module.socket, loss_rate: float = 0.0, reorder_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        :param udp_socket: UDP socket already connected to the peer's address
+        :param loss_rate: fraction of outgoing datagrams to drop on purpose, including acknowledgments
+        :param reorder_rate: fraction of outgoing datagrams to hold back and send after the next one
+        :param seed: seed for choosing which datagrams to drop and reorder
+        """
+        self._udp_socket = udp_socket
+        self._loss_rate = loss_rate
+        self._reorder_rate = reorder_rate
+        self._random = random.Random(seed)
+        self._held_datagram = None  # datagram held back to simulate reordering
+
+        # Received bytes are handed to the game through a local socket pair,
+        # so the game can block on them or wait on them with a selector like on any socket
+        self._delivery_reader, self._delivery_writer = socket_module.socketpair()
+
+        # Wakes the background thread when a send starts the retransmit timer
+        self._wake_reader, self._wake_writer = socket_module.socketpair()
+
+        self._lock = threading.Lock()
+        self._all_acked = threading.Condition(self._lock)  # also notified when the send window opens
+        self._next_sequence_number = 0
+        self._unacked = {}  # sequence number -> _UnackedDatagram
+        self._retransmit_timeout = UDP_INITIAL_RETRANSMIT_TIMEOUT
+        self._smoothed_round_trip_time = None
+        self._round_trip_time_variation = None
+
+        self._next_expected_sequence_number = 0
+        self._early_arrivals = {}  # sequence number -> (packet type, payload) received ahead of a gap
+
+        self._error = None  # ConnectionError to raise once the peer is considered gone
+        self._has_peer_closed = False
+        self._is_closed = False
+
+        self.retransmit_count = 0
+        self.duplicate_count = 0
+        self.simulated_loss_count = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def connect(cls, address: Tuple[str, int], **options) -> 'ReliableUDPSocket':
+        """
+        :param address: peer's host and port
+        :param options: keyword arguments for ReliableUDPSocket()
+        :return: a socket sending to and receiving from only that address
+        """
+        udp_socket = socket_module.socket(socket_module.AF_INET, socket_module.SOCK_DGRAM)
+        udp_socket.connect(address)
+
+        return cls(udp_socket, **options)
+
+    @classmethod
+    def accept(cls, port: int, **options) -> Tuple['ReliableUDPSocket', Tuple[str, int]]:
+        """
+        Waits for the first datagram on a port and connects to whoever sent it
+        :param port: port to listen on
+        :param options: keyword arguments for ReliableUDPSocket()
+        :return: the socket and the peer's address
+        """
+        udp_socket = socket_module.socket(socket_module.AF_INET, socket_module.SOCK_DGRAM)
+        udp_socket.bind(('', port))
+
+        # Peek, so the first datagram is still there for the background thread to acknowledge and deliver
+        _, address = udp_socket.recvfrom(_MAX_DATAGRAM_SIZE, socket_module.MSG_PEEK)
+        udp_socket.connect(address)
+
+        return cls(udp_socket, **options), address
+
+    def fileno(self) -> int:
+        """
+        :return: file descriptor that becomes readable when received bytes are ready, for selectors
+        """
+        return self._delivery_reader.fileno()
+
+    def sendall(self, data: bytes):
+        """
+        Sends bytes reliably, cut into as many datagrams as needed
+        :param data: bytes to send
+        """
+        with memoryview(data) as data_view:
+            for payload_start in range(0, len(data_view), UDP_MAX_PAYLOAD_SIZE):
+                self._send_sequenced(UDP_PACKET_DATA, bytes(data_view[payload_start:
+                                                                      payload_start + UDP_MAX_PAYLOAD_SIZE]))
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        """
+        Waits for received bytes, like socket.recv_into()
+        :param buffer: writable buffer to receive into
+        :param nbytes: most bytes to receive; the whole buffer if 0
+        :return: number of bytes received; 0 means the peer closed the connection
+        """
+        received_count = self._delivery_reader.recv_into(buffer, nbytes)
+
+        if received_count == 0 and self._error is not None:
+            raise self._error
+
+        return received_count
+
+    def recv(self, bufsize: int) -> bytes:
+        """
+        Waits for received bytes, like socket.recv()
+        :param bufsize: most bytes to receive
+        :return: the bytes received; empty means the peer closed the connection
+        """
+        buffer = bytearray(bufsize)
+        received_count = self.recv_into(buffer)
+
+        return bytes(buffer[:received_count])
+
+    def close(self):
+        """
+        Tells the peer the connection is closing, waits briefly for everything sent to be acknowledged,
+        then releases the sockets
+        """
+        if self._is_closed:
+            return
+
+        if self._error is None:
+            try:
+                self._send_sequenced(UDP_PACKET_CLOSE, b'')
+
+                with self._lock:
+                    # A peer that already closed may be gone and unable to acknowledge anything
+                    if not self._has_peer_closed:
+                        self._all_acked.wait_for(lambda: len(self._unacked) == 0 or self._error is not None,
+                                                 UDP_CLOSE_LINGER)
+
+            except ConnectionError:
+                pass
+
+        self._is_closed = True
+        self._wake_writer.send(b'\0')
+        self._thread.join()
+
+        for owned_socket in (self._udp_socket, self._delivery_reader, self._delivery_writer,
+                             self._wake_reader, self._wake_writer):
+            owned_socket.close()
+
+    def _send_sequenced(self, packet_type: int, payload: bytes):
+        """
+        Sends a datagram that must be acknowledged, waiting first if the send window is full
+        :param packet_type: UDP_PACKET_DATA or UDP_PACKET_CLOSE
+        :param payload: bytes for the datagram to carry
+        """
+        with self._lock:
+            self._all_acked.wait_for(lambda: len(self._unacked) < UDP_SEND_WINDOW or self._error is not None)
+
+            if self._error is not None:
+                raise self._error
+
+            sequence_number = self._next_sequence_number
+            self._next_sequence_number += 1
+
+            datagram = _UDP_HEADER.pack(packet_type, sequence_number, self._next_expected_sequence_number) + payload
+            now = time.monotonic()
+            timer_was_idle = len(self._unacked) == 0
+            self._unacked[sequence_number] = _UnackedDatagram(datagram, now, now + self._retransmit_timeout)
+
+            self._transmit(datagram)
+
+        # The background thread waits without a timeout while nothing is in flight
+        if timer_was_idle:
+            self._wake_writer.send(b'\0')
+
+    def _transmit(self, datagram: bytes):
+        """
+        Sends one datagram, unless it's chosen to be dropped or held back for testing.
+        The caller holds the lock.
+        :param datagram: the whole datagram, header included
+        """
+        if self._loss_rate > 0 and self._random.random() < self._loss_rate:
+            self.simulated_loss_count += 1
+            return
+
+        if self._reorder_rate > 0 and self._held_datagram is None and self._random.random() < self._reorder_rate:
+            self._held_datagram = datagram
+            return
+
+        try:
+            self._udp_socket.send(datagram)
+
+            if self._held_datagram is not None:
+                self._udp_socket.send(self._held_datagram)
+                self._held_datagram = None
+
+        except ConnectionRefusedError:
+            # The peer isn't listening yet or anymore; the retransmit timer decides which
+            pass
+
+    def _run(self):
+        """
+        Background thread: acknowledges and delivers incoming datagrams, and retransmits on timeouts
+        """
+        while not self._is_closed and self._error is None:
+            with self._lock:
+                if len(self._unacked) == 0:
+                    timeout = None
+                else:
+                    next_deadline = min(unacked.deadline for unacked in self._unacked.values())
+                    timeout = max(next_deadline - time.monotonic(), 0)
+
+                if self._held_datagram is not None:
+                    timeout = _REORDER_HOLD_TIME if timeout is None else min(timeout, _REORDER_HOLD_TIME)
+
+            readable, _, _ = select.select([self._udp_socket, self._wake_reader], [], [], timeout)
+
+            if self._wake_reader in readable:
+                self._wake_reader.recv(BUFFER_SIZE)
+
+            if self._udp_socket in readable:
+                try:
+                    datagram = self._udp_socket.recv(_MAX_DATAGRAM_SIZE)
+                except ConnectionRefusedError:
+                    datagram = None
+
+                if datagram is not None and len(datagram) >= _UDP_HEADER.size:
+                    self._handle_datagram(datagram)
+
+            self._retransmit_overdue()
+
+            with self._lock:
+                if self._held_datagram is not None:
+                    self._transmit_held()
+
+    def _handle_datagram(self, datagram: bytes):
+        """
+        Acts on one incoming datagram
+        :param datagram: the whole datagram, header included
+        """
+        packet_type, sequence_number, cumulative_ack = _UDP_HEADER.unpack_from(datagram)
+
+        with self._lock:
+            if packet_type == UDP_PACKET_ACK:
+                self._handle_ack(sequence_number, cumulative_ack)
+                return
+
+            if packet_type not in (UDP_PACKET_DATA, UDP_PACKET_CLOSE):
+                return
+
+            # Data also acknowledges whatever the peer had received when sending it
+            self._handle_ack(None, cumulative_ack)
+
+            is_duplicate = (sequence_number < self._next_expected_sequence_number
+                            or sequence_number in self._early_arrivals)
+
+            if is_duplicate:
+                # The peer didn't get the acknowledgment for this one, so acknowledge it again below
+                self.duplicate_count += 1
+
+            elif sequence_number - self._next_expected_sequence_number >= UDP_RECEIVE_WINDOW:
+                # Too far ahead to hold; the peer will retransmit it once the gap is filled
+                return
+
+            else:
+                self._early_arrivals[sequence_number] = (packet_type, datagram[_UDP_HEADER.size:])
+
+                while self._next_expected_sequence_number in self._early_arrivals:
+                    in_order_type, payload = self._early_arrivals.pop(self._next_expected_sequence_number)
+                    self._next_expected_sequence_number += 1
+                    self._deliver(in_order_type, payload)
+
+            self._transmit(_UDP_HEADER.pack(UDP_PACKET_ACK, sequence_number, self._next_expected_sequence_number))
+
+    def _deliver(self, packet_type: int, payload: bytes):
+        """
+        Hands an in-order datagram's contents to the game. The caller holds the lock.
+        :param packet_type: UDP_PACKET_DATA or UDP_PACKET_CLOSE
+        :param payload: bytes the datagram carried
+        """
+        if packet_type == UDP_PACKET_CLOSE:
+            self._has_peer_closed = True
+            self._delivery_writer.shutdown(socket_module.SHUT_WR)
+
+        elif not self._has_peer_closed:
+            # The game reads every message as it arrives, so the pair's buffer never fills in practice
+            self._delivery_writer.sendall(payload)
+
+    def _handle_ack(self, sequence_number: Optional[int], cumulative_ack: int):
+        """
+        Forgets acknowledged datagrams and updates the round-trip time estimate. The caller holds the lock.
+        :param sequence_number: a datagram acknowledged individually, or None
+        :param cumulative_ack: every datagram before this sequence number is acknowledged too
+        """
+        acked_sequence_numbers = [acked for acked in self._unacked if acked < cumulative_ack or acked == sequence_number]
+        if len(acked_sequence_numbers) == 0:
+            return
+
+        now = time.monotonic()
+        for acked_sequence_number in acked_sequence_numbers:
+            unacked = self._unacked.pop(acked_sequence_number)
+
+            # Only datagrams sent once give a trustworthy sample, since a late ack could answer either copy
+            if unacked.retransmit_count == 0:
+                self._update_retransmit_timeout(now - unacked.sent_at)
+
+        self._all_acked.notify_all()
+
+    def _update_retransmit_timeout(self, round_trip_time: float):
+        """
+        Folds a round-trip time sample into the retransmit timeout, the way TCP does (RFC 6298).
+        The caller holds the lock.
+        :param round_trip_time: seconds between sending a datagram and its acknowledgment
+        """
+        if self._smoothed_round_trip_time is None:
+            self._smoothed_round_trip_time = round_trip_time
+            self._round_trip_time_variation = round_trip_time / 2
+        else:
+            self._round_trip_time_variation = (0.75 * self._round_trip_time_variation
+                                               + 0.25 * abs(self._smoothed_round_trip_time - round_trip_time))
+            self._smoothed_round_trip_time = 0.875 * self._smoothed_round_trip_time + 0.125 * round_trip_time
+
+        retransmit_timeout = self._smoothed_round_trip_time + 4 * self._round_trip_time_variation
+        self._retransmit_timeout = min(max(retransmit_timeout, UDP_MIN_RETRANSMIT_TIMEOUT), UDP_MAX_RETRANSMIT_TIMEOUT)
+
+    def _retransmit_overdue(self):
+        """
+        Retransmits every datagram whose timer ran out, backing off the timer each time,
+        and gives up on the peer if one has gone unanswered too many times
+        """
+        with self._lock:
+            now = time.monotonic()
+            overdue = [unacked for unacked in self._unacked.values() if unacked.deadline <= now]
+            if len(overdue) == 0:
+                return
+
+            if any(unacked.retransmit_count >= UDP_MAX_RETRANSMITS for unacked in overdue):
+                self._error = ConnectionResetError('peer stopped acknowledging')
+                self._delivery_writer.shutdown(socket_module.SHUT_WR)
+                self._all_acked.notify_all()
+                return
+
+            self._retransmit_timeout = min(2 * self._retransmit_timeout, UDP_MAX_RETRANSMIT_TIMEOUT)
+
+            for unacked in overdue:
+                unacked.retransmit_count += 1
+                unacked.deadline = now + self._retransmit_timeout
+                self.retransmit_count += 1
+                self._transmit(unacked.datagram)
+
+    def _transmit_held(self):
+        """
+        Sends the datagram held back to simulate reordering. The caller holds the lock.
+        """
+        held_datagram, self._held_datagram = self._held_datagram, None
+
+        try:
+            self._udp_socket.send(held_datagram)
+        except ConnectionRefusedError:
+            pass